@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import BedrockModelConfig, ProcessingConfig, ProcessingJob
+from .models import BedrockModelConfig, ProcessingConfig, ProcessingJob, OCRCacheEntry
 
 
 @admin.register(BedrockModelConfig)
@@ -17,7 +17,7 @@ class BedrockModelConfigAdmin(admin.ModelAdmin):
             'fields': ('name', 'model_id', 'region', 'is_default', 'is_active')
         }),
         ('Model Parameters', {
-            'fields': ('max_tokens', 'temperature', 'top_p', 'prompt_template')
+            'fields': ('max_tokens', 'temperature', 'top_p', 'prompt_template', 'pdf_compaction')
         }),
         ('Pricing', {
             'fields': ('input_token_cost', 'output_token_cost'),
@@ -202,3 +202,20 @@ class ProcessingJobAdmin(admin.ModelAdmin):
         self.message_user(request, f'{count} failed job(s) marked for retry.')
     retry_failed_jobs.short_description = "Retry selected failed jobs"
 
+
+
+@admin.register(OCRCacheEntry)
+class OCRCacheEntryAdmin(admin.ModelAdmin):
+    """Admin interface for OCRCacheEntry model"""
+    
+    list_display = ('pdf_sha256_short', 'model_id', 'hit_count', 'size_bytes', 'created_at', 'last_accessed_at')
+    list_filter = ('model_id', 'created_at')
+    search_fields = ('cache_key', 'pdf_sha256', 'model_id')
+    readonly_fields = ('cache_key', 'pdf_sha256', 'model_id', 'prompt_hash', 'config_hash', 'result_text',
+                       'usage', 'size_bytes', 'hit_count', 'created_at', 'last_accessed_at')
+    date_hierarchy = 'created_at'
+    
+    def pdf_sha256_short(self, obj):
+        """Display shortened PDF hash"""
+        return obj.pdf_sha256[:12]
+    pdf_sha256_short.short_description = 'PDF SHA-256'
@@ -6,3 +6,5 @@ class InvoiceOcrConfig(AppConfig):
     name = 'invoice_ocr'
     verbose_name = 'Invoice OCR'
 
+    def ready(self):
+        from invoice_ocr import signals  # noqa: F401
@@ -0,0 +1,119 @@
+"""
+Pluggable LLM backends.
+
+Both BedrockLLMService (Converse / ConverseStream OCR calls) and
+BedrockKnowledgeBaseService (retrieve_and_generate, Retrieve and Converse
+verification calls) get their clients from the active backend, selected by the
+'llm_backend' config key:
+
+- 'bedrock' (default): pooled boto3 clients from invoice_ocr.clients.
+- 'fake': in-process clients from invoice_ocr.fake_backend that answer with
+  canned or generated JSON after a simulated latency, for load tests without
+  live Bedrock or spend.
+- A dotted path to any LLMBackend subclass.
+
+A backend hands out objects with the boto3 client methods used by the services
+(converse, converse_stream, invoke_model, retrieve_and_generate, retrieve),
+taking the same keyword arguments and returning the same response shapes, so
+the services' request building, response parsing and retry handling are
+exercised unchanged whichever backend is active.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+from django.utils.module_loading import import_string
+
+from invoice_ocr import clients
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.exceptions import ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = {
+    'bedrock': 'invoice_ocr.backends.BedrockBackend',
+    'fake': 'invoice_ocr.fake_backend.FakeBackend',
+}
+
+_backends: Dict[str, 'LLMBackend'] = {}
+_backends_lock = threading.Lock()
+
+
+class LLMBackend:
+    """Interface for a source of Bedrock-compatible clients."""
+
+    name = None
+
+    def get_client(self, service_name: str, region_name: Optional[str] = None):
+        """
+        Get a client for a Bedrock service.
+
+        Args:
+            service_name: 'bedrock-runtime' or 'bedrock-agent-runtime'
+            region_name: AWS region (defaults to bedrock_region config)
+
+        Returns:
+            Object implementing the boto3 client methods the services call
+        """
+        raise NotImplementedError
+
+
+class BedrockBackend(LLMBackend):
+    """Live AWS Bedrock through the shared, pooled boto3 clients."""
+
+    name = 'bedrock'
+
+    def get_client(self, service_name: str, region_name: Optional[str] = None):
+        return clients.get_client(service_name, region_name)
+
+
+def get_backend(name: Optional[str] = None) -> LLMBackend:
+    """
+    Get the LLM backend instance, creating it on first use.
+
+    Args:
+        name: Backend alias or dotted class path (defaults to llm_backend config)
+
+    Returns:
+        LLMBackend: Shared backend instance
+
+    Raises:
+        ConfigurationError: If the backend cannot be imported
+    """
+    name = name or ConfigManager.get_llm_backend()
+    backend = _backends.get(name)
+    if backend is not None:
+        return backend
+
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            try:
+                backend_class = import_string(LLM_BACKENDS.get(name, name))
+            except ImportError as e:
+                raise ConfigurationError(f"Unknown LLM backend '{name}': {str(e)}")
+            backend = backend_class()
+            _backends[name] = backend
+            if name != 'bedrock':
+                logger.warning(f"Using non-Bedrock LLM backend '{name}'")
+        return backend
+
+
+def get_client(service_name: str, region_name: Optional[str] = None):
+    """
+    Get a client for a Bedrock service from the active backend.
+
+    Args:
+        service_name: 'bedrock-runtime' or 'bedrock-agent-runtime'
+        region_name: AWS region (defaults to bedrock_region config)
+
+    Returns:
+        Client from the active backend
+    """
+    return get_backend().get_client(service_name, region_name)
+
+
+def reset_backends():
+    """Drop cached backend instances (used by tests and after backend config changes)."""
+    with _backends_lock:
+        _backends.clear()
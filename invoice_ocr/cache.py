@@ -0,0 +1,151 @@
+"""
+Content-addressed cache for OCR extraction results.
+
+Entries are keyed on the SHA-256 of the PDF bytes together with the model ID,
+a hash of the effective prompt and a hash of the inference configuration, so a
+change to any of them produces a cache miss.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Optional, Dict, Any
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.models import OCRCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class OCRResultCache:
+    """Persistent OCR result cache backed by the OCRCacheEntry model."""
+
+    @staticmethod
+    def build_key(pdf_bytes: bytes, model_id: str, prompt: str, config: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Build the cache key components for an extraction request.
+
+        Args:
+            pdf_bytes: Raw PDF bytes sent to the model
+            model_id: AWS Bedrock model ID
+            prompt: Effective prompt text sent with the document
+            config: Inference configuration (temperature, max_tokens, etc.)
+
+        Returns:
+            dict: 'cache_key', 'pdf_sha256', 'prompt_hash' and 'config_hash'
+        """
+        pdf_sha256 = _sha256(pdf_bytes)
+        prompt_hash = _sha256(prompt.encode('utf-8'))
+        config_hash = _sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+        cache_key = _sha256(f"{pdf_sha256}:{model_id}:{prompt_hash}:{config_hash}".encode('utf-8'))
+        return {
+            'cache_key': cache_key,
+            'pdf_sha256': pdf_sha256,
+            'prompt_hash': prompt_hash,
+            'config_hash': config_hash,
+        }
+
+    @staticmethod
+    def get(cache_key: str) -> Optional[OCRCacheEntry]:
+        """
+        Look up a cached result, discarding it if it is older than the configured max age.
+
+        Args:
+            cache_key: Key returned by build_key()
+
+        Returns:
+            OCRCacheEntry or None on a miss
+        """
+        entry = OCRCacheEntry.objects.filter(cache_key=cache_key).first()
+        if not entry:
+            return None
+
+        max_age_days = ConfigManager.get_ocr_cache_max_age_days()
+        if max_age_days and entry.created_at < timezone.now() - timedelta(days=max_age_days):
+            logger.info(f"OCR cache entry {cache_key[:12]} expired, discarding")
+            entry.delete()
+            return None
+
+        now = timezone.now()
+        OCRCacheEntry.objects.filter(pk=entry.pk).update(hit_count=F('hit_count') + 1, last_accessed_at=now)
+        entry.hit_count += 1
+        entry.last_accessed_at = now
+        return entry
+
+    @staticmethod
+    def set(key_parts: Dict[str, str], model_id: str, result_text: str, usage: Dict[str, Any]) -> OCRCacheEntry:
+        """
+        Store an extraction result and evict old entries if the cache is over its limits.
+
+        Args:
+            key_parts: Dictionary returned by build_key()
+            model_id: AWS Bedrock model ID
+            result_text: Extracted result to cache
+            usage: Token usage and cost information of the extraction
+
+        Returns:
+            OCRCacheEntry: Stored entry
+        """
+        entry, _ = OCRCacheEntry.objects.update_or_create(
+            cache_key=key_parts['cache_key'],
+            defaults={
+                'pdf_sha256': key_parts['pdf_sha256'],
+                'model_id': model_id,
+                'prompt_hash': key_parts['prompt_hash'],
+                'config_hash': key_parts['config_hash'],
+                'result_text': result_text,
+                'usage': usage,
+                'size_bytes': len(result_text.encode('utf-8')),
+                'last_accessed_at': timezone.now(),
+            }
+        )
+        OCRResultCache.evict()
+        return entry
+
+    @staticmethod
+    def evict(max_age_days: Optional[int] = None, max_size_mb: Optional[float] = None) -> int:
+        """
+        Evict entries older than max_age_days, then least recently used entries
+        until the total cached size is under max_size_mb.
+
+        Args:
+            max_age_days: Maximum entry age (defaults to ocr_cache_max_age_days config)
+            max_size_mb: Maximum total cache size (defaults to ocr_cache_max_size_mb config)
+
+        Returns:
+            int: Number of evicted entries
+        """
+        if max_age_days is None:
+            max_age_days = ConfigManager.get_ocr_cache_max_age_days()
+        if max_size_mb is None:
+            max_size_mb = ConfigManager.get_ocr_cache_max_size_mb()
+
+        evicted = 0
+        if max_age_days:
+            cutoff = timezone.now() - timedelta(days=max_age_days)
+            evicted += OCRCacheEntry.objects.filter(created_at__lt=cutoff).delete()[0]
+
+        if max_size_mb:
+            max_size_bytes = int(float(max_size_mb) * 1024 * 1024)
+            total_size = OCRCacheEntry.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+            if total_size > max_size_bytes:
+                stale_ids = []
+                for entry_id, size_bytes in OCRCacheEntry.objects.order_by(
+                    F('last_accessed_at').asc(nulls_first=True), 'created_at'
+                ).values_list('id', 'size_bytes'):
+                    if total_size <= max_size_bytes:
+                        break
+                    stale_ids.append(entry_id)
+                    total_size -= size_bytes
+                evicted += OCRCacheEntry.objects.filter(id__in=stale_ids).delete()[0]
+
+        if evicted:
+            logger.info(f"Evicted {evicted} OCR cache entries")
+        return evicted
@@ -0,0 +1,81 @@
+"""
+Process-wide registry of pooled boto3 clients.
+
+Creating a boto3 client resolves credentials and loads endpoint and service
+models, which is expensive relative to a Bedrock call setup. Clients are
+thread-safe, so one client per (service, region) is created lazily and
+reused by every service instance, worker thread and, on Lambda, every warm
+invocation of the same container.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from invoice_ocr.config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[Tuple[str, str], object] = {}
+_clients_lock = threading.Lock()
+_session = None
+
+
+def build_client_config() -> Config:
+    """
+    Build the botocore client config shared by all Bedrock clients.
+
+    - Per-call connect/read timeouts.
+    - A connection pool sized for our concurrency, with TCP keep-alive so
+      pooled connections survive idle periods between invocations.
+    - Adaptive retry mode for its client-side rate limiting. botocore's own
+      retry attempts stay at one so that call_with_resilience() is the single
+      place retries happen and are accounted for.
+    """
+    return Config(
+        connect_timeout=ConfigManager.get_connect_timeout(),
+        read_timeout=ConfigManager.get_read_timeout(),
+        max_pool_connections=ConfigManager.get_max_pool_connections(),
+        tcp_keepalive=True,
+        retries={'mode': 'adaptive', 'total_max_attempts': 1},
+    )
+
+
+def get_client(service_name: str, region_name: Optional[str] = None):
+    """
+    Get the shared boto3 client for a service and region, creating it on first use.
+
+    Args:
+        service_name: boto3 service name (e.g. 'bedrock-runtime', 'bedrock-agent-runtime')
+        region_name: AWS region (defaults to bedrock_region config)
+
+    Returns:
+        botocore client
+    """
+    global _session
+    region_name = region_name or ConfigManager.get_bedrock_region()
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # boto3.Session is not thread-safe; clients are created under the lock only
+            if _session is None:
+                _session = boto3.session.Session()
+            client = _session.client(service_name, region_name=region_name, config=build_client_config())
+            _clients[key] = client
+            logger.info(f"Created {service_name} client for {region_name}")
+        return client
+
+
+def reset_clients():
+    """Drop all cached clients (used by tests and after credential or config changes)."""
+    global _session
+    with _clients_lock:
+        _clients.clear()
+        _session = None
@@ -0,0 +1,104 @@
+"""
+Adaptive concurrency control for batches of Bedrock calls.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Additive-increase / multiplicative-decrease limiter for concurrent Bedrock calls.
+
+    The number of in-flight calls starts at initial_limit and grows by roughly one slot
+    per window of successful calls, up to max_limit. Each throttle response cuts the limit
+    by decrease_factor (at most once per cooldown period, so a burst of throttles from the
+    same window only counts once). An optional requests-per-minute cap spaces call starts
+    so a batch can run close to the account's Bedrock RPM quota without exceeding it.
+    """
+
+    def __init__(self, max_limit: int, initial_limit: Optional[int] = None, min_limit: int = 1,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 1.0,
+                 max_requests_per_minute: Optional[int] = None):
+        """
+        Initialize limiter.
+
+        Args:
+            max_limit: Maximum number of concurrent calls (usually the worker pool size)
+            initial_limit: Starting concurrency (defaults to max_limit)
+            min_limit: Minimum concurrency after throttling
+            decrease_factor: Multiplier applied to the limit on throttling
+            decrease_cooldown: Minimum seconds between two decreases
+            max_requests_per_minute: Optional cap on call starts per minute
+        """
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.limit = float(min(initial_limit or self.max_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.min_interval = 60.0 / max_requests_per_minute if max_requests_per_minute else 0.0
+        self.in_flight = 0
+        self.throttle_count = 0
+        self.success_count = 0
+        self._condition = threading.Condition()
+        self._last_decrease = 0.0
+        self._next_start = 0.0
+
+    @property
+    def current_limit(self) -> int:
+        """Current number of calls allowed in flight."""
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self):
+        """Block until a call slot is available and the request rate allows a new call."""
+        with self._condition:
+            while self.in_flight >= self.current_limit:
+                self._condition.wait()
+            self.in_flight += 1
+            delay = 0.0
+            if self.min_interval:
+                now = time.monotonic()
+                start_at = max(now, self._next_start)
+                self._next_start = start_at + self.min_interval
+                delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self):
+        """Release a call slot."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Context manager wrapping acquire()/release()."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self):
+        """Record a successful call and grow the limit additively."""
+        with self._condition:
+            self.success_count += 1
+            if self.limit < self.max_limit:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        """Record a throttled call and shrink the limit multiplicatively."""
+        with self._condition:
+            self.throttle_count += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            previous = self.current_limit
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+            logger.warning(f"Bedrock throttling detected, reducing concurrency from {previous} to {self.current_limit}")
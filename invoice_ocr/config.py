@@ -1,14 +1,54 @@
 """
 Configuration manager for invoice_ocr app.
 Reads all configuration from database models.
+
+Outside an operation every get_config() call reads ProcessingConfig. Extraction
+and verification entry points run inside ConfigManager.snapshot(), which loads
+all ProcessingConfig values with one query and serves get_config() from them on
+every thread until the last running operation ends. Saving or deleting a
+ProcessingConfig drops the snapshot (see invoice_ocr.signals), and it is reloaded
+after SNAPSHOT_TTL_SECONDS so long batches see changes made by other processes.
 """
+from contextlib import contextmanager
 from django.core.exceptions import ObjectDoesNotExist
 from invoice_ocr.models import BedrockModelConfig, ProcessingConfig
 from invoice_ocr.exceptions import ConfigurationError, ModelNotFoundError
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_TTL_SECONDS = 30.0
+
+_snapshot_lock = threading.Lock()
+_snapshot_users = 0
+_snapshot = None  # (loaded_at, {key: value}) while an operation is running
+
+
+def _load_snapshot():
+    """Load every ProcessingConfig value; call with _snapshot_lock held."""
+    global _snapshot
+    _snapshot = (time.monotonic(), dict(ProcessingConfig.objects.values_list('key', 'value')))
+    return _snapshot[1]
+
+
+def _snapshot_values():
+    """Get the current snapshot's values, reloading them if stale, or None outside an operation."""
+    with _snapshot_lock:
+        if not _snapshot_users:
+            return None
+        if _snapshot is None or time.monotonic() - _snapshot[0] >= SNAPSHOT_TTL_SECONDS:
+            return _load_snapshot()
+        return _snapshot[1]
+
+
+def invalidate_config_snapshot():
+    """Drop the config snapshot so the next get_config() reads the database."""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
 
 class ConfigManager:
     """Manages configuration by reading from database models."""
@@ -88,6 +128,31 @@ class ConfigManager:
         """
         return BedrockModelConfig.objects.filter(is_active=True).order_by('-is_default', 'name')
     
+    @staticmethod
+    def get_cascade_models():
+        """
+        Get the model cascade order for OCR, cheapest tier first.
+        
+        Uses the 'cascade_model_ids' config list when set; otherwise all active models
+        ordered by per-token price.
+        
+        Returns:
+            list: BedrockModelConfig instances in escalation order
+            
+        Raises:
+            ModelNotFoundError: If a configured model is not found or no model is active
+        """
+        model_ids = ConfigManager.get_config('cascade_model_ids', [])
+        if model_ids:
+            return [ConfigManager.get_model_by_id(model_id) for model_id in model_ids]
+        models = sorted(
+            ConfigManager.list_active_models(),
+            key=lambda model: (model.input_token_cost + model.output_token_cost, model.name)
+        )
+        if not models:
+            raise ModelNotFoundError("No active models configured for the OCR cascade")
+        return models
+    
     @staticmethod
     def get_config(key, default=None):
         """
@@ -100,8 +165,38 @@ class ConfigManager:
         Returns:
             Any: Configuration value or default
         """
+        values = _snapshot_values()
+        if values is not None:
+            return values.get(key, default)
         return ProcessingConfig.get_value(key, default)
     
+    @staticmethod
+    @contextmanager
+    def snapshot():
+        """
+        Serve get_config() from one load of all configuration values for an operation.
+        
+        Usable as a context manager or decorator; nested and concurrent operations share
+        the snapshot. It is loaded on entry, on the calling thread, so worker threads
+        started by the operation read the same values.
+        """
+        global _snapshot_users, _snapshot
+        with _snapshot_lock:
+            _snapshot_users += 1
+            if _snapshot is None or time.monotonic() - _snapshot[0] >= SNAPSHOT_TTL_SECONDS:
+                try:
+                    _load_snapshot()
+                except Exception:
+                    _snapshot_users -= 1
+                    raise
+        try:
+            yield
+        finally:
+            with _snapshot_lock:
+                _snapshot_users -= 1
+                if not _snapshot_users:
+                    _snapshot = None
+    
     @staticmethod
     def set_config(key, value, description=''):
         """
@@ -128,3 +223,289 @@ class ConfigManager:
     def get_bedrock_region():
         """Get default AWS region for Bedrock."""
         return ConfigManager.get_config('bedrock_region', 'us-east-1')
+    
+    @staticmethod
+    def get_ocr_cache_enabled():
+        """Get whether OCR results are served from and stored in the result cache."""
+        return bool(ConfigManager.get_config('ocr_cache_enabled', True))
+    
+    @staticmethod
+    def get_ocr_streaming_enabled():
+        """Get whether uploads extract via ConverseStream and persist line items as they arrive."""
+        return bool(ConfigManager.get_config('ocr_streaming_enabled', False))
+    
+    @staticmethod
+    def get_ocr_cache_max_age_days():
+        """Get maximum age of OCR cache entries in days (0 disables age eviction)."""
+        return ConfigManager.get_config('ocr_cache_max_age_days', 90)
+    
+    @staticmethod
+    def get_ocr_cache_max_size_mb():
+        """Get maximum total size of the OCR cache in MB (0 disables size eviction)."""
+        return ConfigManager.get_config('ocr_cache_max_size_mb', 256)
+    
+    @staticmethod
+    def get_batch_max_workers():
+        """Get maximum number of concurrent Bedrock calls for batch processing."""
+        return int(ConfigManager.get_config('batch_max_workers', 8))
+    
+    @staticmethod
+    def get_batch_max_requests_per_minute():
+        """Get Bedrock requests-per-minute cap for batch processing (0 disables the cap)."""
+        return int(ConfigManager.get_config('batch_max_requests_per_minute', 0))
+    
+    @staticmethod
+    def get_page_split_enabled():
+        """Get whether multi-page PDFs are split into page ranges extracted concurrently."""
+        return bool(ConfigManager.get_config('page_split_enabled', False))
+    
+    @staticmethod
+    def get_page_split_pages_per_chunk():
+        """Get the number of pages per range when splitting PDFs."""
+        return int(ConfigManager.get_config('page_split_pages_per_chunk', 2))
+    
+    @staticmethod
+    def get_pdf_downsample_dpi():
+        """Get the target image resolution for the 'downsample' PDF compaction policy."""
+        return int(ConfigManager.get_config('pdf_downsample_dpi', 150))
+    
+    @staticmethod
+    def get_pdf_max_pages():
+        """Get the maximum number of pages accepted by PDF preflight (0 = no limit)."""
+        return int(ConfigManager.get_config('pdf_max_pages', 0))
+    
+    @staticmethod
+    def get_text_layer_enabled():
+        """Get whether born-digital PDFs are extracted from their text layer instead of multimodal."""
+        return bool(ConfigManager.get_config('text_layer_enabled', False))
+    
+    @staticmethod
+    def get_text_layer_min_chars_per_page():
+        """Get the minimum characters a page needs for the text layer to count it as covered."""
+        return int(ConfigManager.get_config('text_layer_min_chars_per_page', 200))
+    
+    @staticmethod
+    def get_text_layer_min_page_coverage():
+        """Get the minimum fraction of pages with text required to use the text layer."""
+        return float(ConfigManager.get_config('text_layer_min_page_coverage', 0.9))
+    
+    @staticmethod
+    def get_cascade_enabled():
+        """Get whether OCR escalates through the model cascade when validation fails."""
+        return bool(ConfigManager.get_config('cascade_enabled', False))
+    
+    @staticmethod
+    def get_cascade_thresholds():
+        """Get the reconciliation thresholds that decide whether a cascade tier's answer is accepted."""
+        return {
+            'total_tolerance': ConfigManager.get_config('cascade_total_tolerance', '0.01'),
+            'total_tolerance_pct': ConfigManager.get_config('cascade_total_tolerance_pct', '0.005'),
+            'max_line_mismatch_ratio': ConfigManager.get_config('cascade_max_line_mismatch_ratio', 0.0),
+            'max_invoice_age_days': ConfigManager.get_config('cascade_max_invoice_age_days', 3650),
+        }
+    
+    @staticmethod
+    def get_prompt_caching_enabled():
+        """Get whether static extraction instructions are sent as a cacheable system prefix."""
+        return bool(ConfigManager.get_config('prompt_caching_enabled', True))
+    
+    @staticmethod
+    def get_prompt_cache_read_multiplier():
+        """Get the price of prompt cache reads as a multiple of the input token price."""
+        return float(ConfigManager.get_config('prompt_cache_read_cost_multiplier', 0.1))
+    
+    @staticmethod
+    def get_prompt_cache_write_multiplier():
+        """Get the price of prompt cache writes as a multiple of the input token price."""
+        return float(ConfigManager.get_config('prompt_cache_write_cost_multiplier', 1.25))
+    
+    @staticmethod
+    def get_structured_output_enabled():
+        """Get whether OCR and KB verification answer through Converse tool use instead of free-text JSON."""
+        return bool(ConfigManager.get_config('structured_output_enabled', False))
+    
+    @staticmethod
+    def get_kb_verification_max_workers():
+        """Get the number of line items verified against the knowledge base concurrently."""
+        return int(ConfigManager.get_config('kb_verification_max_workers', 4))
+    
+    @staticmethod
+    def get_kb_verification_batch_size():
+        """Get the maximum number of line items verified in one KB prompt (1 disables batching)."""
+        return max(1, int(ConfigManager.get_config('kb_verification_batch_size', 1)))
+    
+    @staticmethod
+    def get_kb_retrieval_results():
+        """Get the number of passages retrieved per knowledge base query."""
+        return int(ConfigManager.get_config('kb_retrieval_results', 5))
+    
+    @staticmethod
+    def get_kb_generation_mode():
+        """Get how KB verdicts are generated ('retrieve_and_generate', or 'converse' over separately retrieved passages)."""
+        return ConfigManager.get_config('kb_generation_mode', 'retrieve_and_generate')
+    
+    @staticmethod
+    def get_kb_retrieval_scope():
+        """Get whether passages are retrieved once per 'invoice' or once per 'line_item' when retrieval is split."""
+        return ConfigManager.get_config('kb_retrieval_scope', 'invoice')
+    
+    @staticmethod
+    def get_kb_retrieval_source():
+        """Get where passages are retrieved from ('bedrock' KB Retrieve, or the local 'bm25' or 'vector' index over RAG/state_data)."""
+        return ConfigManager.get_config('kb_retrieval_source', 'bedrock')
+    
+    @staticmethod
+    def get_kb_bm25_index_path():
+        """Get the BM25 index file path (relative paths are resolved against the project root)."""
+        return ConfigManager.get_config('kb_bm25_index_path', 'RAG/state_data_bm25.idx')
+    
+    @staticmethod
+    def get_kb_vector_index_dir():
+        """Get the local vector index directory (relative paths are resolved against the project root)."""
+        return ConfigManager.get_config('kb_vector_index_dir', 'RAG/state_data_vectors')
+    
+    @staticmethod
+    def get_kb_vector_embedder():
+        """Get the embedder for building the local vector index ('hashing', 'titan' or a dotted Embedder class path)."""
+        return ConfigManager.get_config('kb_vector_embedder', 'hashing')
+    
+    @staticmethod
+    def get_kb_vector_dimension():
+        """Get the embedding dimension used when building the local vector index."""
+        return int(ConfigManager.get_config('kb_vector_dimension', 512))
+    
+    @staticmethod
+    def get_kb_retrieval_cache_enabled():
+        """Get whether retrieved KB passages are cached per knowledge base and query signature."""
+        return bool(ConfigManager.get_config('kb_retrieval_cache_enabled', True))
+    
+    @staticmethod
+    def get_kb_retrieval_cache_ttl_seconds():
+        """Get the age in seconds after which cached KB passages are retrieved again (0 = never)."""
+        return int(ConfigManager.get_config('kb_retrieval_cache_ttl_seconds', 3600))
+    
+    @staticmethod
+    def get_kb_retrieval_cache_max_entries():
+        """Get the maximum number of retrieval queries kept in the in-process passage cache."""
+        return int(ConfigManager.get_config('kb_retrieval_cache_max_entries', 1024))
+    
+    @staticmethod
+    def get_verification_cache_enabled():
+        """Get whether KB verdicts are served from and stored in the verification cache."""
+        return bool(ConfigManager.get_config('verification_cache_enabled', True))
+    
+    @staticmethod
+    def get_verification_cache_ttl_days():
+        """Get the age in days after which cached verification verdicts expire (0 = never)."""
+        return int(ConfigManager.get_config('verification_cache_ttl_days', 30))
+    
+    @staticmethod
+    def get_verification_cache_rate_bucket():
+        """Get the width of the applied-rate buckets used in verification cache keys."""
+        return str(ConfigManager.get_config('verification_cache_rate_bucket', '0.0001'))
+    
+    @staticmethod
+    def get_near_duplicate_enabled():
+        """Get whether verdicts of similar, already verified line items are reused before querying the KB."""
+        return bool(ConfigManager.get_config('near_duplicate_enabled', False))
+    
+    @staticmethod
+    def get_near_duplicate_threshold():
+        """Get the minimum estimated description similarity (0-1) for reusing a near-duplicate verdict."""
+        return float(ConfigManager.get_config('near_duplicate_threshold', 0.6))
+    
+    @staticmethod
+    def get_near_duplicate_num_perm():
+        """Get the MinHash signature length used when building the near-duplicate index."""
+        return int(ConfigManager.get_config('near_duplicate_num_perm', 64))
+    
+    @staticmethod
+    def get_near_duplicate_bands():
+        """Get the number of LSH bands used when building the near-duplicate index."""
+        return int(ConfigManager.get_config('near_duplicate_bands', 16))
+    
+    @staticmethod
+    def get_near_duplicate_index_path():
+        """Get the storage name (or local path) the near-duplicate index is saved to and loaded from."""
+        return ConfigManager.get_config('near_duplicate_index_path', 'taxright/near_duplicate_index.bin')
+    
+    @staticmethod
+    def get_near_duplicate_index_storage():
+        """Get where the near-duplicate index is stored ('default' Django storage, e.g. S3, or 'local' files)."""
+        return ConfigManager.get_config('near_duplicate_index_storage', 'default')
+    
+    @staticmethod
+    def get_rule_engine_enabled():
+        """Get whether line items whose applied rate matches the TaxRule combined rate are verified without the KB."""
+        return bool(ConfigManager.get_config('rule_engine_enabled', True))
+    
+    @staticmethod
+    def get_rule_engine_rate_tolerance():
+        """Get the largest difference between the applied and TaxRule combined rate still accepted as a match."""
+        return str(ConfigManager.get_config('rule_engine_rate_tolerance', '0.0001'))
+    
+    @staticmethod
+    def get_tax_rule_index_check_seconds():
+        """Get how often (seconds) the in-memory TaxRule index checks the database for changes made by other processes (0 = never)."""
+        return float(ConfigManager.get_config('tax_rule_index_check_seconds', 60))
+    
+    @staticmethod
+    def get_tax_rule_snapshot_path():
+        """Get the TaxRule index snapshot file read on cold start (relative to the project root; blank disables it)."""
+        return ConfigManager.get_config('tax_rule_snapshot_path', 'taxright/tax_rules.snapshot')
+    
+    @staticmethod
+    def get_taxability_matrix_enabled():
+        """Get whether line items the SUT taxability matrix answers unconditionally are verified without the KB."""
+        return bool(ConfigManager.get_config('taxability_matrix_enabled', True))
+    
+    @staticmethod
+    def get_taxability_matrix_path():
+        """Get the compiled taxability matrix file (relative paths are resolved against the project root)."""
+        return ConfigManager.get_config('taxability_matrix_path', 'RAG/taxability_matrix.json')
+    
+    @staticmethod
+    def get_verification_streaming_enabled():
+        """Get whether the invoice page follows tax verification over server-sent events (off by default: the Zappa deployment sits behind API Gateway, which buffers responses)."""
+        return bool(ConfigManager.get_config('verification_streaming_enabled', False))
+    
+    @staticmethod
+    def get_verification_poll_timeout():
+        """Get the longest a verification progress long-poll waits for new results, in seconds (keep under the API Gateway timeout)."""
+        return float(ConfigManager.get_config('verification_poll_timeout_seconds', 20))
+    
+    @staticmethod
+    def get_verification_in_flight_seconds():
+        """Get how long after its last saved result a verification is treated as still running, refusing a second start, in seconds."""
+        return float(ConfigManager.get_config('verification_in_flight_seconds', 120))
+
+    @staticmethod
+    def get_llm_backend():
+        """Get the LLM backend alias or class path ('bedrock' or 'fake', see invoice_ocr.backends)."""
+        return ConfigManager.get_config('llm_backend', 'bedrock')
+    
+    @staticmethod
+    def get_connect_timeout():
+        """Get per-call connect timeout for Bedrock clients in seconds."""
+        return ConfigManager.get_config('bedrock_connect_timeout_seconds', 10)
+    
+    @staticmethod
+    def get_read_timeout():
+        """Get per-call read timeout for Bedrock clients in seconds."""
+        return ConfigManager.get_config('bedrock_read_timeout_seconds', 120)
+    
+    @staticmethod
+    def get_max_pool_connections():
+        """Get the HTTP connection pool size for Bedrock clients (defaults to at least the batch worker count)."""
+        configured = int(ConfigManager.get_config('bedrock_max_pool_connections', 0))
+        return configured or max(10, ConfigManager.get_batch_max_workers())
+    
+    @staticmethod
+    def get_circuit_breaker_threshold():
+        """Get number of consecutive failures that opens a Bedrock circuit breaker."""
+        return ConfigManager.get_config('circuit_breaker_failure_threshold', 5)
+    
+    @staticmethod
+    def get_circuit_breaker_reset_seconds():
+        """Get seconds an open Bedrock circuit breaker waits before allowing a trial call."""
+        return ConfigManager.get_config('circuit_breaker_reset_seconds', 30)
@@ -26,3 +26,13 @@ class ConfigurationError(InvoiceProcessingError):
 class PDFValidationError(InvoiceProcessingError):
     """Raised when PDF file validation fails."""
     pass
+
+
+class ThrottlingError(BedrockError):
+    """Raised when AWS Bedrock rejects a request because of throttling or quota limits."""
+    pass
+
+
+class CircuitOpenError(BedrockError):
+    """Raised when a call is rejected because the circuit breaker for its model or KB is open."""
+    pass
@@ -0,0 +1,374 @@
+"""
+Latency-simulating local LLM backend for load tests.
+
+FakeBackend implements the Bedrock client methods used by the OCR and tax
+verification services and answers with canned or generated invoice and
+verification JSON. Each call sleeps for a latency drawn from a configurable
+distribution and can fail with a ThrottlingException or return truncated
+output at configurable rates, so the Django pipeline (upload_invoice ->
+verify_invoice_taxes) can be driven at high volume on a laptop without live
+Bedrock or spend.
+
+Configuration (ProcessingConfig keys, read when the backend is created; call
+invoice_ocr.backends.reset_backends() after changing them):
+
+- fake_llm_latency: {'ocr': spec, 'kb': spec, 'retrieve': spec}, where spec is
+  {'distribution': 'fixed', 'seconds': s}, {'distribution': 'uniform', 'low': a, 'high': b},
+  {'distribution': 'lognormal', 'median': m, 'sigma': s} or
+  {'distribution': 'exponential', 'mean': m}
+- fake_llm_throttle_rate: Probability a call raises ThrottlingException
+- fake_llm_truncation_rate: Probability a response stops at max_tokens mid-JSON
+- fake_llm_seed: Random seed for reproducible runs (None = unseeded)
+- fake_llm_line_items: [min, max] line items per generated invoice
+- fake_llm_state_codes: States generated invoices are drawn from
+- fake_llm_invoice_json / fake_llm_verification_json: Canned answers used instead
+  of generated ones (batch verification prompts get one canned verdict per line item)
+"""
+import io
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional, Union
+
+from botocore.exceptions import ClientError
+
+from invoice_ocr.backends import LLMBackend
+from invoice_ocr.config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY = {
+    'ocr': {'distribution': 'lognormal', 'median': 6.0, 'sigma': 0.35},
+    'kb': {'distribution': 'lognormal', 'median': 3.0, 'sigma': 0.4},
+    'retrieve': {'distribution': 'lognormal', 'median': 0.3, 'sigma': 0.3},
+}
+
+# Approximate combined state + typical local rates used for generated invoices
+FAKE_STATE_RATES = {
+    'CA': Decimal('0.0825'), 'GA': Decimal('0.0700'), 'NC': Decimal('0.0700'),
+    'NY': Decimal('0.0800'), 'TX': Decimal('0.0825'), 'FL': Decimal('0.0700'),
+}
+
+FAKE_VENDORS = ('Home Depot', 'RealPage', 'Grainger', 'Staples', 'Sherwin-Williams', 'Ferguson', 'Lowe\'s')
+
+FAKE_DESCRIPTIONS = (
+    '2x4x8 stud lumber', 'Interior latex paint 1 gal', 'PVC pipe 1/2 in x 10 ft', 'Copy paper case',
+    'Software subscription', 'HVAC filter 20x25x1', 'Installation labor', 'LED bulb 4-pack',
+    'Drywall screws 5 lb', 'Janitorial service', 'Extension cord 50 ft', 'Toner cartridge',
+)
+
+# Applied rate as written by BedrockKnowledgeBaseService._build_tax_verification_prompt
+APPLIED_RATE_PATTERN = re.compile(r'\(as decimal: ([0-9.]+)\)')
+
+# Line item sections as written by BedrockKnowledgeBaseService._build_batch_verification_prompt
+BATCH_ITEM_PATTERN = re.compile(r'Line item ID (\d+):.*?\(as decimal: ([0-9.]+)\)', re.DOTALL)
+BATCH_TOOL_NAME = 'record_tax_verifications'
+
+FAKE_PAGE_TOKENS = 1500
+CHARS_PER_TOKEN = 4
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class LatencyDistribution:
+    """Samples simulated call latency in seconds."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        """
+        Initialize distribution.
+
+        Args:
+            spec: Distribution spec, e.g. {'distribution': 'lognormal', 'median': 3.0, 'sigma': 0.4}
+
+        Raises:
+            ValueError: If the distribution is unknown
+        """
+        self.spec = dict(spec)
+        self.kind = self.spec.get('distribution', 'fixed')
+        if self.kind not in ('fixed', 'uniform', 'lognormal', 'exponential'):
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency in seconds."""
+        if self.kind == 'fixed':
+            return float(self.spec.get('seconds', 0.0))
+        if self.kind == 'uniform':
+            return rng.uniform(float(self.spec.get('low', 0.0)), float(self.spec.get('high', 1.0)))
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(math.log(float(self.spec.get('median', 1.0))), float(self.spec.get('sigma', 0.5)))
+        return rng.expovariate(1.0 / float(self.spec.get('mean', 1.0)))
+
+
+class FakeBackend(LLMBackend):
+    """LLM backend that simulates Bedrock in-process."""
+
+    name = 'fake'
+
+    def __init__(self, sleep=time.sleep):
+        """
+        Initialize backend from fake_llm_* configuration.
+
+        Args:
+            sleep: Function used to wait out simulated latency (replaced in tests)
+        """
+        latency = {**DEFAULT_LATENCY, **(ConfigManager.get_config('fake_llm_latency', {}) or {})}
+        self.latency = {kind: LatencyDistribution(spec) for kind, spec in latency.items()}
+        self.throttle_rate = float(ConfigManager.get_config('fake_llm_throttle_rate', 0.0))
+        self.truncation_rate = float(ConfigManager.get_config('fake_llm_truncation_rate', 0.0))
+        self.line_items = tuple(ConfigManager.get_config('fake_llm_line_items', [1, 20]))
+        self.state_codes = list(ConfigManager.get_config('fake_llm_state_codes', sorted(FAKE_STATE_RATES)))
+        self.invoice_json = ConfigManager.get_config('fake_llm_invoice_json', None)
+        self.verification_json = ConfigManager.get_config('fake_llm_verification_json', None)
+        self.rng = random.Random(ConfigManager.get_config('fake_llm_seed', None))
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._clients = {
+            'bedrock-runtime': FakeRuntimeClient(self),
+            'bedrock-agent-runtime': FakeAgentRuntimeClient(self),
+        }
+
+    def get_client(self, service_name: str, region_name: Optional[str] = None):
+        if service_name not in self._clients:
+            raise ValueError(f"Fake backend does not provide {service_name}")
+        return self._clients[service_name]
+
+    def random(self) -> float:
+        with self._lock:
+            return self.rng.random()
+
+    def simulate_call(self, operation: str, kind: str):
+        """
+        Apply simulated throttling and latency for one call.
+
+        Args:
+            operation: Bedrock operation name (for stats and error messages)
+            kind: Latency distribution to use ('ocr', 'kb' or 'retrieve')
+
+        Raises:
+            ClientError: ThrottlingException, at fake_llm_throttle_rate
+        """
+        throttled = self.random() < self.throttle_rate
+        with self._lock:
+            latency = 0.0 if throttled else self.latency[kind].sample(self.rng)
+            stats = self._stats.setdefault(operation, {'calls': 0, 'throttled': 0, 'truncated': 0, 'latency_seconds': 0.0})
+            stats['calls'] += 1
+            stats['throttled'] += int(throttled)
+            stats['latency_seconds'] += latency
+        if throttled:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded (fake backend)'}}, operation)
+        if latency > 0:
+            self.sleep(latency)
+
+    def maybe_truncate(self, operation: str, text: str) -> Optional[str]:
+        """Return a truncated copy of text at fake_llm_truncation_rate, otherwise None."""
+        if not text or self.random() >= self.truncation_rate:
+            return None
+        with self._lock:
+            self._stats[operation]['truncated'] += 1
+            cut = int(len(text) * self.rng.uniform(0.3, 0.9))
+        return text[:cut]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-operation call, throttle, truncation and simulated latency totals."""
+        with self._lock:
+            return {operation: dict(values) for operation, values in self._stats.items()}
+
+    def generate_invoice(self) -> Dict[str, Any]:
+        """Generate an internally consistent invoice in the extraction schema."""
+        if self.invoice_json:
+            return json.loads(json.dumps(self.invoice_json))
+        with self._lock:
+            rng = self.rng
+            state_code = rng.choice(self.state_codes)
+            rate = FAKE_STATE_RATES.get(state_code, Decimal('0.0600'))
+            line_items = []
+            for _ in range(rng.randint(*self.line_items)):
+                quantity = Decimal(rng.randint(1, 12))
+                unit_price = _money(Decimal(str(rng.uniform(2, 400))))
+                line_total = _money(quantity * unit_price)
+                line_items.append({
+                    'description': rng.choice(FAKE_DESCRIPTIONS),
+                    'quantity': str(quantity),
+                    'unit_price': str(unit_price),
+                    'line_total': str(line_total),
+                    'discount_amount': '0.00',
+                    'tax_amount': str(_money(line_total * rate)),
+                    'tax_rate': str(rate),
+                    'tax_status': 'taxable',
+                })
+            invoice_number = f"FAKE-{rng.randint(100000, 999999)}"
+            vendor_name = rng.choice(FAKE_VENDORS)
+            invoice_date = date.today() - timedelta(days=rng.randint(0, 60))
+        total_tax = sum((Decimal(item['tax_amount']) for item in line_items), Decimal('0.00'))
+        subtotal = sum((Decimal(item['line_total']) for item in line_items), Decimal('0.00'))
+        return {
+            'invoice_number': invoice_number,
+            'date': invoice_date.isoformat(),
+            'vendor_name': vendor_name,
+            'total_amount': str(subtotal + total_tax),
+            'total_tax_amount': str(total_tax),
+            'invoice_discount_amount': '0.00',
+            'state_code': state_code,
+            'jurisdiction': '',
+            'line_items': line_items,
+        }
+
+    def generate_verification(self, prompt: str) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Generate verdicts that confirm the applied rates found in the prompt.
+
+        Returns one verdict, or a list of verdicts keyed by line_item_id for batch prompts.
+        """
+        batch_items = BATCH_ITEM_PATTERN.findall(prompt)
+        if batch_items:
+            return [
+                {'line_item_id': int(line_item_id), **self._verdict(float(applied_rate))}
+                for line_item_id, applied_rate in batch_items
+            ]
+        match = APPLIED_RATE_PATTERN.search(prompt)
+        return self._verdict(float(match.group(1)) if match else 0.0)
+
+    def _verdict(self, applied_rate: float) -> Dict[str, Any]:
+        if self.verification_json:
+            return dict(self.verification_json)
+        return {
+            'is_correct': True,
+            'expected_tax_rate': applied_rate,
+            'confidence_score': 0.9,
+            'reasoning': f"Simulated verification: the applied rate {applied_rate:.4f} matches the state rate for this item.",
+        }
+
+
+def _message_text(messages: List[Dict[str, Any]], system: Optional[List[Dict[str, Any]]] = None) -> str:
+    parts = [block['text'] for block in system or [] if 'text' in block]
+    for message in messages:
+        parts.extend(block['text'] for block in message.get('content', []) if 'text' in block)
+    return '\n'.join(parts)
+
+
+def _estimate_input_tokens(messages: List[Dict[str, Any]], text: str) -> int:
+    documents = sum(1 for message in messages for block in message.get('content', []) if 'document' in block)
+    return len(text) // CHARS_PER_TOKEN + documents * FAKE_PAGE_TOKENS
+
+
+class FakeRuntimeClient:
+    """Fake bedrock-runtime client (Converse, ConverseStream and invoke_model)."""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def _answer(self, operation: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = kwargs.get('messages', [])
+        prompt = _message_text(messages, kwargs.get('system'))
+        tool_name = None
+        if kwargs.get('toolConfig'):
+            tool_name = kwargs['toolConfig']['tools'][0]['toolSpec']['name']
+        is_verification = (
+            tool_name in ('record_tax_verification', BATCH_TOOL_NAME) or bool(APPLIED_RATE_PATTERN.search(prompt))
+        )
+
+        self.backend.simulate_call(operation, 'kb' if is_verification else 'ocr')
+        answer = self.backend.generate_verification(prompt) if is_verification else self.backend.generate_invoice()
+        if tool_name == BATCH_TOOL_NAME:
+            answer = {'verifications': answer if isinstance(answer, list) else []}
+        text = json.dumps(answer, indent=2)
+        truncated = self.backend.maybe_truncate(operation, text)
+        if truncated is not None:
+            text = truncated
+
+        if tool_name and truncated is None:
+            content = [{'toolUse': {'toolUseId': 'tooluse_fake', 'name': tool_name, 'input': answer}}]
+            stop_reason = 'tool_use'
+        else:
+            content = [{'text': text}]
+            stop_reason = 'max_tokens' if truncated is not None else 'end_turn'
+        input_tokens = _estimate_input_tokens(messages, prompt)
+        output_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        return {
+            'output': {'message': {'role': 'assistant', 'content': content}},
+            'stopReason': stop_reason,
+            'usage': {'inputTokens': input_tokens, 'outputTokens': output_tokens, 'totalTokens': input_tokens + output_tokens},
+            'metrics': {'latencyMs': 0},
+        }
+
+    def converse(self, **kwargs) -> Dict[str, Any]:
+        return self._answer('Converse', kwargs)
+
+    def converse_stream(self, **kwargs) -> Dict[str, Any]:
+        response = self._answer('ConverseStream', kwargs)
+        block = response['output']['message']['content'][0]
+        if 'toolUse' in block:
+            text = json.dumps(block['toolUse']['input'])
+            make_delta = lambda chunk: {'toolUse': {'input': chunk}}
+        else:
+            text = block['text']
+            make_delta = lambda chunk: {'text': chunk}
+        events = [{'messageStart': {'role': 'assistant'}}]
+        events.extend(
+            {'contentBlockDelta': {'contentBlockIndex': 0, 'delta': make_delta(text[start:start + 64])}}
+            for start in range(0, len(text), 64)
+        )
+        events.append({'contentBlockStop': {'contentBlockIndex': 0}})
+        events.append({'messageStop': {'stopReason': response['stopReason']}})
+        events.append({'metadata': {'usage': response['usage'], 'metrics': response['metrics']}})
+        return {'stream': iter(events)}
+
+    def invoke_model(self, **kwargs) -> Dict[str, Any]:
+        body = json.loads(kwargs.get('body', '{}'))
+        messages = body.get('messages') or [{'content': [{'text': body.get('prompt') or body.get('inputText', '')}]}]
+        for message in messages:
+            if isinstance(message.get('content'), str):
+                message['content'] = [{'text': message['content']}]
+        response = self._answer('InvokeModel', {'messages': messages})
+        text = response['output']['message']['content'][0].get('text', '')
+        response_body = {
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': response['stopReason'],
+            'usage': {
+                'input_tokens': response['usage']['inputTokens'],
+                'output_tokens': response['usage']['outputTokens'],
+            },
+        }
+        return {'body': io.BytesIO(json.dumps(response_body).encode('utf-8'))}
+
+
+class FakeAgentRuntimeClient:
+    """Fake bedrock-agent-runtime client (retrieve_and_generate and Retrieve)."""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def retrieve_and_generate(self, **kwargs) -> Dict[str, Any]:
+        prompt = kwargs.get('input', {}).get('text', '')
+        self.backend.simulate_call('RetrieveAndGenerate', 'kb')
+        text = json.dumps(self.backend.generate_verification(prompt), indent=2)
+        truncated = self.backend.maybe_truncate('RetrieveAndGenerate', text)
+        return {
+            'output': {'text': truncated if truncated is not None else text},
+            'citations': [],
+            'sessionId': 'fake-session',
+        }
+
+    def retrieve(self, **kwargs) -> Dict[str, Any]:
+        self.backend.simulate_call('Retrieve', 'retrieve')
+        query = kwargs.get('retrievalQuery', {}).get('text', '')
+        count = kwargs.get('retrievalConfiguration', {}).get('vectorSearchConfiguration', {}).get('numberOfResults', 5)
+        return {
+            'retrievalResults': [
+                {
+                    'content': {'text': f"Simulated passage {idx} on the sales tax treatment of: {query}"},
+                    'location': {'type': 'S3', 's3Location': {'uri': f"s3://fake-kb/passage-{idx}.txt"}},
+                    'score': round(1.0 - idx * 0.05, 3),
+                }
+                for idx in range(count)
+            ]
+        }
@@ -0,0 +1,49 @@
+"""
+Management command to evict old or excess OCR cache entries.
+
+Usage:
+    # Evict using ocr_cache_max_age_days / ocr_cache_max_size_mb config
+    python manage.py evict_ocr_cache
+    
+    # Override limits
+    python manage.py evict_ocr_cache --max-age-days 30 --max-size-mb 100
+    
+    # Remove every cached result
+    python manage.py evict_ocr_cache --all
+"""
+from django.core.management.base import BaseCommand
+from invoice_ocr.cache import OCRResultCache
+from invoice_ocr.models import OCRCacheEntry
+
+
+class Command(BaseCommand):
+    help = 'Evict OCR result cache entries by age or total size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-days',
+            type=int,
+            default=None,
+            help='Evict entries older than this many days. Overrides ocr_cache_max_age_days config.'
+        )
+        parser.add_argument(
+            '--max-size-mb',
+            type=float,
+            default=None,
+            help='Evict least recently used entries until the cache is under this size. Overrides ocr_cache_max_size_mb config.'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Remove all cache entries'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            count = OCRCacheEntry.objects.all().delete()[0]
+        else:
+            count = OCRResultCache.evict(
+                max_age_days=options['max_age_days'],
+                max_size_mb=options['max_size_mb']
+            )
+        self.stdout.write(self.style.SUCCESS(f'Evicted {count} OCR cache entries'))
@@ -0,0 +1,96 @@
+"""
+Management command to OCR a batch of invoice PDFs concurrently via AWS Bedrock.
+
+Usage:
+    # Process every PDF in a directory with the default model
+    python manage.py process_invoice_batch /path/to/invoices/
+
+    # Process specific files with 16 workers, capped at 200 requests/minute
+    python manage.py process_invoice_batch a.pdf b.pdf c.pdf --max-workers 16 --max-rpm 200
+"""
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from invoice_ocr.services import InvoiceProcessor
+
+
+class Command(BaseCommand):
+    help = 'Process a batch of invoice PDFs concurrently via AWS Bedrock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            type=str,
+            help='PDF files or directories containing PDF files'
+        )
+        parser.add_argument(
+            '--model-id',
+            type=str,
+            default=None,
+            help='AWS Bedrock model ID to use. If not specified, uses default model.'
+        )
+        parser.add_argument(
+            '--max-workers',
+            type=int,
+            default=None,
+            help='Maximum concurrent Bedrock calls. Overrides batch_max_workers config.'
+        )
+        parser.add_argument(
+            '--max-rpm',
+            type=int,
+            default=None,
+            help='Maximum Bedrock requests per minute. Overrides batch_max_requests_per_minute config.'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Bypass the OCR result cache'
+        )
+
+    def handle(self, *args, **options):
+        file_paths = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                file_paths.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith('.pdf')
+                )
+            elif os.path.isfile(path):
+                file_paths.append(path)
+            else:
+                raise CommandError(f'Path not found: {path}')
+
+        if not file_paths:
+            raise CommandError('No PDF files found')
+
+        kwargs = {}
+        if options['no_cache']:
+            kwargs['use_cache'] = False
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Processing {len(file_paths)} invoices ==='))
+        start_time = time.time()
+        completed = 0
+        failed = 0
+        total_cost = 0.0
+
+        processor = InvoiceProcessor()
+        for item in processor.process_batch(
+            file_paths,
+            model_id=options['model_id'],
+            max_workers=options['max_workers'],
+            max_requests_per_minute=options['max_rpm'],
+            **kwargs
+        ):
+            if item['status'] == 'completed':
+                completed += 1
+                total_cost += (item['usage_info'] or {}).get('totalCost', 0.0)
+                self.stdout.write(f"  [OK] {item['file_path']} (job {item['job_id']}, throttle retries: {item['throttle_retries']})")
+            else:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"  [FAILED] {item['file_path']}: {item['error']}"))
+
+        elapsed = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f'\nCompleted: {completed}, Failed: {failed}, Time: {elapsed:.2f}s, Total cost: ${total_cost:.8f}'
+        ))
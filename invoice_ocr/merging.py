@@ -0,0 +1,107 @@
+"""
+Merging of per-page-range extractions into a single invoice.
+
+When a large PDF is split into page ranges (see BedrockLLMService.process_invoice_split),
+each range is extracted independently. Every range tends to repeat the invoice header,
+items carried over a page break may be reported by both neighbouring ranges, and the
+invoice totals only appear on the final page.
+"""
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Invoice-level amounts printed on the final page; taken from the last range that reports them
+TOTAL_FIELDS = ('total_amount', 'total_tax_amount', 'invoice_discount_amount')
+
+# Placeholder values the extraction prompt produces when a field is not visible
+EMPTY_VALUES = ('', None, 'UNKNOWN', 'Unknown Vendor')
+
+
+def _to_decimal(value: Any) -> Decimal:
+    """Convert an extracted amount to Decimal, treating unparseable values as zero."""
+    if value is None:
+        return Decimal('0')
+    try:
+        if isinstance(value, str):
+            value = value.replace('$', '').replace(',', '').strip() or '0'
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal('0')
+
+
+def _item_signature(item: Dict[str, Any]) -> Tuple:
+    """Identity of a line item for duplicate detection across page boundaries."""
+    return (
+        ' '.join(str(item.get('description', '')).lower().split()),
+        _to_decimal(item.get('quantity')),
+        _to_decimal(item.get('unit_price')),
+        _to_decimal(item.get('line_total')),
+    )
+
+
+def merge_invoice_chunks(chunks: List[Dict[str, Any]], boundary_window: int = 3) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Merge page-range extractions, given in page order, into one invoice.
+
+    - Header fields: first range with a real value wins (repeated headers collapse).
+    - Totals: the last range reporting a non-zero value wins (final-page totals).
+    - Line items: concatenated in page order. An item that repeats one of the last
+      boundary_window items of the previous range is dropped as a page-break duplicate.
+
+    Args:
+        chunks: Parsed invoice dicts, one per page range
+        boundary_window: Number of trailing items of the previous range checked for duplicates
+
+    Returns:
+        tuple: (merged_invoice, report)
+            - merged_invoice: Single invoice dict in the extraction schema
+            - report: 'duplicates_removed', 'line_items_total', 'total_amount',
+              'difference' and 'totals_match'
+    """
+    merged: Dict[str, Any] = {}
+    line_items: List[Dict[str, Any]] = []
+    duplicates_removed = 0
+    previous_tail: List[Tuple] = []
+
+    for chunk in chunks:
+        for key, value in chunk.items():
+            if key == 'line_items':
+                continue
+            if key in TOTAL_FIELDS:
+                if _to_decimal(value) != 0 or key not in merged:
+                    merged[key] = value
+            elif merged.get(key) in EMPTY_VALUES and value not in EMPTY_VALUES:
+                merged[key] = value
+            elif key not in merged:
+                merged[key] = value
+
+        chunk_items = [item for item in chunk.get('line_items') or [] if isinstance(item, dict)]
+        for position, item in enumerate(chunk_items):
+            # Only the first items of a range can be carry-overs from the previous page
+            if position < boundary_window and _item_signature(item) in previous_tail:
+                duplicates_removed += 1
+                continue
+            line_items.append(item)
+        previous_tail = [_item_signature(item) for item in chunk_items[-boundary_window:]]
+
+    merged['line_items'] = line_items
+
+    line_items_total = sum((_to_decimal(item.get('line_total')) for item in line_items), Decimal('0'))
+    total_amount = _to_decimal(merged.get('total_amount'))
+    expected_total = line_items_total - _to_decimal(merged.get('invoice_discount_amount'))
+    difference = expected_total - total_amount
+    report = {
+        'duplicates_removed': duplicates_removed,
+        'line_items_total': str(line_items_total),
+        'total_amount': str(total_amount),
+        'difference': str(difference),
+        'totals_match': abs(difference) <= Decimal('0.01'),
+    }
+    if not report['totals_match']:
+        logger.warning(
+            f"Merged line items do not reconcile with final-page totals: "
+            f"sum(line_totals)={line_items_total}, total_amount={total_amount}, difference={difference}"
+        )
+    return merged, report
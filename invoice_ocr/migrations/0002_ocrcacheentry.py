@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice_ocr', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of the combined cache key components', max_length=64, unique=True)),
+                ('pdf_sha256', models.CharField(db_index=True, help_text='SHA-256 of the PDF bytes', max_length=64)),
+                ('model_id', models.CharField(help_text='Model ID used for the extraction', max_length=255)),
+                ('prompt_hash', models.CharField(help_text='SHA-256 of the effective prompt', max_length=64)),
+                ('config_hash', models.CharField(help_text='SHA-256 of the inference configuration', max_length=64)),
+                ('result_text', models.TextField(help_text='Extracted result returned by the model')),
+                ('usage', models.JSONField(blank=True, default=dict, help_text='Token usage and cost of the original extraction')),
+                ('size_bytes', models.IntegerField(default=0, help_text='Size of the cached result in bytes')),
+                ('hit_count', models.IntegerField(default=0, help_text='Number of times this entry was served from cache')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_accessed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['model_id'], name='invoice_ocr_model_i_5ee3e7_idx')],
+            },
+        ),
+    ]
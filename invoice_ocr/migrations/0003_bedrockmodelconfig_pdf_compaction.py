@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice_ocr', '0002_ocrcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bedrockmodelconfig',
+            name='pdf_compaction',
+            field=models.CharField(choices=[('none', 'None - send PDF as uploaded'), ('lossless', 'Lossless - remove unused objects and compress streams'), ('downsample', 'Downsample - lossless plus downsample oversized images')], default='none', help_text='PDF preflight compaction applied before sending documents to this model', max_length=20),
+        ),
+    ]
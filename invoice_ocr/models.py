@@ -6,6 +6,12 @@ import json
 class BedrockModelConfig(models.Model):
     """Store LLM model configurations in database."""
     
+    PDF_COMPACTION_CHOICES = [
+        ('none', 'None - send PDF as uploaded'),
+        ('lossless', 'Lossless - remove unused objects and compress streams'),
+        ('downsample', 'Downsample - lossless plus downsample oversized images'),
+    ]
+    
     name = models.CharField(max_length=255, unique=True, help_text="Human-readable model name")
     model_id = models.CharField(max_length=255, unique=True, help_text="AWS Bedrock model ID (e.g., anthropic.claude-3-sonnet-20240229-v1:0)")
     region = models.CharField(max_length=50, default='us-east-1', help_text="AWS region for the model")
@@ -13,6 +19,7 @@ class BedrockModelConfig(models.Model):
     temperature = models.FloatField(default=0.7, validators=[MinValueValidator(0.0), MaxValueValidator(1.0)], help_text="Temperature for generation (0.0-1.0)")
     top_p = models.FloatField(default=0.9, validators=[MinValueValidator(0.0), MaxValueValidator(1.0)], help_text="Top-p sampling parameter")
     prompt_template = models.TextField(blank=True, help_text="Default prompt template for this model")
+    pdf_compaction = models.CharField(max_length=20, choices=PDF_COMPACTION_CHOICES, default='none', help_text="PDF preflight compaction applied before sending documents to this model")
     input_token_cost = models.DecimalField(max_digits=10, decimal_places=8, default=0.0, help_text="Cost per 1K input tokens (e.g., 0.003 for $0.003 per thousand)")
     output_token_cost = models.DecimalField(max_digits=10, decimal_places=8, default=0.0, help_text="Cost per 1K output tokens (e.g., 0.015 for $0.015 per thousand)")
     is_default = models.BooleanField(default=False, help_text="Whether this is the default model")
@@ -111,3 +118,28 @@ class ProcessingJob(models.Model):
     
     def __str__(self):
         return f"ProcessingJob {self.id} - {self.method} - {self.status}"
+
+
+class OCRCacheEntry(models.Model):
+    """Cache OCR extraction results keyed by PDF content, model, prompt and inference config."""
+    
+    cache_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the combined cache key components")
+    pdf_sha256 = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the PDF bytes")
+    model_id = models.CharField(max_length=255, help_text="Model ID used for the extraction")
+    prompt_hash = models.CharField(max_length=64, help_text="SHA-256 of the effective prompt")
+    config_hash = models.CharField(max_length=64, help_text="SHA-256 of the inference configuration")
+    result_text = models.TextField(help_text="Extracted result returned by the model")
+    usage = models.JSONField(default=dict, blank=True, help_text="Token usage and cost of the original extraction")
+    size_bytes = models.IntegerField(default=0, help_text="Size of the cached result in bytes")
+    hit_count = models.IntegerField(default=0, help_text="Number of times this entry was served from cache")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_accessed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['model_id']),
+        ]
+    
+    def __str__(self):
+        return f"OCRCacheEntry {self.pdf_sha256[:12]} - {self.model_id}"
@@ -0,0 +1,254 @@
+"""
+Retry, timeout and circuit breaker handling shared by all AWS Bedrock calls.
+
+Both the OCR service (bedrock-runtime) and the tax verification service
+(bedrock-agent-runtime) route their API calls through call_with_resilience(),
+which retries transient failures with exponential backoff and full jitter,
+stops retrying once the overall deadline is reached, and fails fast through a
+per-model / per-KB circuit breaker while Bedrock is degraded.
+
+Throttling means Bedrock is healthy but over quota, so it never counts toward
+the circuit breaker. Callers that pace throttled calls themselves (the AIMD
+limiter in InvoiceProcessor.process_batch) run inside throttle_retries_disabled()
+so throttles reach them at once instead of after a second backoff schedule.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.exceptions import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Bedrock error codes worth retrying: throttling, capacity and transient server errors
+RETRYABLE_ERROR_CODES = (
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'InternalServerException',
+    'ModelTimeoutException',
+    'ModelNotReadyException',
+)
+
+RETRYABLE_EXCEPTIONS = (
+    ConnectTimeoutError,
+    ReadTimeoutError,
+    EndpointConnectionError,
+    ConnectionClosedError,
+)
+
+# Rate limiting rather than degradation: retried, but never counted by the circuit breaker.
+# ServiceUnavailableException is degradation (Bedrock itself is unhealthy), not throttling.
+# This is the single definition; the OCR service maps these codes to ThrottlingError.
+THROTTLING_ERROR_CODES = (
+    'ThrottlingException',
+    'TooManyRequestsException',
+)
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 20.0
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Return True if the error is a transient Bedrock failure worth retrying."""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES
+    return isinstance(error, RETRYABLE_EXCEPTIONS)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Return True if the error is a Bedrock throttling (rate limit) response."""
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+_local = threading.local()
+
+
+@contextmanager
+def throttle_retries_disabled():
+    """Let throttling errors raised on this thread propagate at once instead of being retried."""
+    previous = getattr(_local, 'retry_throttles', True)
+    _local.retry_throttles = False
+    try:
+        yield
+    finally:
+        _local.retry_throttles = previous
+
+
+class RetryStats:
+    """Accumulates attempt counts and time spent waiting between retries."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.errors = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'retry_wait_seconds': round(self.wait_seconds, 3),
+            'errors': self.errors[-5:],
+        }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive transient failures the breaker opens and
+    rejects calls for reset_seconds. It then half-opens and lets a single trial
+    call through: success closes it, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, key: str, failure_threshold: int, reset_seconds: float):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the breaker currently rejects calls."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"Circuit breaker open for {self.key}; failing fast while Bedrock is degraded")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(f"Circuit breaker half-open for {self.key}; trial call already in flight")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit breaker closed for {self.key}")
+            self.state = self.CLOSED
+            self.failure_count = 0
+            self._trial_in_flight = False
+
+    def record_throttle(self):
+        """Record a throttled call: it ends a half-open trial but is not a failure."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failure_count += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failure_count >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened for {self.key} after {self.failure_count} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key: str) -> CircuitBreaker:
+    """Get the process-wide circuit breaker for a model or knowledge base key."""
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                key,
+                failure_threshold=int(ConfigManager.get_circuit_breaker_threshold()),
+                reset_seconds=float(ConfigManager.get_circuit_breaker_reset_seconds()),
+            )
+            _breakers[key] = breaker
+        return breaker
+
+
+def reset_circuit_breakers():
+    """Forget all circuit breaker state (used by tests and after config changes)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def call_with_resilience(func: Callable[[], Any], breaker_key: str,
+                         stats: Optional[RetryStats] = None,
+                         max_retries: Optional[int] = None,
+                         deadline_seconds: Optional[float] = None) -> Any:
+    """
+    Call func with retries, an overall deadline and a circuit breaker.
+
+    Args:
+        func: Zero-argument callable performing one Bedrock API call
+        breaker_key: Circuit breaker key (e.g. 'bedrock-runtime:<model_id>')
+        stats: Optional RetryStats to accumulate attempts and wait time into
+        max_retries: Maximum retries after the first attempt (defaults to max_retries config)
+        deadline_seconds: Overall time budget including waits (defaults to timeout_seconds config)
+
+    Returns:
+        The return value of func
+
+    Raises:
+        CircuitOpenError: If the circuit breaker is open
+        Exception: The last error from func when it is not retryable or retries are exhausted,
+            or at once for throttling inside throttle_retries_disabled()
+    """
+    if stats is None:
+        stats = RetryStats()
+    if max_retries is None:
+        max_retries = int(ConfigManager.get_max_retries())
+    if deadline_seconds is None:
+        deadline_seconds = float(ConfigManager.get_timeout())
+
+    breaker = get_circuit_breaker(breaker_key)
+    deadline = time.monotonic() + deadline_seconds
+    attempt = 0
+    while True:
+        breaker.before_call()
+        stats.attempts += 1
+        try:
+            result = func()
+        except Exception as e:
+            if not is_retryable_error(e):
+                # Request-level errors (validation, access denied) say nothing about Bedrock health
+                breaker.record_success()
+                raise
+            throttled = is_throttling_error(e)
+            if throttled:
+                breaker.record_throttle()
+            else:
+                breaker.record_failure()
+            stats.errors.append(type(e).__name__ if not isinstance(e, ClientError)
+                                else e.response.get('Error', {}).get('Code', 'ClientError'))
+            if attempt >= max_retries or (throttled and not getattr(_local, 'retry_throttles', True)):
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+            if time.monotonic() + delay >= deadline:
+                logger.warning(f"Deadline of {deadline_seconds}s reached for {breaker_key}, not retrying")
+                raise
+            attempt += 1
+            stats.retries += 1
+            stats.wait_seconds += delay
+            logger.info(f"Retrying {breaker_key} after {type(e).__name__} (retry {attempt}/{max_retries}, waiting {delay:.2f}s)")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
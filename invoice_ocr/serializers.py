@@ -9,7 +9,7 @@ class BedrockModelConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = BedrockModelConfig
         fields = ['id', 'name', 'model_id', 'region', 'max_tokens', 'temperature', 
-                 'top_p', 'prompt_template', 'is_default', 'is_active', 
+                 'top_p', 'prompt_template', 'pdf_compaction', 'is_default', 'is_active', 
                  'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
@@ -66,6 +66,23 @@ class InvoiceProcessSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="Custom prompt template"
     )
+    bypass_cache = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Force a fresh extraction instead of serving a cached OCR result"
+    )
+    text_layer = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Extract from the PDF's text layer when usable, falling back to multimodal (defaults to text_layer_enabled config)"
+    )
+    structured_output = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Return the extraction as typed tool output instead of free-text JSON (defaults to structured_output_enabled config)"
+    )
     
     def validate_file(self, value):
         """Validate uploaded file."""
@@ -1,15 +1,18 @@
 """
 Service classes for invoice OCR processing using AWS Bedrock.
 """
-import boto3
 import json
 import time
 import logging
 import base64
 import os
+import random
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import close_old_connections
 from django.utils import timezone
 from botocore.exceptions import ClientError, BotoCoreError
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Iterable, Iterator, Union
 
 from invoice_ocr.config import ConfigManager
 from invoice_ocr.exceptions import (
@@ -17,13 +20,118 @@ from invoice_ocr.exceptions import (
     BedrockError,
     ModelNotFoundError,
     PDFValidationError,
-    ConfigurationError
+    ConfigurationError,
+    ThrottlingError
+)
+from invoice_ocr.utils import (
+    validate_pdf_file, read_pdf_file, format_extracted_text, split_pdf_pages, preflight_pdf,
+    extract_pdf_text_layer,
 )
-from invoice_ocr.utils import validate_pdf_file, read_pdf_file, format_extracted_text
 from invoice_ocr.models import ProcessingJob
+from invoice_ocr.cache import OCRResultCache
+from invoice_ocr.concurrency import AdaptiveConcurrencyLimiter
+from invoice_ocr.streaming import IncrementalInvoiceParser, COMPLETE_EVENT
+from invoice_ocr.merging import merge_invoice_chunks
+from invoice_ocr.resilience import RetryStats, THROTTLING_ERROR_CODES, call_with_resilience, throttle_retries_disabled
+from invoice_ocr.backends import get_client
+from invoice_ocr.tools import INVOICE_EXTRACTION_TOOL, build_tool_config, extract_tool_input
 
 logger = logging.getLogger(__name__)
 
+# Default extraction prompt used when neither the request nor the model config provides a template
+DEFAULT_EXTRACTION_PROMPT = """You are an expert at extracting information from invoices. 
+Analyze the following invoice PDF and extract all relevant information in a structured JSON format.
+
+Extract the following information and return it as valid JSON only (no markdown, no code blocks, just the JSON object):
+
+{
+  "invoice_number": "string (invoice number or ID)",
+  "date": "YYYY-MM-DD (invoice date)",
+  "vendor_name": "string (vendor or supplier name)",
+  "total_amount": "decimal number (total invoice amount)",
+  "total_tax_amount": "decimal number (total tax amount if shown as single line item, otherwise 0)",
+  "invoice_discount_amount": "decimal number (discount applied to entire invoice, 0 if none)",
+  "state_code": "string (2-letter US state code, e.g., CA, NY)",
+  "jurisdiction": "string (county, city, or special district if applicable, empty string if not)",
+  "line_items": [
+    {
+      "description": "string (item description)",
+      "quantity": "decimal number",
+      "unit_price": "decimal number",
+      "line_total": "decimal number (amount charged for this line item AFTER any line-item discount)",
+      "discount_amount": "decimal number (discount applied to this specific line item, 0 if none)",
+      "tax_amount": "decimal number (tax for this line item - ONLY if explicitly shown per line item, otherwise 0)",
+      "tax_rate": "decimal number (tax rate as decimal, e.g., 0.0825 for 8.25% - extract from invoice tax line if shown)",
+      "tax_status": "string (one of: 'taxable', 'exempt', 'unknown')"
+    }
+  ]
+}
+
+Important:
+- Return ONLY valid JSON, no additional text or explanation
+- If a field cannot be determined, use empty string for strings, 0 for numbers, or empty array for line_items
+- Dates must be in YYYY-MM-DD format
+- All amounts should be decimal numbers (strings in JSON)
+- State code should be 2-letter uppercase US state code
+- If jurisdiction is not found, use empty string
+- DISCOUNT HANDLING:
+  - If a discount is applied to a specific line item, extract it as discount_amount for that line item
+  - If a discount is applied to the entire invoice (e.g., "Early payment discount", "Volume discount", "Promotional discount"), extract it as invoice_discount_amount
+  - line_total should be the amount AFTER any line-item discount (i.e., line_total = (quantity * unit_price) - discount_amount)
+  - If the invoice shows a total amount that is less than the sum of line_totals, determine if it's a line-item discount or invoice-level discount based on how it's presented on the invoice
+  - If discounts aren't explicitly shown but totals don't match, infer whether it's line-item or invoice-level based on invoice structure
+- TAX HANDLING: Many invoices show tax as a single line item (e.g., "Tax 6.75%: $438.75") rather than per-line-item
+  - If tax is shown ONLY as a total/subtotal tax line, set tax_amount to 0 for all line items
+  - Extract the total_tax_amount from the invoice tax line (e.g., if invoice shows "NC Tax 6.75%: $438.75", set total_tax_amount to 438.75)
+  - Still extract the tax_rate from the invoice and apply it to all taxable line items
+  - Only set tax_amount > 0 if the invoice explicitly shows tax calculated per individual line item
+  - The tax_rate should be the same for all taxable items on the invoice
+  - If total_tax_amount is extracted, it represents the sum of all taxes on the invoice
+  - Tax should be calculated on the discounted amounts (line_total after discounts)"""
+
+# User turn sent with the attached PDF when the extraction instructions go in the system block
+DOCUMENT_EXTRACTION_INSTRUCTION = "Extract the invoice in the attached document following the instructions above. Return only the JSON object."
+
+# Model ID fragments of Bedrock models that support Converse prompt cache points
+PROMPT_CACHE_MODEL_PATTERNS = (
+    'claude-3-5-haiku',
+    'claude-3-7-sonnet',
+    'claude-sonnet-4',
+    'claude-opus-4',
+    'claude-haiku-4',
+    'nova-micro',
+    'nova-lite',
+    'nova-pro',
+    'nova-premier',
+)
+
+# Extraction prompt for the local text-layer path: same schema, with the PDF's text inlined
+# (braces in the JSON schema are escaped so the prompt can be filled via _prepare_prompt)
+DEFAULT_TEXT_EXTRACTION_PROMPT = DEFAULT_EXTRACTION_PROMPT.replace('{', '{{').replace('}', '}}') + """
+
+The invoice PDF's text layer, page by page:
+
+{invoice_text}"""
+
+# Appended to the extraction prompt for each page range when a PDF is split
+PAGE_RANGE_PROMPT_SUFFIX = """
+
+This document contains pages {first_page}-{last_page} of a {page_count}-page invoice.
+- Extract only the line items printed on these pages.
+- Fill in the invoice header fields if they are visible on these pages.
+- Only report total_amount, total_tax_amount and invoice_discount_amount if the invoice totals are printed on these pages; otherwise use 0."""
+
+# Token and cost fields summed across page ranges
+USAGE_ROLLUP_FIELDS = (
+    'inputTokens', 'outputTokens', 'totalTokens', 'cacheReadInputTokens', 'cacheWriteInputTokens',
+    'inputCost', 'outputCost', 'totalCost', 'cacheReadCost', 'cacheWriteCost', 'cacheSavings',
+)
+
+def supports_prompt_cache(model_id: str) -> bool:
+    """Return True if the model accepts cachePoint blocks in Converse requests."""
+    model_id = model_id.lower()
+    return any(pattern in model_id for pattern in PROMPT_CACHE_MODEL_PATTERNS)
+
 
 class BedrockLLMService:
     """Service for processing invoices using AWS Bedrock LLMs."""
@@ -37,10 +145,27 @@ class BedrockLLMService:
         """
         self.region_name = region_name or ConfigManager.get_bedrock_region()
         try:
-            self.client = boto3.client('bedrock-runtime', region_name=self.region_name)
+            self.client = get_client('bedrock-runtime', self.region_name)
         except Exception as e:
             raise ConfigurationError(f"Failed to initialize Bedrock client: {str(e)}")
     
+    def _get_client(self, region_name: Optional[str] = None):
+        """
+        Get the bedrock-runtime client for a model's region.
+        
+        Args:
+            region_name: Region configured on the model (defaults to the service region)
+            
+        Returns:
+            Client from the active LLM backend (shared boto3 client for Bedrock)
+        """
+        if not region_name or region_name == self.region_name:
+            return self.client
+        try:
+            return get_client('bedrock-runtime', region_name)
+        except Exception as e:
+            raise ConfigurationError(f"Failed to initialize Bedrock client for {region_name}: {str(e)}")
+    
     def _prepare_prompt(self, file_text: str, prompt_template: Optional[str] = None) -> str:
         """
         Prepare the prompt for LLM processing.
@@ -115,257 +240,279 @@ Please extract and format all key information from this invoice."""
         return sanitized
     
     def _invoke_model(self, model_id: str, prompt: str, config: Dict[str, Any], 
-                     pdf_bytes: Optional[bytes] = None, pdf_filename: Optional[str] = None) -> tuple[str, Dict[str, int]]:
+                     pdf_bytes: Optional[bytes] = None, pdf_filename: Optional[str] = None,
+                     retry_stats: Optional[RetryStats] = None,
+                     region_name: Optional[str] = None,
+                     system_prompt: Optional[str] = None,
+                     tool_spec: Optional[Dict[str, Any]] = None) -> tuple[Union[str, Dict[str, Any]], Dict[str, int]]:
         """
-        Invoke Bedrock model with the given prompt.
+        Invoke Bedrock model with the given prompt via the Converse API.
         
         Args:
             model_id: AWS Bedrock model ID
             prompt: Prompt text
             config: Model configuration (temperature, max_tokens, etc.)
-            pdf_bytes: Optional PDF file bytes for direct multimodal processing (Claude 3+)
-                      Uses Converse API for direct PDF attachment
+            pdf_bytes: Optional PDF file bytes attached as a document for direct multimodal
+                      processing (Claude 3+, Nova); None sends the prompt as a text-only message
             pdf_filename: Optional filename for the PDF (defaults to "invoice.pdf" if not provided)
+            retry_stats: Optional RetryStats that accumulates retry attempts and wait time
+            region_name: Region configured on the model (defaults to the service region)
+            system_prompt: Optional static instructions sent as a (cacheable) system block
+            tool_spec: Optional tool the model is forced to answer through
             
         Returns:
-            tuple: (response_text, token_usage_dict)
-                - response_text: Model response text
-                - token_usage_dict: Dictionary with 'inputTokens', 'outputTokens', 'totalTokens'
+            tuple: (response, token_usage_dict)
+                - response: Model response text, or the tool input dict when tool_spec is given
+                  and the model called the tool
+                - token_usage_dict: Dictionary with 'inputTokens', 'outputTokens', 'totalTokens',
+                  'cacheReadInputTokens' and 'cacheWriteInputTokens'
             
         Raises:
             BedrockError: If invocation fails
         """
-        # Use Converse API for direct PDF processing (supports PDF, DOCX, TXT, Markdown, CSV)
-        if pdf_bytes:
-            try:
-                # Converse API supports direct PDF attachment
-                # Note: bytes should be raw bytes, not base64 encoded
-                
-                # Sanitize filename to meet Converse API requirements
-                filename = self._sanitize_filename(pdf_filename) if pdf_filename else "invoice"
-                
-                # Build message content with PDF attachment
-                # Order matters: document first, then text instruction
-                content = [
-                    {
-                        "document": {
-                            "format": "pdf",
-                            "name": filename,
-                            "source": {
-                                "bytes": pdf_bytes
-                            }
-                        }
-                    },
-                    {
-                        "text": prompt
-                    }
-                ]
-                
-                # Prepare Converse API request
-                converse_kwargs = {
-                    "modelId": model_id,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": content
-                        }
-                    ],
-                    "inferenceConfig": {
-                        "maxTokens": config.get('max_tokens', 4096),
-                        "temperature": config.get('temperature', 0.7),
-                        "topP": config.get('top_p', 0.9),
-                    }
-                }
-                
-                response = self.client.converse(**converse_kwargs)
-                
-                # Extract text from Converse API response
-                text_result = None
-                if 'output' in response and 'message' in response['output']:
-                    message = response['output']['message']
-                    if 'content' in message:
-                        # Converse API returns content as a list
-                        text_parts = []
-                        for content_item in message['content']:
-                            if 'text' in content_item:
-                                text_parts.append(content_item['text'])
-                        text_result = '\n'.join(text_parts)
-                    else:
-                        raise BedrockError("Unexpected Converse API response format - no content")
-                else:
-                    raise BedrockError("Unexpected Converse API response format")
-                
-                # Extract token usage from Converse API response
-                token_usage = {
-                    'inputTokens': 0,
-                    'outputTokens': 0,
-                    'totalTokens': 0
-                }
-                if 'usage' in response:
-                    usage = response['usage']
-                    token_usage['inputTokens'] = usage.get('inputTokens', 0)
-                    token_usage['outputTokens'] = usage.get('outputTokens', 0)
-                    token_usage['totalTokens'] = usage.get('totalTokens', 0)
-                
-                return text_result, token_usage
-                    
-            except ClientError as e:
-                error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-                error_message = e.response.get('Error', {}).get('Message', str(e))
-                raise BedrockError(f"AWS Bedrock Converse API error ({error_code}): {error_message}")
-            except Exception as e:
-                raise BedrockError(f"Error using Converse API: {str(e)}")
-        
-        # Fall back to invoke_model for text-only processing
-        # Prepare request body based on model provider
-        if 'claude' in model_id.lower():
-            # Anthropic Claude format
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": config.get('max_tokens', 4096),
-                "temperature": config.get('temperature', 0.7),
-                "top_p": config.get('top_p', 0.9),
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            }
-        elif 'llama' in model_id.lower():
-            # Meta Llama format
-            body = {
-                "prompt": prompt,
-                "max_gen_len": config.get('max_tokens', 4096),
-                "temperature": config.get('temperature', 0.7),
-                "top_p": config.get('top_p', 0.9),
-            }
-        elif 'titan' in model_id.lower():
-            # Amazon Titan format
-            body = {
-                "inputText": prompt,
-                "textGenerationConfig": {
-                    "maxTokenCount": config.get('max_tokens', 4096),
-                    "temperature": config.get('temperature', 0.7),
-                    "topP": config.get('top_p', 0.9),
-                }
-            }
-        else:
-            # Generic format - try Anthropic format as default
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": config.get('max_tokens', 4096),
-                "temperature": config.get('temperature', 0.7),
-                "top_p": config.get('top_p', 0.9),
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            }
+        client = self._get_client(region_name)
         
+        # Converse handles every request: the PDF (multimodal path) or the text layer
+        # (text-layer path) goes in as a content block, and tool use needs Converse too
         try:
-            response = self.client.invoke_model(
-                modelId=model_id,
-                body=json.dumps(body),
-                contentType='application/json',
-                accept='application/json'
-            )
+            # Note: PDF bytes should be raw bytes, not base64 encoded
+            converse_kwargs = self._build_converse_kwargs(model_id, prompt, config, pdf_bytes, pdf_filename,
+                                                          system_prompt=system_prompt, tool_spec=tool_spec)
             
-            response_body = json.loads(response['body'].read())
+            response = call_with_resilience(
+                lambda: client.converse(**converse_kwargs),
+                breaker_key=f"bedrock-runtime:{model_id}",
+                stats=retry_stats
+            )
             
-            # Extract text based on model provider
+            # Extract text from Converse API response
             text_result = None
-            if 'claude' in model_id.lower():
-                # Anthropic Claude response format
-                if 'content' in response_body and len(response_body['content']) > 0:
-                    text_result = response_body['content'][0]['text']
-                else:
-                    raise BedrockError("Unexpected Claude response format")
-            elif 'llama' in model_id.lower():
-                # Meta Llama response format
-                text_result = response_body.get('generation', '')
-            elif 'titan' in model_id.lower():
-                # Amazon Titan response format
-                results = response_body.get('results', [])
-                if results:
-                    text_result = results[0].get('outputText', '')
+            if 'output' in response and 'message' in response['output']:
+                message = response['output']['message']
+                if 'content' in message:
+                    # Converse API returns content as a list
+                    text_parts = []
+                    for content_item in message['content']:
+                        if 'text' in content_item:
+                            text_parts.append(content_item['text'])
+                    text_result = '\n'.join(text_parts)
                 else:
-                    text_result = ''
+                    raise BedrockError("Unexpected Converse API response format - no content")
             else:
-                # Try to extract text from generic response
-                if 'content' in response_body:
-                    if isinstance(response_body['content'], list) and len(response_body['content']) > 0:
-                        text_result = response_body['content'][0].get('text', '')
-                if text_result is None:
-                    text_result = str(response_body)
-            
-            # Extract token usage (if available in response metadata)
-            # Note: invoke_model may not always return usage info in the same format
-            token_usage = {
-                'inputTokens': 0,
-                'outputTokens': 0,
-                'totalTokens': 0
-            }
+                raise BedrockError("Unexpected Converse API response format")
             
-            # Check for usage in response metadata (varies by model)
-            if 'usage' in response_body:
-                usage = response_body['usage']
-                token_usage['inputTokens'] = usage.get('inputTokens', usage.get('input_tokens', 0))
-                token_usage['outputTokens'] = usage.get('outputTokens', usage.get('output_tokens', 0))
-                token_usage['totalTokens'] = usage.get('totalTokens', usage.get('total_tokens', 0))
-            elif 'input_tokens' in response_body or 'output_tokens' in response_body:
-                # Some models return tokens at top level
-                token_usage['inputTokens'] = response_body.get('input_tokens', 0)
-                token_usage['outputTokens'] = response_body.get('output_tokens', 0)
-                token_usage['totalTokens'] = token_usage['inputTokens'] + token_usage['outputTokens']
+            # Extract token usage (including prompt cache reads/writes) from Converse API response
+            token_usage = self._converse_token_usage(response.get('usage', {}))
+            
+            # Structured output: the tool input is already a dict and is returned as-is
+            if tool_spec:
+                tool_input = extract_tool_input(message, tool_spec['name'])
+                if tool_input is not None:
+                    return tool_input, token_usage
             
             return text_result, token_usage
                 
         except ClientError as e:
             error_code = e.response.get('Error', {}).get('Code', 'Unknown')
             error_message = e.response.get('Error', {}).get('Message', str(e))
-            raise BedrockError(f"AWS Bedrock error ({error_code}): {error_message}")
+            if error_code in THROTTLING_ERROR_CODES:
+                raise ThrottlingError(f"AWS Bedrock Converse API throttled ({error_code}): {error_message}")
+            raise BedrockError(f"AWS Bedrock Converse API error ({error_code}): {error_message}")
         except BotoCoreError as e:
             raise BedrockError(f"Boto3 error: {str(e)}")
-        except json.JSONDecodeError as e:
-            raise BedrockError(f"Failed to parse Bedrock response: {str(e)}")
+        except BedrockError:
+            raise
         except Exception as e:
-            raise BedrockError(f"Unexpected error during Bedrock processing: {str(e)}")
+            raise BedrockError(f"Error using Converse API: {str(e)}")
+    
+    def _build_converse_kwargs(self, model_id: str, prompt: str, config: Dict[str, Any],
+                               pdf_bytes: Optional[bytes] = None, pdf_filename: Optional[str] = None,
+                               system_prompt: Optional[str] = None,
+                               tool_spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build a Converse / ConverseStream request, with the PDF attached as a document if given.
+        
+        Args:
+            model_id: AWS Bedrock model ID
+            prompt: Prompt text
+            config: Model configuration (temperature, max_tokens, etc.)
+            pdf_bytes: Raw PDF bytes (not base64 encoded); None for a text-only request
+            pdf_filename: Optional filename for the PDF
+            system_prompt: Optional static instructions. Sent as a system block followed by a
+                           cache point on models that support prompt caching, so the
+                           instructions are billed at the cache-read rate after the first call
+            tool_spec: Optional tool added as a forced toolChoice for structured output
+            
+        Returns:
+            dict: Keyword arguments for client.converse() / client.converse_stream()
+        """
+        # Sanitize filename to meet Converse API requirements
+        filename = self._sanitize_filename(pdf_filename) if pdf_filename else "invoice"
+        
+        # Order matters: document first, then text instruction
+        content = [
+            {
+                "document": {
+                    "format": "pdf",
+                    "name": filename,
+                    "source": {
+                        "bytes": pdf_bytes
+                    }
+                }
+            },
+            {
+                "text": prompt
+            }
+        ] if pdf_bytes else [{"text": prompt}]
+        
+        converse_kwargs = {
+            "modelId": model_id,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "inferenceConfig": {
+                "maxTokens": config.get('max_tokens', 4096),
+                "temperature": config.get('temperature', 0.7),
+                "topP": config.get('top_p', 0.9),
+            }
+        }
+        if system_prompt:
+            system = [{"text": system_prompt}]
+            if supports_prompt_cache(model_id):
+                system.append({"cachePoint": {"type": "default"}})
+            converse_kwargs["system"] = system
+        if tool_spec:
+            converse_kwargs["toolConfig"] = build_tool_config(tool_spec)
+        return converse_kwargs
+    
+    def _converse_token_usage(self, usage: Dict[str, Any]) -> Dict[str, int]:
+        """Normalize Converse / ConverseStream usage, including prompt cache token counts."""
+        return {
+            'inputTokens': usage.get('inputTokens', 0),
+            'outputTokens': usage.get('outputTokens', 0),
+            'totalTokens': usage.get('totalTokens', 0),
+            'cacheReadInputTokens': usage.get('cacheReadInputTokens', 0),
+            'cacheWriteInputTokens': usage.get('cacheWriteInputTokens', 0),
+        }
+    
+    def _invoke_model_stream(self, model_id: str, prompt: str, config: Dict[str, Any],
+                             pdf_bytes: Optional[bytes] = None, pdf_filename: Optional[str] = None,
+                             retry_stats: Optional[RetryStats] = None,
+                             region_name: Optional[str] = None,
+                             system_prompt: Optional[str] = None,
+                             tool_spec: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Invoke a Bedrock model via the ConverseStream API.
+        
+        Only opening the stream is retried; once text has been yielded a failure
+        is raised to the caller, since replaying would duplicate output.
+        
+        Args:
+            model_id: AWS Bedrock model ID
+            prompt: Prompt text
+            config: Model configuration (temperature, max_tokens, etc.)
+            pdf_bytes: PDF file bytes attached as a document (None for text-layer extraction)
+            pdf_filename: Optional filename for the PDF
+            retry_stats: Optional RetryStats that accumulates retry attempts and wait time
+            region_name: Region configured on the model (defaults to the service region)
+            system_prompt: Optional static instructions sent as a (cacheable) system block
+            tool_spec: Optional tool the model is forced to answer through; its streamed
+                       input JSON is yielded as text deltas
+            
+        Yields:
+            tuple: ('text', delta) for each text delta, then ('usage', token_usage_dict)
+                from the stream's metadata event
+            
+        Raises:
+            BedrockError: If invocation fails
+        """
+        client = self._get_client(region_name)
+        converse_kwargs = self._build_converse_kwargs(model_id, prompt, config, pdf_bytes, pdf_filename,
+                                                      system_prompt=system_prompt, tool_spec=tool_spec)
+        token_usage = self._converse_token_usage({})
+        try:
+            response = call_with_resilience(
+                lambda: client.converse_stream(**converse_kwargs),
+                breaker_key=f"bedrock-runtime:{model_id}",
+                stats=retry_stats
+            )
+            
+            for event in response.get('stream', []):
+                if 'contentBlockDelta' in event:
+                    delta = event['contentBlockDelta'].get('delta', {})
+                    text = delta.get('text') or delta.get('toolUse', {}).get('input')
+                    if text:
+                        yield 'text', text
+                elif 'metadata' in event:
+                    token_usage = self._converse_token_usage(event['metadata'].get('usage', {}))
+                elif 'messageStop' in event:
+                    stop_reason = event['messageStop'].get('stopReason')
+                    if stop_reason == 'max_tokens':
+                        logger.warning(f"Streamed extraction from {model_id} stopped at max_tokens; output may be truncated")
+            
+            yield 'usage', token_usage
+            
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+            error_message = e.response.get('Error', {}).get('Message', str(e))
+            if error_code in THROTTLING_ERROR_CODES:
+                raise ThrottlingError(f"AWS Bedrock ConverseStream API throttled ({error_code}): {error_message}")
+            raise BedrockError(f"AWS Bedrock ConverseStream API error ({error_code}): {error_message}")
+        except BedrockError:
+            raise
+        except Exception as e:
+            raise BedrockError(f"Error using ConverseStream API: {str(e)}")
     
     def _calculate_cost(self, token_usage: Dict[str, int], input_token_cost: float, output_token_cost: float) -> Dict[str, float]:
         """
         Calculate cost based on token usage and model pricing.
         
+        Prompt cache reads and writes are billed as input at the cache read/write multipliers
+        of the input token price and are included in 'inputCost'.
+        
         Args:
-            token_usage: Dictionary with 'inputTokens', 'outputTokens', 'totalTokens'
+            token_usage: Dictionary with 'inputTokens', 'outputTokens', 'totalTokens' and optionally
+                         'cacheReadInputTokens' / 'cacheWriteInputTokens'
             input_token_cost: Cost per 1K input tokens
             output_token_cost: Cost per 1K output tokens
             
         Returns:
-            Dictionary with 'inputCost', 'outputCost', 'totalCost'
+            Dictionary with 'inputCost', 'outputCost', 'totalCost', 'cacheReadCost',
+            'cacheWriteCost' and 'cacheSavings' (input cost avoided by cache reads)
         """
         input_tokens = token_usage.get('inputTokens', 0)
         output_tokens = token_usage.get('outputTokens', 0)
+        cache_read_tokens = token_usage.get('cacheReadInputTokens', 0)
+        cache_write_tokens = token_usage.get('cacheWriteInputTokens', 0)
         
         # Convert Decimal to float if needed
         input_cost_per_thousand = float(input_token_cost) if input_token_cost else 0.0
         output_cost_per_thousand = float(output_token_cost) if output_token_cost else 0.0
         
         # Calculate costs (cost per thousand tokens)
-        input_cost = (input_tokens / 1_000) * input_cost_per_thousand
+        cache_read_cost = (cache_read_tokens / 1_000) * input_cost_per_thousand * ConfigManager.get_prompt_cache_read_multiplier()
+        cache_write_cost = (cache_write_tokens / 1_000) * input_cost_per_thousand * ConfigManager.get_prompt_cache_write_multiplier()
+        input_cost = (input_tokens / 1_000) * input_cost_per_thousand + cache_read_cost + cache_write_cost
         output_cost = (output_tokens / 1_000) * output_cost_per_thousand
         total_cost = input_cost + output_cost
+        cache_savings = (cache_read_tokens / 1_000) * input_cost_per_thousand - cache_read_cost
         
         return {
             'inputCost': round(input_cost, 8),
             'outputCost': round(output_cost, 8),
-            'totalCost': round(total_cost, 8)
+            'totalCost': round(total_cost, 8),
+            'cacheReadCost': round(cache_read_cost, 8),
+            'cacheWriteCost': round(cache_write_cost, 8),
+            'cacheSavings': round(cache_savings, 8),
         }
     
+    @ConfigManager.snapshot()
     def process_invoice(self, file_path: str, model_id: Optional[str] = None, 
                        prompt_template: Optional[str] = None,
+                       use_cache: Optional[bool] = None,
                        **kwargs) -> tuple[str, Dict[str, Any]]:
         """
         Process invoice using Bedrock LLM with direct PDF processing.
@@ -374,17 +521,76 @@ Please extract and format all key information from this invoice."""
             file_path: Path to PDF file
             model_id: Model ID to use (defaults to configured default)
             prompt_template: Custom prompt template
-            **kwargs: Additional model parameters (temperature, max_tokens, etc.)
+            use_cache: Whether to use the OCR result cache (defaults to ocr_cache_enabled config).
+                       Pass False to bypass the cache and force a fresh extraction.
+            **kwargs: Additional model parameters (temperature, max_tokens, etc.);
+                      structured_output=True forces a tool call with the invoice schema
+                      (defaults to structured_output_enabled config)
             
         Returns:
-            tuple: (processed_text, usage_dict)
-                - processed_text: Processed invoice text
+            tuple: (processed_result, usage_dict)
+                - processed_result: Extracted invoice JSON text, or the invoice dict when
+                                    structured output (structured_output=True) is used
                 - usage_dict: Dictionary with 'inputTokens', 'outputTokens', 'totalTokens', 
-                             'inputCost', 'outputCost', 'totalCost'
+                             'inputCost', 'outputCost', 'totalCost' and 'cache' (hit/miss info)
             
         Raises:
             BedrockError: If processing fails
         """
+        request = self._prepare_extraction(file_path, model_id=model_id, prompt_template=prompt_template, **kwargs)
+        return self._process_prepared(request, use_cache)
+    
+    def _process_prepared(self, request: Dict[str, Any], use_cache: Optional[bool] = None) -> Tuple[Union[str, Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run an extraction request that _prepare_extraction() has already built.
+        
+        Args:
+            request: Dictionary returned by _prepare_extraction()
+            use_cache: Whether to use the OCR result cache (defaults to ocr_cache_enabled config)
+            
+        Returns:
+            tuple: (processed_result, usage_dict) as returned by process_invoice()
+            
+        Raises:
+            BedrockError: If processing fails
+        """
+        # Serve identical extractions (same PDF, model, prompt and config) from the result cache
+        if use_cache is None:
+            use_cache = ConfigManager.get_ocr_cache_enabled()
+        cache_key_parts, cached = self._lookup_cache(request, use_cache)
+        if cached:
+            return cached
+        
+        # Invoke model with PDF bytes and filename, retrying transient failures
+        retry_stats = RetryStats()
+        try:
+            result, token_usage = self._invoke_request(request, retry_stats)
+        except InvoiceProcessingError as e:
+            e.retry_stats = retry_stats.as_dict()
+            raise
+        
+        return self._finalize_extraction(result, token_usage, request, cache_key_parts, use_cache, retry_stats)
+    
+    def _prepare_extraction(self, file_path: str, model_id: Optional[str] = None,
+                            prompt_template: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Resolve model configuration, inference config, prompt and PDF bytes for an extraction.
+        
+        Args:
+            file_path: Path to PDF file
+            model_id: Model ID to use (defaults to configured default)
+            prompt_template: Custom prompt template
+            **kwargs: Additional model parameters (temperature, max_tokens, etc.)
+            
+        Returns:
+            dict: 'model_config', 'model_id', 'config', 'prompt', 'system_prompt', 'pdf_bytes',
+                  'pdf_filename', 'preflight' (PDF preflight/compaction report), 'extraction'
+                  (multimodal or text-layer path) and 'tool_spec' (structured output tool or None)
+            
+        Raises:
+            BedrockError: If the model does not support direct PDF processing
+            PDFValidationError: If the file is not a readable PDF
+        """
         validate_pdf_file(file_path)
         
         # Get model configuration
@@ -405,78 +611,154 @@ Please extract and format all key information from this invoice."""
         if not prompt_template:
             prompt_template = model_config.prompt_template
         
-        # Determine if model supports direct PDF processing (multimodal)
-        # Claude 3+ and Amazon Nova models support direct PDF/image processing via Converse API
-        is_claude_multimodal = 'claude' in model_id.lower() and ('claude-3' in model_id.lower() or 'claude-4' in model_id.lower())
-        is_nova = 'nova' in model_id.lower()
-        supports_multimodal = is_claude_multimodal or is_nova
+        # Validate and compact the PDF according to the model's compaction policy
+        raw_pdf_bytes = read_pdf_file(file_path)
+        pdf_bytes, preflight = preflight_pdf(
+            raw_pdf_bytes,
+            policy=model_config.pdf_compaction,
+            target_dpi=ConfigManager.get_pdf_downsample_dpi(),
+            max_pages=ConfigManager.get_pdf_max_pages()
+        )
+        
+        # Born-digital PDFs can be extracted from their text layer, which needs no multimodal
+        # model and costs far fewer input tokens than the rendered document
+        use_text_layer = kwargs.get('text_layer')
+        if use_text_layer is None:
+            use_text_layer = ConfigManager.get_text_layer_enabled()
+        extraction = {'path': 'multimodal'}
+        prompt = None
+        if use_text_layer:
+            text, text_report = extract_pdf_text_layer(
+                raw_pdf_bytes,
+                min_chars_per_page=ConfigManager.get_text_layer_min_chars_per_page(),
+                min_page_coverage=ConfigManager.get_text_layer_min_page_coverage()
+            )
+            extraction['text_layer'] = text_report
+            if text_report['usable']:
+                extraction['path'] = 'text_layer'
+                prompt = self._prepare_prompt(text, prompt_template or DEFAULT_TEXT_EXTRACTION_PROMPT)
+            else:
+                logger.info(f"Text layer of {os.path.basename(file_path)} not usable ({text_report['reason']}), falling back to multimodal")
         
-        if supports_multimodal:
-            # Read PDF bytes for direct processing
-            pdf_bytes = read_pdf_file(file_path)
+        if extraction['path'] == 'multimodal':
+            # Determine if model supports direct PDF processing (multimodal)
+            # Claude 3+ and Amazon Nova models support direct PDF/image processing via Converse API
+            is_claude_multimodal = 'claude' in model_id.lower() and ('claude-3' in model_id.lower() or 'claude-4' in model_id.lower())
+            is_nova = 'nova' in model_id.lower()
+            supports_multimodal = is_claude_multimodal or is_nova
             
-            # Extract filename from file path
-            pdf_filename = os.path.basename(file_path)
+            if not supports_multimodal:
+                # Model doesn't support multimodal - raise error
+                if use_text_layer:
+                    raise BedrockError(
+                        f"Model {model_id} does not support direct PDF processing and the PDF's text layer is not usable "
+                        f"({extraction['text_layer']['reason']}). Please use a Claude 3+ or Amazon Nova model."
+                    )
+                raise BedrockError(f"Model {model_id} does not support direct PDF processing. Please use a Claude 3+ or Amazon Nova model.")
             
             # Prepare prompt for direct PDF processing
             if prompt_template:
                 prompt = prompt_template.format(invoice_text="[PDF document will be processed directly]")
             else:
-                prompt = """You are an expert at extracting information from invoices. 
-Analyze the following invoice PDF and extract all relevant information in a structured JSON format.
-
-Extract the following information and return it as valid JSON only (no markdown, no code blocks, just the JSON object):
-
-{
-  "invoice_number": "string (invoice number or ID)",
-  "date": "YYYY-MM-DD (invoice date)",
-  "vendor_name": "string (vendor or supplier name)",
-  "total_amount": "decimal number (total invoice amount)",
-  "total_tax_amount": "decimal number (total tax amount if shown as single line item, otherwise 0)",
-  "invoice_discount_amount": "decimal number (discount applied to entire invoice, 0 if none)",
-  "state_code": "string (2-letter US state code, e.g., CA, NY)",
-  "jurisdiction": "string (county, city, or special district if applicable, empty string if not)",
-  "line_items": [
-    {
-      "description": "string (item description)",
-      "quantity": "decimal number",
-      "unit_price": "decimal number",
-      "line_total": "decimal number (amount charged for this line item AFTER any line-item discount)",
-      "discount_amount": "decimal number (discount applied to this specific line item, 0 if none)",
-      "tax_amount": "decimal number (tax for this line item - ONLY if explicitly shown per line item, otherwise 0)",
-      "tax_rate": "decimal number (tax rate as decimal, e.g., 0.0825 for 8.25% - extract from invoice tax line if shown)",
-      "tax_status": "string (one of: 'taxable', 'exempt', 'unknown')"
-    }
-  ]
-}
-
-Important:
-- Return ONLY valid JSON, no additional text or explanation
-- If a field cannot be determined, use empty string for strings, 0 for numbers, or empty array for line_items
-- Dates must be in YYYY-MM-DD format
-- All amounts should be decimal numbers (strings in JSON)
-- State code should be 2-letter uppercase US state code
-- If jurisdiction is not found, use empty string
-- DISCOUNT HANDLING:
-  - If a discount is applied to a specific line item, extract it as discount_amount for that line item
-  - If a discount is applied to the entire invoice (e.g., "Early payment discount", "Volume discount", "Promotional discount"), extract it as invoice_discount_amount
-  - line_total should be the amount AFTER any line-item discount (i.e., line_total = (quantity * unit_price) - discount_amount)
-  - If the invoice shows a total amount that is less than the sum of line_totals, determine if it's a line-item discount or invoice-level discount based on how it's presented on the invoice
-  - If discounts aren't explicitly shown but totals don't match, infer whether it's line-item or invoice-level based on invoice structure
-- TAX HANDLING: Many invoices show tax as a single line item (e.g., "Tax 6.75%: $438.75") rather than per-line-item
-  - If tax is shown ONLY as a total/subtotal tax line, set tax_amount to 0 for all line items
-  - Extract the total_tax_amount from the invoice tax line (e.g., if invoice shows "NC Tax 6.75%: $438.75", set total_tax_amount to 438.75)
-  - Still extract the tax_rate from the invoice and apply it to all taxable line items
-  - Only set tax_amount > 0 if the invoice explicitly shows tax calculated per individual line item
-  - The tax_rate should be the same for all taxable items on the invoice
-  - If total_tax_amount is extracted, it represents the sum of all taxes on the invoice
-  - Tax should be calculated on the discounted amounts (line_total after discounts)"""
+                prompt = DEFAULT_EXTRACTION_PROMPT
+        
+        # Structured output: the model answers through the invoice tool instead of free text
+        structured_output = kwargs.get('structured_output')
+        if structured_output is None:
+            structured_output = ConfigManager.get_structured_output_enabled()
+        
+        # The static instructions become a cacheable system prefix; the document is the only
+        # part of the request that changes between invoices
+        system_prompt = None
+        if extraction['path'] == 'multimodal' and ConfigManager.get_prompt_caching_enabled():
+            system_prompt, prompt = prompt, DOCUMENT_EXTRACTION_INSTRUCTION
+        
+        return {
+            'model_config': model_config,
+            'model_id': model_id,
+            'config': config,
+            'prompt': prompt,
+            'pdf_bytes': pdf_bytes,
+            'pdf_filename': os.path.basename(file_path),
+            'preflight': preflight,
+            'extraction': extraction,
+            'system_prompt': system_prompt,
+            'tool_spec': INVOICE_EXTRACTION_TOOL if structured_output else None,
+        }
+    
+    def _invoke_request(self, request: Dict[str, Any], retry_stats: RetryStats) -> Tuple[str, Dict[str, int]]:
+        """
+        Invoke the model for a prepared extraction request.
+        
+        The PDF is attached as a document on the multimodal path; on the text-layer path the
+        text is already in the prompt and is sent to Converse as a text-only message, which
+        every Converse-capable model (Claude, Nova, Llama, ...) accepts.
+        """
+        attach_pdf = request['extraction']['path'] == 'multimodal'
+        return self._invoke_model(
+            request['model_id'], request['prompt'], request['config'],
+            pdf_bytes=request['pdf_bytes'] if attach_pdf else None,
+            pdf_filename=request['pdf_filename'],
+            retry_stats=retry_stats, region_name=request['model_config'].region,
+            system_prompt=request.get('system_prompt'), tool_spec=request.get('tool_spec')
+        )
+    
+    def _lookup_cache(self, request: Dict[str, Any], use_cache: bool) -> Tuple[Optional[Dict[str, str]], Optional[Tuple[str, Dict[str, Any]]]]:
+        """
+        Look up an extraction request in the OCR result cache.
+        
+        Args:
+            request: Dictionary returned by _prepare_extraction()
+            use_cache: Whether the cache should be consulted
             
-            # Invoke model with PDF bytes and filename
-            result, token_usage = self._invoke_model(model_id, prompt, config, pdf_bytes=pdf_bytes, pdf_filename=pdf_filename)
-        else:
-            # Model doesn't support multimodal - raise error
-            raise BedrockError(f"Model {model_id} does not support direct PDF processing. Please use a Claude 3+ or Amazon Nova model.")
+        Returns:
+            tuple: (cache_key_parts, cached_result)
+                - cache_key_parts: Cache key components, or None if the cache is bypassed
+                - cached_result: (result_text, usage_info) on a hit, otherwise None; a hit reports
+                  zero tokens and cost, with the cached usage under usage_info['cache']['original_usage']
+        """
+        if not use_cache:
+            return None, None
+        
+        model_id = request['model_id']
+        prompt = (request.get('system_prompt') or '') + request['prompt']
+        if request.get('tool_spec'):
+            # The whole tool spec, so a schema change invalidates cached structured results
+            prompt += f"\n[tool:{json.dumps(request['tool_spec'], sort_keys=True)}]"
+        cache_key_parts = OCRResultCache.build_key(request['pdf_bytes'], model_id, prompt, request['config'])
+        cached_entry = OCRResultCache.get(cache_key_parts['cache_key'])
+        if not cached_entry:
+            return cache_key_parts, None
+        
+        logger.info(f"OCR cache hit for {request['pdf_filename']} (key={cache_key_parts['cache_key'][:12]}, model={model_id})")
+        # Nothing was billed for a hit: report zero usage and keep what the original extraction cost
+        usage_info = {
+            **cached_entry.usage,
+            **{field: 0 for field in USAGE_ROLLUP_FIELDS},
+            'cache': {
+                'hit': True,
+                'key': cache_key_parts['cache_key'],
+                'hit_count': cached_entry.hit_count,
+                'original_usage': cached_entry.usage,
+            },
+            'preflight': request['preflight'],
+            'extraction': request['extraction'],
+        }
+        return cache_key_parts, (cached_entry.result_text, usage_info)
+    
+    def _finalize_extraction(self, result: Union[str, Dict[str, Any]], token_usage: Dict[str, int],
+                             request: Dict[str, Any], cache_key_parts: Optional[Dict[str, str]], use_cache: bool,
+                             retry_stats: RetryStats) -> Tuple[Union[str, Dict[str, Any]], Dict[str, Any]]:
+        """
+        Compute costs, extract the JSON result and store it in the OCR result cache.
+        
+        A structured (tool input) result is already a dict and is returned unchanged; it is
+        serialized only for the cache entry.
+        
+        Returns:
+            tuple: (processed_result, usage_dict) as returned by process_invoice()
+        """
+        model_config = request['model_config']
         
         # Calculate costs based on model pricing
         cost_info = self._calculate_cost(
@@ -491,11 +773,190 @@ Important:
             **cost_info
         }
         
-        # Try to extract JSON from the response (might be wrapped in markdown code blocks)
-        json_result = self._extract_json_from_response(result)
-        formatted_result = json_result if json_result else format_extracted_text(result)
+        if isinstance(result, dict):
+            formatted_result = result
+            cache_text = json.dumps(result)
+        else:
+            # Try to extract JSON from the response (might be wrapped in markdown code blocks)
+            json_result = self._extract_json_from_response(result)
+            formatted_result = json_result if json_result else format_extracted_text(result)
+            cache_text = json_result
+        
+        # Only cache results that contain a parseable JSON extraction
+        if cache_key_parts and cache_text:
+            OCRResultCache.set(cache_key_parts, request['model_id'], cache_text, usage_info)
+        usage_info['retries'] = retry_stats.as_dict()
+        usage_info['cache'] = {
+            'hit': False,
+            'key': cache_key_parts['cache_key'] if cache_key_parts else None,
+            'bypassed': not use_cache,
+        }
+        usage_info['preflight'] = request['preflight']
+        usage_info['extraction'] = request['extraction']
+        usage_info['structured_output'] = isinstance(result, dict)
         return formatted_result, usage_info
     
+    @ConfigManager.snapshot()
+    def process_invoice_split(self, file_path: str, model_id: Optional[str] = None,
+                              prompt_template: Optional[str] = None, use_cache: Optional[bool] = None,
+                              pages_per_chunk: Optional[int] = None, max_workers: Optional[int] = None,
+                              **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        Process a multi-page invoice PDF by extracting page ranges concurrently and merging them.
+        
+        Each range gets its own max_tokens budget, so long invoices no longer come back as
+        truncated JSON, and wall-clock time is set by the slowest range. PDFs with no more
+        than pages_per_chunk pages, or read from their text layer, are extracted whole, as
+        process_invoice() would, without preparing them a second time.
+        
+        Args:
+            file_path: Path to PDF file
+            model_id: Model ID to use (defaults to configured default)
+            prompt_template: Custom prompt template
+            use_cache: Whether to use the OCR result cache (defaults to ocr_cache_enabled config)
+            pages_per_chunk: Pages per range (defaults to page_split_pages_per_chunk config)
+            max_workers: Concurrent range extractions (defaults to batch_max_workers config)
+            **kwargs: Additional model parameters (temperature, max_tokens, etc.)
+            
+        Returns:
+            tuple: (merged_json, usage_dict) in the same shape as process_invoice(); usage_dict
+                sums token usage and cost over all ranges and adds 'split' with per-range
+                usage and the merge/totals report
+            
+        Raises:
+            BedrockError: If any page range fails or returns no parseable JSON
+        """
+        request = self._prepare_extraction(file_path, model_id=model_id, prompt_template=prompt_template, **kwargs)
+        pages_per_chunk = pages_per_chunk or ConfigManager.get_page_split_pages_per_chunk()
+        chunks = split_pdf_pages(request['pdf_bytes'], pages_per_chunk)
+        if len(chunks) <= 1 or request['extraction']['path'] != 'multimodal':
+            return self._process_prepared(request, use_cache)
+        
+        if use_cache is None:
+            use_cache = ConfigManager.get_ocr_cache_enabled()
+        page_count = chunks[-1][1]
+        max_workers = min(len(chunks), max_workers or ConfigManager.get_batch_max_workers())
+        
+        def extract_range(chunk):
+            first_page, last_page, chunk_bytes = chunk
+            chunk_request = {
+                **request,
+                'pdf_bytes': chunk_bytes,
+                'pdf_filename': f"{os.path.splitext(request['pdf_filename'])[0]}_p{first_page}-{last_page}.pdf",
+                'prompt': request['prompt'] + PAGE_RANGE_PROMPT_SUFFIX.format(
+                    first_page=first_page, last_page=last_page, page_count=page_count
+                ),
+            }
+            try:
+                return self._process_prepared(chunk_request, use_cache)
+            finally:
+                close_old_connections()
+        
+        logger.info(f"Splitting {request['pdf_filename']} ({page_count} pages) into {len(chunks)} ranges of up to {pages_per_chunk} pages")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(extract_range, chunks))
+        
+        parsed_chunks = []
+        usage_info = {field: 0 for field in USAGE_ROLLUP_FIELDS}
+        range_usage = []
+        for (first_page, last_page, _), (result, chunk_usage) in zip(chunks, outputs):
+            try:
+                parsed_chunks.append(result if isinstance(result, dict) else json.loads(result))
+            except json.JSONDecodeError:
+                raise BedrockError(f"Pages {first_page}-{last_page} returned no parseable JSON (output may be truncated)")
+            for field in USAGE_ROLLUP_FIELDS:
+                usage_info[field] += chunk_usage.get(field, 0)
+            range_usage.append({
+                'pages': f"{first_page}-{last_page}",
+                'inputTokens': chunk_usage.get('inputTokens', 0),
+                'outputTokens': chunk_usage.get('outputTokens', 0),
+                'totalCost': chunk_usage.get('totalCost', 0.0),
+                'cache_hit': chunk_usage.get('cache', {}).get('hit', False),
+            })
+        
+        merged, merge_report = merge_invoice_chunks(parsed_chunks)
+        usage_info['split'] = {
+            'page_count': page_count,
+            'pages_per_chunk': pages_per_chunk,
+            'ranges': range_usage,
+            **merge_report,
+        }
+        usage_info['cache'] = {
+            'hit': all(item['cache_hit'] for item in range_usage),
+            'key': None,
+            'bypassed': not use_cache,
+        }
+        usage_info['preflight'] = request['preflight']
+        usage_info['extraction'] = request['extraction']
+        return json.dumps(merged, indent=2), usage_info
+    
+    def process_invoice_stream(self, file_path: str, model_id: Optional[str] = None,
+                               prompt_template: Optional[str] = None, use_cache: Optional[bool] = None,
+                               **kwargs) -> Iterator[Tuple[str, Any]]:
+        """
+        Process an invoice PDF using the ConverseStream API, emitting data as it is generated.
+        
+        Header fields and line items are parsed incrementally from the streamed
+        text, so callers can act on them before generation finishes. Cache hits
+        are replayed through the same parser and produce the same events.
+        
+        Args:
+            file_path: Path to PDF file
+            model_id: Model ID to use (defaults to configured default)
+            prompt_template: Custom prompt template
+            use_cache: Whether to use the OCR result cache (defaults to ocr_cache_enabled config)
+            **kwargs: Additional model parameters (temperature, max_tokens, etc.)
+            
+        Yields:
+            tuple: (event_type, payload)
+                - ('header', {field: value}) for each top-level invoice field
+                - ('line_item', dict) for each complete line item
+                - ('complete', {'result': str, 'usage_info': dict}) once, at the end;
+                  result and usage_info match the return value of process_invoice()
+            
+        Raises:
+            BedrockError: If processing fails
+        """
+        request = self._prepare_extraction(file_path, model_id=model_id, prompt_template=prompt_template, **kwargs)
+        parser = IncrementalInvoiceParser()
+        
+        if use_cache is None:
+            use_cache = ConfigManager.get_ocr_cache_enabled()
+        cache_key_parts, cached = self._lookup_cache(request, use_cache)
+        if cached:
+            result, usage_info = cached
+            yield from parser.feed(result)
+            yield COMPLETE_EVENT, {'result': result, 'usage_info': usage_info}
+            return
+        
+        retry_stats = RetryStats()
+        token_usage = {}
+        try:
+            for kind, payload in self._invoke_model_stream(
+                request['model_id'], request['prompt'], request['config'],
+                pdf_bytes=request['pdf_bytes'] if request['extraction']['path'] == 'multimodal' else None,
+                pdf_filename=request['pdf_filename'],
+                retry_stats=retry_stats, region_name=request['model_config'].region,
+                system_prompt=request.get('system_prompt'), tool_spec=request.get('tool_spec')
+            ):
+                if kind == 'text':
+                    yield from parser.feed(payload)
+                else:
+                    token_usage = payload
+        except InvoiceProcessingError as e:
+            e.retry_stats = retry_stats.as_dict()
+            raise
+        
+        # Streamed tool input is pure JSON that the parser has already decoded piece by piece
+        result = parser.text
+        if request.get('tool_spec') and parser.complete:
+            result = {**parser.header, parser.array_key: parser.line_items}
+        result, usage_info = self._finalize_extraction(
+            result, token_usage, request, cache_key_parts, use_cache, retry_stats
+        )
+        usage_info['streamed'] = True
+        yield COMPLETE_EVENT, {'result': result, 'usage_info': usage_info}
+    
     def _extract_json_from_response(self, text: str) -> Optional[str]:
         """
         Extract JSON from response text, handling markdown code blocks.
@@ -542,6 +1003,7 @@ class InvoiceProcessor:
         self.region_name = region_name
         self.bedrock_service = BedrockLLMService(region_name=region_name)
     
+    @ConfigManager.snapshot()
     def process_pdf(self, file_path: str, method: str = 'bedrock', 
                    model_id: Optional[str] = None,
                    create_job: bool = True,
@@ -554,7 +1016,10 @@ class InvoiceProcessor:
             method: Processing method (only 'bedrock' is supported)
             model_id: Model ID for Bedrock (optional, uses default if not specified)
             create_job: Whether to create a ProcessingJob record
-            **kwargs: Additional parameters (temperature, max_tokens, prompt_template, etc.)
+            **kwargs: Additional parameters (temperature, max_tokens, prompt_template, etc.);
+                      split_pages=True extracts page ranges concurrently (defaults to page_split_enabled config);
+                      cascade=True escalates through the model cascade (defaults to cascade_enabled config
+                      when no model_id is given)
             
         Returns:
             tuple: (extracted_text, usage_info)
@@ -576,34 +1041,332 @@ class InvoiceProcessor:
                 status='processing'
             )
         
+        split_pages = kwargs.pop('split_pages', None)
+        if split_pages is None:
+            split_pages = ConfigManager.get_page_split_enabled()
+        extract = self.bedrock_service.process_invoice_split if split_pages else self.bedrock_service.process_invoice
+        
+        # An explicit model_id pins the model; otherwise the cascade may be used
+        cascade = kwargs.pop('cascade', None)
+        if cascade is None:
+            cascade = ConfigManager.get_cascade_enabled() and not model_id
+        
         try:
-            result, usage_info = self.bedrock_service.process_invoice(
-                file_path,
-                model_id=model_id,
-                prompt_template=kwargs.get('prompt_template'),
-                **{k: v for k, v in kwargs.items() if k not in ['prompt_template']}
-            )
-            # Store token usage and cost in job metadata if job exists
+            if cascade:
+                result, usage_info = self._extract_cascade(extract, file_path, **kwargs)
+            else:
+                result, usage_info = extract(
+                    file_path,
+                    model_id=model_id,
+                    prompt_template=kwargs.get('prompt_template'),
+                    **{k: v for k, v in kwargs.items() if k not in ['prompt_template']}
+                )
             if job:
-                job.metadata = job.metadata or {}
-                job.metadata['usage'] = usage_info
-                job.save()
+                self._complete_job(job, result, usage_info)
+            
+            return result, usage_info
             
+        except Exception as e:
             if job:
-                job.status = 'completed'
-                job.extracted_text = result
-                job.completed_at = timezone.now()
-                job.save()
+                self._fail_job(job, e)
+            raise
+    
+    def _extract_cascade(self, extract, file_path: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """
+        Extract with the cheapest model first, escalating only when reconciliation fails.
+        
+        Each tier's answer is checked with InvoiceDataParser.reconciliation_issues() (line totals
+        against the invoice total, quantity x unit_price against line totals, date and state
+        sanity) using the cascade_* thresholds. The first tier that passes answers; if none
+        does, the most capable tier that returned a result answers.
+        
+        Args:
+            extract: Extraction callable (process_invoice or process_invoice_split)
+            file_path: Path to PDF file
+            **kwargs: Additional parameters passed to extract
             
-            return result, usage_info
+        Returns:
+            tuple: (result, usage_info); token and cost fields are summed over all tiers tried,
+                and usage_info['cascade'] records the answering tier, each attempt and the
+                escalation cost (spend on tiers whose answer was rejected)
+        """
+        # taxright depends on invoice_ocr, so its parser is imported lazily
+        from taxright.services import InvoiceDataParser
+        
+        thresholds = ConfigManager.get_cascade_thresholds()
+        check_kwargs = {
+            'total_tolerance': Decimal(str(thresholds['total_tolerance'])),
+            'total_tolerance_pct': Decimal(str(thresholds['total_tolerance_pct'])),
+            'max_line_mismatch_ratio': float(thresholds['max_line_mismatch_ratio']),
+            'max_invoice_age_days': int(thresholds['max_invoice_age_days']),
+        }
+        models = ConfigManager.get_cascade_models()
+        
+        attempts = []
+        totals = {field: 0 for field in USAGE_ROLLUP_FIELDS}
+        answer = None
+        for tier, model in enumerate(models):
+            start_time = time.monotonic()
+            try:
+                result, usage_info = extract(file_path, model_id=model.model_id, **kwargs)
+            except BedrockError as e:
+                attempts.append({'tier': tier, 'model_id': model.model_id, 'error': str(e)})
+                logger.warning(f"Cascade tier {tier} ({model.model_id}) failed: {str(e)}")
+                if tier == len(models) - 1 and answer is None:
+                    raise
+                continue
+            
+            issues = InvoiceDataParser(result).reconciliation_issues(**check_kwargs)
+            for field in USAGE_ROLLUP_FIELDS:
+                totals[field] += usage_info.get(field, 0)
+            attempts.append({
+                'tier': tier,
+                'model_id': model.model_id,
+                'issues': issues,
+                'inputTokens': usage_info.get('inputTokens', 0),
+                'outputTokens': usage_info.get('outputTokens', 0),
+                'totalCost': usage_info.get('totalCost', 0.0),
+                'latency_seconds': round(time.monotonic() - start_time, 3),
+            })
+            answer = (tier, result, usage_info, issues)
+            if not issues:
+                break
+            logger.info(f"Cascade tier {tier} ({model.model_id}) failed validation, escalating: {'; '.join(issues)}")
+        
+        tier, result, usage_info, issues = answer
+        answering_cost = usage_info.get('totalCost', 0.0)
+        usage_info = {
+            **usage_info,
+            **totals,
+            'cascade': {
+                'tier': tier,
+                'model_id': models[tier].model_id,
+                'escalated': tier > 0,
+                'accepted': not issues,
+                'escalation_cost': round(totals['totalCost'] - answering_cost, 8),
+                'latency_seconds': round(sum(a.get('latency_seconds', 0) for a in attempts), 3),
+                'attempts': attempts,
+            },
+        }
+        return result, usage_info
+    
+    def process_pdf_stream(self, file_path: str, method: str = 'bedrock',
+                           model_id: Optional[str] = None,
+                           create_job: bool = True,
+                           **kwargs) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming variant of process_pdf() built on BedrockLLMService.process_invoice_stream().
+        
+        Args:
+            file_path: Path to PDF file
+            method: Processing method (only 'bedrock' is supported)
+            model_id: Model ID for Bedrock (optional, uses default if not specified)
+            create_job: Whether to create a ProcessingJob record
+            **kwargs: Additional parameters (temperature, max_tokens, prompt_template, etc.)
+            
+        Yields:
+            tuple: (event_type, payload) as yielded by process_invoice_stream(); the
+                'complete' payload additionally carries 'job_id'
             
+        Raises:
+            InvoiceProcessingError: If processing fails
+        """
+        if method != 'bedrock':
+            raise InvoiceProcessingError(f"Only 'bedrock' method is supported. Received: {method}")
+        
+        job = None
+        if create_job:
+            job = ProcessingJob.objects.create(
+                file_path=file_path,
+                method=method,
+                model_id=model_id,
+                status='processing'
+            )
+        
+        try:
+            for event_type, payload in self.bedrock_service.process_invoice_stream(
+                file_path,
+                model_id=model_id,
+                prompt_template=kwargs.get('prompt_template'),
+                **{k: v for k, v in kwargs.items() if k not in ['prompt_template']}
+            ):
+                if event_type == COMPLETE_EVENT:
+                    if job:
+                        self._complete_job(job, payload['result'], payload['usage_info'])
+                    payload = {**payload, 'job_id': job.id if job else None}
+                yield event_type, payload
         except Exception as e:
             if job:
-                job.status = 'failed'
-                job.error_message = str(e)
-                job.save()
+                self._fail_job(job, e)
             raise
     
+    def process_batch(self, file_paths: Iterable[str], method: str = 'bedrock',
+                      model_id: Optional[str] = None,
+                      create_job: bool = True,
+                      max_workers: Optional[int] = None,
+                      max_requests_per_minute: Optional[int] = None,
+                      **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Process many PDF invoices concurrently on a bounded worker pool.
+        
+        Concurrency adapts to Bedrock throttling: each ThrottlingException halves the number
+        of calls in flight and the call is retried with backoff, while successful calls grow
+        concurrency back towards max_workers. Results are yielded as each call completes, so
+        callers can persist them without waiting for the whole batch.
+        
+        Args:
+            file_paths: Paths to PDF files
+            method: Processing method (only 'bedrock' is supported)
+            model_id: Model ID for Bedrock (optional, uses default if not specified)
+            create_job: Whether to create a ProcessingJob record per file
+            max_workers: Worker pool size (defaults to batch_max_workers config)
+            max_requests_per_minute: Cap on Bedrock call starts per minute
+                                     (defaults to batch_max_requests_per_minute config, 0 = no cap)
+            **kwargs: Additional parameters passed to process_invoice (temperature, use_cache, etc.)
+            
+        Yields:
+            dict: Per-file result with 'file_path', 'status' ('completed' or 'failed'),
+                  'result', 'usage_info', 'error', 'job_id' and 'throttle_retries'
+            
+        Raises:
+            InvoiceProcessingError: If method is not supported
+        """
+        if method != 'bedrock':
+            raise InvoiceProcessingError(f"Only 'bedrock' method is supported. Received: {method}")
+        
+        file_paths = list(file_paths)
+        max_workers = max_workers or ConfigManager.get_batch_max_workers()
+        if max_requests_per_minute is None:
+            max_requests_per_minute = ConfigManager.get_batch_max_requests_per_minute()
+        max_throttle_retries = ConfigManager.get_max_retries()
+        limiter = AdaptiveConcurrencyLimiter(
+            max_limit=max_workers,
+            max_requests_per_minute=max_requests_per_minute
+        )
+        
+        # Create all jobs up front so progress is visible while the batch runs
+        jobs = {}
+        if create_job:
+            for file_path in file_paths:
+                jobs[file_path] = ProcessingJob.objects.create(
+                    file_path=file_path,
+                    method=method,
+                    model_id=model_id,
+                    status='processing'
+                )
+        
+        def process_one(file_path):
+            throttle_retries = 0
+            try:
+                while True:
+                    # The limiter owns throttle backoff: throttles come straight back from Bedrock calls
+                    with limiter.slot(), throttle_retries_disabled():
+                        try:
+                            result, usage_info = self.bedrock_service.process_invoice(
+                                file_path, model_id=model_id, **kwargs
+                            )
+                            limiter.on_success()
+                            return result, usage_info, throttle_retries
+                        except ThrottlingError:
+                            limiter.on_throttle()
+                            if throttle_retries >= max_throttle_retries:
+                                raise
+                    throttle_retries += 1
+                    backoff = min(30.0, 2 ** throttle_retries) * random.uniform(0.5, 1.0)
+                    logger.info(f"Throttled processing {file_path}, retry {throttle_retries} in {backoff:.1f}s")
+                    time.sleep(backoff)
+            finally:
+                close_old_connections()
+        
+        logger.info(f"Processing batch of {len(file_paths)} invoices with up to {max_workers} workers")
+        finished = set()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {executor.submit(process_one, file_path): file_path for file_path in file_paths}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                job = jobs.get(file_path)
+                try:
+                    result, usage_info, throttle_retries = future.result()
+                except Exception as e:
+                    logger.error(f"Batch processing failed for {file_path}: {str(e)}")
+                    finished.add(file_path)
+                    if job:
+                        self._fail_job(job, e)
+                    yield {
+                        'file_path': file_path,
+                        'status': 'failed',
+                        'result': None,
+                        'usage_info': None,
+                        'error': str(e),
+                        'job_id': job.id if job else None,
+                        'throttle_retries': None,
+                    }
+                    continue
+                
+                finished.add(file_path)
+                if job:
+                    job.metadata = job.metadata or {}
+                    job.metadata['throttle_retries'] = throttle_retries
+                    self._complete_job(job, result, usage_info)
+                yield {
+                    'file_path': file_path,
+                    'status': 'completed',
+                    'result': result,
+                    'usage_info': usage_info,
+                    'error': None,
+                    'job_id': job.id if job else None,
+                    'throttle_retries': throttle_retries,
+                }
+        finally:
+            # If the caller stops iterating, don't process the rest of the batch, and don't
+            # leave jobs that will never complete marked 'processing'
+            executor.shutdown(wait=True, cancel_futures=True)
+            for file_path, job in jobs.items():
+                if file_path not in finished:
+                    self._fail_job(job, InvoiceProcessingError('Batch stopped before this file was processed'))
+        
+        logger.info(
+            f"Batch complete: {limiter.success_count} succeeded, {limiter.throttle_count} throttle responses, "
+            f"final concurrency {limiter.current_limit}"
+        )
+    
+    def _complete_job(self, job: ProcessingJob, result: Union[str, Dict[str, Any]], usage_info: Optional[Dict[str, Any]]):
+        """Mark a ProcessingJob completed, storing the result, token usage, cost and cache hit/miss."""
+        job.metadata = job.metadata or {}
+        job.metadata['usage'] = usage_info
+        if usage_info and 'cache' in usage_info:
+            job.metadata['cache'] = usage_info['cache']
+        if usage_info and 'retries' in usage_info:
+            job.metadata['retries'] = usage_info['retries']
+        if usage_info and usage_info.get('preflight'):
+            # Input tokens alongside the size reduction so compaction savings can be compared per policy
+            job.metadata['preflight'] = {
+                **usage_info['preflight'],
+                'input_tokens': usage_info.get('inputTokens', 0),
+            }
+        if usage_info and 'cascade' in usage_info:
+            job.metadata['cascade'] = usage_info['cascade']
+            job.model_id = usage_info['cascade']['model_id']
+        if usage_info and 'extraction' in usage_info:
+            job.metadata['extraction_path'] = usage_info['extraction']['path']
+            if 'text_layer' in usage_info['extraction']:
+                job.metadata['text_layer'] = usage_info['extraction']['text_layer']
+        job.status = 'completed'
+        job.extracted_text = json.dumps(result, indent=2) if isinstance(result, dict) else result
+        job.completed_at = timezone.now()
+        job.save()
+    
+    def _fail_job(self, job: ProcessingJob, error: Exception):
+        """Mark a ProcessingJob failed with the given error and any retry statistics."""
+        retry_stats = getattr(error, 'retry_stats', None)
+        if retry_stats:
+            job.metadata = job.metadata or {}
+            job.metadata['retries'] = retry_stats
+        job.status = 'failed'
+        job.error_message = str(error)
+        job.save()
+    
     def extract_with_bedrock(self, file_path: str, model_id: Optional[str] = None,
                             prompt_template: Optional[str] = None, **config) -> str:
         """
@@ -0,0 +1,15 @@
+"""
+Signal handlers for the invoice_ocr app.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from invoice_ocr.config import invalidate_config_snapshot
+from invoice_ocr.models import ProcessingConfig
+
+
+@receiver(post_save, sender=ProcessingConfig)
+@receiver(post_delete, sender=ProcessingConfig)
+def refresh_config_snapshot(sender, instance, **kwargs):
+    """Drop the in-process config snapshot so running operations read the changed value."""
+    invalidate_config_snapshot()
@@ -0,0 +1,186 @@
+"""
+Incremental JSON parsing for streamed invoice extractions.
+
+Bedrock's converse_stream returns the model output as a sequence of text
+deltas. IncrementalInvoiceParser consumes those deltas and emits events as
+soon as a top-level header field or a complete element of the line_items
+array has been received, so callers can persist data before the model has
+finished generating the whole invoice.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER_EVENT = 'header'
+LINE_ITEM_EVENT = 'line_item'
+COMPLETE_EVENT = 'complete'
+
+
+class IncrementalInvoiceParser:
+    """
+    Character-level scanner over a streamed JSON invoice object.
+
+    Only the structure needed to find value boundaries is tracked (nesting
+    stack, string/escape state). Each completed value is decoded with
+    json.loads, so the parser never has to understand JSON number or literal
+    syntax itself. Any text before the first '{' (e.g. a markdown code fence)
+    is ignored.
+    """
+
+    def __init__(self, array_key: str = 'line_items'):
+        """
+        Initialize parser.
+
+        Args:
+            array_key: Top-level key whose array elements are emitted one by one
+        """
+        self.array_key = array_key
+        self.header: Dict[str, Any] = {}
+        self.line_items: List[Dict[str, Any]] = []
+        self.complete = False
+        self._buffer: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._current_key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._expect_key = False
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._pos = 0
+        self._started = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Consume a chunk of streamed text.
+
+        Args:
+            text: Next text delta from the model
+
+        Returns:
+            list: (event_type, payload) tuples for values completed by this chunk
+                - ('header', {key: value}) for each top-level scalar/object field
+                - ('line_item', dict) for each element of the array_key array
+        """
+        events = []
+        for char in text:
+            self._buffer.append(char)
+            event = self._consume(char)
+            self._pos += 1
+            if event:
+                events.append(event)
+        return events
+
+    def _text(self, start: int, end: int) -> str:
+        return ''.join(self._buffer[start:end])
+
+    def _consume(self, char: str) -> Optional[Tuple[str, Any]]:
+        if self.complete:
+            return None
+        if not self._started:
+            if char == '{':
+                self._started = True
+                self._stack.append('{')
+                self._expect_key = True
+            return None
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if len(self._stack) == 1 and self._key_start is not None:
+                    self._current_key = json.loads(self._text(self._key_start, self._pos + 1))
+                    self._key_start = None
+            return None
+
+        depth = len(self._stack)
+        if char == '"':
+            self._in_string = True
+            if depth == 1 and self._expect_key:
+                self._key_start = self._pos
+                self._expect_key = False
+            elif depth == 1 and self._value_start is None:
+                self._value_start = self._pos
+            elif depth == 2 and self._in_item_array() and self._item_start is None:
+                self._item_start = self._pos
+            return None
+
+        if char in '{[':
+            if depth == 1 and self._value_start is None:
+                self._value_start = self._pos
+            elif depth == 2 and self._in_item_array() and self._item_start is None:
+                self._item_start = self._pos
+            self._stack.append(char)
+            return None
+
+        if char in '}]':
+            self._stack.pop()
+            depth = len(self._stack)
+            if depth == 0:
+                self.complete = True
+                return self._finish_header_value(self._pos)
+            if depth == 2 and self._in_item_array() and self._item_start is not None:
+                return self._finish_item(self._pos + 1)
+            if depth == 1 and char == ']' and self._current_key == self.array_key:
+                self._value_start = None
+                self._current_key = None
+            return None
+
+        if char == ',':
+            if depth == 1:
+                event = self._finish_header_value(self._pos)
+                self._expect_key = True
+                return event
+            if depth == 2 and self._in_item_array() and self._item_start is not None:
+                return self._finish_item(self._pos)
+            return None
+
+        if char == ':' or char.isspace():
+            return None
+
+        # Start of a number or literal (true/false/null)
+        if depth == 1 and self._value_start is None and self._current_key is not None:
+            self._value_start = self._pos
+        elif depth == 2 and self._in_item_array() and self._item_start is None:
+            self._item_start = self._pos
+        return None
+
+    def _in_item_array(self) -> bool:
+        return self._current_key == self.array_key and self._stack[-1] == '['
+
+    def _finish_item(self, end: int) -> Optional[Tuple[str, Any]]:
+        raw = self._text(self._item_start, end).strip()
+        self._item_start = None
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.warning(f"Could not decode streamed line item: {raw[:100]}")
+            return None
+        self.line_items.append(item)
+        return LINE_ITEM_EVENT, item
+
+    def _finish_header_value(self, end: int) -> Optional[Tuple[str, Any]]:
+        key = self._current_key
+        start = self._value_start
+        self._current_key = None
+        self._value_start = None
+        if key is None or start is None or key == self.array_key:
+            return None
+        raw = self._text(start, end).strip()
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.warning(f"Could not decode streamed field '{key}': {raw[:100]}")
+            return None
+        self.header[key] = value
+        return HEADER_EVENT, {key: value}
+
+    @property
+    def text(self) -> str:
+        """All text received so far."""
+        return ''.join(self._buffer)
@@ -0,0 +1,1003 @@
+from django.test import TestCase, TransactionTestCase
+from unittest import mock
+import io
+import json
+import os
+import tempfile
+
+from .models import BedrockModelConfig, OCRCacheEntry, ProcessingJob
+from .cache import OCRResultCache
+from .services import BedrockLLMService, InvoiceProcessor
+from .concurrency import AdaptiveConcurrencyLimiter
+from .exceptions import BedrockError, PDFValidationError, ThrottlingError, CircuitOpenError
+from .resilience import RetryStats, call_with_resilience, reset_circuit_breakers
+from .streaming import IncrementalInvoiceParser
+from .clients import get_client, reset_clients
+from .backends import get_backend, reset_backends
+from .config import ConfigManager
+from .merging import merge_invoice_chunks
+from .utils import preflight_pdf
+from pypdf import PdfWriter
+from PIL import Image
+from fpdf import FPDF
+from botocore.exceptions import ClientError
+
+
+SAMPLE_INVOICE_JSON = {
+    'invoice_number': 'INV-001',
+    'date': '2024-01-15',
+    'vendor_name': 'Test Vendor',
+    'total_amount': '107.00',
+    'total_tax_amount': '7.00',
+    'invoice_discount_amount': '0',
+    'state_code': 'NC',
+    'jurisdiction': '',
+    'line_items': [
+        {
+            'description': 'Test Item',
+            'quantity': '1',
+            'unit_price': '100.00',
+            'line_total': '100.00',
+            'discount_amount': '0',
+            'tax_amount': '0',
+            'tax_rate': '0.07',
+            'tax_status': 'taxable',
+        }
+    ],
+}
+
+
+def make_client_error(code):
+    """Build a botocore ClientError with the given error code"""
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'Converse')
+
+
+def make_converse_response(text, input_tokens=1000, output_tokens=200):
+    """Build a minimal Converse API response"""
+    return {
+        'output': {'message': {'role': 'assistant', 'content': [{'text': text}]}},
+        'usage': {
+            'inputTokens': input_tokens,
+            'outputTokens': output_tokens,
+            'totalTokens': input_tokens + output_tokens,
+        },
+    }
+
+
+def make_converse_stream_response(text, chunk_size=7, input_tokens=1000, output_tokens=200):
+    """Build a ConverseStream API response that emits text in small deltas"""
+    events = [{'messageStart': {'role': 'assistant'}}]
+    for start in range(0, len(text), chunk_size):
+        events.append({'contentBlockDelta': {'contentBlockIndex': 0, 'delta': {'text': text[start:start + chunk_size]}}})
+    events.append({'contentBlockStop': {'contentBlockIndex': 0}})
+    events.append({'messageStop': {'stopReason': 'end_turn'}})
+    events.append({'metadata': {'usage': {
+        'inputTokens': input_tokens,
+        'outputTokens': output_tokens,
+        'totalTokens': input_tokens + output_tokens,
+    }}})
+    return {'stream': iter(events)}
+
+
+class BedrockTestMixin:
+    """Shared setup for tests that exercise BedrockLLMService with a mocked client"""
+
+    def setUp(self):
+        """Set up a default model and a temporary PDF file"""
+        self.model = BedrockModelConfig.objects.create(
+            name='Claude 3 Haiku',
+            model_id='anthropic.claude-3-haiku-20240307-v1:0',
+            input_token_cost='0.00025',
+            output_token_cost='0.00125',
+            is_default=True,
+        )
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.write(temp_file)
+        temp_file.close()
+        self.pdf_path = temp_file.name
+        self.addCleanup(os.unlink, self.pdf_path)
+
+    def make_service(self, *responses):
+        """Create a BedrockLLMService whose client returns the given Converse responses"""
+        service = BedrockLLMService(region_name='us-east-1')
+        service.client = mock.Mock()
+        service.client.converse.side_effect = list(responses)
+        return service
+
+
+class OCRResultCacheTest(BedrockTestMixin, TestCase):
+    """Test cases for the OCR result cache"""
+
+    def test_cache_hit_skips_bedrock(self):
+        """Test an identical extraction is served from cache"""
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        first_result, first_usage = service.process_invoice(self.pdf_path)
+        second_result, second_usage = service.process_invoice(self.pdf_path)
+
+        self.assertEqual(service.client.converse.call_count, 1)
+        self.assertEqual(first_result, second_result)
+        self.assertFalse(first_usage['cache']['hit'])
+        self.assertTrue(second_usage['cache']['hit'])
+        self.assertEqual(second_usage['inputTokens'], 0)
+        self.assertEqual(second_usage['totalCost'], 0)
+        self.assertEqual(second_usage['cache']['original_usage']['inputTokens'], 1000)
+        self.assertEqual(OCRCacheEntry.objects.get().hit_count, 1)
+
+    def test_cache_hit_not_billed_to_invoice(self):
+        """Test an invoice created from a cached extraction records no OCR cost"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from taxright.services import create_invoice_from_ocr
+        service = self.make_service(make_converse_response(json.dumps({**SAMPLE_INVOICE_JSON, 'state_code': 'XX'})))
+        service.process_invoice(self.pdf_path)
+        result, usage = service.process_invoice(self.pdf_path)
+
+        pdf_file = SimpleUploadedFile('invoice.pdf', b'%PDF-1.4', content_type='application/pdf')
+        with mock.patch('django.core.files.storage.default_storage.save', return_value='invoice.pdf'):
+            invoice = create_invoice_from_ocr(result, pdf_file, ocr_usage_info=usage)
+
+        self.assertEqual(invoice.ocr_total_tokens, 0)
+        self.assertEqual(invoice.ocr_input_cost, 0)
+        self.assertEqual(invoice.ocr_output_cost, 0)
+        self.assertEqual(invoice.ocr_total_cost, 0)
+        self.assertGreater(usage['cache']['original_usage']['totalCost'], 0)
+
+    def test_cache_bypass(self):
+        """Test use_cache=False forces a fresh extraction"""
+        service = self.make_service(
+            make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)),
+            make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)),
+        )
+
+        service.process_invoice(self.pdf_path)
+        _, usage = service.process_invoice(self.pdf_path, use_cache=False)
+
+        self.assertEqual(service.client.converse.call_count, 2)
+        self.assertTrue(usage['cache']['bypassed'])
+
+    def test_config_change_misses(self):
+        """Test a different inference config produces a different cache key"""
+        service = self.make_service(
+            make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)),
+            make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)),
+        )
+
+        service.process_invoice(self.pdf_path)
+        service.process_invoice(self.pdf_path, temperature=0.0)
+
+        self.assertEqual(service.client.converse.call_count, 2)
+        self.assertEqual(OCRCacheEntry.objects.count(), 2)
+
+    def test_evict_by_size(self):
+        """Test least recently used entries are evicted when over the size limit"""
+        for idx in range(3):
+            key_parts = OCRResultCache.build_key(f'pdf-{idx}'.encode(), 'model', 'prompt', {})
+            OCRResultCache.set(key_parts, 'model', 'x' * 600 * 1024, {})
+
+        self.assertEqual(OCRCacheEntry.objects.count(), 3)
+        evicted = OCRResultCache.evict(max_age_days=0, max_size_mb=1)
+
+        self.assertEqual(evicted, 2)
+        self.assertEqual(OCRCacheEntry.objects.count(), 1)
+
+    def test_job_metadata_records_cache(self):
+        """Test cache hit/miss is recorded on ProcessingJob metadata"""
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        processor.process_pdf(self.pdf_path)
+        processor.process_pdf(self.pdf_path)
+
+        jobs = ProcessingJob.objects.order_by('id')
+        self.assertFalse(jobs[0].metadata['cache']['hit'])
+        self.assertTrue(jobs[1].metadata['cache']['hit'])
+
+
+class AdaptiveConcurrencyLimiterTest(TestCase):
+    """Test cases for AdaptiveConcurrencyLimiter"""
+
+    def test_throttle_decreases_limit(self):
+        """Test throttling halves the limit, once per cooldown"""
+        limiter = AdaptiveConcurrencyLimiter(max_limit=8)
+        limiter.on_throttle()
+        limiter.on_throttle()
+        self.assertEqual(limiter.current_limit, 4)
+        self.assertEqual(limiter.throttle_count, 2)
+
+    def test_success_recovers_limit(self):
+        """Test successful calls grow the limit back towards the maximum"""
+        limiter = AdaptiveConcurrencyLimiter(max_limit=8, initial_limit=2)
+        for _ in range(50):
+            limiter.on_success()
+        self.assertEqual(limiter.current_limit, 8)
+
+    def test_limit_never_below_minimum(self):
+        """Test the limit is clamped at min_limit"""
+        limiter = AdaptiveConcurrencyLimiter(max_limit=2, decrease_cooldown=0)
+        for _ in range(5):
+            limiter.on_throttle()
+        self.assertEqual(limiter.current_limit, 1)
+
+
+class InvoiceBatchProcessingTest(TransactionTestCase):
+    """Test cases for InvoiceProcessor.process_batch"""
+
+    def test_batch_creates_jobs_and_retries_throttles(self):
+        """Test each file gets a job and throttled calls are retried"""
+        throttled = set()
+
+        def fake_process_invoice(file_path, **kwargs):
+            if file_path == 'b.pdf' and file_path not in throttled:
+                throttled.add(file_path)
+                raise ThrottlingError('throttled')
+            if file_path == 'c.pdf':
+                raise ValueError('bad pdf')
+            return json.dumps(SAMPLE_INVOICE_JSON), {'totalCost': 0.01}
+
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = mock.Mock()
+        processor.bedrock_service.process_invoice.side_effect = fake_process_invoice
+
+        with mock.patch('invoice_ocr.services.time.sleep'):
+            results = {r['file_path']: r for r in processor.process_batch(['a.pdf', 'b.pdf', 'c.pdf'], max_workers=2)}
+
+        self.assertEqual(results['a.pdf']['status'], 'completed')
+        self.assertEqual(results['b.pdf']['status'], 'completed')
+        self.assertEqual(results['b.pdf']['throttle_retries'], 1)
+        self.assertEqual(results['c.pdf']['status'], 'failed')
+        self.assertEqual(ProcessingJob.objects.count(), 3)
+        self.assertEqual(ProcessingJob.objects.get(file_path='c.pdf').status, 'failed')
+        self.assertEqual(ProcessingJob.objects.get(file_path='b.pdf').metadata['throttle_retries'], 1)
+
+    def test_abandoned_batch_fails_remaining_jobs(self):
+        """Test closing the generator early cancels pending files and fails their jobs"""
+        import time
+
+        def slow_process_invoice(file_path, **kwargs):
+            time.sleep(0.1)
+            return json.dumps(SAMPLE_INVOICE_JSON), {'totalCost': 0.01}
+
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = mock.Mock()
+        processor.bedrock_service.process_invoice.side_effect = slow_process_invoice
+        file_paths = [f'{idx}.pdf' for idx in range(6)]
+
+        batch = processor.process_batch(file_paths, max_workers=1)
+        first = next(batch)
+        batch.close()
+
+        self.assertEqual(first['status'], 'completed')
+        self.assertLess(processor.bedrock_service.process_invoice.call_count, len(file_paths))
+        self.assertFalse(ProcessingJob.objects.filter(status='processing').exists())
+        self.assertEqual(ProcessingJob.objects.get(id=first['job_id']).status, 'completed')
+        self.assertEqual(ProcessingJob.objects.filter(status='failed').count(), len(file_paths) - 1)
+
+
+class BatchThrottlingTest(BedrockTestMixin, TransactionTestCase):
+    """Test cases for sustained throttling in InvoiceProcessor.process_batch"""
+
+    def setUp(self):
+        super().setUp()
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+
+    def test_sustained_throttling_does_not_open_breaker(self):
+        """Test throttles are backed off by the limiter alone and never fail files with CircuitOpenError"""
+        import shutil
+        from invoice_ocr.resilience import get_circuit_breaker
+        calls = []
+
+        def throttle_twice_per_file(**kwargs):
+            calls.append(kwargs)
+            if len(calls) % 3:
+                raise make_client_error('ThrottlingException')
+            return make_converse_response(json.dumps(SAMPLE_INVOICE_JSON))
+
+        ConfigManager.set_config('circuit_breaker_failure_threshold', 2)
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service()
+        processor.bedrock_service.client.converse.side_effect = throttle_twice_per_file
+        file_paths = []
+        for idx in range(6):
+            file_paths.append(f'{self.pdf_path[:-4]}-{idx}.pdf')
+            shutil.copy(self.pdf_path, file_paths[-1])
+            self.addCleanup(os.unlink, file_paths[-1])
+        with mock.patch('invoice_ocr.services.time.sleep'):
+            results = list(processor.process_batch(file_paths, max_workers=1, use_cache=False))
+
+        self.assertFalse([result for result in results if 'Circuit breaker' in (result['error'] or '')])
+        self.assertEqual([result['status'] for result in results], ['completed'] * 6)
+        self.assertEqual([result['throttle_retries'] for result in results], [2] * 6)
+        self.assertEqual(len(calls), 18)
+        self.assertEqual([result['usage_info']['retries']['retries'] for result in results], [0] * 6)
+        breaker = get_circuit_breaker(f"bedrock-runtime:{self.model.model_id}")
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_service_unavailable_not_retried_as_throttling(self):
+        """Test ServiceUnavailable is retried once by the resilience layer, not again by the batch"""
+        ConfigManager.set_config('max_retries', 2)
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service()
+        processor.bedrock_service.client.converse.side_effect = make_client_error('ServiceUnavailableException')
+
+        with mock.patch('invoice_ocr.resilience.time.sleep'):
+            results = list(processor.process_batch([self.pdf_path], max_workers=1, use_cache=False))
+
+        self.assertEqual(results[0]['status'], 'failed')
+        self.assertIn('ServiceUnavailableException', results[0]['error'])
+        self.assertEqual(processor.bedrock_service.client.converse.call_count, 3)
+
+    def test_throttles_still_retried_outside_batches(self):
+        """Test a single extraction keeps retrying throttles without counting them as breaker failures"""
+        service = self.make_service(*[make_client_error('ThrottlingException')] * 3,
+                                    make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+        ConfigManager.set_config('circuit_breaker_failure_threshold', 2)
+
+        with mock.patch('invoice_ocr.resilience.time.sleep'):
+            _, usage = service.process_invoice(self.pdf_path, use_cache=False)
+
+        self.assertEqual(usage['retries']['retries'], 3)
+        self.assertEqual(service.client.converse.call_count, 4)
+
+
+class ConfigSnapshotTest(BedrockTestMixin, TestCase):
+    """Test cases for ConfigManager.snapshot"""
+
+    def test_reads_served_from_one_query(self):
+        """Test config reads inside an operation share one query"""
+        ConfigManager.set_config('max_retries', 5)
+
+        with self.assertNumQueries(1):
+            with ConfigManager.snapshot():
+                self.assertEqual(ConfigManager.get_max_retries(), 5)
+                self.assertEqual(ConfigManager.get_timeout(), 300)
+                with ConfigManager.snapshot():
+                    self.assertEqual(ConfigManager.get_max_retries(), 5)
+
+    def test_save_invalidates_snapshot(self):
+        """Test saving a ProcessingConfig is seen by a running operation"""
+        with ConfigManager.snapshot():
+            self.assertEqual(ConfigManager.get_max_retries(), 3)
+            ConfigManager.set_config('max_retries', 1)
+            self.assertEqual(ConfigManager.get_max_retries(), 1)
+
+    def test_extraction_reads_config_once(self):
+        """Test a Bedrock extraction no longer queries ProcessingConfig per setting"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        with CaptureQueriesContext(connection) as queries:
+            service.process_invoice(self.pdf_path, use_cache=False)
+
+        config_queries = [query for query in queries.captured_queries if 'invoice_ocr_processingconfig' in query['sql']]
+        self.assertEqual(len(config_queries), 1)
+
+
+class ResilienceTest(BedrockTestMixin, TestCase):
+    """Test cases for retry, deadline and circuit breaker handling"""
+
+    def setUp(self):
+        super().setUp()
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+        sleep_patcher = mock.patch('invoice_ocr.resilience.time.sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_retries_transient_errors(self):
+        """Test throttling is retried and recorded in stats"""
+        func = mock.Mock(side_effect=[make_client_error('ThrottlingException'), 'ok'])
+        stats = RetryStats()
+
+        result = call_with_resilience(func, 'test:model', stats=stats, max_retries=3, deadline_seconds=60)
+
+        self.assertEqual(result, 'ok')
+        self.assertEqual(stats.attempts, 2)
+        self.assertEqual(stats.retries, 1)
+        self.assertEqual(self.mock_sleep.call_count, 1)
+
+    def test_does_not_retry_validation_errors(self):
+        """Test request-level errors fail immediately"""
+        func = mock.Mock(side_effect=make_client_error('ValidationException'))
+
+        with self.assertRaises(ClientError):
+            call_with_resilience(func, 'test:model', max_retries=3, deadline_seconds=60)
+        self.assertEqual(func.call_count, 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        """Test the breaker opens after consecutive failures and rejects calls"""
+        func = mock.Mock(side_effect=make_client_error('ServiceUnavailableException'))
+
+        for _ in range(5):
+            with self.assertRaises(ClientError):
+                call_with_resilience(func, 'test:model', max_retries=0, deadline_seconds=60)
+        with self.assertRaises(CircuitOpenError):
+            call_with_resilience(func, 'test:model', max_retries=0, deadline_seconds=60)
+        self.assertEqual(func.call_count, 5)
+
+    def test_failed_job_records_retries(self):
+        """Test retry counts are stored on the job when OCR fails after retries"""
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(*[make_client_error('ThrottlingException')] * 4)
+
+        with self.assertRaises(ThrottlingError):
+            processor.process_pdf(self.pdf_path, use_cache=False)
+
+        job = ProcessingJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.metadata['retries']['attempts'], 4)
+        self.assertEqual(job.metadata['retries']['retries'], 3)
+
+
+class IncrementalInvoiceParserTest(TestCase):
+    """Test cases for IncrementalInvoiceParser"""
+
+    def test_emits_fields_and_line_items_incrementally(self):
+        """Test header fields and line items are emitted as soon as they are complete"""
+        text = '```json\n' + json.dumps(SAMPLE_INVOICE_JSON, indent=2) + '\n```'
+        parser = IncrementalInvoiceParser()
+        events = []
+        for start in range(0, len(text), 5):
+            events.extend(parser.feed(text[start:start + 5]))
+
+        self.assertTrue(parser.complete)
+        self.assertEqual(events[0], ('header', {'invoice_number': 'INV-001'}))
+        self.assertEqual([e for e in events if e[0] == 'line_item'], [('line_item', SAMPLE_INVOICE_JSON['line_items'][0])])
+        self.assertEqual(parser.header['state_code'], 'NC')
+        self.assertNotIn('line_items', parser.header)
+
+    def test_handles_escaped_quotes_and_nested_values(self):
+        """Test delimiters inside strings and nested arrays do not end values early"""
+        data = {'vendor_name': 'A "B", }C', 'line_items': [{'description': 'x], {y', 'tags': [{'a': 1}]}, {'description': 'z'}]}
+        parser = IncrementalInvoiceParser()
+        events = []
+        for char in json.dumps(data):
+            events.extend(parser.feed(char))
+
+        self.assertEqual(parser.header, {'vendor_name': 'A "B", }C'})
+        self.assertEqual(parser.line_items, data['line_items'])
+        self.assertEqual(len(events), 3)
+
+
+class StreamingExtractionTest(BedrockTestMixin, TestCase):
+    """Test cases for streaming extraction via ConverseStream"""
+
+    def make_stream_service(self, text):
+        service = BedrockLLMService(region_name='us-east-1')
+        service.client = mock.Mock()
+        service.client.converse_stream.return_value = make_converse_stream_response(text)
+        return service
+
+    def test_stream_yields_events_and_usage_from_metadata(self):
+        """Test line items are yielded before completion and usage comes from the metadata event"""
+        service = self.make_stream_service(json.dumps(SAMPLE_INVOICE_JSON))
+
+        events = list(service.process_invoice_stream(self.pdf_path))
+
+        kinds = [kind for kind, _ in events]
+        self.assertIn('line_item', kinds)
+        self.assertEqual(kinds[-1], 'complete')
+        self.assertLess(kinds.index('line_item'), kinds.index('complete'))
+        usage = events[-1][1]['usage_info']
+        self.assertEqual(usage['inputTokens'], 1000)
+        self.assertEqual(usage['outputTokens'], 200)
+        self.assertGreater(usage['totalCost'], 0)
+        self.assertTrue(usage['streamed'])
+        self.assertEqual(json.loads(events[-1][1]['result']), SAMPLE_INVOICE_JSON)
+
+    def test_stream_cache_hit_replays_events(self):
+        """Test a cached extraction is replayed through the same events without calling Bedrock"""
+        service = self.make_stream_service(json.dumps(SAMPLE_INVOICE_JSON))
+        list(service.process_invoice_stream(self.pdf_path))
+
+        events = list(service.process_invoice_stream(self.pdf_path))
+
+        self.assertEqual(service.client.converse_stream.call_count, 1)
+        self.assertEqual(len([e for e in events if e[0] == 'line_item']), 1)
+        self.assertTrue(events[-1][1]['usage_info']['cache']['hit'])
+
+    def test_process_pdf_stream_completes_job(self):
+        """Test the streaming processor records the job and returns its id"""
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_stream_service(json.dumps(SAMPLE_INVOICE_JSON))
+
+        events = list(processor.process_pdf_stream(self.pdf_path))
+
+        job = ProcessingJob.objects.get()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(events[-1][1]['job_id'], job.id)
+        self.assertEqual(job.metadata['usage']['inputTokens'], 1000)
+
+
+class ClientRegistryTest(BedrockTestMixin, TestCase):
+    """Test cases for the shared boto3 client registry"""
+
+    def setUp(self):
+        super().setUp()
+        reset_clients()
+        self.addCleanup(reset_clients)
+
+    def test_clients_reused_per_service_and_region(self):
+        """Test the same client is returned for a service/region and differs across regions"""
+        client = get_client('bedrock-runtime', 'us-east-1')
+
+        self.assertIs(get_client('bedrock-runtime', 'us-east-1'), client)
+        self.assertIsNot(get_client('bedrock-runtime', 'us-west-2'), client)
+        self.assertIs(BedrockLLMService(region_name='us-east-1').client, client)
+
+    def test_client_config_is_pooled(self):
+        """Test clients use adaptive retry mode and a connection pool sized for batch concurrency"""
+        config = get_client('bedrock-runtime', 'us-east-1').meta.config
+
+        self.assertEqual(config.retries['mode'], 'adaptive')
+        self.assertGreaterEqual(config.max_pool_connections, 8)
+        self.assertTrue(config.tcp_keepalive)
+
+    def test_calls_routed_to_model_region(self):
+        """Test extraction uses the client for the region configured on the model"""
+        self.model.region = 'eu-central-1'
+        self.model.save()
+        service = self.make_service()
+        regional_client = mock.Mock()
+        regional_client.converse.return_value = make_converse_response(json.dumps(SAMPLE_INVOICE_JSON))
+
+        with mock.patch('invoice_ocr.services.get_client', return_value=regional_client) as mock_get_client:
+            service.process_invoice(self.pdf_path, use_cache=False)
+
+        mock_get_client.assert_called_once_with('bedrock-runtime', 'eu-central-1')
+        self.assertEqual(regional_client.converse.call_count, 1)
+        self.assertEqual(service.client.converse.call_count, 0)
+
+
+class PageSplitTest(BedrockTestMixin, TransactionTestCase):
+    """Test cases for page-splitting extraction of multi-page invoices"""
+
+    def setUp(self):
+        super().setUp()
+        writer = PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(width=612, height=792)
+        with open(self.pdf_path, 'wb') as pdf_file:
+            writer.write(pdf_file)
+
+    def test_ranges_extracted_and_merged(self):
+        """Test each page range is extracted once and results merge with usage rolled up"""
+        def fake_converse(**kwargs):
+            prompt = kwargs['messages'][0]['content'][1]['text']
+            chunk = {'invoice_number': 'INV-001', 'vendor_name': 'Test Vendor', 'total_amount': 0, 'line_items': []}
+            if 'pages 1-2 of a 5-page' in prompt:
+                chunk['line_items'] = [{'description': 'Paint', 'quantity': 1, 'unit_price': 40, 'line_total': 40}]
+            elif 'pages 3-4 of a 5-page' in prompt:
+                chunk['line_items'] = [
+                    {'description': 'paint ', 'quantity': 1, 'unit_price': 40, 'line_total': 40},
+                    {'description': 'Brush', 'quantity': 2, 'unit_price': 5, 'line_total': 10},
+                ]
+            else:
+                chunk['total_amount'] = 50
+            return make_converse_response(json.dumps(chunk), input_tokens=100, output_tokens=50)
+
+        service = self.make_service()
+        service.client.converse.side_effect = fake_converse
+
+        result, usage = service.process_invoice_split(self.pdf_path, pages_per_chunk=2, use_cache=False)
+
+        merged = json.loads(result)
+        self.assertEqual(service.client.converse.call_count, 3)
+        self.assertEqual([item['description'] for item in merged['line_items']], ['Paint', 'Brush'])
+        self.assertEqual(merged['total_amount'], 50)
+        self.assertEqual(usage['inputTokens'], 300)
+        self.assertEqual(usage['outputTokens'], 150)
+        self.assertEqual(len(usage['split']['ranges']), 3)
+        self.assertEqual(usage['split']['duplicates_removed'], 1)
+        self.assertTrue(usage['split']['totals_match'])
+
+    def test_single_range_prepared_once(self):
+        """Test a PDF that fits in one range is read and prepared only once"""
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        with mock.patch.object(service, '_prepare_extraction', wraps=service._prepare_extraction) as prepare:
+            result, usage = service.process_invoice_split(self.pdf_path, pages_per_chunk=10, use_cache=False)
+
+        self.assertEqual(prepare.call_count, 1)
+        self.assertEqual(service.client.converse.call_count, 1)
+        self.assertEqual(json.loads(result), SAMPLE_INVOICE_JSON)
+        self.assertNotIn('split', usage)
+
+    def test_truncated_range_fails(self):
+        """Test a range returning truncated JSON fails the extraction"""
+        service = self.make_service()
+        service.client.converse.side_effect = lambda **kwargs: make_converse_response('{"line_items": [{"desc')
+
+        with self.assertRaises(BedrockError):
+            service.process_invoice_split(self.pdf_path, pages_per_chunk=3, use_cache=False)
+
+
+class MergeInvoiceChunksTest(TestCase):
+    """Test cases for merge_invoice_chunks"""
+
+    def test_header_and_totals(self):
+        """Test header fields come from the first range and totals from the last"""
+        merged, report = merge_invoice_chunks([
+            {'invoice_number': 'INV-9', 'vendor_name': 'Unknown Vendor', 'total_amount': 0,
+             'line_items': [{'description': 'A', 'line_total': '10.00'}]},
+            {'invoice_number': 'UNKNOWN', 'vendor_name': 'Acme', 'total_amount': '$10.00', 'line_items': []},
+        ])
+
+        self.assertEqual(merged['invoice_number'], 'INV-9')
+        self.assertEqual(merged['vendor_name'], 'Acme')
+        self.assertEqual(merged['total_amount'], '$10.00')
+        self.assertTrue(report['totals_match'])
+
+    def test_totals_mismatch_reported(self):
+        """Test a missing line item shows up as a totals mismatch"""
+        _, report = merge_invoice_chunks([
+            {'total_amount': 0, 'line_items': [{'description': 'A', 'line_total': 10}]},
+            {'total_amount': 25, 'line_items': []},
+        ])
+
+        self.assertFalse(report['totals_match'])
+        self.assertEqual(report['difference'], '-15')
+
+
+class PDFPreflightTest(BedrockTestMixin, TestCase):
+    """Test cases for PDF preflight and compaction"""
+
+    def make_scanned_pdf(self, resolution=200):
+        """Build a single-page PDF holding one noisy image at the given resolution"""
+        image = Image.effect_noise((850, 1100), 60).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'PDF', resolution=resolution)
+        return buffer.getvalue()
+
+    def test_rejects_non_pdf(self):
+        """Test files without a PDF header are rejected"""
+        with self.assertRaises(PDFValidationError):
+            preflight_pdf(b'PK\x03\x04 not a pdf')
+
+    def test_none_policy_returns_original(self):
+        """Test the 'none' policy validates and counts pages without changing bytes"""
+        pdf_bytes = self.make_scanned_pdf()
+
+        result, report = preflight_pdf(pdf_bytes, policy='none')
+
+        self.assertEqual(result, pdf_bytes)
+        self.assertEqual(report['page_count'], 1)
+        self.assertEqual(report['bytes_saved'], 0)
+
+    def test_downsample_reduces_size(self):
+        """Test oversized images are downsampled to the target DPI"""
+        pdf_bytes = self.make_scanned_pdf(resolution=300)
+
+        result, report = preflight_pdf(pdf_bytes, policy='downsample', target_dpi=100)
+
+        self.assertLess(len(result), len(pdf_bytes))
+        self.assertEqual(report['images_downsampled'], 1)
+        self.assertEqual(report['compacted_bytes'], len(result))
+        self.assertGreater(report['estimated_image_tokens_saved'], 0)
+
+    def test_max_pages(self):
+        """Test PDFs over the page limit are rejected"""
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=612, height=792)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+
+        with self.assertRaises(PDFValidationError):
+            preflight_pdf(buffer.getvalue(), max_pages=2)
+
+    def test_job_metadata_records_preflight(self):
+        """Test the model's compaction policy is applied and recorded on the job"""
+        self.model.pdf_compaction = 'downsample'
+        self.model.save()
+        with open(self.pdf_path, 'wb') as pdf_file:
+            pdf_file.write(self.make_scanned_pdf(resolution=300))
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        processor.process_pdf(self.pdf_path, use_cache=False)
+
+        sent_bytes = processor.bedrock_service.client.converse.call_args.kwargs['messages'][0]['content'][0]['document']['source']['bytes']
+        preflight = ProcessingJob.objects.get().metadata['preflight']
+        self.assertEqual(preflight['policy'], 'downsample')
+        self.assertEqual(preflight['compacted_bytes'], len(sent_bytes))
+        self.assertGreater(preflight['bytes_saved'], 0)
+        self.assertEqual(preflight['input_tokens'], 1000)
+
+
+class TextLayerExtractionTest(BedrockTestMixin, TestCase):
+    """Test cases for the local text-layer fast path"""
+
+    def write_text_pdf(self):
+        """Write a born-digital invoice PDF with a full text layer"""
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font('Helvetica', size=10)
+        pdf.cell(0, 8, 'Invoice INV-001 from Test Vendor, dated 2024-01-15, ship to Raleigh NC', new_x='LMARGIN', new_y='NEXT')
+        for idx in range(12):
+            pdf.cell(0, 8, f'Line {idx + 1}: Test Item description quantity 1 unit price 100.00 total 100.00', new_x='LMARGIN', new_y='NEXT')
+        pdf.output(self.pdf_path)
+
+    def test_text_only_model_uses_text_layer(self):
+        """Test a text-only model is served from the text layer as a text-only Converse message"""
+        self.write_text_pdf()
+        BedrockModelConfig.objects.create(name='Llama', model_id='meta.llama3-8b-instruct-v1:0')
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON), input_tokens=300, output_tokens=100))
+
+        _, usage = service.process_invoice(self.pdf_path, model_id='meta.llama3-8b-instruct-v1:0',
+                                           text_layer=True, use_cache=False)
+
+        content = service.client.converse.call_args.kwargs['messages'][0]['content']
+        self.assertEqual(len(content), 1)
+        self.assertIn('Line 12: Test Item', content[0]['text'])
+        self.assertEqual(service.client.invoke_model.call_count, 0)
+        self.assertEqual(usage['extraction']['path'], 'text_layer')
+        self.assertEqual(usage['inputTokens'], 300)
+
+    def test_nova_model_uses_text_layer(self):
+        """Test a Nova model on the text-layer path gets a Converse text block, not an Anthropic body"""
+        self.write_text_pdf()
+        BedrockModelConfig.objects.create(name='Nova Lite', model_id='amazon.nova-lite-v1:0')
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        result, usage = service.process_invoice(self.pdf_path, model_id='amazon.nova-lite-v1:0',
+                                                text_layer=True, use_cache=False, structured_output=False)
+
+        kwargs = service.client.converse.call_args.kwargs
+        self.assertEqual(kwargs['modelId'], 'amazon.nova-lite-v1:0')
+        content = kwargs['messages'][0]['content']
+        self.assertEqual([list(block) for block in content], [['text']])
+        self.assertIn('Line 12: Test Item', content[0]['text'])
+        self.assertEqual(service.client.invoke_model.call_count, 0)
+        self.assertEqual(usage['extraction']['path'], 'text_layer')
+        self.assertEqual(json.loads(result)['invoice_number'], 'INV-001')
+
+    def test_falls_back_to_multimodal_without_text(self):
+        """Test a PDF without a text layer is sent as a document and the path is recorded"""
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+
+        processor.process_pdf(self.pdf_path, text_layer=True, use_cache=False)
+
+        content = processor.bedrock_service.client.converse.call_args.kwargs['messages'][0]['content']
+        self.assertIn('document', content[0])
+        job = ProcessingJob.objects.get()
+        self.assertEqual(job.metadata['extraction_path'], 'multimodal')
+        self.assertEqual(job.metadata['text_layer']['reason'], 'no text layer')
+
+    def test_text_only_model_without_text_layer_fails(self):
+        """Test a text-only model cannot fall back to multimodal"""
+        BedrockModelConfig.objects.create(name='Llama', model_id='meta.llama3-8b-instruct-v1:0')
+        service = self.make_service()
+
+        with self.assertRaises(BedrockError):
+            service.process_invoice(self.pdf_path, model_id='meta.llama3-8b-instruct-v1:0', text_layer=True)
+
+
+class ModelCascadeTest(BedrockTestMixin, TestCase):
+    """Test cases for the validation-gated OCR model cascade"""
+
+    def setUp(self):
+        super().setUp()
+        self.cheap = BedrockModelConfig.objects.create(
+            name='Nova Lite',
+            model_id='amazon.nova-lite-v1:0',
+            input_token_cost='0.00006',
+            output_token_cost='0.00024',
+        )
+        self.good_invoice = {
+            'invoice_number': 'INV-7', 'date': '2024-05-01', 'vendor_name': 'RealPage', 'state_code': 'GA',
+            'total_amount': '1085.00', 'total_tax_amount': '0', 'invoice_discount_amount': '0',
+            'line_items': [{'description': 'Subscription', 'quantity': '500', 'unit_price': '2.17', 'line_total': '1085.00'}],
+        }
+        # Decimal-placement error typical of the cheapest tier
+        self.bad_invoice = {**self.good_invoice, 'total_amount': '1085000', 'line_items': [
+            {'description': 'Subscription', 'quantity': '500', 'unit_price': '2170', 'line_total': '1085.00'}
+        ]}
+
+    def process(self, *responses):
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(*responses)
+        processor.process_pdf(self.pdf_path, cascade=True, use_cache=False)
+        return processor, ProcessingJob.objects.get()
+
+    def test_cheapest_tier_answers_when_valid(self):
+        """Test no escalation happens when the cheapest tier passes reconciliation"""
+        processor, job = self.process(make_converse_response(json.dumps(self.good_invoice)))
+
+        self.assertEqual(processor.bedrock_service.client.converse.call_count, 1)
+        self.assertEqual(processor.bedrock_service.client.converse.call_args.kwargs['modelId'], 'amazon.nova-lite-v1:0')
+        self.assertEqual(job.metadata['cascade']['tier'], 0)
+        self.assertFalse(job.metadata['cascade']['escalated'])
+        self.assertEqual(job.metadata['cascade']['escalation_cost'], 0)
+
+    def test_escalates_on_failed_reconciliation(self):
+        """Test a failed reconciliation escalates and the escalation cost is recorded"""
+        processor, job = self.process(
+            make_converse_response(json.dumps(self.bad_invoice)),
+            make_converse_response(json.dumps(self.good_invoice)),
+        )
+
+        cascade = job.metadata['cascade']
+        self.assertEqual(processor.bedrock_service.client.converse.call_count, 2)
+        self.assertEqual(cascade['tier'], 1)
+        self.assertEqual(cascade['model_id'], self.model.model_id)
+        self.assertEqual(job.model_id, self.model.model_id)
+        self.assertTrue(cascade['accepted'])
+        self.assertTrue(any(issue.startswith('line_item_math') for issue in cascade['attempts'][0]['issues']))
+        self.assertGreater(cascade['escalation_cost'], 0)
+        self.assertAlmostEqual(
+            job.metadata['usage']['totalCost'],
+            cascade['attempts'][0]['totalCost'] + cascade['attempts'][1]['totalCost']
+        )
+
+
+class PromptCachingTest(BedrockTestMixin, TestCase):
+    """Test cases for cacheable extraction instructions"""
+
+    def test_cache_point_for_supported_model(self):
+        """Test instructions go in a system block followed by a cache point on supported models"""
+        BedrockModelConfig.objects.create(
+            name='Claude 3.7 Sonnet',
+            model_id='anthropic.claude-3-7-sonnet-20250219-v1:0',
+            input_token_cost='0.003',
+            output_token_cost='0.015',
+        )
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+        service.process_invoice(self.pdf_path, model_id='anthropic.claude-3-7-sonnet-20250219-v1:0', use_cache=False)
+
+        kwargs = service.client.converse.call_args.kwargs
+        self.assertIn('invoice_number', kwargs['system'][0]['text'])
+        self.assertEqual(kwargs['system'][1], {'cachePoint': {'type': 'default'}})
+        user_text = [block['text'] for block in kwargs['messages'][0]['content'] if 'text' in block]
+        self.assertNotIn('invoice_number', user_text[0])
+
+    def test_system_block_without_cache_point(self):
+        """Test models without prompt caching get a plain system block"""
+        service = self.make_service(make_converse_response(json.dumps(SAMPLE_INVOICE_JSON)))
+        service.process_invoice(self.pdf_path, use_cache=False)
+
+        system = service.client.converse.call_args.kwargs['system']
+        self.assertEqual(len(system), 1)
+        self.assertIn('invoice_number', system[0]['text'])
+
+    def test_cache_tokens_in_cost(self):
+        """Test cache read/write tokens are billed in the input cost"""
+        response = make_converse_response(json.dumps(SAMPLE_INVOICE_JSON), input_tokens=1000, output_tokens=0)
+        response['usage']['cacheReadInputTokens'] = 4000
+        response['usage']['cacheWriteInputTokens'] = 0
+        service = self.make_service(response)
+        _, usage = service.process_invoice(self.pdf_path, use_cache=False)
+
+        self.assertEqual(usage['cacheReadInputTokens'], 4000)
+        # 1000 uncached tokens at full price plus 4000 cached tokens at 10%
+        self.assertAlmostEqual(usage['inputCost'], 0.00025 + 4 * 0.00025 * 0.1)
+        self.assertAlmostEqual(usage['cacheSavings'], 4 * 0.00025 * 0.9)
+
+
+def make_tool_use_response(tool_input, tool_name='record_invoice', input_tokens=1000, output_tokens=200):
+    """Build a Converse API response in which the model called a tool"""
+    return {
+        'output': {'message': {'role': 'assistant', 'content': [
+            {'toolUse': {'toolUseId': 'tooluse_1', 'name': tool_name, 'input': tool_input}}
+        ]}},
+        'stopReason': 'tool_use',
+        'usage': {
+            'inputTokens': input_tokens,
+            'outputTokens': output_tokens,
+            'totalTokens': input_tokens + output_tokens,
+        },
+    }
+
+
+class StructuredOutputTest(BedrockTestMixin, TestCase):
+    """Test cases for tool-use structured extraction"""
+
+    def test_tool_input_returned_as_dict(self):
+        """Test the tool input is returned unchanged without regex JSON scraping"""
+        service = self.make_service(make_tool_use_response(SAMPLE_INVOICE_JSON))
+        with mock.patch.object(service, '_extract_json_from_response') as extract_json:
+            result, usage = service.process_invoice(self.pdf_path, use_cache=False, structured_output=True)
+
+        extract_json.assert_not_called()
+        self.assertIs(result, SAMPLE_INVOICE_JSON)
+        self.assertTrue(usage['structured_output'])
+        tool_config = service.client.converse.call_args.kwargs['toolConfig']
+        self.assertEqual(tool_config['toolChoice'], {'tool': {'name': 'record_invoice'}})
+
+    def test_job_and_cache_store_serialized_result(self):
+        """Test the dict is serialized only for the job record and the cache entry"""
+        processor = InvoiceProcessor(region_name='us-east-1')
+        processor.bedrock_service = self.make_service(make_tool_use_response(SAMPLE_INVOICE_JSON))
+        processor.process_pdf(self.pdf_path, structured_output=True)
+
+        self.assertEqual(json.loads(ProcessingJob.objects.get().extracted_text), SAMPLE_INVOICE_JSON)
+        self.assertEqual(json.loads(OCRCacheEntry.objects.get().result_text), SAMPLE_INVOICE_JSON)
+
+    def test_tool_schema_change_misses_cache(self):
+        """Test a changed tool schema produces a different cache key"""
+        from invoice_ocr.tools import INVOICE_EXTRACTION_TOOL
+        service = self.make_service(
+            make_tool_use_response(SAMPLE_INVOICE_JSON),
+            make_tool_use_response(SAMPLE_INVOICE_JSON),
+        )
+        service.process_invoice(self.pdf_path, structured_output=True)
+
+        changed_tool = {**INVOICE_EXTRACTION_TOOL, 'description': INVOICE_EXTRACTION_TOOL['description'] + ' Include PO numbers.'}
+        with mock.patch('invoice_ocr.services.INVOICE_EXTRACTION_TOOL', changed_tool):
+            _, usage = service.process_invoice(self.pdf_path, structured_output=True)
+
+        self.assertEqual(service.client.converse.call_count, 2)
+        self.assertFalse(usage['cache']['hit'])
+        self.assertEqual(OCRCacheEntry.objects.count(), 2)
+
+    def test_streamed_tool_input(self):
+        """Test streamed tool input deltas feed the incremental parser and yield a dict result"""
+        text = json.dumps(SAMPLE_INVOICE_JSON)
+        events = [{'contentBlockDelta': {'contentBlockIndex': 0, 'delta': {'toolUse': {'input': text[start:start + 9]}}}}
+                  for start in range(0, len(text), 9)]
+        events.append({'metadata': {'usage': {'inputTokens': 10, 'outputTokens': 5, 'totalTokens': 15}}})
+        service = self.make_service()
+        service.client.converse_stream.return_value = {'stream': iter(events)}
+
+        output = list(service.process_invoice_stream(self.pdf_path, use_cache=False, structured_output=True))
+
+        self.assertEqual([kind for kind, _ in output].count('line_item'), 1)
+        self.assertEqual(output[-1][1]['result'], SAMPLE_INVOICE_JSON)
+
+
+class FakeBackendTest(BedrockTestMixin, TestCase):
+    """Test cases for the pluggable LLM backend and the latency-simulating fake"""
+
+    def setUp(self):
+        super().setUp()
+        ConfigManager.set_config('llm_backend', 'fake')
+        ConfigManager.set_config('fake_llm_latency', {'ocr': {'distribution': 'fixed', 'seconds': 0.25},
+                                                      'kb': {'distribution': 'fixed', 'seconds': 0}})
+        ConfigManager.set_config('fake_llm_seed', 7)
+        reset_backends()
+        self.addCleanup(reset_backends)
+
+    def test_services_use_configured_backend(self):
+        """Test the OCR service gets its client from the fake backend and parses a consistent invoice"""
+        from taxright.services import InvoiceDataParser
+
+        backend = get_backend()
+        backend.sleep = mock.Mock()
+        service = BedrockLLMService(region_name='us-east-1')
+        result, usage = service.process_invoice(self.pdf_path, use_cache=False)
+
+        self.assertIs(service.client, backend.get_client('bedrock-runtime'))
+        backend.sleep.assert_called_once_with(0.25)
+        self.assertEqual(InvoiceDataParser(result).reconciliation_issues(), [])
+        self.assertGreater(usage['inputTokens'], 0)
+        self.assertEqual(backend.stats()['Converse']['calls'], 1)
+
+    def test_throttling_and_truncation_rates(self):
+        """Test configured throttle and truncation rates surface as Bedrock-shaped failures"""
+        ConfigManager.set_config('fake_llm_throttle_rate', 1.0)
+        reset_backends()
+        client = get_backend().get_client('bedrock-agent-runtime')
+        with self.assertRaises(ClientError) as context:
+            client.retrieve_and_generate(input={'text': 'rate (as decimal: 0.07)'})
+        self.assertEqual(context.exception.response['Error']['Code'], 'ThrottlingException')
+
+        ConfigManager.set_config('fake_llm_throttle_rate', 0.0)
+        ConfigManager.set_config('fake_llm_truncation_rate', 1.0)
+        reset_backends()
+        backend = get_backend()
+        backend.sleep = mock.Mock()
+        response = backend.get_client('bedrock-runtime').converse(messages=[{'role': 'user', 'content': [{'text': 'x'}]}])
+        self.assertEqual(response['stopReason'], 'max_tokens')
+        with self.assertRaises(json.JSONDecodeError):
+            json.loads(response['output']['message']['content'][0]['text'])
+        self.assertEqual(backend.stats()['Converse']['truncated'], 1)
+
+    def test_canned_verification(self):
+        """Test the generated verdict confirms the applied rate found in the prompt"""
+        client = get_backend().get_client('bedrock-agent-runtime')
+        response = client.retrieve_and_generate(input={'text': 'Applied Tax Rate: 7.0000% (as decimal: 0.07)'})
+        self.assertEqual(json.loads(response['output']['text'])['expected_tax_rate'], 0.07)
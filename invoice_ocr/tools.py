@@ -0,0 +1,88 @@
+"""
+Converse tool definitions for structured model output.
+
+Declaring the expected schema as a tool and forcing the model to call it makes
+Bedrock return the answer as typed tool input (already a dict) instead of free
+text, so results no longer have to be scraped out of markdown with regexes and
+cannot be lost to malformed or partially quoted JSON.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_AMOUNT = {'type': ['number', 'string']}
+
+# Invoice extraction schema, mirroring the field list in DEFAULT_EXTRACTION_PROMPT
+INVOICE_EXTRACTION_TOOL = {
+    'name': 'record_invoice',
+    'description': 'Record the data extracted from the invoice.',
+    'inputSchema': {
+        'json': {
+            'type': 'object',
+            'properties': {
+                'invoice_number': {'type': 'string'},
+                'date': {'type': 'string', 'description': 'Invoice date as YYYY-MM-DD'},
+                'vendor_name': {'type': 'string'},
+                'total_amount': _AMOUNT,
+                'total_tax_amount': _AMOUNT,
+                'invoice_discount_amount': _AMOUNT,
+                'state_code': {'type': 'string', 'description': '2-letter US state code'},
+                'jurisdiction': {'type': 'string'},
+                'line_items': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'description': {'type': 'string'},
+                            'quantity': _AMOUNT,
+                            'unit_price': _AMOUNT,
+                            'line_total': _AMOUNT,
+                            'discount_amount': _AMOUNT,
+                            'tax_amount': _AMOUNT,
+                            'tax_rate': {'type': ['number', 'string'], 'description': 'Decimal rate, e.g. 0.0825'},
+                            'tax_status': {'type': 'string', 'enum': ['taxable', 'exempt', 'unknown']},
+                        },
+                        'required': ['description', 'line_total'],
+                    },
+                },
+            },
+            'required': ['invoice_number', 'total_amount', 'line_items'],
+        }
+    },
+}
+
+
+def build_tool_config(tool_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a Converse toolConfig that forces the model to answer through a single tool.
+
+    Args:
+        tool_spec: Tool specification with 'name', 'description' and 'inputSchema'
+
+    Returns:
+        dict: Value for the Converse 'toolConfig' parameter
+    """
+    return {
+        'tools': [{'toolSpec': tool_spec}],
+        'toolChoice': {'tool': {'name': tool_spec['name']}},
+    }
+
+
+def extract_tool_input(message: Dict[str, Any], tool_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the input of the named tool call from a Converse output message.
+
+    Args:
+        message: response['output']['message'] from a Converse call
+        tool_name: Name of the tool the model was asked to call
+
+    Returns:
+        dict: Tool input, or None if the model did not call the tool
+    """
+    for content_item in message.get('content', []):
+        tool_use = content_item.get('toolUse')
+        if tool_use and tool_use.get('name') == tool_name and isinstance(tool_use.get('input'), dict):
+            return tool_use['input']
+    logger.warning(f"Model response did not contain a '{tool_name}' tool call")
+    return None
@@ -1,10 +1,35 @@
 """
 Utility functions for invoice processing.
 """
+import io
 import os
 import logging
 from pathlib import Path
-from invoice_ocr.exceptions import PDFValidationError
+from typing import List, Tuple
+from invoice_ocr.exceptions import ConfigurationError, PDFValidationError
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.errors import PdfReadError
+except ImportError:  # pragma: no cover - pypdf is only needed for page-level processing
+    PdfReader = PdfWriter = None
+    PdfReadError = Exception
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is only needed for image downsampling
+    Image = None
+
+# PDF files must contain this header within the first 1024 bytes
+PDF_MAGIC = b'%PDF-'
+
+COMPACTION_POLICIES = ('none', 'lossless', 'downsample')
+
+# Approximate vision tokens per image pixel (width * height / 750)
+PIXELS_PER_IMAGE_TOKEN = 750
+
+# Share of letters/digits among non-whitespace characters below which a text layer is treated as garbled
+TEXT_LAYER_MIN_ALNUM_RATIO = 0.5
 
 logger = logging.getLogger(__name__)
 
@@ -100,3 +125,262 @@ def get_file_size_mb(file_path):
         float: File size in MB
     """
     return os.path.getsize(file_path) / (1024 * 1024)
+
+
+def _require_pypdf():
+    """Raise ConfigurationError if pypdf is not installed."""
+    if PdfReader is None:
+        raise ConfigurationError("pypdf is required for page-level PDF processing. Install it with: pip install pypdf")
+
+
+def _open_pdf(pdf_bytes):
+    """Open PDF bytes with pypdf, raising PDFValidationError for unreadable files."""
+    _require_pypdf()
+    try:
+        return PdfReader(io.BytesIO(pdf_bytes))
+    except (PdfReadError, ValueError) as e:
+        raise PDFValidationError(f"Could not read PDF: {str(e)}")
+
+
+def get_pdf_page_count(pdf_bytes):
+    """
+    Count the pages in a PDF.
+    
+    Args:
+        pdf_bytes: PDF file contents
+        
+    Returns:
+        int: Number of pages
+        
+    Raises:
+        PDFValidationError: If the PDF cannot be read
+    """
+    return len(_open_pdf(pdf_bytes).pages)
+
+
+def split_pdf_pages(pdf_bytes, pages_per_chunk) -> List[Tuple[int, int, bytes]]:
+    """
+    Split a PDF into consecutive page ranges.
+    
+    Args:
+        pdf_bytes: PDF file contents
+        pages_per_chunk: Maximum number of pages per range
+        
+    Returns:
+        list: (first_page, last_page, chunk_bytes) tuples with 1-based inclusive page numbers
+        
+    Raises:
+        PDFValidationError: If the PDF cannot be read
+    """
+    reader = _open_pdf(pdf_bytes)
+    page_count = len(reader.pages)
+    pages_per_chunk = max(1, int(pages_per_chunk))
+    
+    chunks = []
+    for start in range(0, page_count, pages_per_chunk):
+        end = min(start + pages_per_chunk, page_count)
+        writer = PdfWriter()
+        for page_index in range(start, end):
+            writer.add_page(reader.pages[page_index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        chunks.append((start + 1, end, buffer.getvalue()))
+    return chunks
+
+
+def check_pdf_magic(pdf_bytes):
+    """
+    Check that bytes look like a PDF file.
+    
+    Args:
+        pdf_bytes: File contents
+        
+    Raises:
+        PDFValidationError: If the PDF header is missing
+    """
+    if PDF_MAGIC not in pdf_bytes[:1024]:
+        raise PDFValidationError("File does not contain a PDF header (%PDF-); it may be corrupt or not a PDF")
+
+
+def preflight_pdf(pdf_bytes, policy='none', target_dpi=150, max_pages=0):
+    """
+    Validate a PDF and optionally compact it before submission to Bedrock.
+    
+    Policies:
+        - 'none': validate only, bytes are returned unchanged
+        - 'lossless': remove unused and duplicate objects and compress content streams
+        - 'downsample': 'lossless' plus downsampling of images above target_dpi
+    
+    The original bytes are kept if compaction fails or does not make the file smaller.
+    
+    Args:
+        pdf_bytes: PDF file contents
+        policy: Compaction policy (see COMPACTION_POLICIES)
+        target_dpi: Maximum image resolution for the 'downsample' policy
+        max_pages: Maximum number of pages allowed (0 = no limit)
+        
+    Returns:
+        tuple: (pdf_bytes, report)
+            - pdf_bytes: Bytes to submit (compacted or original)
+            - report: 'policy', 'page_count', 'original_bytes', 'compacted_bytes', 'bytes_saved',
+              'reduction_pct', 'images_downsampled' and 'estimated_image_tokens_saved'
+        
+    Raises:
+        PDFValidationError: If the file is not a readable PDF or has too many pages
+    """
+    if policy not in COMPACTION_POLICIES:
+        raise ConfigurationError(f"Unknown PDF compaction policy: {policy}. Expected one of {', '.join(COMPACTION_POLICIES)}")
+    
+    check_pdf_magic(pdf_bytes)
+    
+    report = {
+        'policy': policy,
+        'page_count': None,
+        'original_bytes': len(pdf_bytes),
+        'compacted_bytes': len(pdf_bytes),
+        'bytes_saved': 0,
+        'reduction_pct': 0.0,
+        'images_downsampled': 0,
+        'estimated_image_tokens_saved': 0,
+    }
+    
+    if PdfReader is None:
+        if policy != 'none':
+            _require_pypdf()
+        logger.warning("pypdf is not installed; skipping PDF page count check")
+        return pdf_bytes, report
+    
+    reader = _open_pdf(pdf_bytes)
+    page_count = len(reader.pages)
+    report['page_count'] = page_count
+    if page_count == 0:
+        raise PDFValidationError("PDF has no pages")
+    if max_pages and page_count > max_pages:
+        raise PDFValidationError(f"PDF has too many pages: {page_count} (max {max_pages})")
+    
+    if policy == 'none':
+        return pdf_bytes, report
+    
+    try:
+        writer = PdfWriter(clone_from=reader)
+        if policy == 'downsample':
+            report['images_downsampled'], pixels_removed = _downsample_images(writer, target_dpi)
+            report['estimated_image_tokens_saved'] = pixels_removed // PIXELS_PER_IMAGE_TOKEN
+        for page in writer.pages:
+            page.compress_content_streams()
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        compacted = buffer.getvalue()
+    except Exception as e:
+        logger.warning(f"PDF compaction failed, sending original: {str(e)}")
+        return pdf_bytes, report
+    
+    if len(compacted) >= len(pdf_bytes):
+        logger.info(f"PDF compaction did not reduce size ({len(pdf_bytes)} -> {len(compacted)} bytes), sending original")
+        return pdf_bytes, report
+    
+    report['compacted_bytes'] = len(compacted)
+    report['bytes_saved'] = len(pdf_bytes) - len(compacted)
+    report['reduction_pct'] = round(100.0 * report['bytes_saved'] / len(pdf_bytes), 1)
+    logger.info(
+        f"PDF preflight ({policy}): {len(pdf_bytes)} -> {len(compacted)} bytes "
+        f"({report['reduction_pct']}% smaller, {report['images_downsampled']} images downsampled)"
+    )
+    return compacted, report
+
+
+def _downsample_images(writer, target_dpi):
+    """
+    Downsample page images whose resolution exceeds target_dpi.
+    
+    Resolution is estimated against the page width, which under-estimates the DPI of
+    images smaller than the page, so images are never downsampled below target_dpi.
+    
+    Returns:
+        tuple: (images_downsampled, pixels_removed)
+    """
+    if Image is None:
+        logger.warning("Pillow is not installed; skipping image downsampling")
+        return 0, 0
+    
+    images_downsampled = 0
+    pixels_removed = 0
+    for page in writer.pages:
+        page_width_inches = float(page.mediabox.width) / 72.0
+        if page_width_inches <= 0:
+            continue
+        for image_file in page.images:
+            try:
+                image = image_file.image
+                width, height = image.size
+                dpi = width / page_width_inches
+                if dpi <= target_dpi * 1.1:
+                    continue
+                scale = target_dpi / dpi
+                new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                if image.mode not in ('L', 'RGB'):
+                    image = image.convert('RGB')
+                image_file.replace(image.resize(new_size, Image.LANCZOS), quality=85)
+                images_downsampled += 1
+                pixels_removed += width * height - new_size[0] * new_size[1]
+            except Exception as e:
+                logger.debug(f"Could not downsample image {getattr(image_file, 'name', '')}: {str(e)}")
+    return images_downsampled, pixels_removed
+
+
+def extract_pdf_text_layer(pdf_bytes, min_chars_per_page=200, min_page_coverage=0.9):
+    """
+    Extract the embedded text layer of a born-digital PDF and assess its coverage.
+    
+    Scanned PDFs have no (or an OCR-garbled) text layer; those are reported as not
+    usable so callers can fall back to multimodal extraction.
+    
+    Args:
+        pdf_bytes: PDF file contents
+        min_chars_per_page: Minimum characters for a page to count as having text
+        min_page_coverage: Minimum fraction of pages that must have text
+        
+    Returns:
+        tuple: (text, report)
+            - text: Page texts separated by page markers
+            - report: 'page_count', 'pages_with_text', 'coverage', 'chars', 'alnum_ratio',
+              'usable' and 'reason' (why the layer is not usable, empty if usable)
+        
+    Raises:
+        PDFValidationError: If the PDF cannot be read
+    """
+    reader = _open_pdf(pdf_bytes)
+    page_texts = []
+    for page in reader.pages:
+        try:
+            page_texts.append((page.extract_text() or '').strip())
+        except Exception as e:
+            logger.debug(f"Text extraction failed for a page: {str(e)}")
+            page_texts.append('')
+    
+    page_count = len(page_texts)
+    pages_with_text = sum(1 for text in page_texts if len(text) >= min_chars_per_page)
+    non_space = [char for text in page_texts for char in text if not char.isspace()]
+    alnum_ratio = sum(1 for char in non_space if char.isalnum()) / len(non_space) if non_space else 0.0
+    coverage = pages_with_text / page_count if page_count else 0.0
+    
+    reason = ''
+    if not non_space:
+        reason = 'no text layer'
+    elif coverage < min_page_coverage:
+        reason = f'only {pages_with_text}/{page_count} pages have at least {min_chars_per_page} characters'
+    elif alnum_ratio < TEXT_LAYER_MIN_ALNUM_RATIO:
+        reason = f'text layer looks garbled (alphanumeric ratio {alnum_ratio:.2f})'
+    
+    report = {
+        'page_count': page_count,
+        'pages_with_text': pages_with_text,
+        'coverage': round(coverage, 3),
+        'chars': sum(len(text) for text in page_texts),
+        'alnum_ratio': round(alnum_ratio, 3),
+        'usable': not reason,
+        'reason': reason,
+    }
+    text = '\n\n'.join(f"--- Page {idx} ---\n{page_text}" for idx, page_text in enumerate(page_texts, start=1))
+    return text, report
@@ -111,6 +111,12 @@ class InvoiceProcessViewSet(viewsets.ViewSet):
                 process_kwargs['max_tokens'] = serializer.validated_data['max_tokens']
             if serializer.validated_data.get('prompt_template'):
                 process_kwargs['prompt_template'] = serializer.validated_data['prompt_template']
+            if serializer.validated_data.get('bypass_cache'):
+                process_kwargs['use_cache'] = False
+            if serializer.validated_data.get('text_layer') is not None:
+                process_kwargs['text_layer'] = serializer.validated_data['text_layer']
+            if serializer.validated_data.get('structured_output') is not None:
+                process_kwargs['structured_output'] = serializer.validated_data['structured_output']
             
             # Process the invoice
             processor = InvoiceProcessor()
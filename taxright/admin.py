@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Invoice, InvoiceLineItem, TaxDetermination, TaxRule, StateKnowledgeBase, LineItemTaxVerification
+from .models import (
+    Invoice, InvoiceLineItem, TaxDetermination, TaxRule, StateKnowledgeBase, LineItemTaxVerification,
+    VerificationCacheEntry,
+)
 
 
 class InvoiceLineItemInline(admin.TabularInline):
@@ -162,3 +165,11 @@ class LineItemTaxVerificationAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(VerificationCacheEntry)
+class VerificationCacheEntryAdmin(admin.ModelAdmin):
+    """Admin interface for VerificationCacheEntry model"""
+    list_display = ('state_code', 'normalized_description', 'tax_status', 'rate_bucket', 'is_correct', 'hit_count', 'created_at')
+    list_filter = ('state_code', 'is_correct', 'tax_status', 'created_at')
+    search_fields = ('normalized_description', 'knowledge_base_id', 'cache_key')
+    readonly_fields = ('cache_key', 'source_line_item_id', 'hit_count', 'created_at', 'last_accessed_at')
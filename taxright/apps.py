@@ -5,3 +5,5 @@ class TaxrightConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'taxright'
 
+    def ready(self):
+        from taxright import signals  # noqa: F401
@@ -0,0 +1,378 @@
+"""
+Offline BM25 index over the state tax topic files in RAG/state_data.
+
+The index is built ahead of time (manage.py build_bm25_index) into a single
+binary file and memory-mapped at runtime, so a cold Lambda container only pays
+for reading the header and vocabulary; postings, document lengths and chunk
+texts are paged in on demand. Documents are sorted by state and every state has
+its own term table, so a query only touches that state's postings and its IDF
+and average document length are computed within the state.
+
+File layout (native byte order, every section 8-byte aligned):
+
+    b'TRBM25I1' | uint32 header length | JSON header | sections
+
+The JSON header holds the parameters, vocabulary, topic and file names, the
+per-state document and term ranges and the offset of each section:
+
+    doc_lengths          uint32[docs]        tokens per chunk
+    doc_text_offsets     uint64[docs + 1]    offsets into 'text'
+    doc_topics           uint32[docs]        index into header 'topics'
+    doc_files            uint32[docs]        index into header 'files'
+    term_ids             uint32[state terms] sorted within each state
+    term_posting_starts  uint32[state terms] offset into the posting arrays
+    term_posting_counts  uint32[state terms] document frequency in the state
+    posting_docs         uint32[postings]
+    posting_tfs          uint16[postings]
+    text                 utf-8 chunk texts
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.utils import timezone
+
+from invoice_ocr.config import ConfigManager
+from taxright.state_data import MAX_CHUNK_WORDS, default_state_data_dir, iter_file_chunks, state_data_files
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TRBM25I1'
+FORMAT_VERSION = 1
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'which', 'with',
+))
+
+SECTION_TYPECODES = (
+    ('doc_lengths', 'I'),
+    ('doc_text_offsets', 'Q'),
+    ('doc_topics', 'I'),
+    ('doc_files', 'I'),
+    ('term_ids', 'I'),
+    ('term_posting_starts', 'I'),
+    ('term_posting_counts', 'I'),
+    ('posting_docs', 'I'),
+    ('posting_tfs', 'H'),
+)
+
+
+def _stem(token: str) -> str:
+    """Strip plural endings so 'screws' matches 'screw' and 'services' matches 'service'."""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into BM25 terms.
+
+    Args:
+        text: Chunk text or query
+
+    Returns:
+        list: Lowercased, lightly stemmed alphanumeric tokens without stopwords
+    """
+    return [_stem(token) for token in _TOKEN.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_bm25_index(path, directory=None, k1: float = 1.2, b: float = 0.75,
+                     max_chunk_words: int = MAX_CHUNK_WORDS) -> Dict[str, Any]:
+    """
+    Build the BM25 index from a state_data directory and write it to a file.
+
+    The file is written next to the target and moved into place, so processes that
+    have the old index mapped keep reading it until they reload.
+
+    Args:
+        path: Output file path
+        directory: state_data directory (defaults to RAG/state_data)
+        k1: BM25 term frequency saturation
+        b: BM25 document length normalization
+        max_chunk_words: Topics longer than this are split into overlapping windows
+
+    Returns:
+        dict: Build statistics (states, chunks, terms, postings, bytes)
+    """
+    directory = Path(directory or default_state_data_dir())
+    terms: Dict[str, int] = {}
+    topics: Dict[str, int] = {}
+    files: List[str] = []
+    sections = {name: array(typecode) for name, typecode in SECTION_TYPECODES}
+    sections['doc_text_offsets'].append(0)
+    text = bytearray()
+    states = {}
+
+    for state_code, paths in sorted(state_data_files(directory).items()):
+        doc_start = len(sections['doc_lengths'])
+        postings: Dict[int, List[tuple]] = {}
+        total_length = 0
+        for file_path in paths:
+            file_index = len(files)
+            files.append(file_path.name)
+            for chunk in iter_file_chunks(file_path, max_chunk_words):
+                doc_id = len(sections['doc_lengths'])
+                tokens = tokenize(chunk['text'])
+                for term, tf in Counter(tokens).items():
+                    term_id = terms.setdefault(term, len(terms))
+                    postings.setdefault(term_id, []).append((doc_id, min(tf, 0xFFFF)))
+                sections['doc_lengths'].append(len(tokens))
+                sections['doc_topics'].append(topics.setdefault(chunk['topic'], len(topics)))
+                sections['doc_files'].append(file_index)
+                text.extend(chunk['text'].encode('utf-8'))
+                sections['doc_text_offsets'].append(len(text))
+                total_length += len(tokens)
+
+        term_start = len(sections['term_ids'])
+        for term_id in sorted(postings):
+            sections['term_ids'].append(term_id)
+            sections['term_posting_starts'].append(len(sections['posting_docs']))
+            sections['term_posting_counts'].append(len(postings[term_id]))
+            for doc_id, tf in postings[term_id]:
+                sections['posting_docs'].append(doc_id)
+                sections['posting_tfs'].append(tf)
+        doc_count = len(sections['doc_lengths']) - doc_start
+        states[state_code] = {
+            'docs': [doc_start, doc_start + doc_count],
+            'terms': [term_start, len(sections['term_ids'])],
+            'avgdl': total_length / doc_count if doc_count else 0.0,
+        }
+
+    header = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'k1': k1,
+        'b': b,
+        'max_chunk_words': max_chunk_words,
+        'built_at': timezone.now().isoformat(),
+        'source': str(directory),
+        'terms': sorted(terms, key=terms.get),
+        'topics': sorted(topics, key=topics.get),
+        'files': files,
+        'states': states,
+        'sections': {},
+    }
+    blobs = [(name, sections[name].tobytes()) for name, _ in SECTION_TYPECODES] + [('text', bytes(text))]
+
+    # Section offsets depend on the header length, which depends on the offsets; repeat until they agree
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, blob in blobs:
+            header['sections'][name] = [offset, len(blob)]
+            offset = _aligned(offset + len(blob))
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if _aligned(len(MAGIC) + 4 + len(header_bytes)) == data_start:
+            break
+        data_start = _aligned(len(MAGIC) + 4 + len(header_bytes))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack('<I', len(header_bytes)))
+        handle.write(header_bytes)
+        for name, blob in blobs:
+            handle.seek(header['sections'][name][0])
+            handle.write(blob)
+        size = handle.tell()
+    os.replace(temp_path, path)
+
+    return {
+        'states': len(states),
+        'chunks': len(sections['doc_lengths']),
+        'terms': len(terms),
+        'postings': len(sections['posting_docs']),
+        'bytes': size,
+    }
+
+
+class BM25Index:
+    """Read-only, memory-mapped BM25 index written by write_bm25_index()."""
+
+    def __init__(self, path):
+        """
+        Map an index file.
+
+        Args:
+            path: Index file path
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+            ValueError: If the file is not a compatible BM25 index
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a BM25 index: {self.path}")
+        header_length = struct.unpack_from('<I', self._mmap, len(MAGIC))[0]
+        header = json.loads(self._mmap[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+        if header['version'] != FORMAT_VERSION or header['byteorder'] != sys.byteorder:
+            self._mmap.close()
+            raise ValueError(f"Incompatible BM25 index (version {header['version']}, {header['byteorder']}-endian)")
+
+        self.k1 = header['k1']
+        self.b = header['b']
+        self.built_at = header['built_at']
+        self.states = header['states']
+        self.topics = header['topics']
+        self.files = header['files']
+        self.vocabulary = {term: term_id for term_id, term in enumerate(header['terms'])}
+        self._buffer = memoryview(self._mmap)
+        self._views = {}
+        for name, typecode in SECTION_TYPECODES:
+            offset, length = header['sections'][name]
+            self._views[name] = self._buffer[offset:offset + length].cast(typecode)
+        offset, length = header['sections']['text']
+        self._text = self._buffer[offset:offset + length]
+
+    def close(self):
+        """Release the memory-mapped views and the mapping."""
+        for view in self._views.values():
+            view.release()
+        self._views = {}
+        self._text.release()
+        self._buffer.release()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return len(self._views['doc_lengths'])
+
+    def has_state(self, state_code: str) -> bool:
+        """Return True if the index has chunks for a state."""
+        state = self.states.get((state_code or '').upper())
+        return bool(state) and state['docs'][1] > state['docs'][0]
+
+    def chunk(self, doc_id: int) -> Dict[str, Any]:
+        """
+        Get a chunk's text and provenance.
+
+        Args:
+            doc_id: Document ID returned by search()
+
+        Returns:
+            dict: 'doc_id', 'text', 'topic' and 'file'
+        """
+        offsets = self._views['doc_text_offsets']
+        return {
+            'doc_id': doc_id,
+            'text': bytes(self._text[offsets[doc_id]:offsets[doc_id + 1]]).decode('utf-8'),
+            'topic': self.topics[self._views['doc_topics'][doc_id]],
+            'file': self.files[self._views['doc_files'][doc_id]],
+        }
+
+    def search(self, state_code: str, query: str, top_k: int = 5) -> List[tuple]:
+        """
+        Score a state's chunks against a query with BM25.
+
+        Args:
+            state_code: 2-letter state code
+            query: Query text
+            top_k: Number of results
+
+        Returns:
+            list: (doc_id, score) pairs, best first; empty if the state is not indexed
+        """
+        state = self.states.get((state_code or '').upper())
+        if not state or not state['avgdl']:
+            return []
+        doc_count = state['docs'][1] - state['docs'][0]
+        term_start, term_end = state['terms']
+        term_ids = self._views['term_ids'][term_start:term_end]
+        starts, counts = self._views['term_posting_starts'], self._views['term_posting_counts']
+        posting_docs, posting_tfs = self._views['posting_docs'], self._views['posting_tfs']
+        doc_lengths = self._views['doc_lengths']
+        k1, b, avgdl = self.k1, self.b, state['avgdl']
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            position = bisect_left(term_ids, term_id)
+            if position == len(term_ids) or term_ids[position] != term_id:
+                continue
+            start, count = starts[term_start + position], counts[term_start + position]
+            idf = math.log(1 + (doc_count - count + 0.5) / (count + 0.5))
+            for doc_id, tf in zip(posting_docs[start:start + count], posting_tfs[start:start + count]):
+                norm = tf + k1 * (1 - b + b * doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+    def retrieve(self, state_code: str, query: str, number_of_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search a state and format the hits like Bedrock Retrieve 'retrievalResults'.
+
+        Args:
+            state_code: 2-letter state code
+            query: Query text
+            number_of_results: Number of results
+
+        Returns:
+            list: Retrieval results with content, location, score and metadata
+        """
+        results = []
+        for doc_id, score in self.search(state_code, query, number_of_results):
+            chunk = self.chunk(doc_id)
+            results.append({
+                'content': {'text': chunk['text']},
+                'location': {'type': 'LOCAL', 'localLocation': {'uri': f"state_data/{chunk['file']}"}},
+                'score': round(score, 4),
+                'metadata': {'state_code': state_code.upper(), 'topic': chunk['topic'], 'chunk_id': doc_id},
+            })
+        return results
+
+
+def bm25_index_path() -> Path:
+    """Resolve the configured index path (relative paths are relative to the project root)."""
+    path = Path(ConfigManager.get_kb_bm25_index_path())
+    return path if path.is_absolute() else Path(__file__).resolve().parent.parent / path
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index() -> BM25Index:
+    """
+    Return the process-wide BM25 index, mapping it on first use.
+
+    Raises:
+        FileNotFoundError: If the index has not been built (manage.py build_bm25_index)
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index(bm25_index_path())
+            logger.info(f"Mapped BM25 index {_index.path} ({len(_index)} chunks, built {_index.built_at})")
+        return _index
+
+
+def reset_bm25_index():
+    """Drop the process-wide BM25 index so the next use maps the file again (e.g. after a rebuild)."""
+    global _index
+    with _index_lock:
+        _index = None
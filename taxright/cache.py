@@ -0,0 +1,226 @@
+"""
+Persistent cache of KB tax verification verdicts.
+
+The same items are bought from the same vendors in the same states over and
+over, so a verdict is keyed on the facts the KB actually judges: state,
+jurisdiction, normalized description, tax status, the applied rate rounded to
+a rate bucket and the knowledge base ID. Entries expire after a TTL and are
+dropped for a state whenever its StateKnowledgeBase mapping changes (see
+taxright.signals).
+"""
+import hashlib
+import logging
+import re
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db.models import F
+from django.utils import timezone
+
+from invoice_ocr.config import ConfigManager
+from taxright.models import InvoiceLineItem, VerificationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_NON_ALPHANUMERIC = re.compile(r'[^a-z0-9]+')
+
+# Fields an upsert replaces when a verdict is stored again under an existing key
+CACHE_ENTRY_UPDATE_FIELDS = [
+    'state_code', 'jurisdiction', 'normalized_description', 'tax_status', 'rate_bucket', 'knowledge_base_id',
+    'is_correct', 'expected_tax_rate', 'confidence_score', 'reasoning', 'citations', 'source_line_item_id',
+    'created_at', 'last_accessed_at',
+]
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normalize a line item description for matching.
+
+    Lowercases and collapses punctuation and whitespace runs to single spaces, so
+    'PVC Pipe, 1/2"' and 'pvc pipe 1/2' match.
+
+    Args:
+        description: Raw line item description
+
+    Returns:
+        str: Normalized description
+    """
+    return _NON_ALPHANUMERIC.sub(' ', (description or '').lower()).strip()
+
+
+def rate_bucket(rate: Any, bucket_size: Optional[Decimal] = None) -> Decimal:
+    """
+    Round an applied tax rate to its cache bucket.
+
+    Args:
+        rate: Tax rate as decimal (e.g. 0.0825)
+        bucket_size: Bucket width (defaults to verification_cache_rate_bucket config)
+
+    Returns:
+        Decimal: Rate rounded to the nearest bucket, 4 decimal places
+    """
+    bucket_size = Decimal(str(bucket_size or ConfigManager.get_verification_cache_rate_bucket()))
+    buckets = (Decimal(str(rate)) / bucket_size).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return (buckets * bucket_size).quantize(Decimal('0.0001'))
+
+
+class VerificationResultCache:
+    """Persistent verification cache backed by the VerificationCacheEntry model."""
+
+    @staticmethod
+    def build_key(line_item: InvoiceLineItem, state_code: str, jurisdiction: str, kb_id: str,
+                  bucket_size: Optional[Decimal] = None) -> Dict[str, Any]:
+        """
+        Build the cache key components for a line item verification.
+
+        Args:
+            line_item: InvoiceLineItem to verify
+            state_code: Invoice state code
+            jurisdiction: Invoice jurisdiction ('' if none)
+            kb_id: Knowledge Base ID the verdict comes from
+            bucket_size: Rate bucket width (defaults to verification_cache_rate_bucket config);
+                pass it when building many keys so the setting is read once
+
+        Returns:
+            dict: 'cache_key' plus the individual key fields
+        """
+        parts = {
+            'state_code': (state_code or '').upper(),
+            'jurisdiction': normalize_description(jurisdiction),
+            'normalized_description': normalize_description(line_item.description),
+            'tax_status': line_item.tax_status,
+            'rate_bucket': rate_bucket(line_item.tax_rate, bucket_size),
+            'knowledge_base_id': kb_id,
+        }
+        raw_key = '\x1f'.join(str(parts[field]) for field in (
+            'state_code', 'jurisdiction', 'normalized_description', 'tax_status', 'rate_bucket', 'knowledge_base_id'
+        ))
+        parts['cache_key'] = hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+        return parts
+
+    @staticmethod
+    def get_many(cache_keys: Iterable[str]) -> Dict[str, VerificationCacheEntry]:
+        """
+        Look up cached verdicts, discarding entries older than the configured TTL.
+
+        One query fetches the entries, one deletes expired ones and one updates the hit
+        counts, however many keys are looked up.
+
+        Args:
+            cache_keys: Keys returned by build_key()
+
+        Returns:
+            dict: VerificationCacheEntry by cache key for the hits
+        """
+        entries = {entry.cache_key: entry for entry in VerificationCacheEntry.objects.filter(cache_key__in=set(cache_keys))}
+        if not entries:
+            return {}
+
+        now = timezone.now()
+        ttl_days = ConfigManager.get_verification_cache_ttl_days()
+        if ttl_days:
+            expired = [key for key, entry in entries.items() if entry.created_at < now - timedelta(days=ttl_days)]
+            if expired:
+                logger.info(f"Discarding {len(expired)} expired verification cache entries")
+                VerificationCacheEntry.objects.filter(cache_key__in=expired).delete()
+                for key in expired:
+                    del entries[key]
+        if entries:
+            VerificationCacheEntry.objects.filter(pk__in=[entry.pk for entry in entries.values()]).update(
+                hit_count=F('hit_count') + 1, last_accessed_at=now
+            )
+            for entry in entries.values():
+                entry.hit_count += 1
+                entry.last_accessed_at = now
+        return entries
+
+    @staticmethod
+    def set_many(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any], Optional[int]]]) -> int:
+        """
+        Store KB verdicts, replacing existing entries with the same keys, in one query.
+
+        Args:
+            items: (key_parts, verification, source_line_item_id) per verdict, where key_parts
+                comes from build_key(), verification is a result with is_correct,
+                expected_tax_rate, confidence_score, reasoning and kb_response, and
+                source_line_item_id is the line item it was produced for
+
+        Returns:
+            int: Number of entries stored
+        """
+        now = timezone.now()
+        # One row per key: an upsert may not touch the same row twice
+        entries = {}
+        for key_parts, verification, source_line_item_id in items:
+            entries[key_parts['cache_key']] = VerificationCacheEntry(
+                cache_key=key_parts['cache_key'],
+                state_code=key_parts['state_code'],
+                jurisdiction=key_parts['jurisdiction'],
+                normalized_description=key_parts['normalized_description'],
+                tax_status=key_parts['tax_status'],
+                rate_bucket=key_parts['rate_bucket'],
+                knowledge_base_id=key_parts['knowledge_base_id'],
+                is_correct=verification['is_correct'],
+                expected_tax_rate=Decimal(str(verification['expected_tax_rate'])).quantize(Decimal('0.0001')),
+                confidence_score=Decimal(str(verification['confidence_score'])).quantize(Decimal('0.01')),
+                reasoning=verification['reasoning'],
+                citations=(verification.get('kb_response') or {}).get('citations', []),
+                source_line_item_id=source_line_item_id,
+                created_at=now,
+                last_accessed_at=None,
+            )
+        if entries:
+            VerificationCacheEntry.objects.bulk_create(
+                list(entries.values()),
+                update_conflicts=True,
+                unique_fields=['cache_key'],
+                update_fields=CACHE_ENTRY_UPDATE_FIELDS,
+            )
+        return len(entries)
+
+    @staticmethod
+    def to_verification(entry: VerificationCacheEntry) -> Dict[str, Any]:
+        """
+        Build a verification result from a cache entry.
+
+        The result has no kb_response, so no KB usage or cost is recorded for it.
+
+        Args:
+            entry: Cache entry returned by get_many()
+
+        Returns:
+            dict: Verification result in the shape returned by verify_line_item_tax()
+        """
+        return {
+            'is_correct': entry.is_correct,
+            'expected_tax_rate': entry.expected_tax_rate,
+            'confidence_score': entry.confidence_score,
+            'reasoning': entry.reasoning,
+            'kb_response': None,
+            'kb_id': entry.knowledge_base_id,
+            'citations': entry.citations,
+            'source': 'cache',
+            'cache': {
+                'entry_id': entry.id,
+                'cached_at': entry.created_at.isoformat(),
+                'source_line_item_id': entry.source_line_item_id,
+                'hit_count': entry.hit_count,
+            },
+        }
+
+    @staticmethod
+    def invalidate_state(state_code: str) -> int:
+        """
+        Drop every cached verdict for a state.
+
+        Args:
+            state_code: US state code
+
+        Returns:
+            int: Number of deleted entries
+        """
+        deleted = VerificationCacheEntry.objects.filter(state_code=(state_code or '').upper()).delete()[0]
+        if deleted:
+            logger.info(f"Invalidated {deleted} verification cache entries for state {state_code}")
+        return deleted
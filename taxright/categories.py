@@ -0,0 +1,179 @@
+"""
+Line item category classifier for the taxability matrix.
+
+Maps a line item's description (and, for generic service lines such as "Service
+call" or "Labor", its vendor name) to a category whose topic is a row of the
+compiled SUT workbooks (see taxright.taxability). The rules are deliberately
+narrow: a description that matches no category is left to the rate engine and
+the knowledge base, so a miss costs a KB call while a wrong match costs a wrong
+verdict.
+
+The workbooks only cover services to real property, transportation, utilities,
+fuel and food by name; other services and equipment rentals have no taxability
+row and are not classified. Categories whose workbook answer depends on the
+buyer's use (manufacturing inputs, restaurant disposables, common carrier
+vehicles) are not classified either.
+"""
+import re
+from typing import Dict, Optional
+
+REAL_PROPERTY_SERVICES = 'Real Property, Construction Contracts and Materials, Mobile and Manufactured Homes > Services to Real Property'
+TRANSPORTATION = 'Transportation Property, Fuel, Services'
+VEHICLES = f'{TRANSPORTATION} > Motor Vehicles, Intrastate or Non-Commercial Use'
+PASSENGERS = f'{TRANSPORTATION} > Property and Passenger Transportation'
+UTILITIES = 'Utilities, Fuel, Mining and Natural Resource Extraction, Production, Sale > Utilities'
+FUEL = 'Utilities, Fuel, Mining and Natural Resource Extraction, Production, Sale > Fuel'
+FOOD = 'Food and Food Products, Eating Establishments > Food and Food Ingredients > Specific Products'
+EATING = 'Food and Food Products, Eating Establishments'
+
+# Descriptions this generic are classified by the vendor name instead
+GENERIC_SERVICE = re.compile(r'^\W*(?:(?:service|labor|labour|repair|maintenance|call|visit|trip|charge|fee|hourly|monthly|work|hours?)\b\W*)+$')
+
+# (slug, name, topic, description pattern, vendor pattern, exclusion pattern); the first match wins
+_CATEGORY_RULES = (
+    ('hvac_installation', 'HVAC installation', f'{REAL_PROPERTY_SERVICES} > HVAC Installation',
+     r'\b(hvac|furnace|heat pump|air condition\w*|a/?c unit)\b.*\binstall\w*|\binstall\w*\b.*\b(hvac|furnace|heat pump|air condition\w*)\b',
+     None, None),
+    ('hvac_repair', 'HVAC repair', f'{REAL_PROPERTY_SERVICES} > HVAC Repair',
+     r'\b(hvac|furnace|heat pump|air condition\w*|boiler)\b.*\b(repair|service|maintenance|tune[- ]?up)\b'
+     r'|\b(repair|service|maintenance)\b.*\b(hvac|furnace|heat pump)\b',
+     r'\b(hvac|heating|air conditioning)\b', r'\b(filters?|parts?|thermostat)\b'),
+    ('plumbing', 'Plumbing', f'{REAL_PROPERTY_SERVICES} > Plumbing',
+     r'\bplumbing (service|repair|labor|work)\b|\bplumber\b|\bdrain (cleaning|clearing)\b',
+     r'\bplumb(ing|ers?)\b', r'\b(fixtures?|supplies|parts)\b'),
+    ('electrical_work', 'Electrical work', f'{REAL_PROPERTY_SERVICES} > Electrical Work',
+     r'\belectrical (work|repair|service|labor)\b|\belectrician\b|\brewiring\b',
+     r'\belectrical (contractors?|services)\b|\belectricians?\b', r'\b(supplies|parts|wire spool)\b'),
+    ('window_cleaning', 'Window cleaning', f'{REAL_PROPERTY_SERVICES} > Window Cleaning',
+     r'\bwindow (cleaning|washing)\b', r'\bwindow (cleaning|washing)\b', r'\b(solution|squeegee|supplies)\b'),
+    ('gutter_cleaning', 'Gutter cleaning', f'{REAL_PROPERTY_SERVICES} > Gutter Cleaning',
+     r'\bgutter (cleaning|clean[- ]?out)\b', None, None),
+    ('power_washing_sidewalks', 'Power washing of sidewalks and parking lots',
+     f'{REAL_PROPERTY_SERVICES} > Power Washing Sidewalks and Parking Lots',
+     r'\b(power|pressure) wash\w*\b.*\b(sidewalks?|driveways?|parking lot|walkways?)\b'
+     r'|\b(sidewalks?|driveways?|parking lot|walkways?)\b.*\b(power|pressure) wash\w*\b',
+     None, r'\b(rental|machine|washer)\b'),
+    ('power_washing_buildings', 'Power washing of buildings', f'{REAL_PROPERTY_SERVICES} > Power Washing Buildings',
+     r'\b(power|pressure) washing\b', r'\b(power|pressure) washing\b', r'\b(rental|machine|washer)\b'),
+    ('janitorial', 'Janitorial service', f'{REAL_PROPERTY_SERVICES} > Interior Real Property Maintenance',
+     r'\bjanitorial (service|services|cleaning)\b|\b(office|building|commercial) cleaning\b|\bcustodial services?\b',
+     r'\bjanitorial\b|\bcustodial\b', r'\b(supplies|products|chemicals?)\b'),
+    ('landscaping', 'Landscaping and grounds maintenance',
+     f'{REAL_PROPERTY_SERVICES} > Exterior Real Property Maintenance',
+     r'\b(landscaping|landscape maintenance|lawn (care|mowing|service)|grounds maintenance|snow (removal|plowing))\b',
+     r'\b(landscaping|lawn care|grounds maintenance)\b', r'\b(mulch|seed|fertilizer|plants?|pavers?|equipment)\b'),
+    ('excavation_demolition', 'Excavation and demolition', f'{REAL_PROPERTY_SERVICES} > Excavation and Demolition',
+     r'\b(excavation|demolition)\b', r'\b(excavating|excavation|demolition)\b', r'\b(rental|equipment)\b'),
+    ('site_cleanup', 'Site cleanup', f'{REAL_PROPERTY_SERVICES} > Site Cleanup',
+     r'\b(site|construction) clean[- ]?up\b|\bdebris removal\b', None, None),
+    ('sign_painting', 'Sign painting and lettering', f'{REAL_PROPERTY_SERVICES} > Sign Painting and Lettering Services',
+     r'\bsign (painting|lettering)\b', None, None),
+
+    ('towing', 'Towing', f'{TRANSPORTATION} > Towing',
+     r'\btowing\b|\btow (service|charge|fee)\b', r'\btowing\b', r'\b(hitch|strap|rope|mirror)\b'),
+    ('car_wash', 'Car wash', f'{TRANSPORTATION} > Car Wash',
+     r'\b(car|vehicle|truck|fleet) wash(ing)?\b', None, r'\b(soap|shampoo|brush|supplies)\b'),
+    ('car_detailing', 'Car detailing', f'{TRANSPORTATION} > Car Detailing',
+     r'\b(auto|car|vehicle|truck) detailing\b', None, r'\b(supplies|products|kit)\b'),
+    ('parking', 'Parking', f'{TRANSPORTATION} > Parking and Valet',
+     r'\bvalet\b|\bparking (fee|charge|garage|pass|permit|space|validation)\b', None,
+     r'\b(striping|sealing|sweeping|paving|repair|signs?)\b'),
+    ('moving', 'Moving services', f'{PASSENGERS} > Property Transportation, Moving Services',
+     r'\bmoving (service|services|labor)\b|\b(office|relocation) move\b|\brelocation services\b', r'\bmovers?\b', None),
+    ('air_travel', 'Air passenger transportation', f'{PASSENGERS} > Passenger Transportation, Air',
+     r'\b(airfare|air fare|airline ticket|plane ticket)\b', None, None),
+    ('taxi', 'Taxi and ride-hailing', f'{PASSENGERS} > Passenger Transportation, Taxi or Transportation Network',
+     r'\b(taxi|cab fare|rideshare|ride share|uber|lyft)\b', None, r'\beats\b'),
+    ('limousine', 'Limousine service', f'{PASSENGERS} > Passenger Transportation, Limousine',
+     r'\b(limo|limousine|car service)\b', r'\blimousine\b', None),
+    ('vehicle_rental', 'Short-term vehicle rental', f'{VEHICLES} > Short-term Motor Vehicle Rentals',
+     r'\b(car|vehicle|auto|van|pickup) rental\b|\brental (car|vehicle)\b', None, r'\b(lease|monthly|annual)\b'),
+    ('vehicle_maintenance', 'Vehicle maintenance', f'{VEHICLES} > Maintenance Services',
+     r'\boil change\b|\btire rotation\b|\bwheel alignment\b|\b(vehicle|fleet) (maintenance|inspection)\b', None, None),
+    ('vehicle_repair', 'Vehicle repair', f'{VEHICLES} > Repair Services',
+     r'\b(auto|vehicle|car|truck|fleet) repair\b|\bbrake (repair|job|service)\b|\btransmission repair\b',
+     r'\b(auto repair|automotive|collision|body shop)\b', r'\bparts?\b'),
+    ('tires', 'Tires', f'{VEHICLES} > Tires', r'\btires?\b', None, r'\b(rotation|repair|patch|disposal|gauge|chains?)\b'),
+
+    ('compressed_natural_gas', 'Compressed natural gas', f'{FUEL} > Compressed Natural Gas',
+     r'\bcompressed natural gas\b|\bcng\b', None, None),
+    ('electricity', 'Electricity', f'{UTILITIES} > Electricity',
+     r'\belectricity\b|\belectric (service|utility|usage|bill)\b|\bkwh\b', None, r'\b(meter|generator|panel)\b'),
+    ('natural_gas', 'Natural gas', f'{UTILITIES} > Natural Gas',
+     r'\bnatural gas\b|\bgas (service|utility|usage)\b|\btherms?\b', None, r'\b(grill|heater|generator|line install\w*)\b'),
+    ('water_sewer', 'Water and sewer service', f'{UTILITIES} > Water and Sewer',
+     r'\bwater and sewer\b|\bsewer (service|charge|fee)\b|\bwater (service|utility|usage) (charge|fee)?\b', None,
+     r'\b(heater|softener|bottled|line)\b'),
+    ('dyed_diesel', 'Dyed diesel', f'{FUEL} > Dyed Diesel', r'\b(dyed|off[- ]road|red) diesel\b', None, None),
+    ('undyed_diesel', 'Diesel fuel', f'{FUEL} > Undyed Diesel',
+     r'\bdiesel( fuel)?\b', None, r'\b(exhaust fluid|def|engine|generator|pump|filter|rental)\b'),
+    ('gasoline', 'Gasoline', f'{FUEL} > Gasoline',
+     r'\bgasoline\b|\bunleaded( fuel| gas)?\b', None, r'\b(can|container|engine|generator)\b'),
+    ('propane', 'Propane', f'{FUEL} > Propane',
+     r'\bpropane\b|\blp gas\b', None, r'\b(tank rental|heater|torch|grill|regulator|hose)\b'),
+    ('kerosene', 'Kerosene', f'{FUEL} > Kerosene', r'\bkerosene\b', None, r'\b(heater|lamp)\b'),
+    ('heating_oil', 'Heating oil', f'{FUEL} > Heating Oil', r'\b(heating|fuel) oil\b', None, r'\b(tank|furnace|filter)\b'),
+
+    ('catering', 'Catering', f'{EATING} > Catering and Personal Chefs',
+     r'\bcater(ing|ed)\b', r'\bcater(ing|ers?)\b', r'\b(equipment|supplies|disposables)\b'),
+    ('alcoholic_beverages', 'Alcoholic beverages', f'{FOOD} > Alcoholic Beverages',
+     r'\b(beer|wine|liquor|spirits|vodka|whiske?y|bourbon|tequila|gin|rum)\b', None,
+     r'\b(glass(es)?|opener|rack|cooler|fridge|refrigerator)\b'),
+    ('candy', 'Candy', f'{FOOD} > Candy', r'\b(candy|candies|chocolate bars?|chewing gum|confections?)\b', None,
+     r'\b(machine|dispenser|jar)\b'),
+    ('soft_drinks', 'Soft drinks', f'{FOOD} > Soft Drinks', r'\b(soda|sodas|soft drinks?|cola)\b', None,
+     r'\b(baking soda|soda ash|soda blast\w*|machine|fountain)\b'),
+    ('bottled_water', 'Bottled water', f'{FOOD} > Bottled Water',
+     r'\bbottled water\b|\bspring water\b|\bdrinking water\b', None, r'\b(cooler|dispenser|rental)\b'),
+    ('ice', 'Ice', f'{FOOD} > Ice', r'\b(bags? of ice|bagged ice|ice bags?)\b', None, r'\bmachine\b'),
+    ('coffee', 'Coffee', f'{FOOD} > Coffee', r'\bcoffee\b', None,
+     r'\b(maker|machine|brewer|filters?|mugs?|cups?|lids?|stirrers?|equipment|service)\b'),
+    ('tea', 'Tea', f'{FOOD} > Tea', r'\btea\b', None, r'\b(kettle|maker|cups?|mugs?)\b'),
+    ('juice', 'Juice', f'{FOOD} > Juice', r'\bjuices?\b', None, r'\b(machine|juicer|dispenser)\b'),
+    ('dietary_supplements', 'Dietary supplements and vitamins', f'{FOOD} > Dietary Supplements and Vitamins',
+     r'\bvitamins?\b|\bdietary supplements?\b', None, None),
+    ('grocery', 'Grocery items', f'{FOOD} > Grocery Items', r'\bgrocer(y|ies)\b', None, r'\b(bags?|carts?)\b'),
+)
+
+CATEGORIES = tuple(
+    {
+        'slug': slug,
+        'name': name,
+        'topic': topic,
+        'pattern': re.compile(pattern),
+        'vendor_pattern': re.compile(vendor_pattern) if vendor_pattern else None,
+        'exclude': re.compile(exclude) if exclude else None,
+    }
+    for slug, name, topic, pattern, vendor_pattern, exclude in _CATEGORY_RULES
+)
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return ' '.join((text or '').lower().split())
+
+
+def classify_line_item(description: str, vendor_name: str = '') -> Optional[Dict[str, str]]:
+    """
+    Classify a line item into a taxability matrix category.
+
+    Args:
+        description: Line item description
+        vendor_name: Invoice vendor name, consulted only for generic service descriptions
+
+    Returns:
+        dict: The category's 'slug', 'name' and 'topic', or None if the item matches no category
+    """
+    description = _normalize(description)
+    if not description:
+        return None
+    for category in CATEGORIES:
+        if category['pattern'].search(description) and not (category['exclude'] and category['exclude'].search(description)):
+            return {'slug': category['slug'], 'name': category['name'], 'topic': category['topic']}
+
+    vendor_name = _normalize(vendor_name)
+    if vendor_name and GENERIC_SERVICE.match(description):
+        for category in CATEGORIES:
+            if category['vendor_pattern'] and category['vendor_pattern'].search(vendor_name):
+                return {'slug': category['slug'], 'name': category['name'], 'topic': category['topic']}
+    return None
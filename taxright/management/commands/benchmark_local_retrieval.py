@@ -0,0 +1,151 @@
+"""
+Management command to compare a local retrieval index with the Bedrock knowledge bases.
+
+For each state, retrieval queries are built from that state's invoice line item
+descriptions (or a built-in sample when there are none), exactly as the
+verification service builds them. Each query is run against the local BM25 or
+vector index and, unless --skip-kb is given, against the state's Bedrock
+knowledge base through the Retrieve API. The command reports latency for both
+and the top-k overlap: the share of KB passages matched by a local passage,
+either by the same source file or by the passages' text overlapping (the KB
+chunks documents differently, so exact chunk identity cannot be compared).
+
+Usage:
+    # Every state with an active KB mapping, 20 queries each
+    python manage.py benchmark_local_retrieval
+
+    # Local latency only, for a few states
+    python manage.py benchmark_local_retrieval --states NC,CA,TX --skip-kb
+
+    # A/B the local vector index against the S3-vector knowledge bases
+    python manage.py benchmark_local_retrieval --source vector
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.exceptions import ConfigurationError
+from taxright.bm25 import BM25Index, bm25_index_path, tokenize
+from taxright.management.commands.load_test_pipeline import percentile
+from taxright.models import InvoiceLineItem, StateKnowledgeBase
+from taxright.retrieval import passages_from_references
+from taxright.services import BedrockKnowledgeBaseService
+from taxright.vector_index import LocalVectorIndex, vector_index_dir
+
+SAMPLE_DESCRIPTIONS = (
+    'PVC pipe 1/2 in x 10 ft', 'Interior latex paint 5 gal', 'Prewritten software license',
+    'Installation labor', 'Copy paper case', 'Shipping and handling', 'Equipment rental (weekly)',
+    'Janitorial services', 'Dimensional lumber 2x4x8', 'Extended warranty contract',
+    'Bottled water 24 pk', 'Diesel fuel', 'Medical gloves box', 'Cloud hosting subscription',
+    'Repair parts and labor', 'Office chair', 'Printed catalogs', 'Safety glasses',
+    'Concrete mix 80 lb', 'Telephone service',
+)
+
+# Share of the shorter passage's terms that must appear in the other for two passages to match
+TEXT_MATCH_THRESHOLD = 0.6
+
+
+def passages_match(local, remote):
+    """Whether a local passage and a KB passage come from the same file or substantially the same text."""
+    local_file = (local['location'] or '').rsplit('/', 1)[-1]
+    remote_file = (remote['location'] or '').rsplit('/', 1)[-1]
+    if local_file and local_file == remote_file:
+        return True
+    local_terms, remote_terms = set(tokenize(local['text'])), set(tokenize(remote['text']))
+    if not local_terms or not remote_terms:
+        return False
+    return len(local_terms & remote_terms) / min(len(local_terms), len(remote_terms)) >= TEXT_MATCH_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = 'Benchmark local retrieval latency and top-k overlap against the Bedrock knowledge bases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--states', type=str, default='', help='Comma-separated state codes (default: states with an active KB)')
+        parser.add_argument('--queries', type=int, default=20, help='Queries per state')
+        parser.add_argument('--top-k', type=int, default=None, help='Passages per query (default: kb_retrieval_results config)')
+        parser.add_argument('--source', choices=('bm25', 'vector'), default='bm25', help='Local index to benchmark')
+        parser.add_argument('--index', type=str, default=None,
+                            help='BM25 index file or vector index directory (default: from config)')
+        parser.add_argument('--skip-kb', action='store_true', help='Only time the local index; make no Bedrock calls')
+
+    def handle(self, *args, **options):
+        label = options['source'].upper()
+        try:
+            if options['source'] == 'vector':
+                index = LocalVectorIndex(options['index'] or vector_index_dir())
+            else:
+                index = BM25Index(options['index'] or bm25_index_path())
+        except (FileNotFoundError, ConfigurationError) as e:
+            raise CommandError(f"{e}. Build it first with: python manage.py build_{options['source']}_index")
+        top_k = options['top_k'] or ConfigManager.get_kb_retrieval_results()
+        knowledge_bases = {kb.state_code: kb for kb in StateKnowledgeBase.objects.filter(is_active=True)}
+        if options['states']:
+            states = [code.strip().upper() for code in options['states'].split(',') if code.strip()]
+        else:
+            states = sorted(knowledge_bases)
+        if not states:
+            raise CommandError('No states to benchmark: pass --states or configure StateKnowledgeBase mappings')
+        service = None if options['skip_kb'] else BedrockKnowledgeBaseService()
+
+        local_timings, kb_timings, overlaps, rows = [], [], [], []
+        for state_code in states:
+            if not index.has_state(state_code):
+                self.stdout.write(self.style.WARNING(f'{state_code}: not in the {label} index, skipped'))
+                continue
+            kb = knowledge_bases.get(state_code)
+            state_local, state_kb, state_overlaps = [], [], []
+            for query in self._queries(state_code, options['queries']):
+                start = time.perf_counter()
+                local = passages_from_references(index.retrieve(state_code, query, top_k))
+                state_local.append((time.perf_counter() - start) * 1000)
+                if service is None or kb is None:
+                    continue
+
+                start = time.perf_counter()
+                response = service._get_client(kb.region).retrieve(
+                    knowledgeBaseId=kb.knowledge_base_id,
+                    retrievalQuery={'text': query},
+                    retrievalConfiguration={'vectorSearchConfiguration': {'numberOfResults': top_k}}
+                )
+                state_kb.append((time.perf_counter() - start) * 1000)
+                remote = passages_from_references(response.get('retrievalResults', []))
+                if remote:
+                    matched = sum(1 for passage in remote if any(passages_match(hit, passage) for hit in local))
+                    state_overlaps.append(matched / len(remote))
+
+            local_timings.extend(state_local)
+            kb_timings.extend(state_kb)
+            overlaps.extend(state_overlaps)
+            rows.append((state_code, state_local, state_kb, state_overlaps))
+        index.close()
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Retrieval benchmark (top {top_k}) ==='))
+        for state_code, state_local, state_kb, state_overlaps in rows:
+            line = f'  {state_code}: {len(state_local)} queries | {label} p50 {percentile(state_local, 0.5):.2f}ms'
+            if state_kb:
+                line += (f' | KB p50 {percentile(state_kb, 0.5):.0f}ms'
+                         f' | overlap@{top_k} {sum(state_overlaps) / max(1, len(state_overlaps)):.0%}')
+            self.stdout.write(line)
+        self.stdout.write(
+            f'\n  {label}: mean {sum(local_timings) / max(1, len(local_timings)):.2f}ms, '
+            f'p50 {percentile(local_timings, 0.5):.2f}ms, p95 {percentile(local_timings, 0.95):.2f}ms, '
+            f'p99 {percentile(local_timings, 0.99):.2f}ms'
+        )
+        if kb_timings:
+            self.stdout.write(
+                f'  KB:   mean {sum(kb_timings) / len(kb_timings):.0f}ms, '
+                f'p50 {percentile(kb_timings, 0.5):.0f}ms, p95 {percentile(kb_timings, 0.95):.0f}ms, '
+                f'p99 {percentile(kb_timings, 0.99):.0f}ms'
+            )
+            self.stdout.write(f'  Top-{top_k} overlap: {sum(overlaps) / max(1, len(overlaps)):.1%} of KB passages matched')
+
+    def _queries(self, state_code, limit):
+        """Retrieval queries for a state, built the way the verification service builds them."""
+        descriptions = list(
+            InvoiceLineItem.objects.filter(invoice__state_code=state_code)
+            .values_list('description', flat=True).distinct()[:limit]
+        )
+        descriptions += list(SAMPLE_DESCRIPTIONS[:max(0, limit - len(descriptions))])
+        return [f"Sales and use tax treatment and rate in {state_code} for: {description}" for description in descriptions]
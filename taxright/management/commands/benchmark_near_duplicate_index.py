@@ -0,0 +1,156 @@
+"""
+Management command to benchmark the near-duplicate line item index.
+
+Builds an in-memory index of synthetic line item descriptions (no database
+access), then measures lookup latency and match rate for three kinds of
+queries: indexed descriptions ('exact'), formatting variants of them
+('variant') and freshly generated descriptions ('new', which can legitimately
+match items of the same brand, product and variant). Finally it times
+serializing and reloading the index.
+
+Usage:
+    # Lookup latency at 1M indexed items across 5 states
+    python manage.py benchmark_near_duplicate_index --items 1000000
+
+    # Quick run with a different threshold
+    python manage.py benchmark_near_duplicate_index --items 50000 --threshold 0.7
+"""
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.management.commands.load_test_pipeline import percentile
+from taxright.near_duplicates import NearDuplicateIndex
+
+BRANDS = (
+    'Sherwin Williams', 'Behr', 'Benjamin Moore', 'Valspar', 'Rust-Oleum', 'Kilz', 'Zinsser', 'Dutch Boy',
+    'Charlotte Pipe', 'Nibco', 'Mueller', 'SharkBite', 'Oatey', 'Moen', 'Delta', 'Kohler',
+    'Georgia-Pacific', 'Simpson Strong-Tie', 'GRK', 'DeWalt', 'Milwaukee', 'Makita', 'Leviton', 'Lutron',
+)
+PRODUCTS = (
+    'Interior Latex Paint', 'Exterior Acrylic Paint', 'Primer Sealer', 'PVC Pipe', 'CPVC Elbow', 'Copper Tee',
+    'Ball Valve', 'Faucet Cartridge', 'Drywall Screws', 'Joist Hanger', 'Deck Screws', 'Stud Lumber',
+    'Cordless Drill', 'Impact Driver', 'Circular Saw Blade', 'Dimmer Switch', 'GFCI Outlet', 'Wire Nuts',
+    'Caulk Tube', 'Wood Filler', 'Paint Roller Cover', 'Drop Cloth', 'Shop Towels', 'HVAC Filter',
+)
+VARIANTS = (
+    'Dover White', 'Agreeable Gray', 'Semi-Gloss', 'Eggshell', 'Flat', 'Satin', '1/2 in', '3/4 in',
+    '1 in x 10 ft', 'Sch 40', 'Brass', 'Chrome', 'Galvanized', 'Zinc', '20V', '18V', '15A', '20A',
+    'White', 'Almond', '16x25x1', '20x25x1',
+)
+SIZES = ('1 gal', '5 gal', '1 qt', '10 oz', '5 lb', '1 lb', '25 pk', '100 ct', 'each', '2 pk', '8 ft', '10 ft')
+STATES = ('CA', 'TX', 'NY', 'FL', 'GA', 'NC', 'IL', 'PA', 'OH', 'WA')
+TAX_STATUSES = ('taxable', 'taxable', 'taxable', 'exempt')
+RATES = ('0.0700', '0.0725', '0.0825', '0.0875', '0.0600')
+
+
+def synthetic_description(rng):
+    """A realistic-looking, almost always distinct line item description."""
+    return (
+        f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS)} {rng.choice(VARIANTS)} "
+        f"{rng.choice(SIZES)} SKU {rng.randint(10000, 999999)}"
+    )
+
+
+def perturb(description, rng):
+    """Produce a formatting variant of a description (case, spacing, abbreviations, a dropped word)."""
+    words = description.split()
+    if len(words) > 4 and rng.random() < 0.5:
+        del words[rng.randrange(1, len(words) - 2)]
+    variant = ' '.join(words)
+    variant = variant.replace(' gal', 'GAL').replace(' in', '"').replace(' ft', 'FT')
+    return variant.upper() if rng.random() < 0.5 else variant.lower()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark near-duplicate index build, lookup latency and serialization at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000000, help='Indexed line items')
+        parser.add_argument('--states', type=int, default=5, help='State partitions the items are spread over')
+        parser.add_argument('--queries', type=int, default=2000, help='Lookups to time')
+        parser.add_argument('--threshold', type=float, default=0.6, help='Similarity threshold for lookups')
+        parser.add_argument('--num-perm', type=int, default=64, help='MinHash signature length')
+        parser.add_argument('--bands', type=int, default=16, help='LSH bands')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+        parser.add_argument('--skip-serialization', action='store_true', help='Do not time save/load')
+
+    def handle(self, *args, **options):
+        if options['items'] < 1 or options['queries'] < 1:
+            raise CommandError('--items and --queries must be at least 1')
+        if not 1 <= options['states'] <= len(STATES):
+            raise CommandError(f'--states must be between 1 and {len(STATES)}')
+
+        rng = random.Random(options['seed'])
+        states = STATES[:options['states']]
+        index = NearDuplicateIndex(num_perm=options['num_perm'], bands=options['bands'])
+        query_pool = []
+        sample_every = max(1, options['items'] // (options['queries'] * 4))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n=== Building index of {options['items']:,} items "
+            f"({options['num_perm']} perms, {options['bands']} bands, {len(states)} states) ==="
+        ))
+        started = time.perf_counter()
+        for item_id in range(1, options['items'] + 1):
+            row = (rng.choice(states), synthetic_description(rng), rng.choice(TAX_STATUSES), rng.choice(RATES))
+            index.add(row[0], row[1], row[2], row[3], verification_id=item_id, line_item_id=item_id)
+            if item_id % sample_every == 0:
+                query_pool.append(row)
+            if item_id % 100000 == 0:
+                self.stdout.write(f'  {item_id:,} items ({time.perf_counter() - started:.0f}s)')
+        added = time.perf_counter()
+        index.compact()
+        built = time.perf_counter()
+        self.stdout.write(
+            f'  Added in {added - started:.1f}s ({options["items"] / (added - started):,.0f} items/s), '
+            f'compacted in {built - added:.1f}s'
+        )
+
+        self._benchmark_lookups(index, query_pool, rng, options)
+        if not options['skip_serialization']:
+            self._benchmark_serialization(index, query_pool, options)
+
+    def _benchmark_lookups(self, index, query_pool, rng, options):
+        threshold = options['threshold']
+        queries = [rng.choice(query_pool) for _ in range(options['queries'])]
+        timings = {'exact': [], 'variant': [], 'new': []}
+        matched = {'exact': 0, 'variant': 0, 'new': 0}
+        for state, description, tax_status, rate in queries:
+            for kind, text in (
+                ('exact', description),
+                ('variant', perturb(description, rng)),
+                ('new', synthetic_description(rng)),
+            ):
+                start = time.perf_counter()
+                match = index.lookup(state, text, tax_status, rate, threshold)
+                timings[kind].append((time.perf_counter() - start) * 1000)
+                matched[kind] += int(match is not None)
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Lookups ({len(queries):,} per kind, threshold {threshold}) ==='))
+        for kind, values in timings.items():
+            self.stdout.write(
+                f'  {kind:>7}: matched {matched[kind] / len(queries):6.1%} | latency mean {sum(values) / len(values):.3f}ms, '
+                f'p50 {percentile(values, 0.5):.3f}ms, p95 {percentile(values, 0.95):.3f}ms, '
+                f'p99 {percentile(values, 0.99):.3f}ms, max {max(values):.3f}ms'
+            )
+
+    def _benchmark_serialization(self, index, query_pool, options):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        index.write(buffer)
+        written = time.perf_counter()
+        buffer.seek(0)
+        loaded = NearDuplicateIndex.read(buffer)
+        read = time.perf_counter()
+
+        state, description, tax_status, rate = query_pool[0]
+        consistent = loaded.lookup(state, description, tax_status, rate, options['threshold']) == \
+            index.lookup(state, description, tax_status, rate, options['threshold'])
+        self.stdout.write(self.style.SUCCESS('\n=== Serialization ==='))
+        self.stdout.write(
+            f'  {len(buffer.getvalue()) / 1024 / 1024:.1f} MB, write {written - start:.2f}s, '
+            f'load {read - written:.2f}s, reloaded index consistent: {consistent}'
+        )
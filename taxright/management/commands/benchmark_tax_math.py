@@ -0,0 +1,105 @@
+"""
+Management command to benchmark the vectorized expected-tax math.
+
+Generates synthetic invoices (no database access) with a mix of taxable,
+exempt and unverified line items, pre- and post-discount line totals and
+zero-rate verifications, then times taxright.tax_math.compute_expected_taxes()
+over the whole batch against the line-by-line Decimal reference
+(reference_invoice_tax()) on a sample, and checks both agree.
+
+Usage:
+    # 100k invoices
+    python manage.py benchmark_tax_math
+
+    # Larger invoices, full reference comparison
+    python manage.py benchmark_tax_math --invoices 20000 --max-items 50 --reference-sample 20000
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.tax_math import InvoiceBatch, compute_expected_taxes, from_cents, reference_invoice_tax
+
+RATES = (Decimal('0.0000'), Decimal('0.0400'), Decimal('0.0600'), Decimal('0.0675'), Decimal('0.0725'),
+         Decimal('0.0825'), Decimal('0.0887'), Decimal('0.1025'))
+
+
+def synthetic_invoice(rng, max_items):
+    """Generate (total, discount, total_tax, items) for one synthetic invoice."""
+    items = []
+    for _ in range(rng.randint(1, max_items)):
+        line_total = Decimal(rng.randrange(0, 500000)) / 100
+        applied_rate = rng.choice(RATES)
+        roll = rng.random()
+        if roll < 0.05:
+            expected_rate = None
+        elif roll < 0.15:
+            expected_rate = Decimal('0.0000')
+        elif roll < 0.25:
+            expected_rate = rng.choice(RATES)
+        else:
+            expected_rate = applied_rate
+        tax_amount = (line_total * applied_rate).quantize(Decimal('0.01'))
+        items.append((line_total, tax_amount, applied_rate, expected_rate, applied_rate > 0, rng.random() < 0.03))
+    subtotal = sum((item[0] for item in items), Decimal('0.00'))
+    discount = Decimal(rng.randrange(0, 50000)) / 100 if rng.random() < 0.3 else Decimal('0.00')
+    total = subtotal if rng.random() < 0.5 else subtotal - discount
+    total_tax = sum((item[1] for item in items), Decimal('0.00')) if rng.random() < 0.5 else None
+    return total, discount, total_tax, items
+
+
+class Command(BaseCommand):
+    help = 'Benchmark vectorized expected-tax computation against the line-by-line Decimal reference'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=100000, help='Synthetic invoices to evaluate')
+        parser.add_argument('--max-items', type=int, default=12, help='Maximum line items per invoice')
+        parser.add_argument('--reference-sample', type=int, default=10000, help='Invoices also evaluated with the Decimal reference')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic invoices')
+
+    def handle(self, *args, **options):
+        if options['invoices'] < 1 or options['max_items'] < 1:
+            raise CommandError('--invoices and --max-items must be positive')
+        rng = random.Random(options['seed'])
+        invoices = [synthetic_invoice(rng, options['max_items']) for _ in range(options['invoices'])]
+
+        started = time.perf_counter()
+        batch = InvoiceBatch()
+        for invoice in invoices:
+            batch.add_invoice(*invoice)
+        arrays = batch.arrays()
+        pack_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        results = compute_expected_taxes(arrays)
+        compute_seconds = time.perf_counter() - started
+
+        sample = invoices[:min(options['reference_sample'], len(invoices))]
+        started = time.perf_counter()
+        references = [reference_invoice_tax(*invoice) for invoice in sample]
+        reference_seconds = time.perf_counter() - started
+        mismatches = sum(
+            1 for position, reference in enumerate(references)
+            if from_cents(results['expected_tax'][position]) != reference['expected_tax']
+            or from_cents(results['actual_tax'][position]) != reference['actual_tax']
+        )
+
+        items = len(arrays['line_total'])
+        per_invoice_vectorized = compute_seconds / len(invoices) * 1e6
+        per_invoice_reference = reference_seconds / len(sample) * 1e6 if sample else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"\n=== Tax math: {len(invoices):,} invoices, {items:,} line items ==="
+        ))
+        self.stdout.write(f"  Pack:       {pack_seconds:.2f}s")
+        self.stdout.write(
+            f"  Vectorized: {compute_seconds:.3f}s ({len(invoices) / compute_seconds:,.0f} invoices/s, {per_invoice_vectorized:.2f}us/invoice)"
+        )
+        if sample:
+            self.stdout.write(
+                f"  Reference:  {len(sample):,} in {reference_seconds:.3f}s ({per_invoice_reference:.2f}us/invoice), "
+                f"speedup {per_invoice_reference / per_invoice_vectorized:.1f}x"
+            )
+        self.stdout.write(f"  Mismatches: {mismatches:,} of {len(sample):,}")
+        if mismatches:
+            raise CommandError('Vectorized results differ from the Decimal reference')
@@ -0,0 +1,113 @@
+"""
+Management command to benchmark the in-memory TaxRule index.
+
+Builds an index of synthetic rules (no database access): statewide rate
+changes for every state plus county, city and special district rules for the
+requested number of jurisdictions, each with a few effective-dated rate
+changes. It then times combined-rate lookups for random jurisdictions and
+dates, and writing and reading the snapshot.
+
+Usage:
+    # 50k local jurisdictions
+    python manage.py benchmark_tax_rule_index
+
+    # Larger history per jurisdiction
+    python manage.py benchmark_tax_rule_index --jurisdictions 50000 --changes 10
+"""
+import datetime
+import io
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.management.commands.load_test_pipeline import percentile
+from taxright.rate_engine import combine_rules
+from taxright.rule_index import TaxRuleIndex, jurisdiction_keys
+from taxright.services import US_STATE_CODES
+
+LOCAL_RULE_TYPES = ('county', 'county', 'city', 'special')
+FIRST_DATE = datetime.date(2015, 1, 1)
+LAST_DATE = datetime.date(2025, 12, 31)
+
+
+def random_date(rng):
+    return FIRST_DATE + datetime.timedelta(days=rng.randrange((LAST_DATE - FIRST_DATE).days))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark TaxRule index build, combined-rate lookup latency and snapshot size at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jurisdictions', type=int, default=50000, help='Local jurisdictions (county, city, special)')
+        parser.add_argument('--changes', type=int, default=4, help='Maximum effective-dated rate changes per jurisdiction')
+        parser.add_argument('--lookups', type=int, default=100000, help='Combined-rate lookups to time')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic rules')
+
+    def handle(self, *args, **options):
+        if options['jurisdictions'] < 1 or options['changes'] < 1:
+            raise CommandError('--jurisdictions and --changes must be positive')
+        rng = random.Random(options['seed'])
+        states = sorted(US_STATE_CODES)
+        rows, jurisdictions = [], []
+        rule_id = 0
+        for state_code in states:
+            for effective_date in sorted({random_date(rng) for _ in range(3)} | {FIRST_DATE}):
+                rule_id += 1
+                rows.append((rule_id, state_code, '', 'state', Decimal(rng.randrange(290, 725)) / 10000, effective_date))
+        for number in range(options['jurisdictions']):
+            state_code = rng.choice(states)
+            rule_type = rng.choice(LOCAL_RULE_TYPES)
+            name = f"Jurisdiction {number} {rule_type.title()}"
+            jurisdictions.append((state_code, name))
+            for effective_date in {random_date(rng) for _ in range(rng.randint(1, options['changes']))}:
+                rule_id += 1
+                rows.append((rule_id, state_code, name, rule_type, Decimal(rng.randrange(25, 300)) / 10000, effective_date))
+
+        started = time.perf_counter()
+        index = TaxRuleIndex.build(rows)
+        build_seconds = time.perf_counter() - started
+
+        queries = []
+        for _ in range(options['lookups']):
+            state_code, name = rng.choice(jurisdictions)
+            queries.append((state_code, f"{name}, Unlisted City", random_date(rng)))
+        resolved = complete = 0
+        timings = []
+        started = time.perf_counter()
+        for state_code, jurisdiction, on_date in queries:
+            lookup_started = time.perf_counter()
+            resolution = combine_rules(
+                state_code, jurisdiction, on_date, index.rules_on(state_code, jurisdiction_keys(jurisdiction), on_date)
+            )
+            timings.append((time.perf_counter() - lookup_started) * 1e6)
+            if resolution is not None:
+                resolved += 1
+                complete += resolution['complete']
+        lookup_seconds = time.perf_counter() - started
+
+        buffer = io.BytesIO()
+        started = time.perf_counter()
+        index.write(buffer)
+        write_seconds = time.perf_counter() - started
+        buffer.seek(0)
+        started = time.perf_counter()
+        loaded = TaxRuleIndex.read(buffer)
+        read_seconds = time.perf_counter() - started
+        if len(loaded) != len(index):
+            raise CommandError('Snapshot round trip lost rules')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n=== TaxRule index: {len(index):,} rules, {len(index.series):,} series, {options['jurisdictions']:,} jurisdictions ==="
+        ))
+        self.stdout.write(f"  Build:    {build_seconds:.2f}s")
+        self.stdout.write(
+            f"  Lookup:   {len(queries):,} in {lookup_seconds:.2f}s ({len(queries) / lookup_seconds:,.0f}/s); "
+            f"p50 {percentile(timings, 0.5):.1f}us, p95 {percentile(timings, 0.95):.1f}us, p99 {percentile(timings, 0.99):.1f}us"
+        )
+        self.stdout.write(f"            {resolved:,} resolved, {complete:,} with a matching local rule")
+        self.stdout.write(
+            f"  Snapshot: {buffer.getbuffer().nbytes / 1024 / 1024:.2f} MB, write {write_seconds * 1000:.0f}ms, "
+            f"read {read_seconds * 1000:.0f}ms"
+        )
@@ -0,0 +1,66 @@
+"""
+Management command to build the offline BM25 index over RAG/state_data.
+
+The index is a single memory-mapped file (see taxright.bm25). Build it before
+deploying so it ships with the application package, then set
+kb_retrieval_source to 'bm25' to retrieve passages locally instead of from the
+Bedrock knowledge bases.
+
+Usage:
+    # Build from RAG/state_data to the configured kb_bm25_index_path
+    python manage.py build_bm25_index
+
+    # Build from another state_data directory to a specific file
+    python manage.py build_bm25_index --state-data /data/state_data --output /tmp/state_data_bm25.idx
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.bm25 import BM25Index, bm25_index_path, reset_bm25_index, write_bm25_index
+from taxright.state_data import MAX_CHUNK_WORDS, state_data_files
+
+
+class Command(BaseCommand):
+    help = 'Build the offline BM25 retrieval index from the RAG/state_data topic files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--state-data',
+            type=str,
+            default=None,
+            help='Directory of state topic files written by RAG/fileparser.py. Defaults to RAG/state_data.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Index file to write. Defaults to kb_bm25_index_path config.'
+        )
+        parser.add_argument('--k1', type=float, default=1.2, help='BM25 term frequency saturation')
+        parser.add_argument('--b', type=float, default=0.75, help='BM25 document length normalization')
+        parser.add_argument(
+            '--max-chunk-words',
+            type=int,
+            default=MAX_CHUNK_WORDS,
+            help='Topics longer than this are split into overlapping windows'
+        )
+
+    def handle(self, *args, **options):
+        if not state_data_files(options['state_data']):
+            raise CommandError('No state topic files found; nothing to index')
+        output = options['output'] or bm25_index_path()
+        started = time.perf_counter()
+        stats = write_bm25_index(
+            output, directory=options['state_data'], k1=options['k1'], b=options['b'],
+            max_chunk_words=options['max_chunk_words']
+        )
+        reset_bm25_index()
+
+        index = BM25Index(output)
+        index.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['chunks']:,} chunks from {stats['states']} states "
+            f"({stats['terms']:,} terms, {stats['postings']:,} postings) in {time.perf_counter() - started:.1f}s; "
+            f"wrote {stats['bytes'] / 1024 / 1024:.1f} MB to {output}"
+        ))
@@ -0,0 +1,73 @@
+"""
+Management command to build and save the near-duplicate line item index.
+
+The index is built from every line item verdict produced by a knowledge base
+query and saved to near_duplicate_index_path (default Django storage, i.e. S3 in
+production), where request handlers load it on cold start instead of
+rebuilding it from the database.
+
+Usage:
+    # Rebuild from the database and save to the configured location
+    python manage.py build_near_duplicate_index
+
+    # Save to a local file instead
+    python manage.py build_near_duplicate_index --output /tmp/near_duplicate_index.bin --local
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoice_ocr.config import ConfigManager
+from taxright.near_duplicates import NearDuplicateIndex, reset_near_duplicate_index, verified_line_item_rows
+
+
+class Command(BaseCommand):
+    help = 'Build the near-duplicate line item index from verified line items and save it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Storage name or path to save to. Defaults to near_duplicate_index_path config.'
+        )
+        parser.add_argument(
+            '--local',
+            action='store_true',
+            help='Write to a local file instead of the configured storage'
+        )
+        parser.add_argument(
+            '--num-perm',
+            type=int,
+            default=None,
+            help='MinHash signature length. Overrides near_duplicate_num_perm config.'
+        )
+        parser.add_argument(
+            '--bands',
+            type=int,
+            default=None,
+            help='LSH bands. Overrides near_duplicate_bands config.'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or ConfigManager.get_near_duplicate_index_path()
+        started = time.perf_counter()
+        index = NearDuplicateIndex.build(
+            verified_line_item_rows(),
+            num_perm=options['num_perm'] or ConfigManager.get_near_duplicate_num_perm(),
+            bands=options['bands'] or ConfigManager.get_near_duplicate_bands()
+        )
+        built = time.perf_counter()
+
+        if options['local']:
+            with open(output, 'wb') as index_file:
+                index.write(index_file)
+        else:
+            index.save(output)
+        reset_near_duplicate_index()
+
+        states = ', '.join(f'{state}={len(partition)}' for state, partition in sorted(index.partitions.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index)} verified line items ({states or "none"}) in {built - started:.1f}s; '
+            f'saved to {output} in {time.perf_counter() - built:.1f}s'
+        ))
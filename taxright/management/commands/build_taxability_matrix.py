@@ -0,0 +1,62 @@
+"""
+Management command to compile the taxability matrix from the SUT workbooks.
+
+The matrix (see taxright.taxability) maps workbook topics x states to
+taxable / exempt / conditional / no guidance / unresolved verdicts with their
+citations. It is compiled on first use when the file is missing; build it
+before deploying so workers load the JSON instead of parsing the workbooks.
+
+Usage:
+    # Compile RAG/SUT*.xlsx to the configured taxability_matrix_path
+    python manage.py build_taxability_matrix
+
+    # Compile another workbook directory to a specific file
+    python manage.py build_taxability_matrix --workbooks /data/sut --output /tmp/taxability_matrix.json
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.categories import CATEGORIES
+from taxright.taxability import (
+    TaxabilityMatrix, compile_taxability_matrix, reset_taxability_matrix, taxability_matrix_path
+)
+
+
+class Command(BaseCommand):
+    help = 'Compile the state-by-topic taxability matrix from the RAG/SUT*.xlsx workbooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workbooks',
+            type=str,
+            default=None,
+            help='Directory holding SUT*.xlsx. Defaults to RAG/.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Matrix file to write. Defaults to taxability_matrix_path config.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix = TaxabilityMatrix(compile_taxability_matrix(options['workbooks']))
+        if not matrix.sources:
+            raise CommandError('No SUT*.xlsx workbooks found; nothing to compile')
+        output = options['output'] or taxability_matrix_path()
+        matrix.save(output)
+        reset_taxability_matrix()
+
+        statuses = Counter(
+            verdict['status'] for verdicts in matrix.topics.values() for verdict in verdicts.values()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {len(matrix)} topics from {len(matrix.sources)} workbooks in {time.perf_counter() - started:.1f}s "
+            f"({', '.join(f'{count:,} {status}' for status, count in statuses.most_common())}); wrote {output}"
+        ))
+        missing = [category['slug'] for category in CATEGORIES if category['topic'] not in matrix.topics]
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Categories without a topic in the workbooks: {', '.join(missing)}"))
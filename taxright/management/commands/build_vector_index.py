@@ -0,0 +1,77 @@
+"""
+Management command to build or update the local vector index over RAG/state_data.
+
+Only files whose content changed since the last build are embedded again (see
+taxright.vector_index). Build it before deploying so it ships with the
+application package, then set kb_retrieval_source to 'vector' to retrieve
+passages locally.
+
+Usage:
+    # Update the configured kb_vector_index_dir with the configured embedder
+    python manage.py build_vector_index
+
+    # Rebuild from scratch with Titan embeddings (same model as the Bedrock KBs)
+    python manage.py build_vector_index --embedder titan --dimension 1024 --full
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.state_data import MAX_CHUNK_WORDS, state_data_files
+from taxright.vector_index import build_vector_index, get_embedder, reset_vector_index, vector_index_dir
+
+
+class Command(BaseCommand):
+    help = 'Build or incrementally update the local vector index from the RAG/state_data topic files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--state-data',
+            type=str,
+            default=None,
+            help='Directory of state topic files written by RAG/fileparser.py. Defaults to RAG/state_data.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Index directory. Defaults to kb_vector_index_dir config.'
+        )
+        parser.add_argument(
+            '--embedder',
+            type=str,
+            default=None,
+            help="'hashing', 'titan' or a dotted Embedder class path. Defaults to kb_vector_embedder config."
+        )
+        parser.add_argument(
+            '--dimension',
+            type=int,
+            default=None,
+            help='Embedding dimension. Defaults to kb_vector_dimension config.'
+        )
+        parser.add_argument(
+            '--max-chunk-words',
+            type=int,
+            default=MAX_CHUNK_WORDS,
+            help='Topics longer than this are split into overlapping windows'
+        )
+        parser.add_argument('--full', action='store_true', help='Re-embed every file, not only changed ones')
+
+    def handle(self, *args, **options):
+        if not state_data_files(options['state_data']):
+            raise CommandError('No state topic files found; nothing to index')
+        output = options['output'] or vector_index_dir()
+        embedder = get_embedder(options['embedder'], options['dimension'])
+        started = time.perf_counter()
+        stats = build_vector_index(
+            output, directory=options['state_data'], embedder=embedder,
+            max_chunk_words=options['max_chunk_words'], full=options['full']
+        )
+        reset_vector_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['chunks']:,} chunks from {stats['files']} files in {stats['states']} states "
+            f"with {embedder.fingerprint} in {time.perf_counter() - started:.1f}s: "
+            f"{stats['embedded_files']} files ({stats['embedded_chunks']:,} chunks) embedded, "
+            f"{stats['reused_files']} unchanged; wrote {stats['bytes'] / 1024 / 1024:.1f} MB to {output}"
+        ))
@@ -0,0 +1,248 @@
+"""
+Management command to load-test the upload_invoice -> verify_invoice_taxes pipeline.
+
+Each simulated request posts a PDF to the upload view through the Django test
+client, so OCR, invoice persistence and the auto-triggered tax verification run
+exactly as in production. Requests run on a pool of workers that stands in for
+concurrent Lambda executions. By default the fake LLM backend is used for the
+duration of the run (see invoice_ocr.fake_backend for its latency, throttle and
+truncation settings), so no Bedrock calls are made.
+
+Usage:
+    # 1,000 invoices with 50 concurrent executions against the fake backend
+    python manage.py load_test_pipeline --invoices 1000 --concurrency 50
+
+    # Estimate Lambda concurrency for 100x a current volume of 30 invoices/minute
+    python manage.py load_test_pipeline --invoices 500 --concurrency 40 --target-rate 3000
+
+    # Create fake knowledge base mappings so every generated state is verified
+    python manage.py load_test_pipeline --create-kb-mappings
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import reverse
+from pypdf import PdfWriter
+
+from invoice_ocr.backends import get_backend, reset_backends
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.models import ProcessingConfig
+from taxright.models import Invoice, LineItemTaxVerification, StateKnowledgeBase
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook that counts queries and their wall time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Load-test upload_invoice -> verify_invoice_taxes with simulated concurrent Lambda executions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--invoices',
+            type=int,
+            default=100,
+            help='Number of invoices to upload'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Concurrent requests (simulated Lambda executions)'
+        )
+        parser.add_argument(
+            '--backend',
+            type=str,
+            default='fake',
+            help="LLM backend to use for the run ('fake' by default; 'bedrock' makes live, billed calls)"
+        )
+        parser.add_argument(
+            '--target-rate',
+            type=float,
+            default=None,
+            help='Invoices per minute to size Lambda concurrency for (e.g. 100x current volume)'
+        )
+        parser.add_argument(
+            '--pdf',
+            type=str,
+            default=None,
+            help='PDF to upload (defaults to a generated one-page PDF; the fake backend ignores content)'
+        )
+        parser.add_argument(
+            '--username',
+            type=str,
+            default='loadtest',
+            help='User the requests are made as (created if missing)'
+        )
+        parser.add_argument(
+            '--create-kb-mappings',
+            action='store_true',
+            help='Create placeholder StateKnowledgeBase mappings for the fake backend states that have none'
+        )
+
+    def handle(self, *args, **options):
+        if options['invoices'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--invoices and --concurrency must be at least 1')
+
+        pdf_bytes = self._load_pdf(options['pdf'])
+        user, _ = get_user_model().objects.get_or_create(username=options['username'])
+
+        previous_backend = ConfigManager.get_config('llm_backend', None)
+        ConfigManager.set_config('llm_backend', options['backend'])
+        reset_backends()
+        try:
+            backend = get_backend()
+            if options['create_kb_mappings']:
+                self._create_kb_mappings(getattr(backend, 'state_codes', []))
+            results = self._run(pdf_bytes, user, options['invoices'], options['concurrency'])
+        finally:
+            if previous_backend is None:
+                ProcessingConfig.objects.filter(key='llm_backend').delete()
+            else:
+                ConfigManager.set_config('llm_backend', previous_backend)
+            reset_backends()
+
+        self._report(results, backend, options)
+
+    def _load_pdf(self, path):
+        if path:
+            if not os.path.isfile(path):
+                raise CommandError(f'PDF file not found: {path}')
+            with open(path, 'rb') as pdf_file:
+                return pdf_file.read()
+        with tempfile.TemporaryFile() as buffer:
+            writer = PdfWriter()
+            writer.add_blank_page(width=612, height=792)
+            writer.write(buffer)
+            buffer.seek(0)
+            return buffer.read()
+
+    def _create_kb_mappings(self, state_codes):
+        for state_code in state_codes:
+            _, created = StateKnowledgeBase.objects.get_or_create(
+                state_code=state_code,
+                defaults={'knowledge_base_id': f'FAKE{state_code}', 'knowledge_base_name': f'Load test KB ({state_code})'}
+            )
+            if created:
+                self.stdout.write(f'  Created placeholder knowledge base mapping for {state_code}')
+
+    def _run(self, pdf_bytes, user, invoice_count, concurrency):
+        upload_url = reverse('taxright:upload')
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'peak': 0}
+        local = threading.local()
+
+        def upload(index):
+            # One logged-in client per worker thread, like a warm Lambda container
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            counter = QueryCounter()
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(counter):
+                    response = local.client.post(upload_url, {
+                        'pdf_file': SimpleUploadedFile(f'loadtest-{index}.pdf', pdf_bytes, content_type='application/pdf')
+                    })
+                ok = response.status_code == 302 and '/invoice/' in response.get('Location', '')
+                error = None if ok else f'HTTP {response.status_code}'
+            except Exception as e:
+                ok, error = False, str(e)
+            finally:
+                with lock:
+                    state['in_flight'] -= 1
+                close_old_connections()
+            return {
+                'ok': ok,
+                'error': error,
+                'seconds': time.perf_counter() - start,
+                'queries': counter.count,
+                'query_seconds': counter.seconds,
+            }
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n=== Uploading {invoice_count} invoices with concurrency {concurrency} ==='
+        ))
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(upload, range(invoice_count)))
+        return {
+            'requests': results,
+            'elapsed': time.perf_counter() - started_at,
+            'peak_in_flight': state['peak'],
+        }
+
+    def _report(self, results, backend, options):
+        requests = results['requests']
+        elapsed = results['elapsed']
+        latencies = [item['seconds'] for item in requests]
+        succeeded = [item for item in requests if item['ok']]
+        failed = [item for item in requests if not item['ok']]
+        total_queries = sum(item['queries'] for item in requests)
+        query_seconds = sum(item['query_seconds'] for item in requests)
+        mean_latency = sum(latencies) / len(latencies)
+        throughput = len(succeeded) / elapsed * 60 if elapsed else 0.0
+
+        self.stdout.write(self.style.SUCCESS('\n=== Results ==='))
+        self.stdout.write(f'  Succeeded: {len(succeeded)}, Failed: {len(failed)}, Wall time: {elapsed:.2f}s')
+        self.stdout.write(f'  Throughput: {throughput:.1f} invoices/minute')
+        self.stdout.write(
+            f'  Latency (upload + verification): mean {mean_latency:.2f}s, p50 {percentile(latencies, 0.5):.2f}s, '
+            f'p95 {percentile(latencies, 0.95):.2f}s, p99 {percentile(latencies, 0.99):.2f}s, max {max(latencies):.2f}s'
+        )
+        self.stdout.write(
+            f'  DB: {total_queries} queries ({total_queries / len(requests):.1f}/invoice, '
+            f'{total_queries / elapsed:.1f}/s), {query_seconds:.2f}s in queries'
+        )
+        self.stdout.write(f'  Peak concurrent executions: {results["peak_in_flight"]}')
+        if options['target_rate']:
+            # Little's law: executions in flight = arrival rate x time per execution
+            needed = options['target_rate'] / 60 * mean_latency
+            self.stdout.write(
+                f'  Lambda concurrency needed for {options["target_rate"]:.0f} invoices/minute: ~{needed:.1f}'
+            )
+        self.stdout.write(
+            f'  Invoices completed: {Invoice.objects.filter(status="completed").count()}, '
+            f'line item verifications: {LineItemTaxVerification.objects.count()} (all runs)'
+        )
+        stats = getattr(backend, 'stats', None)
+        if stats:
+            self.stdout.write(self.style.SUCCESS('\n=== Backend calls ==='))
+            for operation, values in sorted(stats().items()):
+                self.stdout.write(
+                    f"  {operation}: {values['calls']} calls, {values['throttled']} throttled, "
+                    f"{values['truncated']} truncated, {values['latency_seconds']:.1f}s simulated latency"
+                )
+        for item in failed[:10]:
+            self.stdout.write(self.style.ERROR(f"  [FAILED] {item['error']}"))
@@ -0,0 +1,120 @@
+"""
+Management command to recompute the expected and actual tax of stored determinations.
+
+Re-runs the expected-tax calculation (taxright.tax_math) over invoices that
+already have a TaxDetermination, using each line item's latest stored
+verification, without any Bedrock calls. Invoices are evaluated in batches as
+one vectorized computation each, and only determinations whose amounts changed
+are written. Use it after a change to the tax math or to line item data.
+
+Usage:
+    # Recompute every determination
+    python manage.py recompute_tax_determinations
+
+    # Report what would change without writing
+    python manage.py recompute_tax_determinations --dry-run
+
+    # Specific invoices
+    python manage.py recompute_tax_determinations --invoice-ids 12 15 18
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from taxright.models import InvoiceLineItem, LineItemTaxVerification, TaxDetermination
+from taxright.tax_math import InvoiceBatch, compute_expected_taxes, from_cents
+
+
+def clamp_rate(rate):
+    """Clamp a stored rate to [0, 1], as BedrockKnowledgeBaseService._validate_tax_rate does."""
+    return None if rate is None else min(max(rate, Decimal('0.0000')), Decimal('1.0000'))
+
+
+def latest_verifications(line_item_ids):
+    """
+    Get the latest verification of each line item.
+
+    Returns:
+        dict: line_item_id -> (expected_tax_rate, verification source)
+    """
+    latest = {}
+    rows = LineItemTaxVerification.objects.filter(line_item_id__in=line_item_ids).order_by(
+        'line_item_id', '-verified_at', '-id'
+    ).values_list('line_item_id', 'expected_tax_rate', 'verification_details__source')
+    for line_item_id, expected_rate, source in rows:
+        latest.setdefault(line_item_id, (expected_rate, source))
+    return latest
+
+
+class Command(BaseCommand):
+    help = 'Recompute expected and actual tax of existing tax determinations from stored verifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoice-ids', type=int, nargs='+', default=None, help='Only recompute these invoices')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Invoices evaluated per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        determinations = TaxDetermination.objects.select_related('invoice').order_by('invoice_id')
+        if options['invoice_ids']:
+            determinations = determinations.filter(invoice_id__in=options['invoice_ids'])
+
+        started = time.perf_counter()
+        checked = changed = 0
+        determination_ids = list(determinations.values_list('id', flat=True))
+        for start in range(0, len(determination_ids), options['batch_size']):
+            batch_determinations = list(determinations.filter(id__in=determination_ids[start:start + options['batch_size']]))
+            updates = self._recompute(batch_determinations)
+            checked += len(batch_determinations)
+            changed += len(updates)
+            for determination, old_expected, old_actual in updates:
+                self.stdout.write(
+                    f"  {determination.invoice.invoice_number}: expected {old_expected} -> {determination.expected_tax}, "
+                    f"actual {old_actual} -> {determination.actual_tax}"
+                )
+            if updates and not options['dry_run']:
+                with transaction.atomic():
+                    TaxDetermination.objects.bulk_update(
+                        [update[0] for update in updates], ['expected_tax', 'actual_tax', 'discrepancy_amount']
+                    )
+
+        action = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {changed:,} of {checked:,} determinations in {time.perf_counter() - started:.2f}s"
+        ))
+
+    def _recompute(self, determinations):
+        """Recompute a batch of determinations in memory, returning (determination, old expected, old actual) for changed ones."""
+        items_by_invoice = {determination.invoice_id: [] for determination in determinations}
+        rows = InvoiceLineItem.objects.filter(invoice_id__in=list(items_by_invoice)).order_by('invoice_id', 'id').values_list(
+            'id', 'invoice_id', 'line_total', 'tax_amount', 'tax_rate', 'tax_status'
+        )
+        for row in rows:
+            items_by_invoice[row[1]].append(row)
+        verifications = latest_verifications([row[0] for items in items_by_invoice.values() for row in items])
+
+        batch = InvoiceBatch()
+        for determination in determinations:
+            items = []
+            for line_item_id, _, line_total, tax_amount, tax_rate, tax_status in items_by_invoice[determination.invoice_id]:
+                expected_rate, source = verifications.get(line_item_id, (None, None))
+                exempt = source == 'taxability_matrix' and expected_rate is not None and not expected_rate
+                items.append((line_total, tax_amount, clamp_rate(tax_rate), clamp_rate(expected_rate), tax_status == 'taxable', exempt))
+            invoice = determination.invoice
+            batch.add_invoice(invoice.total_amount, invoice.invoice_discount_amount, invoice.total_tax_amount, items)
+        results = compute_expected_taxes(batch.arrays())
+
+        updates = []
+        for determination, expected_cents, actual_cents in zip(determinations, results['expected_tax'], results['actual_tax']):
+            expected_tax, actual_tax = from_cents(expected_cents), from_cents(actual_cents)
+            if expected_tax == determination.expected_tax and actual_tax == determination.actual_tax:
+                continue
+            updates.append((determination, determination.expected_tax, determination.actual_tax))
+            determination.expected_tax = expected_tax
+            determination.actual_tax = actual_tax
+            determination.discrepancy_amount = actual_tax - expected_tax
+        return updates
@@ -0,0 +1,48 @@
+"""
+Management command to write the TaxRule index snapshot.
+
+The snapshot (see taxright.rule_index) lets a cold Lambda container load every
+tax rule from one small file instead of the database. Write it before
+deploying so it ships with the application package; a snapshot whose
+fingerprint no longer matches the TaxRule table is ignored and the rules are
+loaded from the database instead.
+
+Usage:
+    # Write to the configured tax_rule_snapshot_path
+    python manage.py snapshot_tax_rules
+
+    # Write to a specific file
+    python manage.py snapshot_tax_rules --output /tmp/tax_rules.snapshot
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from taxright.rule_index import TaxRuleIndex, reset_tax_rule_index, rules_fingerprint, snapshot_path, tax_rule_rows
+
+
+class Command(BaseCommand):
+    help = 'Build the in-memory TaxRule index from the database and save it as a snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Snapshot file to write. Defaults to tax_rule_snapshot_path config.'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or snapshot_path()
+        if not output:
+            raise CommandError('tax_rule_snapshot_path is blank; pass --output')
+        started = time.perf_counter()
+        index = TaxRuleIndex.build(tax_rule_rows(), rules_fingerprint())
+        index.save(output)
+        reset_tax_rule_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {len(index):,} tax rules in {len(index.series):,} series to {output} "
+            f"({os.path.getsize(output) / 1024:.1f} KB) in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxright', '0009_invoice_invoice_discount_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerificationCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of the combined cache key components', max_length=64, unique=True)),
+                ('state_code', models.CharField(db_index=True, help_text='US state code (e.g., CA, NY)', max_length=2)),
+                ('jurisdiction', models.CharField(blank=True, max_length=255)),
+                ('normalized_description', models.TextField(help_text='Lowercased line item description with punctuation and spacing collapsed')),
+                ('tax_status', models.CharField(max_length=20)),
+                ('rate_bucket', models.DecimalField(decimal_places=4, help_text='Applied tax rate rounded to the cache rate bucket (as decimal)', max_digits=5)),
+                ('knowledge_base_id', models.CharField(help_text='AWS Bedrock Knowledge Base ID that produced the verdict', max_length=255)),
+                ('is_correct', models.BooleanField()),
+                ('expected_tax_rate', models.DecimalField(decimal_places=4, max_digits=5)),
+                ('confidence_score', models.DecimalField(decimal_places=2, max_digits=3)),
+                ('reasoning', models.TextField()),
+                ('citations', models.JSONField(blank=True, default=list, help_text='KB citations of the original verification')),
+                ('source_line_item_id', models.BigIntegerField(blank=True, help_text='Line item whose KB verification was cached', null=True)),
+                ('hit_count', models.IntegerField(default=0, help_text='Number of times this entry was served from cache')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_accessed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['state_code', 'knowledge_base_id'], name='taxright_ve_state_c_d23674_idx')],
+            },
+        ),
+    ]
@@ -114,12 +114,20 @@ class Invoice(models.Model):
     def __str__(self):
         return f"{self.invoice_number} - {self.vendor_name} ({self.date})"
     
-    def recalculate_total_llm_cost(self):
-        """Recalculate total_llm_cost from OCR cost + sum of all line item KB costs"""
+    def recalculate_total_llm_cost(self, line_items=None):
+        """
+        Recalculate total_llm_cost from OCR cost + sum of all line item KB costs.
+        
+        Args:
+            line_items: The invoice's line items if already loaded (summed in memory instead of aggregated)
+        """
         from django.db.models import Sum
-        line_items_total = self.line_items.aggregate(
-            total=Sum('kb_total_cost')
-        )['total'] or Decimal('0.00')
+        if line_items is not None:
+            line_items_total = sum((line_item.kb_total_cost or Decimal('0.00') for line_item in line_items), Decimal('0.00'))
+        else:
+            line_items_total = self.line_items.aggregate(
+                total=Sum('kb_total_cost')
+            )['total'] or Decimal('0.00')
         self.total_llm_cost = self.ocr_total_cost + line_items_total
         self.save(update_fields=['total_llm_cost', 'updated_at'])
 
@@ -270,7 +278,7 @@ class TaxDetermination(models.Model):
 
 
 class TaxRule(models.Model):
-    """Tax rules by state/jurisdiction (for future use)"""
+    """Effective-dated tax rates by state/jurisdiction, combined by the rate engine (taxright.rate_engine)"""
     
     RULE_TYPE_CHOICES = [
         ('state', 'State'),
@@ -371,3 +379,37 @@ class LineItemTaxVerification(models.Model):
         status = "Correct" if self.is_correct else "Incorrect"
         return f"Verification for {self.line_item.description[:30]}... - {status} ({self.confidence_score})"
 
+
+
+class VerificationCacheEntry(models.Model):
+    """Cached KB verdict keyed on normalized line item facts (state, jurisdiction, description, status, rate, KB)"""
+    
+    cache_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the combined cache key components")
+    state_code = models.CharField(max_length=2, db_index=True, help_text="US state code (e.g., CA, NY)")
+    jurisdiction = models.CharField(max_length=255, blank=True)
+    normalized_description = models.TextField(help_text="Lowercased line item description with punctuation and spacing collapsed")
+    tax_status = models.CharField(max_length=20)
+    rate_bucket = models.DecimalField(
+        max_digits=5,
+        decimal_places=4,
+        help_text="Applied tax rate rounded to the cache rate bucket (as decimal)"
+    )
+    knowledge_base_id = models.CharField(max_length=255, help_text="AWS Bedrock Knowledge Base ID that produced the verdict")
+    is_correct = models.BooleanField()
+    expected_tax_rate = models.DecimalField(max_digits=5, decimal_places=4)
+    confidence_score = models.DecimalField(max_digits=3, decimal_places=2)
+    reasoning = models.TextField()
+    citations = models.JSONField(default=list, blank=True, help_text="KB citations of the original verification")
+    source_line_item_id = models.BigIntegerField(null=True, blank=True, help_text="Line item whose KB verification was cached")
+    hit_count = models.IntegerField(default=0, help_text="Number of times this entry was served from cache")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_accessed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['state_code', 'knowledge_base_id']),
+        ]
+    
+    def __str__(self):
+        return f"VerificationCacheEntry {self.state_code} - {self.normalized_description[:30]} @ {self.rate_bucket}"
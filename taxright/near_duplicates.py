@@ -0,0 +1,539 @@
+"""
+Near-duplicate line item index (MinHash / LSH) for reusing prior verifications.
+
+Exact-match caching (taxright.cache) misses spelling variants of the same
+item, e.g. "Dover White Paint 5GAL" vs "dover white paint 5 gal". This index
+holds a MinHash signature of every KB-verified line item description,
+partitioned by state, and finds previously verified items whose estimated
+Jaccard similarity is above a threshold.
+
+- Descriptions are shingled into words and character 3-grams, with letter/digit
+  runs split apart ("5GAL" -> "5 gal").
+- Signatures are num_perm 32-bit MinHash values. Locality-sensitive hashing
+  splits them into bands; the tax status and applied rate are mixed into every
+  band key, so only items that share both can ever be candidates.
+- Each band keeps its keys in row order plus a sorted permutation that is
+  searched with bisect. Rows added since the last compaction live in a small
+  dict, so adds are O(bands) and compaction (a sort per band) is amortized.
+- The whole index serializes to a compact binary blob that can be written to
+  a file or any Django storage (S3 in production) and loaded on cold start.
+
+Memory is roughly num_perm * 4 + bands * 12 bytes per item (about 450 MB per
+million items with the defaults).
+"""
+import hashlib
+import io
+import json
+import logging
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from invoice_ocr.config import ConfigManager
+from taxright.cache import normalize_description
+from taxright.tax_math import to_bps
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MAGIC = b'TRNDIDX1'
+MAX_HASH = (1 << 32) - 1
+EMPTY_SIGNATURE_VALUE = MAX_HASH
+
+_ALPHA_DIGIT_BOUNDARY = re.compile(r'(?<=[a-z])(?=[0-9])|(?<=[0-9])(?=[a-z])')
+
+
+def shingles(description: str) -> set:
+    """
+    Shingle a description into words and padded character 3-grams.
+
+    Args:
+        description: Raw line item description
+
+    Returns:
+        set: Shingle strings (empty for a blank description)
+    """
+    words = _ALPHA_DIGIT_BOUNDARY.sub(' ', normalize_description(description)).split()
+    result = set(words)
+    for word in words:
+        padded = f" {word} "
+        result.update(padded[idx:idx + 3] for idx in range(len(padded) - 2))
+    return result
+
+
+class MinHasher:
+    """
+    Seeded MinHash over description shingles.
+
+    Each shingle is hashed once into num_perm independent 32-bit values (keyed
+    BLAKE2b, 16 values per digest); a signature is the column-wise minimum over
+    the description's shingles. Shingle values are memoized, since the 3-gram
+    vocabulary of invoice descriptions is small.
+    """
+
+    CACHE_LIMIT = 500000
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        """
+        Initialize hasher.
+
+        Args:
+            num_perm: Signature length
+            seed: Hash key seed (must match to compare signatures)
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        self._keys = [
+            hashlib.blake2b(f"minhash:{seed}:{block}".encode('utf-8'), digest_size=16).digest()
+            for block in range((num_perm + 15) // 16)
+        ]
+        self._cache: Dict[str, tuple] = {}
+
+    def _shingle_values(self, shingle: str) -> tuple:
+        values = self._cache.get(shingle)
+        if values is None:
+            data = shingle.encode('utf-8')
+            digest = array('I')
+            for key in self._keys:
+                digest.frombytes(hashlib.blake2b(data, digest_size=64, key=key).digest())
+            values = tuple(digest[:self.num_perm])
+            if len(self._cache) >= self.CACHE_LIMIT:
+                self._cache.clear()
+            self._cache[shingle] = values
+        return values
+
+    def signature(self, description: str) -> array:
+        """
+        Compute the MinHash signature of a description.
+
+        Args:
+            description: Raw line item description
+
+        Returns:
+            array('I'): num_perm values (all EMPTY_SIGNATURE_VALUE for a blank description)
+        """
+        columns = [self._shingle_values(shingle) for shingle in shingles(description)]
+        if not columns:
+            return array('I', [EMPTY_SIGNATURE_VALUE] * self.num_perm)
+        return array('I', map(min, zip(*columns)))
+
+
+class _StatePartition:
+    """Signatures, verdict references and LSH bands for one state."""
+
+    def __init__(self, num_perm: int, bands: int):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.signatures = array('I')
+        self.verification_ids = array('q')
+        self.line_item_ids = array('q')
+        self.rate_bps = array('i')
+        self.tax_statuses: List[str] = []
+        self.band_keys = [array('Q') for _ in range(bands)]
+        self.sorted_rows = [array('I') for _ in range(bands)]
+        self.pending: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self.rows_by_line_item: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.verification_ids)
+
+    def compute_band_keys(self, signature: array, tax_status: str, rate_bps: int) -> List[int]:
+        prefix = f"{tax_status}|{rate_bps}|".encode('utf-8')
+        keys = []
+        for band in range(self.bands):
+            start = band * self.rows_per_band
+            data = prefix + struct.pack('<I', band) + signature[start:start + self.rows_per_band].tobytes()
+            keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little'))
+        return keys
+
+    def add(self, signature: array, verification_id: int, line_item_id: int, tax_status: str, rate_bps: int):
+        previous = self.rows_by_line_item.get(line_item_id)
+        if previous is not None:
+            # Tombstone the superseded verdict; rows are never renumbered
+            self.verification_ids[previous] = -1
+        row = len(self.verification_ids)
+        self.signatures.extend(signature)
+        self.verification_ids.append(verification_id)
+        self.line_item_ids.append(line_item_id)
+        self.rate_bps.append(rate_bps)
+        self.tax_statuses.append(tax_status)
+        self.rows_by_line_item[line_item_id] = row
+        for band, key in enumerate(self.compute_band_keys(signature, tax_status, rate_bps)):
+            self.band_keys[band].append(key)
+            self.pending[band].setdefault(key, []).append(row)
+
+    def pending_count(self) -> int:
+        return len(self.verification_ids) - len(self.sorted_rows[0]) if self.bands else 0
+
+    def compact(self):
+        """Fold pending rows into the sorted band permutations."""
+        if not self.pending_count():
+            return
+        for band in range(self.bands):
+            keys = self.band_keys[band]
+            self.sorted_rows[band] = array('I', sorted(range(len(keys)), key=keys.__getitem__))
+            self.pending[band] = {}
+
+    def candidates(self, band_keys: List[int], limit: int) -> List[int]:
+        """Rows sharing at least one band with the query, most shared bands first, at most limit."""
+        counts = Counter()
+        for band, key in enumerate(band_keys):
+            keys = self.band_keys[band]
+            sorted_rows = self.sorted_rows[band]
+            start = bisect_left(sorted_rows, key, key=keys.__getitem__)
+            end = bisect_right(sorted_rows, key, lo=start, key=keys.__getitem__)
+            # Within a bucket rows are in insertion order; very common buckets keep only the newest
+            counts.update(sorted_rows[max(start, end - limit):end])
+            counts.update(self.pending[band].get(key, ())[-limit:])
+        return [row for row, _ in counts.most_common(limit)]
+
+    def similarity(self, signature: array, row: int) -> float:
+        start = row * self.num_perm
+        stored = self.signatures[start:start + self.num_perm]
+        return sum(1 for left, right in zip(signature, stored) if left == right) / self.num_perm
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of verified line item descriptions, partitioned by state."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1, max_candidates: int = 200):
+        """
+        Initialize an empty index.
+
+        Args:
+            num_perm: MinHash signature length
+            bands: LSH bands (must divide num_perm; more bands find lower similarities)
+            seed: MinHash hash key seed
+            max_candidates: Most band-sharing rows whose signatures are compared per lookup
+
+        Raises:
+            ValueError: If bands does not divide num_perm
+        """
+        if bands < 1 or num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, seed)
+        self.partitions: Dict[str, _StatePartition] = {}
+        self.max_verification_id = 0
+        self.max_candidates = max_candidates
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return sum(len(partition) for partition in self.partitions.values())
+
+    def add(self, state_code: str, description: str, tax_status: str, tax_rate: Any,
+            verification_id: int, line_item_id: int, signature: Optional[array] = None):
+        """
+        Add (or replace) a verified line item.
+
+        Args:
+            state_code: Invoice state code
+            description: Line item description
+            tax_status: Line item tax status
+            tax_rate: Applied tax rate as decimal
+            verification_id: LineItemTaxVerification ID whose verdict can be reused
+            line_item_id: InvoiceLineItem ID (a later add for the same item replaces it)
+            signature: Precomputed MinHash signature (computed from description if omitted)
+        """
+        signature = signature if signature is not None else self.hasher.signature(description)
+        with self._lock:
+            partition = self.partitions.get(state_code.upper())
+            if partition is None:
+                partition = self.partitions[state_code.upper()] = _StatePartition(self.num_perm, self.bands)
+            partition.add(signature, verification_id, line_item_id, tax_status, to_bps(tax_rate))
+            self.max_verification_id = max(self.max_verification_id, verification_id)
+            if partition.pending_count() > max(10000, len(partition) // 10):
+                partition.compact()
+
+    def lookup(self, state_code: str, description: str, tax_status: str, tax_rate: Any,
+               threshold: float, exclude_line_item_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar verified line item in the same state with the same tax status and rate.
+
+        Args:
+            state_code: Invoice state code
+            description: Line item description
+            tax_status: Line item tax status
+            tax_rate: Applied tax rate as decimal
+            threshold: Minimum estimated Jaccard similarity (0-1)
+            exclude_line_item_id: Line item to ignore (the item being verified)
+
+        Returns:
+            dict with 'verification_id', 'line_item_id' and 'similarity', or None
+        """
+        partition = self.partitions.get((state_code or '').upper())
+        if partition is None or not shingles(description):
+            return None
+        signature = self.hasher.signature(description)
+        rate_bps = to_bps(tax_rate)
+        with self._lock:
+            best = None
+            band_keys = partition.compute_band_keys(signature, tax_status, rate_bps)
+            for row in partition.candidates(band_keys, self.max_candidates):
+                verification_id = partition.verification_ids[row]
+                if verification_id < 0 or partition.line_item_ids[row] == exclude_line_item_id:
+                    continue
+                if partition.tax_statuses[row] != tax_status or partition.rate_bps[row] != rate_bps:
+                    continue
+                similarity = partition.similarity(signature, row)
+                # Ties go to the most recent verdict
+                if similarity >= threshold and (best is None or similarity >= best['similarity']):
+                    best = {
+                        'verification_id': verification_id,
+                        'line_item_id': partition.line_item_ids[row],
+                        'similarity': round(similarity, 4),
+                    }
+            return best
+
+    def compact(self):
+        """Fold all pending rows into the sorted band indexes (done automatically as the index grows)."""
+        with self._lock:
+            for partition in self.partitions.values():
+                partition.compact()
+
+    def write(self, stream):
+        """
+        Serialize the index to a binary stream.
+
+        Args:
+            stream: Writable binary file object
+        """
+        with self._lock:
+            self.compact()
+            header = {
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                'seed': self.hasher.seed,
+                'max_verification_id': self.max_verification_id,
+                'states': {state: len(partition) for state, partition in self.partitions.items()},
+            }
+            header_bytes = json.dumps(header).encode('utf-8')
+            stream.write(FORMAT_MAGIC)
+            stream.write(struct.pack('<I', len(header_bytes)))
+            stream.write(header_bytes)
+            for state in header['states']:
+                partition = self.partitions[state]
+                statuses = '\n'.join(partition.tax_statuses).encode('utf-8')
+                stream.write(struct.pack('<Q', len(statuses)))
+                stream.write(statuses)
+                for values in (partition.signatures, partition.verification_ids, partition.line_item_ids, partition.rate_bps):
+                    stream.write(values.tobytes())
+                for band in range(self.bands):
+                    stream.write(partition.band_keys[band].tobytes())
+                    stream.write(partition.sorted_rows[band].tobytes())
+
+    @classmethod
+    def read(cls, stream) -> 'NearDuplicateIndex':
+        """
+        Load an index written by write().
+
+        Args:
+            stream: Readable binary file object
+
+        Returns:
+            NearDuplicateIndex
+
+        Raises:
+            ValueError: If the stream is not a serialized index
+        """
+        if stream.read(len(FORMAT_MAGIC)) != FORMAT_MAGIC:
+            raise ValueError("Not a near-duplicate index file")
+        header_length, = struct.unpack('<I', stream.read(4))
+        header = json.loads(stream.read(header_length).decode('utf-8'))
+        index = cls(num_perm=header['num_perm'], bands=header['bands'], seed=header['seed'])
+        index.max_verification_id = header.get('max_verification_id', 0)
+
+        def read_array(typecode, count):
+            values = array(typecode)
+            values.frombytes(stream.read(count * values.itemsize))
+            return values
+
+        for state, count in header['states'].items():
+            partition = _StatePartition(index.num_perm, index.bands)
+            statuses_length, = struct.unpack('<Q', stream.read(8))
+            statuses = stream.read(statuses_length).decode('utf-8')
+            partition.tax_statuses = statuses.split('\n') if count else []
+            partition.signatures = read_array('I', count * index.num_perm)
+            partition.verification_ids = read_array('q', count)
+            partition.line_item_ids = read_array('q', count)
+            partition.rate_bps = read_array('i', count)
+            for band in range(index.bands):
+                partition.band_keys[band] = read_array('Q', count)
+                partition.sorted_rows[band] = read_array('I', count)
+            partition.rows_by_line_item = {
+                line_item_id: row for row, line_item_id in enumerate(partition.line_item_ids)
+                if partition.verification_ids[row] >= 0
+            }
+            index.partitions[state] = partition
+        return index
+
+    def save(self, name: str, storage=None):
+        """
+        Save the index to a Django storage (S3 in production) or a local path.
+
+        Args:
+            name: Storage name, or a filesystem path when storage is None and
+                near_duplicate_index_storage is 'local'
+            storage: Django storage (defaults to the configured index storage)
+        """
+        buffer = io.BytesIO()
+        self.write(buffer)
+        buffer.seek(0)
+        storage = storage or _index_storage()
+        if storage is None:
+            with open(name, 'wb') as index_file:
+                index_file.write(buffer.getvalue())
+            return
+        from django.core.files.base import ContentFile
+        # S3 storage is configured with file_overwrite=False, so replace explicitly
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+    @classmethod
+    def load(cls, name: str, storage=None) -> Optional['NearDuplicateIndex']:
+        """
+        Load an index saved with save().
+
+        Args:
+            name: Storage name or local path
+            storage: Django storage (defaults to the configured index storage)
+
+        Returns:
+            NearDuplicateIndex, or None if nothing has been saved under name
+        """
+        import os
+        storage = storage or _index_storage()
+        if storage is None:
+            if not os.path.exists(name):
+                return None
+            with open(name, 'rb') as index_file:
+                return cls.read(io.BytesIO(index_file.read()))
+        if not storage.exists(name):
+            return None
+        with storage.open(name, 'rb') as index_file:
+            return cls.read(io.BytesIO(index_file.read()))
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]], num_perm: int = 64, bands: int = 16,
+              seed: int = 1) -> 'NearDuplicateIndex':
+        """
+        Build an index from verified line item rows.
+
+        Args:
+            rows: Dicts with state_code, description, tax_status, tax_rate,
+                verification_id and line_item_id
+            num_perm: MinHash signature length
+            bands: LSH bands
+            seed: MinHash hash key seed
+
+        Returns:
+            NearDuplicateIndex
+        """
+        index = cls(num_perm=num_perm, bands=bands, seed=seed)
+        for row in rows:
+            index.add(
+                row['state_code'], row['description'], row['tax_status'], row['tax_rate'],
+                row['verification_id'], row['line_item_id']
+            )
+        index.compact()
+        return index
+
+
+def _index_storage():
+    """Django storage for the serialized index, or None for plain local files."""
+    if ConfigManager.get_near_duplicate_index_storage() == 'local':
+        return None
+    from django.core.files.storage import default_storage
+    return default_storage
+
+
+def verified_line_item_rows(queryset=None):
+    """
+    Yield index rows for line items verified by a knowledge base query.
+
+    Verdicts that were themselves reused (cache, near-duplicate) or that failed are skipped.
+
+    Args:
+        queryset: LineItemTaxVerification queryset (defaults to all)
+
+    Yields:
+        dict: Row for NearDuplicateIndex.add()/build()
+    """
+    from taxright.models import LineItemTaxVerification
+    queryset = queryset if queryset is not None else LineItemTaxVerification.objects.all()
+    for verification in queryset.select_related('line_item__invoice').order_by('verified_at', 'id').iterator():
+        details = verification.verification_details or {}
+        if details.get('error') or details.get('source', 'knowledge_base') != 'knowledge_base':
+            continue
+        line_item = verification.line_item
+        yield {
+            'state_code': line_item.invoice.state_code,
+            'description': line_item.description,
+            'tax_status': line_item.tax_status,
+            'tax_rate': line_item.tax_rate,
+            'verification_id': verification.id,
+            'line_item_id': line_item.id,
+        }
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """
+    Get the process-wide index, loading it on first use.
+
+    The saved index (near_duplicate_index_path) is loaded if present and caught up
+    with verifications made since it was saved; otherwise the index is built from
+    the verified line items in the database.
+
+    Returns:
+        NearDuplicateIndex
+    """
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            started = time.perf_counter()
+            path = ConfigManager.get_near_duplicate_index_path()
+            try:
+                index = NearDuplicateIndex.load(path)
+            except Exception as e:
+                logger.error(f"Failed to load near-duplicate index from {path}: {str(e)}")
+                index = None
+            if index is None:
+                index = NearDuplicateIndex.build(
+                    verified_line_item_rows(),
+                    num_perm=ConfigManager.get_near_duplicate_num_perm(),
+                    bands=ConfigManager.get_near_duplicate_bands()
+                )
+                source = 'database'
+            else:
+                from taxright.models import LineItemTaxVerification
+                for row in verified_line_item_rows(
+                    LineItemTaxVerification.objects.filter(id__gt=index.max_verification_id)
+                ):
+                    index.add(
+                        row['state_code'], row['description'], row['tax_status'], row['tax_rate'],
+                        row['verification_id'], row['line_item_id']
+                    )
+                source = path
+            logger.info(f"Near-duplicate index ready: {len(index)} items from {source} in {time.perf_counter() - started:.2f}s")
+            _index = index
+    return _index
+
+
+def reset_near_duplicate_index():
+    """Drop the process-wide index (used by tests and after a rebuild)."""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,197 @@
+"""
+Tax verification progress for the invoice page.
+
+With progress enabled, BedrockKnowledgeBaseService.verify_invoice_taxes writes each
+line item's LineItemTaxVerification as soon as its result is ready and the
+TaxDetermination last, each with a fresh verified_at. Progress is therefore a
+cursor over verified_at: verifications after the cursor are new results, and a
+determination at or after it ends the verification.
+
+A verification is only ever started by a POST to verify-taxes (CSRF-protected,
+and refused while another one is in flight); the page then follows it from the
+cursor it took before starting. Where responses can stream, the
+verify-taxes/stream endpoint sends the events after the cursor as server-sent
+events. Behind API Gateway (Zappa on Lambda), which buffers responses and cuts
+requests off after 29 seconds, the page long-polls the verification-progress
+endpoint with its cursor instead.
+"""
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterator, Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from invoice_ocr.config import ConfigManager
+from taxright.models import Invoice, LineItemTaxVerification, TaxDetermination
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15.0
+
+
+def format_cursor(moment: datetime) -> str:
+    """Format a verified_at timestamp as a progress cursor."""
+    return moment.isoformat()
+
+
+def parse_cursor(value: str) -> datetime:
+    """
+    Parse a progress cursor.
+
+    Raises:
+        ValueError: If the cursor is not an ISO 8601 timestamp
+    """
+    moment = parse_datetime(value.strip().replace(' ', '+'))
+    if moment is None:
+        raise ValueError(f"Invalid progress cursor: {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def verification_event(verification: LineItemTaxVerification) -> Dict[str, Any]:
+    """Serialize a line item verification as a progress event."""
+    return {
+        'line_item_id': verification.line_item_id,
+        'verification_id': verification.id,
+        'line_item_description': verification.line_item.description,
+        'is_correct': verification.is_correct,
+        'confidence_score': float(verification.confidence_score),
+        'reasoning': verification.reasoning,
+        'expected_tax_rate': float(verification.expected_tax_rate),
+        'applied_tax_rate': float(verification.applied_tax_rate),
+        'source': (verification.verification_details or {}).get('source'),
+        'verified_at': format_cursor(verification.verified_at),
+    }
+
+
+def determination_event(determination: TaxDetermination) -> Dict[str, Any]:
+    """Serialize a tax determination as the final progress event."""
+    return {
+        'determination_id': determination.id,
+        'determination_status': determination.determination_status,
+        'expected_tax': str(determination.expected_tax),
+        'actual_tax': str(determination.actual_tax),
+        'discrepancy_amount': str(determination.discrepancy_amount),
+        'summary': (determination.kb_verification_metadata or {}).get('summary', {}),
+        'verified_at': format_cursor(determination.verified_at),
+    }
+
+
+def progress_since(invoice: Invoice, cursor: datetime) -> Dict[str, Any]:
+    """
+    Get the verifications and determination an invoice gained after a cursor.
+
+    Args:
+        invoice: Invoice being verified
+        cursor: verified_at of the last result already seen
+
+    Returns:
+        dict: 'verifications' (events, oldest first), 'determination' (event or None) and
+        the advanced 'cursor'
+    """
+    verifications = list(
+        LineItemTaxVerification.objects.filter(line_item__invoice=invoice, verified_at__gt=cursor)
+        .select_related('line_item').order_by('verified_at', 'id')
+    )
+    if verifications:
+        cursor = max(cursor, verifications[-1].verified_at)
+    determination = TaxDetermination.objects.filter(invoice=invoice, verified_at__gte=cursor).first()
+    if determination is not None:
+        cursor = max(cursor, determination.verified_at)
+    return {
+        'cursor': format_cursor(cursor),
+        'verifications': [verification_event(verification) for verification in verifications],
+        'determination': determination_event(determination) if determination is not None else None,
+    }
+
+
+def wait_for_progress(invoice: Invoice, cursor: datetime, timeout: float) -> Dict[str, Any]:
+    """
+    Long-poll progress_since() until there is something new or the timeout passes.
+
+    Args:
+        invoice: Invoice being verified
+        cursor: verified_at of the last result already seen
+        timeout: Longest wait in seconds (0 checks once)
+
+    Returns:
+        dict: Same as progress_since(), with no events if the timeout passed first
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        progress = progress_since(invoice, cursor)
+        if progress['verifications'] or progress['determination'] or time.monotonic() >= deadline:
+            return progress
+        time.sleep(min(POLL_INTERVAL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+
+def sse_event(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Format one server-sent event."""
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def verification_in_progress(invoice: Invoice, window: float) -> Optional[datetime]:
+    """
+    Check whether a progress-reporting verification of an invoice looks in flight.
+
+    It does when a line item verification was saved within the last window seconds
+    and no determination has been saved since, which is how a verification with
+    progress looks until it finishes.
+
+    Args:
+        invoice: Invoice to check
+        window: In-flight window in seconds
+
+    Returns:
+        datetime: A cursor to follow the running verification from, or None
+    """
+    since = timezone.now() - timedelta(seconds=window)
+    latest = LineItemTaxVerification.objects.filter(
+        line_item__invoice=invoice, verified_at__gte=since
+    ).order_by('-verified_at').values_list('verified_at', flat=True).first()
+    if latest is None:
+        return None
+    determined_at = TaxDetermination.objects.filter(invoice=invoice).values_list('verified_at', flat=True).first()
+    if determined_at is not None and determined_at >= latest:
+        return None
+    return max(since, determined_at) if determined_at is not None else since
+
+
+def verification_stream(invoice: Invoice, cursor: datetime) -> Iterator[str]:
+    """
+    Server-sent events of the verification results an invoice gained after a cursor.
+
+    Sends a 'verification' event per line item verification saved after the cursor
+    and ends with a 'determination' event, or after verification_poll_timeout_seconds
+    without one (an EventSource then reconnects with the Last-Event-ID it got). Each
+    event's id is the cursor to resume from. It never starts a verification.
+
+    Args:
+        invoice: Invoice being verified
+        cursor: verified_at of the last result already seen
+
+    Yields:
+        str: Formatted server-sent events and keep-alive comments
+    """
+    deadline = time.monotonic() + ConfigManager.get_verification_poll_timeout()
+    while True:
+        progress = wait_for_progress(invoice, cursor, min(KEEPALIVE_SECONDS, max(0.0, deadline - time.monotonic())))
+        cursor = parse_cursor(progress['cursor'])
+        for event in progress['verifications']:
+            yield sse_event('verification', event, event['verified_at'])
+        if progress['determination'] is not None:
+            yield sse_event('determination', progress['determination'], progress['cursor'])
+            return
+        if time.monotonic() >= deadline:
+            return
+        if not progress['verifications']:
+            yield ': keep-alive\n\n'
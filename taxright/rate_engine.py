@@ -0,0 +1,161 @@
+"""
+Deterministic rate resolution from TaxRule rows.
+
+Most line items are taxable at exactly the combined state + local rate, and
+asking the knowledge base to confirm that a 6.75% NC rate is 6.75% costs a
+Bedrock call per item. This engine combines the TaxRule rows effective on the
+invoice date into the expected rate for the invoice's state and jurisdiction;
+when a taxable item's applied rate matches it within tolerance the verification
+service records a 'rule_engine' verdict and skips Bedrock. Rate mismatches,
+non-taxable items and jurisdictions without rules still go to the KB.
+
+Rule selection:
+- For every (rule_type, jurisdiction) the row with the latest effective_date on
+  or before the invoice date applies.
+- Rules with a blank jurisdiction are statewide and always apply. A resolution
+  needs at least one; without it the state has no rules and nothing is resolved.
+- County, city and special district rules apply when their jurisdiction name
+  matches the invoice jurisdiction or one of its comma-separated parts, ignoring
+  case, punctuation and generic words ("Wake County" matches "wake").
+- If the invoice names a jurisdiction but no local rule matched it, the
+  resolution is marked incomplete (the local rate is unknown) and is not used
+  to accept an applied rate.
+
+Rules are read from the process-local effective-dated index in
+taxright.rule_index rather than queried per invoice.
+"""
+import datetime
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+from django.utils.dateparse import parse_date
+
+from taxright.models import InvoiceLineItem
+from taxright.rule_index import get_tax_rule_index, jurisdiction_key, jurisdiction_keys
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPE_ORDER = ('state', 'county', 'city', 'special')
+
+
+def as_date(value) -> datetime.date:
+    """Coerce an invoice date (date, datetime or ISO string) to a date, defaulting to today."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return (parse_date(value) if isinstance(value, str) else None) or datetime.date.today()
+
+
+def combine_rules(state_code: str, jurisdiction: str, on_date: datetime.date,
+                  rules: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Combine the rules in effect for a state and jurisdiction into one rate.
+
+    Args:
+        state_code: 2-letter state code
+        jurisdiction: Invoice jurisdiction (may be blank)
+        on_date: Date the rates must be effective on
+        rules: Latest effective rule per (rule_type, jurisdiction), as dicts with 'rule_id',
+            'rule_type', 'jurisdiction', 'tax_rate', 'effective_date' and optionally the
+            precomputed 'jurisdiction_key'
+
+    Returns:
+        dict: 'state_code', 'jurisdiction', 'date', 'combined_rate', 'complete' and the
+        applied 'components'; None if no statewide rule is in effect
+    """
+    wanted = jurisdiction_keys(jurisdiction)
+    statewide, local = [], []
+    for rule in rules:
+        key = rule['jurisdiction_key'] if 'jurisdiction_key' in rule else jurisdiction_key(rule['jurisdiction'])
+        if not key:
+            statewide.append(rule)
+        elif key in wanted:
+            local.append(rule)
+    if not statewide:
+        return None
+
+    order = {rule_type: position for position, rule_type in enumerate(RULE_TYPE_ORDER)}
+    components = sorted(statewide + local, key=lambda rule: (order.get(rule['rule_type'], len(order)), rule['jurisdiction']))
+    return {
+        'state_code': state_code.upper(),
+        'jurisdiction': jurisdiction or '',
+        'date': on_date,
+        'combined_rate': sum((rule['tax_rate'] for rule in components), Decimal('0')).quantize(Decimal('0.0001')),
+        'complete': not wanted or bool(local),
+        'components': components,
+    }
+
+
+def resolve_rate(state_code: str, jurisdiction: str = '', on_date=None) -> Optional[Dict[str, Any]]:
+    """
+    Resolve the combined TaxRule rate for a state and jurisdiction on a date.
+
+    Args:
+        state_code: 2-letter state code
+        jurisdiction: Invoice jurisdiction (may be blank)
+        on_date: Invoice date (defaults to today)
+
+    Returns:
+        dict: Resolution as returned by combine_rules(), or None if the state has no rules in effect
+    """
+    on_date = as_date(on_date)
+    rules = get_tax_rule_index().rules_on(state_code, jurisdiction_keys(jurisdiction or ''), on_date)
+    return combine_rules(state_code or '', jurisdiction, on_date, rules)
+
+
+def verify_with_rules(line_item: InvoiceLineItem, resolution: Optional[Dict[str, Any]],
+                      tolerance: Decimal) -> Optional[Dict[str, Any]]:
+    """
+    Accept a line item's applied rate if it matches the resolved combined rate.
+
+    Only taxable items with a complete resolution are judged; everything else
+    (including every mismatch) is left to the knowledge base.
+
+    Args:
+        line_item: InvoiceLineItem instance
+        resolution: Result of resolve_rate(), or None
+        tolerance: Largest accepted difference between applied and combined rate
+
+    Returns:
+        dict: Verification result with source 'rule_engine', or None if the KB must decide
+    """
+    if not resolution or not resolution['complete'] or line_item.tax_status != 'taxable':
+        return None
+    applied_rate = Decimal(str(line_item.tax_rate or 0))
+    combined_rate = resolution['combined_rate']
+    if combined_rate <= 0 or abs(applied_rate - combined_rate) > tolerance:
+        return None
+
+    breakdown = ' + '.join(
+        f"{component['jurisdiction'] or resolution['state_code']} {component['rule_type']} {component['tax_rate'] * 100:.2f}%"
+        for component in resolution['components']
+    )
+    return {
+        'is_correct': True,
+        'expected_tax_rate': combined_rate,
+        'confidence_score': Decimal('1.00'),
+        'reasoning': (
+            f"Applied rate {applied_rate * 100:.2f}% matches the combined rate {combined_rate * 100:.2f}% "
+            f"in effect on {resolution['date'].isoformat()} ({breakdown})."
+        ),
+        'kb_response': None,
+        'kb_id': None,
+        'kb_name': None,
+        'source': 'rule_engine',
+        'rule_engine': {
+            'combined_rate': str(combined_rate),
+            'date': resolution['date'].isoformat(),
+            'components': [
+                {
+                    'rule_id': component['rule_id'],
+                    'rule_type': component['rule_type'],
+                    'jurisdiction': component['jurisdiction'],
+                    'tax_rate': str(component['tax_rate']),
+                    'effective_date': component['effective_date'].isoformat(),
+                }
+                for component in resolution['components']
+            ],
+        },
+    }
@@ -0,0 +1,224 @@
+"""
+In-process cache of passages retrieved from state knowledge bases.
+
+When retrieval is split from generation (structured output, the 'converse'
+generation mode or a local retrieval source), passages are fetched with the
+Retrieve API or from a local index and handed to a plain Converse call. Most
+line items on an invoice, and most invoices for a state, hit the same handful
+of SUT passages, so retrieved passages are cached per (knowledge base ID or
+local source and state, query signature). Lookups are single-flight: worker
+threads asking for the same passages while a retrieval is in flight wait for
+it instead of repeating it.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.exceptions import ConfigurationError
+from taxright.bm25 import get_bm25_index
+from taxright.cache import normalize_description
+from taxright.vector_index import get_vector_index
+
+logger = logging.getLogger(__name__)
+
+
+def query_signature(retrieval_query: str, number_of_results: int) -> str:
+    """
+    Build the cache signature of a retrieval query.
+
+    Queries that differ only in case, punctuation or spacing share a signature.
+
+    Args:
+        retrieval_query: Text sent to the Retrieve API
+        number_of_results: Number of passages requested
+
+    Returns:
+        str: Hex digest identifying the query
+    """
+    raw = f"{normalize_description(retrieval_query)}\x1f{number_of_results}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def passages_from_references(references: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Flatten Retrieve API results into auditable passage records.
+
+    Args:
+        references: 'retrievalResults' from a Retrieve response
+
+    Returns:
+        list: Dicts with rank, score, location and text, in retrieval order
+    """
+    passages = []
+    for rank, reference in enumerate(references, start=1):
+        location = reference.get('location') or {}
+        uri = next(
+            (value.get('uri') or value.get('url') for value in location.values()
+             if isinstance(value, dict) and (value.get('uri') or value.get('url'))),
+            None
+        )
+        passages.append({
+            'rank': rank,
+            'score': reference.get('score'),
+            'location': uri,
+            'text': (reference.get('content') or {}).get('text', ''),
+        })
+    return passages
+
+
+def get_local_retriever(source: str, state_code: Optional[str]):
+    """
+    Get the local retrieval index for a kb_retrieval_source, if it can serve a state.
+
+    Local indexes expose retrieve(state_code, query, number_of_results) returning results
+    shaped like Bedrock Retrieve 'retrievalResults'.
+
+    Args:
+        source: Configured retrieval source ('bm25' or 'vector')
+        state_code: State to retrieve passages for
+
+    Returns:
+        The index, or None (after logging why) if the caller should fall back to the KB
+    """
+    loaders = {'bm25': get_bm25_index, 'vector': get_vector_index}
+    if source not in loaders:
+        logger.warning(f"Unknown retrieval source '{source}', using the Bedrock knowledge base")
+        return None
+    try:
+        index = loaders[source]()
+    except (OSError, ValueError, ConfigurationError) as e:
+        logger.warning(f"Local '{source}' retrieval index unavailable ({str(e)}), using the Bedrock knowledge base")
+        return None
+    if not state_code or not index.has_state(state_code):
+        logger.warning(f"Local '{source}' retrieval index has no passages for state {state_code}, using the Bedrock knowledge base")
+        return None
+    return index
+
+
+class RetrievedContextCache:
+    """Thread-safe LRU cache of Retrieve results with a TTL and single-flight lookups."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum cached queries; least recently used entries are evicted
+            ttl_seconds: Age after which entries are retrieved again (0 = never expire)
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]]' = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def _get_fresh(self, key: Tuple[str, str]) -> Optional[List[Dict[str, Any]]]:
+        """Return a cached, unexpired value and mark it recently used (caller holds the lock)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, references = entry
+        if self.ttl_seconds and self.clock() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return references
+
+    def get_or_retrieve(self, kb_id: str, signature: str,
+                        retrieve: Callable[[], List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Return cached retrieval results, calling retrieve() once on a miss.
+
+        Args:
+            kb_id: Knowledge Base ID
+            signature: Query signature from query_signature()
+            retrieve: Callable returning 'retrievalResults'; exceptions propagate and nothing is cached
+
+        Returns:
+            tuple: (retrieval results, whether they came from the cache)
+        """
+        key = (kb_id, signature)
+        while True:
+            with self._lock:
+                references = self._get_fresh(key)
+                if references is not None:
+                    self.hits += 1
+                    return references, True
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = self._in_flight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is retrieving the same passages; wait for it and re-check
+            event.wait()
+
+        try:
+            references = retrieve()
+            with self._lock:
+                self._entries[key] = (self.clock(), references)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return references, False
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            event.set()
+
+    def invalidate_kb(self, kb_id: str) -> int:
+        """
+        Drop every cached query for a knowledge base.
+
+        Args:
+            kb_id: Knowledge Base ID
+
+        Returns:
+            int: Number of dropped entries
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == kb_id]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        """Drop all cached queries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_cache: Optional[RetrievedContextCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieved_context_cache() -> RetrievedContextCache:
+    """Return the process-wide retrieved context cache, creating it from config on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RetrievedContextCache(
+                max_entries=ConfigManager.get_kb_retrieval_cache_max_entries(),
+                ttl_seconds=ConfigManager.get_kb_retrieval_cache_ttl_seconds()
+            )
+        return _cache
+
+
+def reset_retrieved_context_cache():
+    """Discard the process-wide retrieved context cache (used by tests and after KB re-syncs)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,381 @@
+"""
+Process-local, effective-dated index of TaxRule rows.
+
+The rate engine (taxright.rate_engine) asks "combined rate for state X,
+jurisdiction Y on date D" for every invoice, thousands of times per batch.
+Instead of querying TaxRule each time, rules are loaded once into:
+
+- parallel arrays of effective dates (as proleptic ordinals), rates (in
+  hundredths of a percent) and rule IDs, holding one contiguous, date-sorted
+  run per (state_code, jurisdiction, rule_type) series, searched with bisect
+  for the rule in effect on a date;
+- per state, the statewide series (blank jurisdiction) and a dict of local
+  series by normalized jurisdiction name.
+
+Freshness:
+- TaxRule post_save/post_delete signals bump a version counter (see
+  taxright.signals); the next lookup in this process rebuilds the index.
+- Other processes (Lambda containers, workers) cannot see those signals, so at
+  most every tax_rule_index_check_seconds the index compares its fingerprint
+  (rule count and latest updated_at) with the database and rebuilds if it
+  changed. Bulk queryset.update() calls that leave updated_at alone are not
+  detected; rebuild the snapshot or reset the index after them.
+
+The index serializes to a compact binary snapshot (manage.py
+snapshot_tax_rules). On a cold start it is read from tax_rule_snapshot_path
+instead of loading every rule, as long as its fingerprint still matches.
+"""
+import datetime
+import io
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import Count, Max
+
+from invoice_ocr.config import ConfigManager
+from taxright.cache import normalize_description
+from taxright.models import TaxRule
+from taxright.tax_math import to_bps
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MAGIC = b'TRRULES1'
+
+# Words that do not distinguish one jurisdiction from another
+_GENERIC_JURISDICTION_WORDS = frozenset(['county', 'city', 'of', 'town', 'township', 'parish', 'borough', 'village'])
+_JURISDICTION_SEPARATORS = re.compile(r'[,;/|]')
+
+
+def jurisdiction_key(name: str) -> str:
+    """
+    Normalize a jurisdiction name for matching.
+
+    Args:
+        name: Jurisdiction name, e.g. "Wake County" or "City of Raleigh"
+
+    Returns:
+        str: Lowercase words without generic words ("wake", "raleigh"); '' for statewide
+    """
+    words = normalize_description(name or '').split()
+    significant = [word for word in words if word not in _GENERIC_JURISDICTION_WORDS]
+    return ' '.join(significant or words)
+
+
+@lru_cache(maxsize=4096)
+def jurisdiction_keys(jurisdiction: str) -> frozenset:
+    """
+    Get the keys a rule's jurisdiction may match for an invoice jurisdiction.
+
+    Args:
+        jurisdiction: Invoice jurisdiction, e.g. "Wake County, Raleigh"
+
+    Returns:
+        frozenset: Keys of the whole jurisdiction and of each comma-separated part
+    """
+    parts = [jurisdiction or ''] + _JURISDICTION_SEPARATORS.split(jurisdiction or '')
+    return frozenset(key for key in (jurisdiction_key(part) for part in parts) if key)
+
+
+class _RuleSeries:
+    """Effective-dated rules of one (state, jurisdiction, rule type): rows start..end of the index columns."""
+
+    __slots__ = ('rule_type', 'jurisdiction', 'key', 'start', 'end')
+
+    def __init__(self, rule_type: str, jurisdiction: str, key: str, start: int, end: int):
+        self.rule_type = rule_type
+        self.jurisdiction = jurisdiction
+        self.key = key
+        self.start = start
+        self.end = end
+
+
+class TaxRuleIndex:
+    """Bisect-searchable TaxRule series, grouped by state and jurisdiction."""
+
+    def __init__(self, fingerprint: Optional[Dict[str, Any]] = None, version: int = 0):
+        """
+        Initialize an empty index.
+
+        Args:
+            fingerprint: rules_fingerprint() of the rules the index was built from
+            version: Process-local rules version the index was built at
+        """
+        self.fingerprint = fingerprint or {}
+        self.version = version
+        # Rule columns; each series owns a contiguous run of rows sorted by effective date
+        self.dates = array('i')
+        self.rates_bps = array('i')
+        self.rule_ids = array('q')
+        self.series: List[tuple] = []
+        self._statewide: Dict[str, List[_RuleSeries]] = {}
+        self._local: Dict[str, Dict[str, List[_RuleSeries]]] = {}
+
+    def __len__(self) -> int:
+        """Number of indexed rules."""
+        return len(self.dates)
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple], fingerprint: Optional[Dict[str, Any]] = None,
+              version: int = 0) -> 'TaxRuleIndex':
+        """
+        Build an index from rule rows.
+
+        Args:
+            rows: (id, state_code, jurisdiction, rule_type, tax_rate, effective_date) tuples in any order
+            fingerprint: rules_fingerprint() of the rows
+            version: Process-local rules version
+
+        Returns:
+            TaxRuleIndex
+        """
+        index = cls(fingerprint, version)
+        grouped: Dict[tuple, list] = {}
+        for rule_id, state_code, jurisdiction, rule_type, tax_rate, effective_date in rows:
+            key = (state_code.upper(), jurisdiction_key(jurisdiction), rule_type)
+            grouped.setdefault(key, []).append(
+                (effective_date.toordinal(), rule_id, to_bps(tax_rate), jurisdiction)
+            )
+        for key in sorted(grouped):
+            entries = sorted(grouped[key])
+            start = len(index.dates)
+            for ordinal, rule_id, rate_bps, _name in entries:
+                index.dates.append(ordinal)
+                index.rule_ids.append(rule_id)
+                index.rates_bps.append(rate_bps)
+            # The series is labelled with the name of its latest rule
+            index._add_series(key[0], _RuleSeries(key[2], entries[-1][3], key[1], start, len(index.dates)))
+        return index
+
+    def _add_series(self, state_code: str, series: _RuleSeries):
+        self.series.append((state_code, series))
+        if series.key:
+            self._local.setdefault(state_code, {}).setdefault(series.key, []).append(series)
+        else:
+            self._statewide.setdefault(state_code, []).append(series)
+
+    def has_state(self, state_code: str) -> bool:
+        """Return True if the state has statewide rules."""
+        return (state_code or '').upper() in self._statewide
+
+    def rule_at(self, series: _RuleSeries, ordinal: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a series' rule in effect on a date.
+
+        Args:
+            series: Series of this index
+            ordinal: date.toordinal() of the date
+
+        Returns:
+            dict: 'rule_id', 'rule_type', 'jurisdiction', 'jurisdiction_key', 'tax_rate' and
+            'effective_date'; None if the series' first rule is later
+        """
+        row = bisect_right(self.dates, ordinal, series.start, series.end) - 1
+        if row < series.start:
+            return None
+        return {
+            'rule_id': self.rule_ids[row],
+            'rule_type': series.rule_type,
+            'jurisdiction': series.jurisdiction,
+            'jurisdiction_key': series.key,
+            'tax_rate': Decimal(self.rates_bps[row]) / 10000,
+            'effective_date': datetime.date.fromordinal(self.dates[row]),
+        }
+
+    def rules_on(self, state_code: str, jurisdiction_keys: Iterable[str], on_date: datetime.date) -> List[Dict[str, Any]]:
+        """
+        Get the rules in effect on a date: every statewide series plus the local series named.
+
+        Args:
+            state_code: 2-letter state code
+            jurisdiction_keys: Normalized jurisdiction names (see jurisdiction_keys())
+            on_date: Date the rules must be effective on
+
+        Returns:
+            list: Rule dicts as returned by rule_at()
+        """
+        state_code = (state_code or '').upper()
+        statewide = self._statewide.get(state_code)
+        if not statewide:
+            return []
+        ordinal = on_date.toordinal()
+        candidates = list(statewide)
+        local = self._local.get(state_code, {})
+        for key in jurisdiction_keys:
+            candidates.extend(local.get(key, ()))
+        return [rule for rule in (self.rule_at(series, ordinal) for series in candidates) if rule is not None]
+
+    def write(self, stream):
+        """
+        Serialize the index to a binary stream.
+
+        Args:
+            stream: Writable binary file object
+        """
+        header = {
+            'fingerprint': self.fingerprint,
+            'rules': len(self.dates),
+            'series': [
+                [state_code, series.key, series.rule_type, series.jurisdiction, series.end - series.start]
+                for state_code, series in self.series
+            ],
+        }
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        stream.write(FORMAT_MAGIC)
+        stream.write(struct.pack('<I', len(header_bytes)))
+        stream.write(header_bytes)
+        for values in (self.dates, self.rates_bps, self.rule_ids):
+            stream.write(values.tobytes())
+
+    @classmethod
+    def read(cls, stream, version: int = 0) -> 'TaxRuleIndex':
+        """
+        Load an index written by write().
+
+        Args:
+            stream: Readable binary file object
+            version: Process-local rules version to stamp on the index
+
+        Returns:
+            TaxRuleIndex
+
+        Raises:
+            ValueError: If the stream is not a serialized index
+        """
+        if stream.read(len(FORMAT_MAGIC)) != FORMAT_MAGIC:
+            raise ValueError("Not a tax rule index snapshot")
+        header_length, = struct.unpack('<I', stream.read(4))
+        header = json.loads(stream.read(header_length).decode('utf-8'))
+        index = cls(header['fingerprint'], version)
+        for values in (index.dates, index.rates_bps, index.rule_ids):
+            values.frombytes(stream.read(header['rules'] * values.itemsize))
+            if len(values) != header['rules']:
+                raise ValueError("Truncated tax rule index snapshot")
+
+        start = 0
+        for state_code, key, rule_type, jurisdiction, count in header['series']:
+            index._add_series(state_code, _RuleSeries(rule_type, jurisdiction, key, start, start + count))
+            start += count
+        return index
+
+    def save(self, path):
+        """Write the snapshot to a local file, replacing it atomically."""
+        buffer = io.BytesIO()
+        self.write(buffer)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as snapshot_file:
+            snapshot_file.write(buffer.getvalue())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, version: int = 0) -> Optional['TaxRuleIndex']:
+        """Read a snapshot saved with save(), or return None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as snapshot_file:
+            return cls.read(io.BytesIO(snapshot_file.read()), version)
+
+
+def rules_fingerprint() -> Dict[str, Any]:
+    """
+    Summarize the TaxRule table so a stale index or snapshot can be detected with one query.
+
+    Returns:
+        dict: 'count' and 'updated_at' (ISO timestamp of the latest change, or None)
+    """
+    summary = TaxRule.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    return {
+        'count': summary['count'],
+        'updated_at': summary['updated_at'].isoformat() if summary['updated_at'] else None,
+    }
+
+
+def tax_rule_rows() -> Iterable[tuple]:
+    """Yield every TaxRule as a row for TaxRuleIndex.build()."""
+    return TaxRule.objects.order_by().values_list(
+        'id', 'state_code', 'jurisdiction', 'rule_type', 'tax_rate', 'effective_date'
+    ).iterator(chunk_size=5000)
+
+
+def snapshot_path() -> Optional[Path]:
+    """Resolve the configured snapshot path (relative paths are relative to the project root), or None if disabled."""
+    configured = ConfigManager.get_tax_rule_snapshot_path()
+    if not configured:
+        return None
+    path = Path(configured)
+    return path if path.is_absolute() else Path(__file__).resolve().parent.parent / path
+
+
+_index: Optional[TaxRuleIndex] = None
+_index_lock = threading.Lock()
+_checked_at = 0.0
+_rules_version = 0
+
+
+def bump_rules_version():
+    """Mark the process-wide index stale; it is rebuilt on the next lookup."""
+    global _rules_version
+    with _index_lock:
+        _rules_version += 1
+
+
+def _load_index(version: int, first_load: bool) -> TaxRuleIndex:
+    """Load the index from the snapshot (on first load, if still current) or from the database."""
+    started = time.perf_counter()
+    fingerprint = rules_fingerprint()
+    path = snapshot_path() if first_load else None
+    if path is not None:
+        try:
+            index = TaxRuleIndex.load(path, version)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Tax rule snapshot {path} unreadable ({str(e)}), loading rules from the database")
+            index = None
+        if index is not None and index.fingerprint == fingerprint:
+            logger.info(f"Tax rule index ready: {len(index)} rules from {path} in {time.perf_counter() - started:.3f}s")
+            return index
+        if index is not None:
+            logger.info(f"Tax rule snapshot {path} is stale, loading rules from the database")
+    index = TaxRuleIndex.build(tax_rule_rows(), fingerprint, version)
+    logger.info(f"Tax rule index ready: {len(index)} rules from the database in {time.perf_counter() - started:.3f}s")
+    return index
+
+
+def get_tax_rule_index() -> TaxRuleIndex:
+    """
+    Get the process-wide tax rule index, loading or refreshing it as needed.
+
+    Returns:
+        TaxRuleIndex
+    """
+    global _index, _checked_at
+    with _index_lock:
+        index, version = _index, _rules_version
+        check_seconds = ConfigManager.get_tax_rule_index_check_seconds()
+        now = time.monotonic()
+        if index is not None and index.version == version:
+            if not check_seconds or now - _checked_at < check_seconds:
+                return index
+            if index.fingerprint == rules_fingerprint():
+                _checked_at = now
+                return index
+            logger.info("Tax rules changed in another process, rebuilding the tax rule index")
+        _index = _load_index(version, first_load=index is None)
+        _checked_at = now
+        return _index
+
+
+def reset_tax_rule_index():
+    """Drop the process-wide index (used by tests and after bulk rule changes)."""
+    global _index
+    with _index_lock:
+        _index = None
@@ -4,31 +4,104 @@ Service classes for processing invoice data from OCR.
 import json
 import logging
 import re
-import boto3
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import close_old_connections, transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from botocore.exceptions import ClientError, BotoCoreError
 
 from taxright.models import Invoice, InvoiceLineItem, StateKnowledgeBase, LineItemTaxVerification, TaxDetermination
+from taxright.cache import VerificationResultCache, normalize_description
+from taxright.near_duplicates import get_near_duplicate_index
+from taxright.categories import classify_line_item
+from taxright.rate_engine import resolve_rate, verify_with_rules
+from taxright.retrieval import (
+    get_local_retriever, get_retrieved_context_cache, passages_from_references, query_signature
+)
+from taxright.taxability import get_taxability_matrix, taxability_details, verify_with_matrix
+from taxright.tax_math import InvoiceBatch, compute_expected_taxes, from_cents
 from invoice_ocr.models import BedrockModelConfig
+from invoice_ocr.resilience import RetryStats, call_with_resilience
+from invoice_ocr.backends import get_client
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.tools import build_tool_config, extract_tool_input
 
 logger = logging.getLogger(__name__)
 
+# US state, DC and territory codes accepted as invoice state_code
+US_STATE_CODES = frozenset([
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA',
+    'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM',
+    'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY', 'PR', 'GU', 'VI', 'AS', 'MP',
+])
+
+# Invoice-wide retrieval queries are embedded as one vector; longer queries only dilute it
+MAX_RETRIEVAL_QUERY_CHARS = 1000
+
+# InvoiceLineItem fields written by _apply_kb_usage()
+KB_USAGE_FIELDS = ['kb_input_tokens', 'kb_output_tokens', 'kb_total_tokens', 'kb_input_cost', 'kb_output_cost', 'kb_total_cost']
+
+# Verification schema for structured KB answers, mirroring the JSON requested by the verification prompt
+TAX_VERIFICATION_TOOL = {
+    'name': 'record_tax_verification',
+    'description': 'Record whether the tax rate applied to the line item is correct.',
+    'inputSchema': {
+        'json': {
+            'type': 'object',
+            'properties': {
+                'is_correct': {'type': 'boolean'},
+                'expected_tax_rate': {'type': 'number', 'description': 'Decimal rate, e.g. 0.0825 for 8.25%'},
+                'confidence_score': {'type': 'number', 'minimum': 0, 'maximum': 1},
+                'reasoning': {'type': 'string', 'description': 'Concise explanation based on state tax law'},
+            },
+            'required': ['is_correct', 'expected_tax_rate', 'confidence_score', 'reasoning'],
+        }
+    },
+}
+
+# Batch verification schema: one verdict per line item, keyed by line_item_id
+TAX_VERIFICATION_BATCH_TOOL = {
+    'name': 'record_tax_verifications',
+    'description': 'Record, for each line item, whether the tax rate applied to it is correct.',
+    'inputSchema': {
+        'json': {
+            'type': 'object',
+            'properties': {
+                'verifications': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'line_item_id': {'type': 'integer'},
+                            **TAX_VERIFICATION_TOOL['inputSchema']['json']['properties'],
+                        },
+                        'required': ['line_item_id'] + TAX_VERIFICATION_TOOL['inputSchema']['json']['required'],
+                    },
+                },
+            },
+            'required': ['verifications'],
+        }
+    },
+}
+
 
 class InvoiceDataParser:
     """Parse and validate invoice data from OCR JSON response."""
     
-    def __init__(self, ocr_json: str):
+    def __init__(self, ocr_json: Union[str, Dict[str, Any]]):
         """
         Initialize parser with OCR JSON response.
         
         Args:
-            ocr_json: JSON string from OCR service
+            ocr_json: JSON string from OCR service, or the already-decoded dict from
+                      structured (tool use) extraction, which is used without re-parsing
         """
         self.ocr_json = ocr_json
-        self.parsed_data = None
+        self.parsed_data = ocr_json if isinstance(ocr_json, dict) else None
         self.errors = []
         
     def parse(self) -> Dict[str, Any]:
@@ -41,6 +114,10 @@ class InvoiceDataParser:
         Raises:
             ValueError: If JSON is invalid or required fields are missing
         """
+        if isinstance(self.ocr_json, dict):
+            self.parsed_data = self.ocr_json
+            return self.parsed_data
+        
         try:
             self.parsed_data = json.loads(self.ocr_json)
         except json.JSONDecodeError as e:
@@ -58,20 +135,11 @@ class InvoiceDataParser:
         Returns:
             dict: Validated invoice data with defaults for missing fields
         """
-        if not self.parsed_data:
+        if self.parsed_data is None:
             self.parse()
         
-        data = {
-            'invoice_number': self._get_string('invoice_number', default='UNKNOWN'),
-            'date': self._get_date('date'),
-            'vendor_name': self._get_string('vendor_name', default='Unknown Vendor'),
-            'total_amount': self._get_decimal('total_amount', default=Decimal('0.00')),
-            'total_tax_amount': self._get_decimal('total_tax_amount', default=Decimal('0.00')),
-            'invoice_discount_amount': self._get_decimal('invoice_discount_amount', default=Decimal('0.00')),
-            'state_code': self._get_string('state_code', default='').upper()[:2],
-            'jurisdiction': self._get_string('jurisdiction', default=''),
-            'line_items': self._get_line_items(),
-        }
+        data = self.extract_header()
+        data['line_items'] = self._get_line_items()
         
         # Validate invoice totals: sum(line_totals) - invoice_discount_amount ≈ total_amount
         line_items_total = sum(item['line_total'] for item in data['line_items'])
@@ -124,6 +192,96 @@ class InvoiceDataParser:
         
         return data
     
+    def reconciliation_issues(self, total_tolerance: Decimal = Decimal('0.01'),
+                              total_tolerance_pct: Decimal = Decimal('0.005'),
+                              max_line_mismatch_ratio: float = 0.0,
+                              max_invoice_age_days: int = 3650) -> list:
+        """
+        Run reconciliation checks used to judge whether an extraction can be trusted.
+        
+        Checks are made against the values as extracted (no discount inference), so
+        decimal-placement errors and missed line items show up as failures.
+        
+        Args:
+            total_tolerance: Absolute tolerance for sum(line_totals) - discount vs total_amount
+            total_tolerance_pct: Relative tolerance (fraction of total_amount) for the same check
+            max_line_mismatch_ratio: Fraction of line items allowed to fail quantity x unit_price
+            max_invoice_age_days: Oldest invoice date accepted as plausible
+            
+        Returns:
+            list: Issue strings; empty if every check passed
+        """
+        try:
+            if not self.parsed_data:
+                self.parse()
+        except ValueError as e:
+            return [f"invalid_json: {str(e)}"]
+        
+        issues = []
+        header = self.extract_header()
+        line_items = self._get_line_items()
+        if not line_items:
+            issues.append("no_line_items")
+        
+        # Line totals against invoice total (with or without tax, since line totals may include it)
+        line_items_total = sum((item['line_total'] for item in line_items), Decimal('0.00'))
+        expected_total = line_items_total - header['invoice_discount_amount']
+        tolerance = max(total_tolerance, abs(header['total_amount']) * total_tolerance_pct)
+        if line_items and min(
+            abs(expected_total - header['total_amount']),
+            abs(expected_total + header['total_tax_amount'] - header['total_amount'])
+        ) > tolerance:
+            issues.append(
+                f"total_mismatch: sum(line_totals) - discount = {expected_total}, total_amount = {header['total_amount']}"
+            )
+        
+        # quantity x unit_price against line_total, using the raw extracted values
+        raw_items = [item for item in self.parsed_data.get('line_items') or [] if isinstance(item, dict)]
+        mismatched = 0
+        for item in raw_items:
+            quantity = self._get_decimal_from_dict(item, 'quantity', default=Decimal('1.00'))
+            unit_price = self._get_decimal_from_dict(item, 'unit_price')
+            line_total = self._get_decimal_from_dict(item, 'line_total')
+            discount = self._get_decimal_from_dict(item, 'discount_amount')
+            if line_total == Decimal('0.00') or unit_price == Decimal('0.00'):
+                continue
+            if abs(quantity * unit_price - discount - line_total) > max(total_tolerance, abs(line_total) * total_tolerance_pct):
+                mismatched += 1
+        if raw_items and mismatched / len(raw_items) > max_line_mismatch_ratio:
+            issues.append(f"line_item_math: {mismatched}/{len(raw_items)} items where quantity x unit_price - discount != line_total")
+        
+        # Date and state sanity
+        today = timezone.now().date()
+        if header['date'] is None:
+            issues.append("missing_date")
+        elif header['date'] > today + timedelta(days=31) or (today - header['date']).days > max_invoice_age_days:
+            issues.append(f"implausible_date: {header['date']}")
+        if header['state_code'] not in US_STATE_CODES:
+            issues.append(f"invalid_state_code: '{header['state_code']}'")
+        
+        return issues
+    
+    def extract_header(self) -> Dict[str, Any]:
+        """
+        Extract invoice-level fields only, without line items or totals validation.
+        
+        Returns:
+            dict: Header fields with defaults for missing values
+        """
+        if not self.parsed_data:
+            self.parse()
+        
+        return {
+            'invoice_number': self._get_string('invoice_number', default='UNKNOWN'),
+            'date': self._get_date('date'),
+            'vendor_name': self._get_string('vendor_name', default='Unknown Vendor'),
+            'total_amount': self._get_decimal('total_amount', default=Decimal('0.00')),
+            'total_tax_amount': self._get_decimal('total_tax_amount', default=Decimal('0.00')),
+            'invoice_discount_amount': self._get_decimal('invoice_discount_amount', default=Decimal('0.00')),
+            'state_code': self._get_string('state_code', default='').upper()[:2],
+            'jurisdiction': self._get_string('jurisdiction', default=''),
+        }
+    
     def _get_string(self, key: str, default: str = '') -> str:
         """Extract string value with default."""
         value = self.parsed_data.get(key, default)
@@ -174,60 +332,75 @@ class InvoiceDataParser:
         
         validated_items = []
         for idx, item in enumerate(line_items):
-            if not isinstance(item, dict):
-                logger.warning(f"Line item {idx} is not a dictionary, skipping")
-                continue
-            
-            try:
-                validated_item = {
-                    'description': str(item.get('description', '')).strip() or f'Item {idx + 1}',
-                    'quantity': self._get_decimal_from_dict(item, 'quantity', default=Decimal('1.00')),
-                    'unit_price': self._get_decimal_from_dict(item, 'unit_price', default=Decimal('0.00')),
-                    'line_total': self._get_decimal_from_dict(item, 'line_total', default=Decimal('0.00')),
-                    'discount_amount': self._get_decimal_from_dict(item, 'discount_amount', default=Decimal('0.00')),
-                    'tax_amount': self._get_decimal_from_dict(item, 'tax_amount', default=Decimal('0.00')),
-                    'tax_rate': self._get_decimal_from_dict(item, 'tax_rate', default=Decimal('0.0000')),
-                    'tax_status': self._get_tax_status(item.get('tax_status', 'unknown')),
-                }
-                
-                # Calculate expected line_total: (quantity * unit_price) - discount_amount
-                expected_line_total = (validated_item['quantity'] * validated_item['unit_price']) - validated_item['discount_amount']
-                
-                # Validate line_total matches expected value
-                # Only recalculate line_total if it's 0 AND we have both quantity and unit_price > 0
-                # But be conservative - if OCR says line_total is 0, it might be legitimate (e.g., bundled items, OCR couldn't extract)
-                if validated_item['line_total'] == Decimal('0.00') and validated_item['quantity'] > 0 and validated_item['unit_price'] > 0:
-                    # Only recalculate if it seems like a calculation error (not if it's legitimately 0)
-                    # We'll let the invoice-level validation decide if this creates issues
-                    # For now, trust OCR's line_total = 0 unless we have strong evidence otherwise
-                    # Don't auto-recalculate - this can cause false discount inference
-                    pass
-                else:
-                    # Validate that line_total matches expected value (within tolerance for rounding)
-                    tolerance = Decimal('0.01')
-                    if abs(validated_item['line_total'] - expected_line_total) > tolerance:
-                        logger.warning(
-                            f"Line item {idx} line_total doesn't match expected value: "
-                            f"line_total={validated_item['line_total']}, "
-                            f"expected=(quantity * unit_price - discount)={expected_line_total}, "
-                            f"quantity={validated_item['quantity']}, "
-                            f"unit_price={validated_item['unit_price']}, "
-                            f"discount_amount={validated_item['discount_amount']}"
-                        )
-                        # If discount wasn't extracted but line_total is less than quantity * unit_price, infer discount
-                        pre_discount_total = validated_item['quantity'] * validated_item['unit_price']
-                        if validated_item['discount_amount'] == Decimal('0.00') and validated_item['line_total'] < pre_discount_total:
-                            inferred_discount = pre_discount_total - validated_item['line_total']
-                            logger.info(f"Inferred discount_amount={inferred_discount} for line item {idx}")
-                            validated_item['discount_amount'] = inferred_discount
-                
+            validated_item = self.validate_line_item(item, idx)
+            if validated_item is not None:
                 validated_items.append(validated_item)
-            except Exception as e:
-                logger.warning(f"Error processing line item {idx}: {str(e)}")
-                continue
         
         return validated_items
     
+    def validate_line_item(self, item: Any, idx: int) -> Optional[Dict[str, Any]]:
+        """
+        Validate a single OCR line item.
+        
+        Args:
+            item: Raw line item from the OCR JSON
+            idx: Zero-based position of the item on the invoice
+            
+        Returns:
+            dict: Validated line item, or None if the item could not be used
+        """
+        if not isinstance(item, dict):
+            logger.warning(f"Line item {idx} is not a dictionary, skipping")
+            return None
+        
+        try:
+            validated_item = {
+                'description': str(item.get('description', '')).strip() or f'Item {idx + 1}',
+                'quantity': self._get_decimal_from_dict(item, 'quantity', default=Decimal('1.00')),
+                'unit_price': self._get_decimal_from_dict(item, 'unit_price', default=Decimal('0.00')),
+                'line_total': self._get_decimal_from_dict(item, 'line_total', default=Decimal('0.00')),
+                'discount_amount': self._get_decimal_from_dict(item, 'discount_amount', default=Decimal('0.00')),
+                'tax_amount': self._get_decimal_from_dict(item, 'tax_amount', default=Decimal('0.00')),
+                'tax_rate': self._get_decimal_from_dict(item, 'tax_rate', default=Decimal('0.0000')),
+                'tax_status': self._get_tax_status(item.get('tax_status', 'unknown')),
+            }
+            
+            # Calculate expected line_total: (quantity * unit_price) - discount_amount
+            expected_line_total = (validated_item['quantity'] * validated_item['unit_price']) - validated_item['discount_amount']
+            
+            # Validate line_total matches expected value
+            # Only recalculate line_total if it's 0 AND we have both quantity and unit_price > 0
+            # But be conservative - if OCR says line_total is 0, it might be legitimate (e.g., bundled items, OCR couldn't extract)
+            if validated_item['line_total'] == Decimal('0.00') and validated_item['quantity'] > 0 and validated_item['unit_price'] > 0:
+                # Only recalculate if it seems like a calculation error (not if it's legitimately 0)
+                # We'll let the invoice-level validation decide if this creates issues
+                # For now, trust OCR's line_total = 0 unless we have strong evidence otherwise
+                # Don't auto-recalculate - this can cause false discount inference
+                pass
+            else:
+                # Validate that line_total matches expected value (within tolerance for rounding)
+                tolerance = Decimal('0.01')
+                if abs(validated_item['line_total'] - expected_line_total) > tolerance:
+                    logger.warning(
+                        f"Line item {idx} line_total doesn't match expected value: "
+                        f"line_total={validated_item['line_total']}, "
+                        f"expected=(quantity * unit_price - discount)={expected_line_total}, "
+                        f"quantity={validated_item['quantity']}, "
+                        f"unit_price={validated_item['unit_price']}, "
+                        f"discount_amount={validated_item['discount_amount']}"
+                    )
+                    # If discount wasn't extracted but line_total is less than quantity * unit_price, infer discount
+                    pre_discount_total = validated_item['quantity'] * validated_item['unit_price']
+                    if validated_item['discount_amount'] == Decimal('0.00') and validated_item['line_total'] < pre_discount_total:
+                        inferred_discount = pre_discount_total - validated_item['line_total']
+                        logger.info(f"Inferred discount_amount={inferred_discount} for line item {idx}")
+                        validated_item['discount_amount'] = inferred_discount
+            
+            return validated_item
+        except Exception as e:
+            logger.warning(f"Error processing line item {idx}: {str(e)}")
+            return None
+    
     def _get_decimal_from_dict(self, data: dict, key: str, default: Decimal = Decimal('0.00')) -> Decimal:
         """Extract decimal from dictionary."""
         value = data.get(key, default)
@@ -247,12 +420,13 @@ class InvoiceDataParser:
         return status_lower if status_lower in valid_statuses else 'unknown'
 
 
-def create_invoice_from_ocr(ocr_json: str, pdf_file, ocr_job=None, invoice=None, ocr_usage_info=None) -> Invoice:
+def create_invoice_from_ocr(ocr_json: Union[str, Dict[str, Any]], pdf_file, ocr_job=None, invoice=None,
+                            ocr_usage_info=None) -> Invoice:
     """
     Create or update Invoice and InvoiceLineItem records from OCR JSON.
     
     Args:
-        ocr_json: JSON string from OCR service
+        ocr_json: JSON string from OCR service, or the invoice dict from structured extraction
         pdf_file: Django FileField file object
         ocr_job: Optional ProcessingJob instance
         invoice: Optional existing Invoice instance to update
@@ -267,7 +441,100 @@ def create_invoice_from_ocr(ocr_json: str, pdf_file, ocr_job=None, invoice=None,
     parser = InvoiceDataParser(ocr_json)
     data = parser.validate_and_extract()
     
-    # Create or update invoice
+    invoice = _save_invoice_header(data, pdf_file, ocr_job=ocr_job, invoice=invoice, ocr_json=ocr_json)
+    
+    # Delete existing line items if updating
+    if invoice.line_items.exists():
+        invoice.line_items.all().delete()
+    
+    # Create line items
+    for item_data in data['line_items']:
+        _create_line_item(invoice, item_data)
+    
+    _finalize_invoice(invoice, ocr_usage_info)
+    return invoice
+
+
+def create_invoice_from_ocr_stream(ocr_events, pdf_file, ocr_job=None, invoice=None) -> Invoice:
+    """
+    Create or update an Invoice from streamed OCR events, persisting line items as they arrive.
+    
+    Consumes the events yielded by InvoiceProcessor.process_pdf_stream(). Header
+    fields are saved as soon as the first line item arrives and each line item is
+    written when it is complete, so the invoice detail page fills in while the
+    model is still generating. On the final 'complete' event the full JSON is
+    validated as in create_invoice_from_ocr(); if it disagrees with what was
+    streamed the line items are rebuilt from the full result. Token usage and
+    cost come from the stream's metadata event.
+    
+    Args:
+        ocr_events: Iterable of (event_type, payload) tuples
+        pdf_file: Django FileField file object
+        ocr_job: Optional ProcessingJob instance (defaults to the job in the 'complete' event)
+        invoice: Optional existing Invoice instance to update
+        
+    Returns:
+        Invoice: Created or updated invoice instance
+        
+    Raises:
+        ValueError: If data is invalid or the stream ends without a result
+    """
+    item_parser = InvoiceDataParser({})
+    header = {}
+    header_saved = False
+    streamed_items = []
+    complete_payload = None
+    
+    for event_type, payload in ocr_events:
+        if event_type == 'header':
+            header.update(payload)
+        elif event_type == 'line_item':
+            if not header_saved:
+                data = InvoiceDataParser(header).extract_header()
+                invoice = _save_invoice_header(data, pdf_file, ocr_job=ocr_job, invoice=invoice)
+                if invoice.line_items.exists():
+                    invoice.line_items.all().delete()
+                header_saved = True
+            item_data = item_parser.validate_line_item(payload, len(streamed_items))
+            if item_data is not None:
+                _create_line_item(invoice, item_data)
+                streamed_items.append(item_data)
+        elif event_type == 'complete':
+            complete_payload = payload
+    
+    if complete_payload is None:
+        raise ValueError("OCR stream ended without a final result")
+    
+    ocr_json = complete_payload['result']
+    if ocr_job is None and complete_payload.get('job_id'):
+        from invoice_ocr.models import ProcessingJob
+        ocr_job = ProcessingJob.objects.filter(id=complete_payload['job_id']).first()
+    
+    data = InvoiceDataParser(ocr_json).validate_and_extract()
+    invoice = _save_invoice_header(data, pdf_file, ocr_job=ocr_job, invoice=invoice, ocr_json=ocr_json)
+    
+    # Items validated individually can differ from the full parse (e.g. a malformed
+    # streamed fragment); the full result is authoritative
+    if streamed_items != data['line_items']:
+        if streamed_items:
+            logger.warning(
+                f"Streamed line items for invoice {invoice.invoice_number} differ from the final result "
+                f"({len(streamed_items)} streamed, {len(data['line_items'])} final); rebuilding"
+            )
+        invoice.line_items.all().delete()
+        for item_data in data['line_items']:
+            _create_line_item(invoice, item_data)
+    
+    _finalize_invoice(invoice, complete_payload.get('usage_info'))
+    return invoice
+
+
+def _save_invoice_header(data: Dict[str, Any], pdf_file, ocr_job=None, invoice=None,
+                         ocr_json: Union[str, Dict[str, Any]] = '') -> Invoice:
+    """Create or update an Invoice's header fields from validated OCR data."""
+    if isinstance(ocr_json, dict):
+        # Structured extraction result; serialized only for storage
+        ocr_json = json.dumps(ocr_json, indent=2)
     if invoice:
         invoice.invoice_number = data['invoice_number']
         invoice.date = data['date'] or timezone.now().date()
@@ -281,40 +548,41 @@ def create_invoice_from_ocr(ocr_json: str, pdf_file, ocr_job=None, invoice=None,
         invoice.raw_ocr_data = ocr_json
         invoice.ocr_error = ''  # Clear any previous errors
         invoice.save()
-    else:
-        invoice = Invoice.objects.create(
-            invoice_number=data['invoice_number'],
-            date=data['date'] or timezone.now().date(),
-            vendor_name=data['vendor_name'],
-            total_amount=data['total_amount'],
-            total_tax_amount=data['total_tax_amount'],
-            invoice_discount_amount=data['invoice_discount_amount'],
-            state_code=data['state_code'] or 'XX',
-            jurisdiction=data['jurisdiction'],
-            pdf_file=pdf_file,
-            status='processing',
-            ocr_job=ocr_job,
-            raw_ocr_data=ocr_json,
-        )
-    
-    # Delete existing line items if updating
-    if invoice.line_items.exists():
-        invoice.line_items.all().delete()
-    
-    # Create line items
-    for item_data in data['line_items']:
-        InvoiceLineItem.objects.create(
-            invoice=invoice,
-            description=item_data['description'],
-            quantity=item_data['quantity'],
-            unit_price=item_data['unit_price'],
-            line_total=item_data['line_total'],
-            discount_amount=item_data['discount_amount'],
-            tax_amount=item_data['tax_amount'],
-            tax_rate=item_data['tax_rate'],
-            tax_status=item_data['tax_status'],
-        )
+        return invoice
     
+    return Invoice.objects.create(
+        invoice_number=data['invoice_number'],
+        date=data['date'] or timezone.now().date(),
+        vendor_name=data['vendor_name'],
+        total_amount=data['total_amount'],
+        total_tax_amount=data['total_tax_amount'],
+        invoice_discount_amount=data['invoice_discount_amount'],
+        state_code=data['state_code'] or 'XX',
+        jurisdiction=data['jurisdiction'],
+        pdf_file=pdf_file,
+        status='processing',
+        ocr_job=ocr_job,
+        raw_ocr_data=ocr_json,
+    )
+
+
+def _create_line_item(invoice: Invoice, item_data: Dict[str, Any]) -> InvoiceLineItem:
+    """Create an InvoiceLineItem from a validated line item dict."""
+    return InvoiceLineItem.objects.create(
+        invoice=invoice,
+        description=item_data['description'],
+        quantity=item_data['quantity'],
+        unit_price=item_data['unit_price'],
+        line_total=item_data['line_total'],
+        discount_amount=item_data['discount_amount'],
+        tax_amount=item_data['tax_amount'],
+        tax_rate=item_data['tax_rate'],
+        tax_status=item_data['tax_status'],
+    )
+
+
+def _finalize_invoice(invoice: Invoice, ocr_usage_info: Optional[Dict[str, Any]] = None):
+    """Save OCR usage, mark the invoice completed and auto-trigger tax verification."""
     # Save OCR token usage and costs if provided
     if ocr_usage_info:
         invoice.ocr_input_tokens = ocr_usage_info.get('inputTokens', 0)
@@ -341,8 +609,6 @@ def create_invoice_from_ocr(ocr_json: str, pdf_file, ocr_job=None, invoice=None,
         except Exception as e:
             # Log error but don't fail invoice creation
             logger.warning(f"Failed to auto-trigger tax verification for invoice {invoice.invoice_number}: {str(e)}")
-    
-    return invoice
 
 
 class BedrockKnowledgeBaseService:
@@ -357,11 +623,25 @@ class BedrockKnowledgeBaseService:
         """
         self.region_name = region_name or 'us-east-1'
         try:
-            self.client = boto3.client('bedrock-agent-runtime', region_name=self.region_name)
+            self.client = get_client('bedrock-agent-runtime', self.region_name)
         except Exception as e:
             logger.error(f"Failed to initialize Bedrock client: {str(e)}")
             raise
     
+    def _get_client(self, region_name: Optional[str] = None):
+        """
+        Get the bedrock-agent-runtime client for a knowledge base's region.
+        
+        Args:
+            region_name: Region configured on the StateKnowledgeBase (defaults to the service region)
+            
+        Returns:
+            Client from the active LLM backend (shared boto3 client for Bedrock)
+        """
+        if not region_name or region_name == self.region_name:
+            return self.client
+        return get_client('bedrock-agent-runtime', region_name)
+    
     def _estimate_tokens(self, text: str) -> int:
         """
         Estimate token count from text length.
@@ -395,14 +675,19 @@ class BedrockKnowledgeBaseService:
             logger.warning(f"No active knowledge base found for state: {state_code}")
             return None
     
-    def query_knowledge_base(self, kb_id: str, query_text: str, model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0") -> Dict[str, Any]:
+    def query_knowledge_base(self, kb_id: str, query_text: str, model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0",
+                             region_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Query a Bedrock Knowledge Base using retrieve_and_generate API.
         
+        Transient failures are retried with backoff and guarded by a per-KB circuit breaker;
+        retry counts and wait time are returned in metadata['retries'].
+        
         Args:
             kb_id: Knowledge Base ID
             query_text: Query text to send to the KB
             model_id: Model ID to use for generation (default: Claude 3 Sonnet)
+            region_name: Region the knowledge base lives in (defaults to the service region)
             
         Returns:
             Dictionary with 'answer', 'citations', and 'metadata'
@@ -410,16 +695,23 @@ class BedrockKnowledgeBaseService:
         Raises:
             Exception: If query fails
         """
+        region_name = region_name or self.region_name
+        client = self._get_client(region_name)
+        retry_stats = RetryStats()
         try:
-            response = self.client.retrieve_and_generate(
-                input={'text': query_text},
-                retrieveAndGenerateConfiguration={
-                    'type': 'KNOWLEDGE_BASE',
-                    'knowledgeBaseConfiguration': {
-                        'knowledgeBaseId': kb_id,
-                        'modelArn': f'arn:aws:bedrock:{self.region_name}::foundation-model/{model_id}'
+            response = call_with_resilience(
+                lambda: client.retrieve_and_generate(
+                    input={'text': query_text},
+                    retrieveAndGenerateConfiguration={
+                        'type': 'KNOWLEDGE_BASE',
+                        'knowledgeBaseConfiguration': {
+                            'knowledgeBaseId': kb_id,
+                            'modelArn': f'arn:aws:bedrock:{region_name}::foundation-model/{model_id}'
+                        }
                     }
-                }
+                ),
+                breaker_key=f"bedrock-agent-runtime:{kb_id}",
+                stats=retry_stats
             )
             
             # Extract answer and citations
@@ -440,7 +732,8 @@ class BedrockKnowledgeBaseService:
                 'citations': response.get('citations', []),
                 'metadata': {
                     'session_id': response.get('sessionId'),
-                    'model_id': model_id
+                    'model_id': model_id,
+                    'retries': retry_stats.as_dict()
                 },
                 'token_usage': {
                     'inputTokens': input_tokens,
@@ -463,6 +756,207 @@ class BedrockKnowledgeBaseService:
             logger.error(f"Unexpected error querying KB: {str(e)}")
             raise
     
+    def retrieve_passages(self, kb_id: str, retrieval_query: str, region_name: Optional[str] = None,
+                          stats: Optional[RetryStats] = None, state_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieve passages for a query from the configured retrieval source.
+        
+        With kb_retrieval_source 'bedrock' passages come from the KB's Retrieve API; with a
+        local source (e.g. 'bm25') they come from an offline index over RAG/state_data, falling
+        back to the KB when the index is missing or does not cover the state. Results are
+        cached per (KB ID or local source and state, query signature) when
+        kb_retrieval_cache_enabled is set (see taxright.retrieval), so line items and
+        invoices asking the same question share one retrieval.
+        
+        Args:
+            kb_id: Knowledge Base ID
+            retrieval_query: Short query used to retrieve passages
+            region_name: Region the knowledge base lives in (defaults to the service region)
+            stats: Optional RetryStats the Retrieve call's retries are added to
+            state_code: State the KB covers (required for local retrieval sources)
+            
+        Returns:
+            Dictionary with 'references' (raw retrieval results) and 'retrieval' (source, query,
+            signature, cache_hit and the ranked, scored 'chunks')
+        """
+        client = self._get_client(region_name or self.region_name)
+        number_of_results = ConfigManager.get_kb_retrieval_results()
+        signature = query_signature(retrieval_query, number_of_results)
+        source, cache_namespace = 'bedrock', kb_id
+        
+        def retrieve_from_kb():
+            response = call_with_resilience(
+                lambda: client.retrieve(
+                    knowledgeBaseId=kb_id,
+                    retrievalQuery={'text': retrieval_query},
+                    retrievalConfiguration={
+                        'vectorSearchConfiguration': {'numberOfResults': number_of_results}
+                    }
+                ),
+                breaker_key=f"bedrock-agent-runtime:{kb_id}",
+                stats=stats
+            )
+            return response.get('retrievalResults', [])
+        
+        retrieve_fn = retrieve_from_kb
+        configured_source = ConfigManager.get_kb_retrieval_source()
+        if configured_source != 'bedrock':
+            retriever = get_local_retriever(configured_source, state_code)
+            if retriever is not None:
+                source, cache_namespace = configured_source, f"{configured_source}:{state_code.upper()}"
+                
+                def retrieve_locally():
+                    return retriever.retrieve(state_code, retrieval_query, number_of_results)
+                
+                retrieve_fn = retrieve_locally
+        
+        if ConfigManager.get_kb_retrieval_cache_enabled():
+            references, cache_hit = get_retrieved_context_cache().get_or_retrieve(cache_namespace, signature, retrieve_fn)
+        else:
+            references, cache_hit = retrieve_fn(), False
+        
+        return {
+            'references': references,
+            'retrieval': {
+                'source': source,
+                'query': retrieval_query,
+                'signature': signature,
+                'cache_hit': cache_hit,
+                'chunks': passages_from_references(references),
+            }
+        }
+    
+    def query_knowledge_base_split(self, kb_id: str, query_text: str, retrieval_query: str,
+                                   model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0",
+                                   region_name: Optional[str] = None,
+                                   tool_spec: Optional[Dict[str, Any]] = None,
+                                   state_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Query a Bedrock Knowledge Base with retrieval split from generation.
+        
+        Passages come from retrieve_passages() (cached) and the answer is generated by a
+        plain Converse call over them, optionally forced through a tool.
+        
+        Args:
+            kb_id: Knowledge Base ID
+            query_text: Verification prompt
+            retrieval_query: Short query used to retrieve passages from the KB
+            model_id: Model ID to use for generation (default: Claude 3 Sonnet)
+            region_name: Region the knowledge base lives in (defaults to the service region)
+            tool_spec: Tool the answer is forced through; None for a free-text answer
+            state_code: State the KB covers, used by local retrieval sources
+            
+        Returns:
+            Dictionary with 'answer', 'structured', 'citations', 'retrieval', 'metadata' and
+            'token_usage'; 'structured' is None without a tool or if the model did not call it
+            
+        Raises:
+            Exception: If query fails
+        """
+        region_name = region_name or self.region_name
+        runtime_client = get_client('bedrock-runtime', region_name)
+        retry_stats = RetryStats()
+        try:
+            retrieved = self.retrieve_passages(
+                kb_id, retrieval_query, region_name=region_name, stats=retry_stats, state_code=state_code
+            )
+            references = retrieved['references']
+            passages = '\n\n'.join(f"[{chunk['rank']}] {chunk['text']}" for chunk in retrieved['retrieval']['chunks'])
+            
+            request = {
+                'modelId': model_id,
+                'messages': [{
+                    'role': 'user',
+                    'content': [{'text': f"Relevant tax law passages:\n\n{passages}\n\n{query_text}"}]
+                }],
+                'inferenceConfig': {'maxTokens': 1024, 'temperature': 0.0}
+            }
+            if tool_spec:
+                request['toolConfig'] = build_tool_config(tool_spec)
+            response = call_with_resilience(
+                lambda: runtime_client.converse(**request),
+                breaker_key=f"bedrock-runtime:{model_id}",
+                stats=retry_stats
+            )
+            
+            message = response.get('output', {}).get('message', {})
+            structured = extract_tool_input(message, tool_spec['name']) if tool_spec else None
+            answer_text = '\n'.join(item['text'] for item in message.get('content', []) if 'text' in item)
+            usage = response.get('usage', {})
+            
+            return {
+                'answer': answer_text or (structured or {}).get('reasoning', ''),
+                'structured': structured,
+                'citations': [{'retrievedReferences': references}] if references else [],
+                'retrieval': retrieved['retrieval'],
+                'metadata': {
+                    'model_id': model_id,
+                    'structured_output': bool(tool_spec),
+                    'retries': retry_stats.as_dict()
+                },
+                'token_usage': {
+                    'inputTokens': usage.get('inputTokens', 0),
+                    'outputTokens': usage.get('outputTokens', 0),
+                    'totalTokens': usage.get('totalTokens', 0)
+                }
+            }
+            
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+            error_message = e.response.get('Error', {}).get('Message', str(e))
+            logger.error(f"AWS Bedrock KB error ({error_code}): {error_message}")
+            raise Exception(f"Failed to query knowledge base: {error_message}")
+        except BotoCoreError as e:
+            logger.error(f"Boto3 error querying KB: {str(e)}")
+            raise Exception(f"Boto3 error: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error querying KB: {str(e)}")
+            raise
+    
+    def query_knowledge_base_structured(self, kb_id: str, query_text: str, retrieval_query: str,
+                                        model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0",
+                                        region_name: Optional[str] = None,
+                                        tool_spec: Optional[Dict[str, Any]] = None,
+                                        state_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Query a Bedrock Knowledge Base with structured (tool use) output.
+        
+        retrieve_and_generate cannot take a toolConfig, so this goes through
+        query_knowledge_base_split() with the answer forced through the verification tool.
+        The tool input is returned as a dict in 'structured'.
+        
+        Args:
+            kb_id: Knowledge Base ID
+            query_text: Verification prompt
+            retrieval_query: Short query used to retrieve passages from the KB
+            model_id: Model ID to use for generation (default: Claude 3 Sonnet)
+            region_name: Region the knowledge base lives in (defaults to the service region)
+            tool_spec: Tool the answer is forced through (defaults to TAX_VERIFICATION_TOOL)
+            state_code: State the KB covers, used by local retrieval sources
+            
+        Returns:
+            Dictionary as returned by query_knowledge_base_split(); 'structured' is None if
+            the model did not call the tool
+            
+        Raises:
+            Exception: If query fails
+        """
+        return self.query_knowledge_base_split(
+            kb_id, query_text, retrieval_query, model_id=model_id, region_name=region_name,
+            tool_spec=tool_spec or TAX_VERIFICATION_TOOL, state_code=state_code
+        )
+    
+    def _get_generation_mode(self) -> str:
+        """Get the KB generation mode; local retrieval sources always generate with Converse."""
+        if ConfigManager.get_kb_retrieval_source() != 'bedrock':
+            return 'converse'
+        return ConfigManager.get_kb_generation_mode()
+    
+    def _build_retrieval_query(self, line_item: InvoiceLineItem, state_code: str, jurisdiction: str = '') -> str:
+        """Build the short passage-retrieval query for a line item (the full prompt is too long to embed well)."""
+        location = f"{jurisdiction}, {state_code}" if jurisdiction else state_code
+        return f"Sales and use tax treatment and rate in {location} for: {line_item.description}"
+    
     def _build_tax_verification_prompt(self, line_item: InvoiceLineItem, state_code: str, jurisdiction: str = '', invoice: Optional[Invoice] = None) -> str:
         """
         Build a structured prompt for tax verification.
@@ -632,47 +1126,247 @@ IMPORTANT:
                     'reasoning': f"Failed to parse JSON response. Error: {str(e)}. Response preview: {response_text[:300]}"
                 }
         
-        # Validate and normalize response
-        try:
-            result = {
-                'is_correct': bool(parsed.get('is_correct', False)),
-                'expected_tax_rate': Decimal(str(parsed.get('expected_tax_rate', 0))),
-                'confidence_score': Decimal(str(parsed.get('confidence_score', 0.5))),
-                'reasoning': str(parsed.get('reasoning', 'No reasoning provided')).strip()
-            }
-            
-            # Clamp confidence score to 0-1
-            if result['confidence_score'] < 0:
-                result['confidence_score'] = Decimal('0.00')
-            elif result['confidence_score'] > 1:
-                result['confidence_score'] = Decimal('1.00')
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error normalizing parsed response: {str(e)}")
-            # Return default values if normalization fails
-            return {
-                'is_correct': False,
-                'expected_tax_rate': Decimal('0.0000'),
-                'confidence_score': Decimal('0.00'),
-                'reasoning': f"Error processing response: {str(e)}. Response preview: {response_text[:300]}"
-            }
+        return self._normalize_verification(parsed, response_text)
     
-    def _normalize_rate_mentions(self, text: str) -> str:
+    def _build_batch_retrieval_query(self, line_items: list, state_code: str, jurisdiction: str = '') -> str:
+        """Build the passage-retrieval query for a batch (or a whole invoice) of line items, listing each description once."""
+        location = f"{jurisdiction}, {state_code}" if jurisdiction else state_code
+        descriptions = {}
+        for line_item in line_items:
+            descriptions.setdefault(normalize_description(line_item.description), line_item.description)
+        query = f"Sales and use tax treatment and rates in {location} for: {'; '.join(descriptions.values())}"
+        return query[:MAX_RETRIEVAL_QUERY_CHARS]
+    
+    def _build_batch_verification_prompt(self, line_items: list, state_code: str, jurisdiction: str = '',
+                                         invoice: Optional[Invoice] = None) -> str:
         """
-        Normalize rate mentions in text to remove precision-only differences.
+        Build a prompt that verifies several line items of one invoice at once.
         
-        This helps detect when reasoning mentions the same rate with different
-        decimal precision (e.g., "6.75%" vs "6.7500%") as if they're different.
+        The state context and verification guidelines are stated once; each line item is
+        listed under its ID and the model answers with a JSON array of verdicts keyed by
+        line_item_id.
         
         Args:
-            text: Text that may contain rate mentions
-            
+            line_items: InvoiceLineItem instances from the same invoice
+            state_code: State code
+            jurisdiction: Optional jurisdiction (county, city, etc.)
+            invoice: Optional Invoice instance for context (vendor, total_tax_amount)
+        
         Returns:
-            Normalized text with rates rounded to 4 decimal places
+            Formatted prompt string
         """
-        import re
+        jurisdiction_text = f" in {jurisdiction}" if jurisdiction else ""
+        
+        invoice_context = ""
+        total_tax_amount = Decimal('0.00')
+        if invoice:
+            total_tax_amount = invoice.total_tax_amount or Decimal('0.00')
+            if invoice.vendor_name:
+                invoice_context += f"\n- Vendor: {invoice.vendor_name} (this may help identify the type of business/service)"
+            invoice_context += f"\n- Invoice Total Tax Amount: ${total_tax_amount:.2f}"
+        
+        item_sections = []
+        for line_item in line_items:
+            applied_rate_percent = float(line_item.tax_rate) * 100
+            applied_rate_decimal = float(line_item.tax_rate)
+            
+            # Same tax display patterns as _build_tax_verification_prompt, one line per item
+            if line_item.tax_amount == Decimal('0.00') and line_item.tax_rate > Decimal('0.0000') and total_tax_amount > Decimal('0.00'):
+                display_note = "tax is shown as a single total on the invoice, not per line item; verify the rate"
+            elif line_item.tax_amount > Decimal('0.00'):
+                display_note = "tax is shown per line item"
+            elif line_item.tax_amount == Decimal('0.00') and line_item.tax_rate == Decimal('0.0000'):
+                display_note = f"no tax applied; verify whether this item type is exempt in {state_code}{jurisdiction_text}"
+            else:
+                display_note = "no tax amount shown"
+            
+            item_sections.append(f"""Line item ID {line_item.id}:
+- Description: {line_item.description}
+- Quantity: {line_item.quantity}
+- Unit Price: ${line_item.unit_price}
+- Line Total: ${line_item.line_total}
+- Tax Status: {line_item.get_tax_status_display()}
+- Applied Tax Rate: {applied_rate_percent:.4f}% (as decimal: {applied_rate_decimal})
+- Applied Tax Amount: ${line_item.tax_amount}
+- Tax Display: {display_note}""")
+        
+        items_text = '\n\n'.join(item_sections)
+        line_item_ids = ', '.join(str(line_item.id) for line_item in line_items)
+        
+        prompt = f"""You are a tax law expert for {state_code}{jurisdiction_text}.
+
+Analyze each of the following invoice line items and determine if the tax that was applied to it is correct according to state tax law.
+
+Invoice Context:{invoice_context}
+
+Line Items:
+
+{items_text}
+
+For EACH line item, determine:
+1. Is the tax rate applied to this item correct according to {state_code} state tax law?
+2. What is the expected tax rate for this type of item in {state_code}{jurisdiction_text}? (Provide as a decimal, e.g., 0.0825 for 8.25%)
+3. Provide your confidence level (0.0 to 1.0) in your determination
+4. Explain your reasoning based on the relevant tax laws
+
+IMPORTANT VERIFICATION GUIDELINES:
+- Judge every line item on its own; do not copy a verdict from another item unless the items are of the same type
+- Focus on verifying each item's APPLIED TAX RATE (use the exact value shown), not the tax amount
+- CRITICAL CONSISTENCY RULE: If expected_tax_rate ≠ applied tax rate (beyond 0.0001 tolerance), then is_correct MUST be false
+- Set is_correct to true ONLY if the applied rate matches the expected rate (within 0.0001 tolerance)
+- Each item's reasoning must be consistent with its is_correct determination
+- If an item's Applied Tax Amount is $0.00 but its Applied Tax Rate is > 0%, tax is shown as a total on the invoice - still verify the rate is correct
+
+CRITICAL RATE MATCHING GUIDELINES:
+- If an item shows a tax rate and tax_status = 'taxable', its expected_tax_rate should typically match the applied rate unless this specific item type is explicitly exempt from tax
+- Only set expected_tax_rate = 0.0000 if the item type is explicitly exempt from tax according to state law
+- Precision differences (e.g., 6.75% vs 6.7500%) are NOT actual differences - do NOT mark items as incorrect due to rate formatting
+
+Respond in JSON format with an array containing exactly one object per line item:
+[
+    {{
+        "line_item_id": 123,
+        "is_correct": true/false,
+        "expected_tax_rate": 0.0825,
+        "confidence_score": 0.95,
+        "reasoning": "Concise explanation based on state tax law..."
+    }}
+]
+
+IMPORTANT:
+- Return ONLY a valid JSON array, no additional text or markdown formatting
+- Include one object for every line item ID listed above ({line_item_ids}), using those exact IDs
+- Keep each reasoning field concise (under 300 characters)
+- Do not include URLs or external links in the reasoning fields
+- Ensure all quotes in the reasoning fields are properly escaped
+- expected_tax_rate should be a decimal (e.g., 0.0825 for 8.25%, not 8.25)"""
+
+        return prompt
+    
+    def _parse_batch_verification_response(self, response_text: str) -> list:
+        """
+        Extract the verdict objects from a batch KB answer.
+        
+        Accepts a JSON array (optionally fenced in markdown) or an object with a
+        'verifications' array. If the array is malformed or truncated, every complete
+        object that can still be decoded is salvaged, so only the lost items need to be
+        verified again.
+        
+        Args:
+            response_text: Raw response text from KB
+        
+        Returns:
+            list: Decoded verdict dicts (not yet normalized)
+        """
+        match = re.search(r'```(?:json)?\s*(.*?)\s*```', response_text, re.DOTALL)
+        json_str = match.group(1) if match else response_text
+        start = json_str.find('[')
+        end = json_str.rfind(']')
+        candidate = json_str[start:end + 1] if start != -1 and end > start else json_str.strip()
+        
+        try:
+            parsed = json.loads(candidate)
+            if isinstance(parsed, dict):
+                parsed = parsed.get('verifications', [parsed])
+            if isinstance(parsed, list):
+                return [element for element in parsed if isinstance(element, dict)]
+        except json.JSONDecodeError as e:
+            logger.warning(f"Batch verification JSON parse failed: {str(e)}. Salvaging complete objects...")
+        
+        # Decode each complete top-level object; a truncated tail is dropped
+        decoder = json.JSONDecoder()
+        elements = []
+        position = json_str.find('{')
+        while position != -1:
+            try:
+                element, end_position = decoder.raw_decode(json_str, position)
+            except json.JSONDecodeError:
+                position = json_str.find('{', position + 1)
+                continue
+            if isinstance(element, dict):
+                elements.extend(element['verifications'] if isinstance(element.get('verifications'), list) else [element])
+            position = json_str.find('{', end_position)
+        return [element for element in elements if isinstance(element, dict)]
+    
+    def _collect_batch_verdicts(self, elements: list, line_item_ids: list, response_text: str = '') -> Dict[int, Dict[str, Any]]:
+        """
+        Normalize batch verdicts and key them by line item ID.
+        
+        Verdicts for unknown IDs, duplicates and verdicts missing is_correct or
+        expected_tax_rate are dropped, so the affected items are retried individually.
+        
+        Args:
+            elements: Verdict dicts from the model
+            line_item_ids: IDs of the line items in the batch
+            response_text: Raw response text, used only in error messages
+        
+        Returns:
+            dict: Normalized verification dicts by line item ID
+        """
+        verdicts = {}
+        for element in elements:
+            try:
+                line_item_id = int(element.get('line_item_id'))
+            except (TypeError, ValueError):
+                continue
+            if line_item_id not in line_item_ids or line_item_id in verdicts:
+                continue
+            if 'is_correct' not in element or 'expected_tax_rate' not in element:
+                continue
+            verdicts[line_item_id] = self._normalize_verification(element, response_text)
+        return verdicts
+    
+    def _normalize_verification(self, parsed: Dict[str, Any], response_text: str = '') -> Dict[str, Any]:
+        """
+        Normalize a decoded verification answer (parsed text or structured tool input).
+        
+        Args:
+            parsed: Dictionary with 'is_correct', 'expected_tax_rate', 'confidence_score' and 'reasoning'
+            response_text: Raw response text, used only in error messages
+            
+        Returns:
+            Dictionary with verification results; confidence clamped to 0-1
+        """
+        try:
+            result = {
+                'is_correct': bool(parsed.get('is_correct', False)),
+                'expected_tax_rate': Decimal(str(parsed.get('expected_tax_rate', 0))),
+                'confidence_score': Decimal(str(parsed.get('confidence_score', 0.5))),
+                'reasoning': str(parsed.get('reasoning', 'No reasoning provided')).strip()
+            }
+            
+            # Clamp confidence score to 0-1
+            if result['confidence_score'] < 0:
+                result['confidence_score'] = Decimal('0.00')
+            elif result['confidence_score'] > 1:
+                result['confidence_score'] = Decimal('1.00')
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error normalizing parsed response: {str(e)}")
+            # Return default values if normalization fails
+            return {
+                'is_correct': False,
+                'expected_tax_rate': Decimal('0.0000'),
+                'confidence_score': Decimal('0.00'),
+                'reasoning': f"Error processing response: {str(e)}. Response preview: {(response_text or str(parsed))[:300]}"
+            }
+    
+    def _normalize_rate_mentions(self, text: str) -> str:
+        """
+        Normalize rate mentions in text to remove precision-only differences.
+        
+        This helps detect when reasoning mentions the same rate with different
+        decimal precision (e.g., "6.75%" vs "6.7500%") as if they're different.
+        
+        Args:
+            text: Text that may contain rate mentions
+            
+        Returns:
+            Normalized text with rates rounded to 4 decimal places
+        """
+        import re
         
         # Pattern to match percentage rates: digits, optional decimal, digits, %
         rate_pattern = r'(\d+\.?\d*)\s*%'
@@ -751,6 +1445,15 @@ IMPORTANT:
         """
         Verify if tax applied to a line item is correct using Bedrock KB.
         
+        Items in a category the SUT taxability matrix answers unconditionally
+        (taxright.taxability) are decided without a KB call when
+        taxability_matrix_enabled is set, and taxable items whose applied rate matches
+        the combined TaxRule rate are accepted by the rate engine
+        (taxright.rate_engine) when rule_engine_enabled is set. Verdicts are served from and stored in the
+        verification cache (taxright.cache) when verification_cache_enabled is set, and
+        reused from similar verified line items (taxright.near_duplicates) when
+        near_duplicate_enabled is set.
+        
         Args:
             line_item: InvoiceLineItem instance
             state_code: State code
@@ -769,8 +1472,50 @@ IMPORTANT:
         if invoice is None:
             invoice = line_item.invoice
         
-        # Get KB for state
+        resolved = self._get_local_verifications(state_code, jurisdiction, invoice, [line_item])
+        if resolved:
+            return resolved[line_item.id]
+        
         kb = self.get_knowledge_base_for_state(state_code)
+        cache_enabled = bool(kb) and ConfigManager.get_verification_cache_enabled()
+        if cache_enabled:
+            cached = self._get_cached_verifications(invoice, [line_item], kb)
+            if cached:
+                return cached[line_item.id]
+        if kb and ConfigManager.get_near_duplicate_enabled():
+            reused = self._get_near_duplicate_verifications(invoice, [line_item])
+            if reused:
+                return reused[line_item.id]
+        
+        verification = self._verify_line_item(line_item, state_code, jurisdiction, invoice, kb)
+        self._save_kb_usage(line_item, verification)
+        if cache_enabled:
+            self._store_cached_verifications(invoice, [line_item], [verification], kb)
+        return verification
+    
+    def _verify_line_item(self, line_item: InvoiceLineItem, state_code: str, jurisdiction: str,
+                          invoice: Invoice, kb: Optional[StateKnowledgeBase],
+                          structured_output: Optional[bool] = None, generation_mode: Optional[str] = None,
+                          retrieval_query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Query the KB and check one line item without writing to the database.
+        
+        Safe to run on worker threads: the KB mapping and settings are resolved by the
+        caller, and token usage is persisted separately by _save_kb_usage().
+        
+        Args:
+            line_item: InvoiceLineItem instance
+            state_code: State code
+            jurisdiction: Optional jurisdiction
+            invoice: Invoice instance for context
+            kb: StateKnowledgeBase for the state, or None if not mapped
+            structured_output: Whether to use tool-use verification (defaults to structured_output_enabled config)
+            generation_mode: 'retrieve_and_generate' or 'converse' (defaults to kb_generation_mode config)
+            retrieval_query: Passage-retrieval query shared with other line items (defaults to one for this item)
+            
+        Returns:
+            Dictionary with verification results as returned by verify_line_item_tax()
+        """
         if not kb:
             logger.warning(f"No KB mapping found for state {state_code}")
             return {
@@ -785,184 +1530,253 @@ IMPORTANT:
         # Build prompt with invoice context
         prompt = self._build_tax_verification_prompt(line_item, state_code, jurisdiction, invoice=invoice)
         
+        if structured_output is None:
+            structured_output = ConfigManager.get_structured_output_enabled()
+        if generation_mode is None:
+            generation_mode = self._get_generation_mode()
+        retrieval_query = retrieval_query or self._build_retrieval_query(line_item, state_code, jurisdiction)
+        
         try:
             # Query KB
-            kb_response = self.query_knowledge_base(kb.knowledge_base_id, prompt)
+            if structured_output:
+                kb_response = self.query_knowledge_base_structured(
+                    kb.knowledge_base_id, prompt, retrieval_query, region_name=kb.region, state_code=kb.state_code
+                )
+            elif generation_mode == 'converse':
+                kb_response = self.query_knowledge_base_split(
+                    kb.knowledge_base_id, prompt, retrieval_query, region_name=kb.region, state_code=kb.state_code
+                )
+            else:
+                kb_response = self.query_knowledge_base(kb.knowledge_base_id, prompt, region_name=kb.region)
             
             if not kb_response:
                 raise Exception("Empty response from knowledge base")
             
-            # Parse response
+            # Structured answers are already typed; free-text answers are parsed
             answer = kb_response.get('answer', '')
-            if not answer:
+            if kb_response.get('structured') is not None:
+                verification = self._normalize_verification(kb_response['structured'])
+            elif not answer:
                 raise Exception("No answer in KB response")
+            else:
+                verification = self._parse_verification_response(answer)
             
-            verification = self._parse_verification_response(answer)
+            self._apply_consistency_checks(verification, line_item)
             
-            # Validate consistency between expected/applied rates and is_correct
-            applied_rate = Decimal(str(line_item.tax_rate))
-            expected_rate = verification['expected_tax_rate']
-            tolerance = Decimal('0.0001')  # Allow small floating point differences
+            # Add KB metadata
+            verification['kb_response'] = kb_response
+            verification['kb_id'] = kb.knowledge_base_id
+            verification['kb_name'] = kb.knowledge_base_name
             
-            # Handle case where KB returns 0.0000 expected rate for taxable items
-            # Check if reasoning contradicts the zero rate
-            if expected_rate == Decimal('0.0000') and applied_rate > Decimal('0.0000'):
-                # KB returned zero expected rate but item has applied tax
-                # Check reasoning to see if it actually suggests the item should be taxable
-                reasoning_lower = verification['reasoning'].lower()
-                rates_in_reasoning = self._extract_rates_from_reasoning(verification['reasoning'])
-                
-                # Check if reasoning mentions a non-zero tax rate
-                reasoning_suggests_taxable = False
-                for mentioned_rate in rates_in_reasoning:
-                    if mentioned_rate > tolerance:
-                        # Reasoning mentions a non-zero rate
-                        if abs(mentioned_rate - applied_rate) <= tolerance:
-                            # The mentioned rate matches the applied rate
-                            reasoning_suggests_taxable = True
-                            logger.info(
-                                f"KB returned expected_rate=0.0000 but reasoning mentions rate {mentioned_rate} "
-                                f"that matches applied_rate={applied_rate}. Using applied_rate as expected_rate."
-                            )
-                            expected_rate = applied_rate
-                            verification['expected_tax_rate'] = expected_rate
-                            break
-                        elif mentioned_rate > tolerance:
-                            # Reasoning mentions a different non-zero rate
-                            reasoning_suggests_taxable = True
-                            logger.info(
-                                f"KB returned expected_rate=0.0000 but reasoning mentions rate {mentioned_rate}. "
-                                f"Using mentioned rate as expected_rate."
-                            )
-                            expected_rate = mentioned_rate
-                            verification['expected_tax_rate'] = expected_rate
-                            break
-                
-                # If item is marked as taxable in OCR and reasoning doesn't explicitly say it's exempt,
-                # treat the zero expected rate as likely incorrect
-                if not reasoning_suggests_taxable and line_item.tax_status == 'taxable':
-                    exempt_keywords = ['exempt', 'not subject to tax', 'no tax', 'tax-free', 'non-taxable']
-                    reasoning_explicitly_exempt = any(keyword in reasoning_lower for keyword in exempt_keywords)
-                    
-                    if not reasoning_explicitly_exempt:
-                        # Item is taxable but KB returned 0.0000 without clear exemption reasoning
-                        # Use applied rate as expected rate (likely KB error)
-                        logger.warning(
-                            f"KB returned expected_rate=0.0000 for taxable item (tax_status='taxable', "
-                            f"applied_rate={applied_rate}) without explicit exemption reasoning. "
-                            f"Using applied_rate as expected_rate."
+            return verification
+            
+        except Exception as e:
+            logger.error(f"Error verifying line item tax (line_item_id={line_item.id}, state={state_code}): {str(e)}", exc_info=True)
+            return {
+                'is_correct': False,
+                'expected_tax_rate': Decimal('0.0000'),
+                'confidence_score': Decimal('0.00'),
+                'reasoning': f"Error during verification: {str(e)}",
+                'kb_response': None,
+                'error': str(e)
+            }
+    
+    def _apply_consistency_checks(self, verification: Dict[str, Any], line_item: InvoiceLineItem) -> Dict[str, Any]:
+        """
+        Reconcile a parsed KB verdict with the applied rate and its own reasoning.
+        
+        Args:
+            verification: Normalized verification dict (updated in place)
+            line_item: InvoiceLineItem the verdict is for
+            
+        Returns:
+            The same verification dict, with is_correct, expected_tax_rate and reasoning corrected
+        """
+        # Validate consistency between expected/applied rates and is_correct
+        applied_rate = Decimal(str(line_item.tax_rate))
+        expected_rate = verification['expected_tax_rate']
+        tolerance = Decimal('0.0001')  # Allow small floating point differences
+        
+        # Handle case where KB returns 0.0000 expected rate for taxable items
+        # Check if reasoning contradicts the zero rate
+        if expected_rate == Decimal('0.0000') and applied_rate > Decimal('0.0000'):
+            # KB returned zero expected rate but item has applied tax
+            # Check reasoning to see if it actually suggests the item should be taxable
+            reasoning_lower = verification['reasoning'].lower()
+            rates_in_reasoning = self._extract_rates_from_reasoning(verification['reasoning'])
+            
+            # Check if reasoning mentions a non-zero tax rate
+            reasoning_suggests_taxable = False
+            for mentioned_rate in rates_in_reasoning:
+                if mentioned_rate > tolerance:
+                    # Reasoning mentions a non-zero rate
+                    if abs(mentioned_rate - applied_rate) <= tolerance:
+                        # The mentioned rate matches the applied rate
+                        reasoning_suggests_taxable = True
+                        logger.info(
+                            f"KB returned expected_rate=0.0000 but reasoning mentions rate {mentioned_rate} "
+                            f"that matches applied_rate={applied_rate}. Using applied_rate as expected_rate."
                         )
                         expected_rate = applied_rate
                         verification['expected_tax_rate'] = expected_rate
+                        break
+                    elif mentioned_rate > tolerance:
+                        # Reasoning mentions a different non-zero rate
+                        reasoning_suggests_taxable = True
+                        logger.info(
+                            f"KB returned expected_rate=0.0000 but reasoning mentions rate {mentioned_rate}. "
+                            f"Using mentioned rate as expected_rate."
+                        )
+                        expected_rate = mentioned_rate
+                        verification['expected_tax_rate'] = expected_rate
+                        break
             
-            rates_match = abs(applied_rate - expected_rate) <= tolerance
-            
-            # CRITICAL: Enforce consistency - if rates don't match, is_correct MUST be false
-            if not rates_match:
-                if verification['is_correct']:
+            # If item is marked as taxable in OCR and reasoning doesn't explicitly say it's exempt,
+            # treat the zero expected rate as likely incorrect
+            if not reasoning_suggests_taxable and line_item.tax_status == 'taxable':
+                exempt_keywords = ['exempt', 'not subject to tax', 'no tax', 'tax-free', 'non-taxable']
+                reasoning_explicitly_exempt = any(keyword in reasoning_lower for keyword in exempt_keywords)
+                
+                if not reasoning_explicitly_exempt:
+                    # Item is taxable but KB returned 0.0000 without clear exemption reasoning
+                    # Use applied rate as expected rate (likely KB error)
                     logger.warning(
-                        f"Auto-correcting is_correct: rates don't match but KB said correct. "
-                        f"Applied={applied_rate}, Expected={expected_rate}, "
-                        f"Difference={abs(applied_rate - expected_rate)}"
-                    )
-                    verification['is_correct'] = False
-                    # Update reasoning to note the correction
-                    verification['reasoning'] = (
-                        f"[Auto-corrected] The applied tax rate ({applied_rate * 100:.4f}%) does not match "
-                        f"the expected rate ({expected_rate * 100:.4f}%), so is_correct has been set to false. "
-                        f"Original reasoning: {verification['reasoning']}"
+                        f"KB returned expected_rate=0.0000 for taxable item (tax_status='taxable', "
+                        f"applied_rate={applied_rate}) without explicit exemption reasoning. "
+                        f"Using applied_rate as expected_rate."
                     )
-            else:
-                # Rates match - override KB's is_correct if it's wrong
-                if not verification['is_correct']:
-                    logger.info(f"Auto-correcting is_correct: rates match (applied={applied_rate}, expected={expected_rate})")
-                    verification['is_correct'] = True
-                    # Update reasoning to note the correction
-                    if "applied tax rate of 0%" in verification['reasoning'].lower():
-                        verification['reasoning'] = f"[Auto-corrected] The applied tax rate ({applied_rate * 100:.4f}%) matches the expected rate ({expected_rate * 100:.4f}%). " + verification['reasoning']
-            
-            # Additional validation: Check for contradictory reasoning text
-            # If reasoning mentions expected rate differs from applied rate but is_correct is true, correct it
-            # Also detect precision-only differences (e.g., "6.75%" vs "6.7500%")
-            reasoning_lower = verification['reasoning'].lower()
-            normalized_reasoning = self._normalize_rate_mentions(verification['reasoning'])
-            
+                    expected_rate = applied_rate
+                    verification['expected_tax_rate'] = expected_rate
+        
+        rates_match = abs(applied_rate - expected_rate) <= tolerance
+        
+        # CRITICAL: Enforce consistency - if rates don't match, is_correct MUST be false
+        if not rates_match:
             if verification['is_correct']:
-                # Check for phrases that suggest rates don't match
-                contradiction_phrases = [
-                    'expected rate differs',
-                    'expected rate is different',
-                    'expected rate does not match',
-                    'applied rate does not match',
-                    'applied rate differs',
-                    'applied rate is different',
-                    'should be',
-                    'should have been',
-                    'technically incorrect',
-                ]
-                
-                # Extract all rate mentions from reasoning
-                rates_in_reasoning = self._extract_rates_from_reasoning(verification['reasoning'])
-                
-                # Check for actual contradictions (rates that differ beyond tolerance)
-                found_contradiction = False
-                for mentioned_rate in rates_in_reasoning:
-                    # Check if mentioned rate differs from applied rate (beyond tolerance)
-                    if abs(mentioned_rate - applied_rate) > tolerance:
-                        # Check if mentioned rate matches expected rate (within tolerance)
-                        if abs(mentioned_rate - expected_rate) <= tolerance:
-                            # Reasoning mentions expected rate that differs from applied
-                            # This is a real contradiction
-                            logger.warning(
-                                f"Detected contradictory reasoning: reasoning mentions rate {mentioned_rate} "
-                                f"but is_correct is true with applied_rate={applied_rate}, expected_rate={expected_rate}"
-                            )
-                            verification['is_correct'] = False
-                            verification['reasoning'] = (
-                                f"[Auto-corrected] Contradictory reasoning detected. "
-                                f"The reasoning suggests the expected rate ({mentioned_rate * 100:.4f}%) differs from the applied rate ({applied_rate * 100:.4f}%), "
-                                f"so is_correct has been set to false. Original reasoning: {verification['reasoning']}"
+                logger.warning(
+                    f"Auto-correcting is_correct: rates don't match but KB said correct. "
+                    f"Applied={applied_rate}, Expected={expected_rate}, "
+                    f"Difference={abs(applied_rate - expected_rate)}"
+                )
+                verification['is_correct'] = False
+                # Update reasoning to note the correction
+                verification['reasoning'] = (
+                    f"[Auto-corrected] The applied tax rate ({applied_rate * 100:.4f}%) does not match "
+                    f"the expected rate ({expected_rate * 100:.4f}%), so is_correct has been set to false. "
+                    f"Original reasoning: {verification['reasoning']}"
+                )
+        else:
+            # Rates match - override KB's is_correct if it's wrong
+            if not verification['is_correct']:
+                logger.info(f"Auto-correcting is_correct: rates match (applied={applied_rate}, expected={expected_rate})")
+                verification['is_correct'] = True
+                # Update reasoning to note the correction
+                if "applied tax rate of 0%" in verification['reasoning'].lower():
+                    verification['reasoning'] = f"[Auto-corrected] The applied tax rate ({applied_rate * 100:.4f}%) matches the expected rate ({expected_rate * 100:.4f}%). " + verification['reasoning']
+        
+        # Additional validation: Check for contradictory reasoning text
+        # If reasoning mentions expected rate differs from applied rate but is_correct is true, correct it
+        # Also detect precision-only differences (e.g., "6.75%" vs "6.7500%")
+        reasoning_lower = verification['reasoning'].lower()
+        normalized_reasoning = self._normalize_rate_mentions(verification['reasoning'])
+        
+        if verification['is_correct']:
+            # Check for phrases that suggest rates don't match
+            contradiction_phrases = [
+                'expected rate differs',
+                'expected rate is different',
+                'expected rate does not match',
+                'applied rate does not match',
+                'applied rate differs',
+                'applied rate is different',
+                'should be',
+                'should have been',
+                'technically incorrect',
+            ]
+            
+            # Extract all rate mentions from reasoning
+            rates_in_reasoning = self._extract_rates_from_reasoning(verification['reasoning'])
+            
+            # Check for actual contradictions (rates that differ beyond tolerance)
+            found_contradiction = False
+            for mentioned_rate in rates_in_reasoning:
+                # Check if mentioned rate differs from applied rate (beyond tolerance)
+                if abs(mentioned_rate - applied_rate) > tolerance:
+                    # Check if mentioned rate matches expected rate (within tolerance)
+                    if abs(mentioned_rate - expected_rate) <= tolerance:
+                        # Reasoning mentions expected rate that differs from applied
+                        # This is a real contradiction
+                        logger.warning(
+                            f"Detected contradictory reasoning: reasoning mentions rate {mentioned_rate} "
+                            f"but is_correct is true with applied_rate={applied_rate}, expected_rate={expected_rate}"
+                        )
+                        verification['is_correct'] = False
+                        verification['reasoning'] = (
+                            f"[Auto-corrected] Contradictory reasoning detected. "
+                            f"The reasoning suggests the expected rate ({mentioned_rate * 100:.4f}%) differs from the applied rate ({applied_rate * 100:.4f}%), "
+                            f"so is_correct has been set to false. Original reasoning: {verification['reasoning']}"
+                        )
+                        found_contradiction = True
+                        break
+            
+            # Check for precision-only differences (false positives)
+            # If reasoning mentions rates that are the same when normalized, but uses phrases suggesting they differ
+            if not found_contradiction:
+                for phrase in contradiction_phrases:
+                    if phrase in reasoning_lower:
+                        # Check if all mentioned rates, when normalized, match applied/expected rates
+                        all_rates_match = True
+                        for mentioned_rate in rates_in_reasoning:
+                            # Check if mentioned rate matches applied or expected (within tolerance)
+                            matches_applied = abs(mentioned_rate - applied_rate) <= tolerance
+                            matches_expected = abs(mentioned_rate - expected_rate) <= tolerance
+                            if not (matches_applied or matches_expected):
+                                all_rates_match = False
+                                break
+                        
+                        # If all rates match but reasoning suggests they don't, it's a precision-only difference
+                        if all_rates_match and rates_in_reasoning:
+                            logger.info(
+                                f"Detected precision-only difference in reasoning: rates match but reasoning suggests they don't. "
+                                f"Applied={applied_rate}, Expected={expected_rate}, Mentioned rates={rates_in_reasoning}"
                             )
-                            found_contradiction = True
-                            break
-                
-                # Check for precision-only differences (false positives)
-                # If reasoning mentions rates that are the same when normalized, but uses phrases suggesting they differ
-                if not found_contradiction:
-                    for phrase in contradiction_phrases:
-                        if phrase in reasoning_lower:
-                            # Check if all mentioned rates, when normalized, match applied/expected rates
-                            all_rates_match = True
-                            for mentioned_rate in rates_in_reasoning:
-                                # Check if mentioned rate matches applied or expected (within tolerance)
-                                matches_applied = abs(mentioned_rate - applied_rate) <= tolerance
-                                matches_expected = abs(mentioned_rate - expected_rate) <= tolerance
-                                if not (matches_applied or matches_expected):
-                                    all_rates_match = False
-                                    break
-                            
-                            # If all rates match but reasoning suggests they don't, it's a precision-only difference
-                            if all_rates_match and rates_in_reasoning:
-                                logger.info(
-                                    f"Detected precision-only difference in reasoning: rates match but reasoning suggests they don't. "
-                                    f"Applied={applied_rate}, Expected={expected_rate}, Mentioned rates={rates_in_reasoning}"
+                            # Don't change is_correct since rates actually match
+                            # But update reasoning to clarify
+                            if "technically incorrect" in reasoning_lower or "does not match" in reasoning_lower:
+                                verification['reasoning'] = (
+                                    f"[Clarified] The applied tax rate ({applied_rate * 100:.4f}%) matches the expected rate ({expected_rate * 100:.4f}%). "
+                                    f"Any mention of rate differences in the original reasoning referred to decimal precision formatting, not actual rate differences. "
+                                    f"Original reasoning: {verification['reasoning']}"
                                 )
-                                # Don't change is_correct since rates actually match
-                                # But update reasoning to clarify
-                                if "technically incorrect" in reasoning_lower or "does not match" in reasoning_lower:
-                                    verification['reasoning'] = (
-                                        f"[Clarified] The applied tax rate ({applied_rate * 100:.4f}%) matches the expected rate ({expected_rate * 100:.4f}%). "
-                                        f"Any mention of rate differences in the original reasoning referred to decimal precision formatting, not actual rate differences. "
-                                        f"Original reasoning: {verification['reasoning']}"
-                                    )
-                                break
-            
-            # Add KB metadata
-            verification['kb_response'] = kb_response
-            verification['kb_id'] = kb.knowledge_base_id
-            verification['kb_name'] = kb.knowledge_base_name
+                            break
+        
+        return verification
+    
+    def _load_token_costs(self) -> Dict[str, Tuple[float, float]]:
+        """Per-1K input and output token costs of the active models, by model ID (one query)."""
+        return {
+            model_id: (float(input_cost), float(output_cost))
+            for model_id, input_cost, output_cost in BedrockModelConfig.objects.filter(is_active=True)
+            .values_list('model_id', 'input_token_cost', 'output_token_cost')
+        }
+    
+    def _apply_kb_usage(self, line_item: InvoiceLineItem, verification: Dict[str, Any],
+                        token_costs: Optional[Dict[str, Tuple[float, float]]] = None) -> bool:
+        """
+        Calculate KB token costs for a verification and set them on the line item, without saving.
+        
+        Args:
+            line_item: InvoiceLineItem the verification belongs to
+            verification: Result of _verify_line_item(); nothing is set if the KB was not queried
+            token_costs: Result of _load_token_costs(); the model's pricing is queried when omitted
             
-            # Calculate and save token costs to line item
+        Returns:
+            bool: Whether the line item's KB usage fields were changed
+        """
+        kb_response = verification.get('kb_response')
+        if not kb_response:
+            return False
+        try:
             token_usage = kb_response.get('token_usage', {})
             input_tokens = token_usage.get('inputTokens', 0)
             output_tokens = token_usage.get('outputTokens', 0)
@@ -970,11 +1784,14 @@ IMPORTANT:
             
             # Get model pricing (default to Claude 3 Sonnet pricing)
             model_id = kb_response.get('metadata', {}).get('model_id', 'anthropic.claude-3-sonnet-20240229-v1:0')
-            try:
-                model_config = BedrockModelConfig.objects.get(model_id=model_id, is_active=True)
-                input_cost_per_1k = float(model_config.input_token_cost)
-                output_cost_per_1k = float(model_config.output_token_cost)
-            except BedrockModelConfig.DoesNotExist:
+            if token_costs is None:
+                token_costs = {
+                    model.model_id: (float(model.input_token_cost), float(model.output_token_cost))
+                    for model in BedrockModelConfig.objects.filter(model_id=model_id, is_active=True)
+                }
+            if model_id in token_costs:
+                input_cost_per_1k, output_cost_per_1k = token_costs[model_id]
+            else:
                 # Default Claude 3 Sonnet pricing if model not found
                 logger.warning(f"Model config not found for {model_id}, using default pricing")
                 input_cost_per_1k = 0.003  # $0.003 per 1K input tokens
@@ -985,22 +1802,45 @@ IMPORTANT:
             output_cost = (output_tokens / 1000.0) * output_cost_per_1k
             total_cost = input_cost + output_cost
             
-            # Save to line item
             line_item.kb_input_tokens = input_tokens
             line_item.kb_output_tokens = output_tokens
             line_item.kb_total_tokens = total_tokens
             line_item.kb_input_cost = Decimal(str(round(input_cost, 8)))
             line_item.kb_output_cost = Decimal(str(round(output_cost, 8)))
             line_item.kb_total_cost = Decimal(str(round(total_cost, 8)))
-            line_item.save(update_fields=[
-                'kb_input_tokens', 'kb_output_tokens', 'kb_total_tokens',
-                'kb_input_cost', 'kb_output_cost', 'kb_total_cost', 'updated_at'
-            ])
-            
-            return verification
-            
+            return True
         except Exception as e:
-            logger.error(f"Error verifying line item tax (line_item_id={line_item.id}, state={state_code}): {str(e)}", exc_info=True)
+            logger.error(f"Error calculating KB usage (line_item_id={line_item.id}): {str(e)}", exc_info=True)
+            return False
+    
+    def _save_kb_usage(self, line_item: InvoiceLineItem, verification: Dict[str, Any]):
+        """
+        Calculate KB token costs for a verification and save them to the line item.
+        
+        Args:
+            line_item: InvoiceLineItem the verification belongs to
+            verification: Result of _verify_line_item(); nothing is saved if the KB was not queried
+        """
+        if not self._apply_kb_usage(line_item, verification):
+            return
+        try:
+            line_item.save(update_fields=KB_USAGE_FIELDS + ['updated_at'])
+        except Exception as e:
+            logger.error(f"Error saving KB usage (line_item_id={line_item.id}): {str(e)}", exc_info=True)
+    
+    def _verify_line_item_safely(self, line_item: InvoiceLineItem, invoice: Invoice,
+                                 kb: Optional[StateKnowledgeBase], structured_output: bool,
+                                 generation_mode: Optional[str] = None,
+                                 retrieval_query: Optional[str] = None) -> Dict[str, Any]:
+        """Verify one line item, returning an error result instead of raising."""
+        try:
+            return self._verify_line_item(
+                line_item, invoice.state_code, invoice.jurisdiction, invoice, kb,
+                structured_output=structured_output, generation_mode=generation_mode,
+                retrieval_query=retrieval_query
+            )
+        except Exception as e:
+            logger.error(f"Error verifying line item tax (line_item_id={line_item.id}): {str(e)}", exc_info=True)
             return {
                 'is_correct': False,
                 'expected_tax_rate': Decimal('0.0000'),
@@ -1010,12 +1850,544 @@ IMPORTANT:
                 'error': str(e)
             }
     
-    def verify_invoice_taxes(self, invoice: Invoice) -> Dict[str, Any]:
+    def _run_concurrently(self, func, items: list, on_result: Optional[Callable] = None) -> list:
+        """
+        Apply func to items on a bounded thread pool, returning results in item order.
+        
+        Concurrency is capped by the kb_verification_max_workers config; worker threads
+        close their database connections when done.
+        
+        Args:
+            func: Callable taking one item; must not raise
+            items: Items to process
+            on_result: Optional callable(item, result), called on the calling thread as each item completes
+        
+        Returns:
+            list: func(item) for each item, in the same order
+        """
+        max_workers = min(len(items), ConfigManager.get_kb_verification_max_workers())
+        if max_workers <= 1:
+            results = []
+            for item in items:
+                results.append(func(item))
+                if on_result is not None:
+                    on_result(item, results[-1])
+            return results
+        
+        def run_in_worker(item):
+            try:
+                return func(item)
+            finally:
+                close_old_connections()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if on_result is None:
+                return list(executor.map(run_in_worker, items))
+            futures = {executor.submit(run_in_worker, item): index for index, item in enumerate(items)}
+            results = [None] * len(items)
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                on_result(items[index], results[index])
+            return results
+    
+    def _verify_line_items(self, invoice: Invoice, line_items: list, on_result: Optional[Callable] = None) -> list:
+        """
+        Verify line items on a bounded thread pool, returning results in line item order.
+        
+        Concurrency is capped by the kb_verification_max_workers config. A failure in one
+        item's verification is returned as that item's error result and does not affect
+        the others. Items decided from the taxability matrix or accepted by the TaxRule
+        rate engine never reach the KB. When kb_verification_batch_size is above 1,
+        items are verified in batched prompts (see _verify_line_items_batched). When retrieval is split from
+        generation and kb_retrieval_scope is 'invoice', all prompts share one retrieval query.
+        
+        Args:
+            invoice: Invoice the line items belong to
+            line_items: InvoiceLineItem instances to verify
+            on_result: Optional callable(line_item, result), called on this thread as each item's result is ready
+            
+        Returns:
+            list: Verification result dicts, one per line item, in the same order
+        """
+        kb = self.get_knowledge_base_for_state(invoice.state_code)
+        structured_output = ConfigManager.get_structured_output_enabled()
+        batch_size = ConfigManager.get_kb_verification_batch_size()
+        cache_enabled = bool(kb) and ConfigManager.get_verification_cache_enabled()
+        
+        # Local and cached verdicts are looked up (and new ones stored) on this thread, outside the KB calls
+        results = self._get_local_verifications(invoice.state_code, invoice.jurisdiction, invoice, line_items)
+        pending = [line_item for line_item in line_items if line_item.id not in results]
+        if cache_enabled and pending:
+            results.update(self._get_cached_verifications(invoice, pending, kb))
+            pending = [line_item for line_item in pending if line_item.id not in results]
+        if kb and pending and ConfigManager.get_near_duplicate_enabled():
+            results.update(self._get_near_duplicate_verifications(invoice, pending))
+            pending = [line_item for line_item in pending if line_item.id not in results]
+        if on_result is not None:
+            for line_item in line_items:
+                if line_item.id in results:
+                    on_result(line_item, results[line_item.id])
+        
+        # With retrieval split from generation, the invoice's items can share one cached Retrieve call
+        generation_mode = self._get_generation_mode()
+        retrieval_query = None
+        if kb and pending and (structured_output or generation_mode == 'converse') \
+                and ConfigManager.get_kb_retrieval_scope() == 'invoice':
+            retrieval_query = self._build_batch_retrieval_query(pending, invoice.state_code, invoice.jurisdiction)
+        
+        if not pending:
+            queried = []
+        elif kb and batch_size > 1 and len(pending) > 1:
+            queried = self._verify_line_items_batched(
+                invoice, pending, kb, structured_output, batch_size,
+                generation_mode=generation_mode, retrieval_query=retrieval_query, on_result=on_result
+            )
+        else:
+            queried = self._run_concurrently(
+                lambda line_item: self._verify_line_item_safely(
+                    line_item, invoice, kb, structured_output,
+                    generation_mode=generation_mode, retrieval_query=retrieval_query
+                ),
+                pending,
+                on_result=on_result
+            )
+        
+        if cache_enabled:
+            self._store_cached_verifications(invoice, pending, queried, kb)
+        results.update(zip((line_item.id for line_item in pending), queried))
+        return [results[line_item.id] for line_item in line_items]
+
+    def _get_local_verifications(self, state_code: str, jurisdiction: str, invoice: Invoice,
+                                 line_items: list) -> Dict[int, Dict[str, Any]]:
+        """
+        Decide line items without the KB from the taxability matrix and the TaxRule rate engine.
+        
+        Items are classified into taxability matrix categories (taxright.categories). Items
+        whose category is conditional, has no guidance, or is unresolved (label and summary
+        disagree) in the state are left to the KB;
+        exempt categories, and taxable categories charged no tax, are decided from the
+        matrix (taxright.taxability); remaining taxable items whose applied rate matches the
+        combined TaxRule rate are accepted by the rate engine (taxright.rate_engine).
+        
+        Args:
+            state_code: State code
+            jurisdiction: Optional jurisdiction
+            invoice: Invoice the line items belong to (its date selects the effective rules)
+            line_items: InvoiceLineItem instances
+            
+        Returns:
+            dict: Verification results by line item ID for the items decided locally
+        """
+        rule_engine_enabled = ConfigManager.get_rule_engine_enabled()
+        matrix = None
+        if ConfigManager.get_taxability_matrix_enabled():
+            try:
+                matrix = get_taxability_matrix()
+            except Exception as e:
+                logger.error(f"Taxability matrix unavailable (invoice={invoice.invoice_number}): {str(e)}", exc_info=True)
+        if not rule_engine_enabled and matrix is None:
+            return {}
+        tolerance = Decimal(ConfigManager.get_rule_engine_rate_tolerance())
+        resolution = None
+        if rule_engine_enabled:
+            try:
+                resolution = resolve_rate(state_code, jurisdiction, invoice.date)
+            except Exception as e:
+                logger.error(f"Rate engine unavailable (invoice={invoice.invoice_number}): {str(e)}", exc_info=True)
+        
+        hits, counts = {}, {'taxability_matrix': 0, 'rule_engine': 0}
+        for line_item in line_items:
+            category = classify_line_item(line_item.description, invoice.vendor_name) if matrix is not None else None
+            verdict = matrix.lookup(state_code, category['topic']) if category else None
+            if category and (verdict is None or verdict['status'] in ('conditional', 'no_guidance', 'unresolved')):
+                continue
+            verification = verify_with_matrix(line_item, state_code, category, verdict, resolution, tolerance) if verdict else None
+            if verification is None:
+                verification = verify_with_rules(line_item, resolution, tolerance)
+                if verification and verdict:
+                    verification['taxability'] = taxability_details(category, verdict)
+            if verification:
+                hits[line_item.id] = verification
+                counts[verification['source']] += 1
+        if hits:
+            logger.info(
+                f"Decided {len(hits)} of {len(line_items)} line items locally "
+                f"({counts['taxability_matrix']} from the taxability matrix, {counts['rule_engine']} by the rate engine; "
+                f"invoice={invoice.invoice_number})"
+            )
+        return hits
+
+    def _get_cached_verifications(self, invoice: Invoice, line_items: list,
+                                  kb: StateKnowledgeBase) -> Dict[int, Dict[str, Any]]:
+        """
+        Look up cached verdicts for line items.
+        
+        Args:
+            invoice: Invoice the line items belong to
+            line_items: InvoiceLineItem instances
+            kb: StateKnowledgeBase for the invoice state
+            
+        Returns:
+            dict: Verification results by line item ID for the cache hits
+        """
+        bucket_size = ConfigManager.get_verification_cache_rate_bucket()
+        cache_keys = {
+            line_item.id: VerificationResultCache.build_key(
+                line_item, invoice.state_code, invoice.jurisdiction, kb.knowledge_base_id, bucket_size
+            )['cache_key']
+            for line_item in line_items
+        }
+        entries = VerificationResultCache.get_many(cache_keys.values())
+        hits = {}
+        for line_item in line_items:
+            entry = entries.get(cache_keys[line_item.id])
+            if entry:
+                verification = VerificationResultCache.to_verification(entry)
+                verification['kb_name'] = kb.knowledge_base_name
+                hits[line_item.id] = verification
+        if hits:
+            logger.info(f"Verification cache: {len(hits)} of {len(line_items)} line items served from cache (invoice={invoice.invoice_number})")
+        return hits
+
+    def _get_near_duplicate_verifications(self, invoice: Invoice, line_items: list) -> Dict[int, Dict[str, Any]]:
+        """
+        Reuse verdicts of similar, already verified line items (see taxright.near_duplicates).
+        
+        A neighbour must be in the same state, share the tax status and applied rate, and
+        have an estimated description similarity of at least near_duplicate_threshold.
+        
+        Args:
+            invoice: Invoice the line items belong to
+            line_items: InvoiceLineItem instances without a verdict yet
+            
+        Returns:
+            dict: Verification results by line item ID for the items with a match
+        """
+        try:
+            index = get_near_duplicate_index()
+        except Exception as e:
+            logger.error(f"Near-duplicate index unavailable: {str(e)}", exc_info=True)
+            return {}
+        threshold = ConfigManager.get_near_duplicate_threshold()
+        matches = {}
+        for line_item in line_items:
+            match = index.lookup(
+                invoice.state_code, line_item.description, line_item.tax_status, line_item.tax_rate,
+                threshold, exclude_line_item_id=line_item.id
+            )
+            if match:
+                matches[line_item.id] = match
+        if not matches:
+            return {}
+        
+        sources = LineItemTaxVerification.objects.in_bulk([match['verification_id'] for match in matches.values()])
+        hits = {}
+        for line_item_id, match in matches.items():
+            source = sources.get(match['verification_id'])
+            if source is None:
+                continue
+            details = source.verification_details or {}
+            hits[line_item_id] = {
+                'is_correct': source.is_correct,
+                'expected_tax_rate': source.expected_tax_rate,
+                'confidence_score': source.confidence_score,
+                'reasoning': source.reasoning,
+                'kb_response': None,
+                'kb_id': details.get('kb_id'),
+                'kb_name': details.get('kb_name'),
+                'citations': details.get('citations', []),
+                'source': 'near_duplicate',
+                'near_duplicate': {
+                    'verification_id': source.id,
+                    'line_item_id': match['line_item_id'],
+                    'similarity': match['similarity'],
+                },
+            }
+        if hits:
+            logger.info(f"Near-duplicate index: reused {len(hits)} of {len(line_items)} verdicts (invoice={invoice.invoice_number})")
+        return hits
+
+    def _store_cached_verifications(self, invoice: Invoice, line_items: list, verifications: list,
+                                    kb: StateKnowledgeBase):
+        """
+        Store successful KB verdicts in the verification cache.
+        
+        Errors and verdicts that were not produced by a KB query for the line item
+        itself (shared duplicates) are not cached.
+        
+        Args:
+            invoice: Invoice the line items belong to
+            line_items: InvoiceLineItem instances that were verified
+            verifications: Their verification results, in the same order
+            kb: StateKnowledgeBase for the invoice state
+        """
+        bucket_size = ConfigManager.get_verification_cache_rate_bucket()
+        items = []
+        for line_item, verification in zip(line_items, verifications):
+            if verification.get('error') or not verification.get('kb_response'):
+                continue
+            if (verification.get('batch') or {}).get('deduplicated_from'):
+                continue
+            key_parts = VerificationResultCache.build_key(
+                line_item, invoice.state_code, invoice.jurisdiction, kb.knowledge_base_id, bucket_size
+            )
+            items.append((key_parts, verification, line_item.id))
+        try:
+            VerificationResultCache.set_many(items)
+        except Exception as e:
+            logger.error(f"Error caching verifications (invoice={invoice.invoice_number}): {str(e)}", exc_info=True)
+    
+    def _dedupe_key(self, line_item: InvoiceLineItem) -> tuple:
+        """Key under which line items of one invoice share a verdict (same description, status and applied rate)."""
+        return (normalize_description(line_item.description), line_item.tax_status, Decimal(str(line_item.tax_rate)))
+    
+    def _verify_line_items_batched(self, invoice: Invoice, line_items: list, kb: StateKnowledgeBase,
+                                   structured_output: bool, batch_size: int, generation_mode: Optional[str] = None,
+                                   retrieval_query: Optional[str] = None, on_result: Optional[Callable] = None) -> list:
+        """
+        Verify line items with up to batch_size items per KB prompt.
+        
+        Line items with the same description, tax status and applied rate are verified
+        once and share the verdict. Batches run concurrently; any item whose verdict is
+        missing or unusable in a batch answer is retried on its own.
+        
+        Args:
+            invoice: Invoice the line items belong to
+            line_items: InvoiceLineItem instances to verify
+            kb: StateKnowledgeBase for the invoice state
+            structured_output: Whether to use tool-use verification
+            batch_size: Maximum line items per prompt
+            generation_mode: 'retrieve_and_generate' or 'converse' (defaults to kb_generation_mode config)
+            retrieval_query: Passage-retrieval query shared by all batches (defaults to one per batch)
+            on_result: Optional callable(line_item, result), called as each batch's items are settled
+            
+        Returns:
+            list: Verification result dicts, one per line item, in the same order
+        """
+        groups = {}
+        for line_item in line_items:
+            groups.setdefault(self._dedupe_key(line_item), []).append(line_item)
+        representatives = [members[0] for members in groups.values()]
+        batches = [representatives[start:start + batch_size] for start in range(0, len(representatives), batch_size)]
+        
+        verifications = {}
+        
+        def settle(representative, verification):
+            # The representative's verdict is shared with its duplicates
+            for line_item in groups[self._dedupe_key(representative)]:
+                if line_item is not representative:
+                    verifications[line_item.id] = self._copy_shared_verification(verification, representative)
+                else:
+                    verifications[line_item.id] = verification
+                if on_result is not None:
+                    on_result(line_item, verifications[line_item.id])
+        
+        def settle_batch(batch, batch_results):
+            for line_item in batch:
+                if line_item.id in batch_results:
+                    settle(line_item, batch_results[line_item.id])
+        
+        results = {}
+        for batch_results in self._run_concurrently(
+            lambda batch: self._verify_batch(
+                batch, invoice, kb, structured_output,
+                generation_mode=generation_mode, retrieval_query=retrieval_query
+            ),
+            batches,
+            on_result=settle_batch
+        ):
+            results.update(batch_results)
+        
+        missing = [line_item for line_item in representatives if line_item.id not in results]
+        if missing:
+            logger.info(
+                f"Retrying {len(missing)} line item(s) individually after batched verification "
+                f"(invoice={invoice.invoice_number})"
+            )
+            
+            def retry(line_item):
+                verification = self._verify_line_item_safely(
+                    line_item, invoice, kb, structured_output,
+                    generation_mode=generation_mode, retrieval_query=retrieval_query
+                )
+                verification['batch'] = {'retried_individually': True}
+                return verification
+            
+            self._run_concurrently(retry, missing, on_result=settle)
+        
+        logger.info(
+            f"Verified {len(line_items)} line items of invoice {invoice.invoice_number} with "
+            f"{len(batches)} batched and {len(missing)} individual KB queries "
+            f"({len(line_items) - len(representatives)} duplicates reused)"
+        )
+        
+        return [verifications[line_item.id] for line_item in line_items]
+    
+    def _copy_shared_verification(self, verification: Dict[str, Any], source: InvoiceLineItem) -> Dict[str, Any]:
+        """Copy a verdict for a duplicate line item; token usage stays with the source so it is not counted twice."""
+        shared = dict(verification)
+        if verification.get('kb_response'):
+            shared['kb_response'] = {
+                **verification['kb_response'],
+                'token_usage': {'inputTokens': 0, 'outputTokens': 0, 'totalTokens': 0}
+            }
+        shared['batch'] = {**(verification.get('batch') or {}), 'deduplicated_from': source.id}
+        return shared
+    
+    def _split_token_usage(self, token_usage: Dict[str, Any], parts: int) -> list:
+        """Split a call's token usage into near-equal integer shares that add up to the total."""
+        shares = [{} for _ in range(parts)]
+        for key in ('inputTokens', 'outputTokens', 'totalTokens'):
+            quotient, remainder = divmod(int(token_usage.get(key, 0) or 0), parts)
+            for index, share in enumerate(shares):
+                share[key] = quotient + (1 if index < remainder else 0)
+        return shares
+    
+    def _verify_batch(self, batch: list, invoice: Invoice, kb: StateKnowledgeBase,
+                      structured_output: bool, generation_mode: Optional[str] = None,
+                      retrieval_query: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Verify a batch of line items with one KB query, without writing to the database.
+        
+        Each verdict goes through the same consistency checks as a single-item
+        verification. The call's token usage is split across the verdicts returned.
+        
+        Args:
+            batch: InvoiceLineItem instances (distinct, from one invoice)
+            invoice: Invoice the line items belong to
+            kb: StateKnowledgeBase for the invoice state
+            structured_output: Whether to use tool-use verification
+            generation_mode: 'retrieve_and_generate' or 'converse' (defaults to kb_generation_mode config)
+            retrieval_query: Passage-retrieval query (defaults to one built for the batch)
+            
+        Returns:
+            dict: Verification results by line item ID; items missing from the answer
+            (or every item, if the query fails) are left out for the caller to retry
+        """
+        if len(batch) == 1:
+            line_item = batch[0]
+            return {line_item.id: self._verify_line_item_safely(
+                line_item, invoice, kb, structured_output,
+                generation_mode=generation_mode, retrieval_query=retrieval_query
+            )}
+        
+        state_code, jurisdiction = invoice.state_code, invoice.jurisdiction
+        line_item_ids = [line_item.id for line_item in batch]
+        prompt = self._build_batch_verification_prompt(batch, state_code, jurisdiction, invoice=invoice)
+        if generation_mode is None:
+            generation_mode = self._get_generation_mode()
+        retrieval_query = retrieval_query or self._build_batch_retrieval_query(batch, state_code, jurisdiction)
+        
+        try:
+            if structured_output:
+                kb_response = self.query_knowledge_base_structured(
+                    kb.knowledge_base_id, prompt, retrieval_query,
+                    region_name=kb.region, tool_spec=TAX_VERIFICATION_BATCH_TOOL, state_code=kb.state_code
+                )
+                answer = kb_response.get('answer', '')
+                elements = (kb_response.get('structured') or {}).get('verifications') or []
+            else:
+                if generation_mode == 'converse':
+                    kb_response = self.query_knowledge_base_split(
+                        kb.knowledge_base_id, prompt, retrieval_query, region_name=kb.region,
+                        state_code=kb.state_code
+                    )
+                else:
+                    kb_response = self.query_knowledge_base(kb.knowledge_base_id, prompt, region_name=kb.region)
+                answer = kb_response.get('answer', '')
+                elements = self._parse_batch_verification_response(answer)
+            verdicts = self._collect_batch_verdicts(elements, line_item_ids, answer)
+        except Exception as e:
+            logger.warning(
+                f"Batched verification failed for line items {line_item_ids} (state={state_code}): {str(e)}. "
+                f"Retrying individually."
+            )
+            return {}
+        
+        if len(verdicts) < len(batch):
+            logger.warning(
+                f"Batch answer covered {len(verdicts)} of {len(batch)} line items "
+                f"(missing: {[line_item_id for line_item_id in line_item_ids if line_item_id not in verdicts]})"
+            )
+        
+        results = {}
+        shares = self._split_token_usage(kb_response.get('token_usage', {}), max(1, len(verdicts)))
+        answered = [line_item for line_item in batch if line_item.id in verdicts]
+        for line_item, token_usage in zip(answered, shares):
+            verification = self._apply_consistency_checks(verdicts[line_item.id], line_item)
+            verification['kb_response'] = {**kb_response, 'token_usage': token_usage}
+            verification['kb_id'] = kb.knowledge_base_id
+            verification['kb_name'] = kb.knowledge_base_name
+            verification['batch'] = {'size': len(batch), 'line_item_ids': line_item_ids}
+            results[line_item.id] = verification
+        return results
+    
+    def _prepare_verification(self, line_item: InvoiceLineItem, verification_result: Dict[str, Any],
+                              token_costs: Dict[str, Tuple[float, float]], now) -> Tuple[LineItemTaxVerification, bool]:
+        """
+        Build or update a line item's LineItemTaxVerification in memory, without saving.
+        
+        Args:
+            line_item: InvoiceLineItem with its tax_verifications prefetched (latest first)
+            verification_result: Verification result dict for the line item
+            token_costs: Token costs from _load_token_costs()
+            now: Timestamp for verified_at and updated_at
+            
+        Returns:
+            tuple: (verification, whether the line item's KB usage fields changed)
+        """
+        usage_changed = self._apply_kb_usage(line_item, verification_result, token_costs)
+        if usage_changed:
+            line_item.updated_at = now
+        fields = {
+            'is_correct': verification_result['is_correct'],
+            'confidence_score': verification_result['confidence_score'],
+            'reasoning': verification_result['reasoning'],
+            'expected_tax_rate': verification_result['expected_tax_rate'],
+            'applied_tax_rate': line_item.tax_rate,
+            'verification_details': {
+                'kb_id': verification_result.get('kb_id'),
+                'kb_name': verification_result.get('kb_name'),
+                'source': verification_result.get('source', 'knowledge_base'),
+                'cache': verification_result.get('cache'),
+                'near_duplicate': verification_result.get('near_duplicate'),
+                'rule_engine': verification_result.get('rule_engine'),
+                'taxability': verification_result.get('taxability'),
+                'citations': (verification_result.get('kb_response') or {}).get('citations', verification_result.get('citations', [])),
+                'retries': ((verification_result.get('kb_response') or {}).get('metadata') or {}).get('retries'),
+                'retrieval': (verification_result.get('kb_response') or {}).get('retrieval'),
+                'batch': verification_result.get('batch'),
+                'error': verification_result.get('error')
+            }
+        }
+        existing = line_item.tax_verifications.all()
+        if existing:
+            verification_obj = existing[0]
+            for field, value in fields.items():
+                setattr(verification_obj, field, value)
+            # A re-verification moves verified_at forward so progress cursors see it
+            verification_obj.verified_at = now
+            verification_obj.updated_at = now
+        else:
+            verification_obj = LineItemTaxVerification(line_item=line_item, verified_at=now, **fields)
+        return verification_obj, usage_changed
+    
+    @ConfigManager.snapshot()
+    def verify_invoice_taxes(self, invoice: Invoice, progress: bool = False,
+                             on_progress: Optional[Callable] = None) -> Dict[str, Any]:
         """
         Verify taxes for all line items in an invoice.
         
+        By default every write happens in one transaction once all line items are
+        verified. With progress, each line item's LineItemTaxVerification is written
+        (with a fresh verified_at) as soon as its result is ready, so clients can follow
+        the verification with a cursor over verified_at; the determination is written last.
+        
         Args:
             invoice: Invoice instance
+            progress: Write each line item's verification as soon as it is ready
+            on_progress: Optional callable(verification, result) called after each such write; implies progress
             
         Returns:
             Dictionary with:
@@ -1030,49 +2402,69 @@ IMPORTANT:
                 }
             }
         
+        # KB calls run concurrently; line items and their existing verifications are loaded once up front,
+        # everything is computed in memory and all database writes happen in one transaction at the end
+        line_items = list(invoice.line_items.prefetch_related(
+            Prefetch('tax_verifications', queryset=LineItemTaxVerification.objects.order_by('-verified_at'))
+        ))
+        token_costs = None
+        # Verifications already written as they completed (progress mode), by line item ID
+        written = {}
+        
+        def write_progress(line_item, verification_result):
+            try:
+                verification_obj, usage_changed = self._prepare_verification(
+                    line_item, verification_result, token_costs, timezone.now()
+                )
+                with transaction.atomic():
+                    if usage_changed:
+                        line_item.save(update_fields=KB_USAGE_FIELDS + ['updated_at'])
+                    verification_obj.save()
+            except Exception as e:
+                # Left for the final bulk write
+                logger.error(f"Error writing verification progress for line_item_id={line_item.id}: {str(e)}", exc_info=True)
+                return
+            written[line_item.id] = verification_obj
+            if on_progress is not None:
+                on_progress(verification_obj, verification_result)
+        
+        if progress or on_progress is not None:
+            token_costs = self._load_token_costs()
+            verification_results = self._verify_line_items(invoice, line_items, on_result=write_progress)
+        else:
+            verification_results = self._verify_line_items(invoice, line_items)
+        
+        near_duplicate_index = get_near_duplicate_index() if ConfigManager.get_near_duplicate_enabled() else None
+        if token_costs is None:
+            token_costs = self._load_token_costs() if any(result.get('kb_response') for result in verification_results) else {}
+        now = timezone.now()
+        
         verifications = []
-        for line_item in invoice.line_items.all():
-            verification_result = self.verify_line_item_tax(
-                line_item,
-                invoice.state_code,
-                invoice.jurisdiction,
-                invoice=invoice
-            )
-            
-            # Create or update LineItemTaxVerification record
-            verification_obj, created = LineItemTaxVerification.objects.update_or_create(
-                line_item=line_item,
-                defaults={
-                    'is_correct': verification_result['is_correct'],
-                    'confidence_score': verification_result['confidence_score'],
-                    'reasoning': verification_result['reasoning'],
-                    'expected_tax_rate': verification_result['expected_tax_rate'],
-                    'applied_tax_rate': line_item.tax_rate,
-                    'verification_details': {
-                        'kb_id': verification_result.get('kb_id'),
-                        'kb_name': verification_result.get('kb_name'),
-                        'citations': (verification_result.get('kb_response') or {}).get('citations', []),
-                        'error': verification_result.get('error')
-                    }
-                }
-            )
-            
-            verifications.append({
-                'line_item_id': line_item.id,
-                'verification_id': verification_obj.id,
-                'is_correct': verification_result['is_correct'],
-                'confidence_score': float(verification_result['confidence_score']),
-                'reasoning': verification_result['reasoning'],
-                'expected_tax_rate': float(verification_result['expected_tax_rate']),
-                'applied_tax_rate': float(line_item.tax_rate),
-                'kb_id': verification_result.get('kb_id'),
-                'kb_name': verification_result.get('kb_name')
-            })
+        verification_objs = {}
+        new_verification_objs, updated_verification_objs, usage_line_items = [], [], []
+        # Exempt verdicts from the taxability matrix are deliberate, not a failed KB answer to fall back from
+        exempt_by_matrix = set()
+        for line_item, verification_result in zip(line_items, verification_results):
+            if verification_result.get('source') == 'taxability_matrix' and not verification_result['expected_tax_rate']:
+                exempt_by_matrix.add(line_item.id)
+            if line_item.id in written:
+                # Rewritten below in case the expected-tax fallback updates it
+                verification_obj = written[line_item.id]
+                updated_verification_objs.append(verification_obj)
+            else:
+                verification_obj, usage_changed = self._prepare_verification(line_item, verification_result, token_costs, now)
+                if usage_changed:
+                    usage_line_items.append(line_item)
+                if verification_obj.pk:
+                    updated_verification_objs.append(verification_obj)
+                else:
+                    new_verification_objs.append(verification_obj)
+            verification_objs[line_item.id] = verification_obj
         
         # Calculate summary
-        total_items = len(verifications)
-        correct_items = sum(1 for v in verifications if v['is_correct'])
-        avg_confidence = sum(v['confidence_score'] for v in verifications) / total_items if total_items > 0 else 0
+        total_items = len(verification_results)
+        correct_items = sum(1 for result in verification_results if result['is_correct'])
+        avg_confidence = sum(float(result['confidence_score']) for result in verification_results) / total_items if total_items > 0 else 0
         
         summary = {
             'total_line_items': total_items,
@@ -1086,7 +2478,7 @@ IMPORTANT:
         # Calculate expected tax and actual tax with proper validation and rounding
         
         # Handle edge case: empty verifications list
-        if not verifications:
+        if not verification_results:
             logger.warning(f"No verifications available for invoice {invoice.invoice_number}, will use applied tax rates for expected tax calculation")
         
         try:
@@ -1094,120 +2486,57 @@ IMPORTANT:
             # Use expected_tax_rate from KB response (not applied rate from invoice)
             # Create a mapping of line_item_id to validated expected_tax_rate from verifications
             expected_rate_map = {}
-            for v in verifications:
-                line_item_id = v['line_item_id']
-                raw_rate = v.get('expected_tax_rate', 0.0)
+            for line_item, verification_result in zip(line_items, verification_results):
+                raw_rate = float(verification_result.get('expected_tax_rate', 0.0))
                 # Validate and clamp the expected tax rate
-                validated_rate = self._validate_tax_rate(raw_rate, line_item_id=line_item_id)
-                expected_rate_map[line_item_id] = validated_rate
+                validated_rate = self._validate_tax_rate(raw_rate, line_item_id=line_item.id)
+                expected_rate_map[line_item.id] = validated_rate
             
-            # Calculate expected tax for each taxable line item
-            # Handle edge cases: failed verifications, zero line totals, missing verifications
-            total_expected_tax = Decimal('0.00')
-            zero_rate_fallback_count = 0
-            fallback_rate_updates = {}  # Track which verifications need to be updated with fallback rates
-            
-            # First pass: identify which items will be included in tax calculation and calculate taxable subtotal
-            # This is needed to properly allocate invoice-level discounts only to taxable items
-            taxable_items = []
-            taxable_subtotal = Decimal('0.00')
-            for line_item in invoice.line_items.all():
-                expected_rate = expected_rate_map.get(line_item.id)
-                # Determine if item should be included in expected tax calculation
-                if line_item.tax_status != 'taxable':
-                    if expected_rate is None or expected_rate == Decimal('0.0000'):
-                        continue  # Skip exempt items
-                # Item will be included - add to taxable subtotal
-                taxable_items.append((line_item, expected_rate))
-                taxable_subtotal += line_item.line_total
-            
-            # Calculate subtotal of all line items for validation/warning purposes
-            subtotal = sum(line_item.line_total for line_item in invoice.line_items.all())
-            
-            # Determine if line_totals already include invoice-level discount
-            # If subtotal ≈ total_amount (within tolerance), line_totals are post-discount
-            # If subtotal ≈ total_amount + invoice_discount_amount, line_totals are pre-discount
-            tolerance = Decimal('0.01')
-            line_totals_include_discount = False
-            if invoice.invoice_discount_amount and invoice.invoice_discount_amount > Decimal('0.00'):
-                # Check if line_totals are already post-discount
-                if abs(subtotal - invoice.total_amount) <= tolerance:
-                    line_totals_include_discount = True
-                    logger.info(
-                        f"Invoice {invoice.invoice_number}: line_totals appear to already include invoice-level discount "
-                        f"(subtotal={subtotal}, total_amount={invoice.total_amount})"
-                    )
-                elif abs(subtotal - (invoice.total_amount + invoice.invoice_discount_amount)) <= tolerance:
-                    line_totals_include_discount = False
-                    logger.info(
-                        f"Invoice {invoice.invoice_number}: line_totals are pre-discount "
-                        f"(subtotal={subtotal}, total_amount={invoice.total_amount}, invoice_discount_amount={invoice.invoice_discount_amount})"
-                    )
+            # Expected and actual tax are computed in integer cents by taxright.tax_math, which
+            # allocates the invoice-level discount to the taxed items and falls back to the applied
+            # rate for items without a usable expected rate
+            tax_items = [
+                (
+                    line_item.line_total,
+                    line_item.tax_amount,
+                    self._validate_tax_rate(line_item.tax_rate, line_item_id=line_item.id),
+                    expected_rate_map.get(line_item.id),
+                    line_item.tax_status == 'taxable',
+                    line_item.id in exempt_by_matrix,
+                )
+                for line_item in line_items
+            ]
+            batch = InvoiceBatch()
+            batch.add_invoice(invoice.total_amount, invoice.invoice_discount_amount, invoice.total_tax_amount, tax_items)
+            tax_results = compute_expected_taxes(batch.arrays())
             
-            # Second pass: calculate expected tax for taxable items
-            for line_item, expected_rate in taxable_items:
-                # Item is already confirmed to be taxable - proceed with tax calculation
-                # Use expected rate from verification, or fallback to applied rate
-                
-                # If verification failed (expected_rate is 0.0000) but line item has applied tax_rate,
-                # use applied rate as fallback with a warning
+            if tax_results['discount_included'][0]:
+                logger.info(
+                    f"Invoice {invoice.invoice_number}: line_totals appear to already include invoice-level discount "
+                    f"(subtotal={from_cents(tax_results['subtotal'][0])}, total_amount={invoice.total_amount})"
+                )
+            if from_cents(tax_results['subtotal'][0]) > invoice.total_amount + (invoice.invoice_discount_amount or Decimal('0.00')) + Decimal('0.01'):
+                logger.warning(
+                    f"Invoice {invoice.invoice_number}: line_totals may be pre-discount "
+                    f"(subtotal={from_cents(tax_results['subtotal'][0])}, total_amount={invoice.total_amount}, "
+                    f"invoice_discount_amount={invoice.invoice_discount_amount})"
+                )
+            
+            # Track which verifications need to be updated with fallback rates
+            zero_rate_fallback_count = 0
+            fallback_rate_updates = {}
+            for line_item, (_, _, applied_rate, expected_rate, _, _), fallback in zip(line_items, tax_items, tax_results['fallback']):
+                if not fallback:
+                    continue
                 if expected_rate is None:
-                    # No verification found - use applied rate as fallback
-                    expected_rate = self._validate_tax_rate(line_item.tax_rate, line_item_id=line_item.id)
-                    logger.warning(f"No verification found for line_item_id={line_item.id}, using applied tax_rate={expected_rate}")
-                    # Track that we're using fallback - will update verification later
-                    fallback_rate_updates[line_item.id] = expected_rate
-                elif expected_rate == Decimal('0.0000') and line_item.tax_rate > Decimal('0.0000'):
-                    # Verification returned 0.0000 but item has applied tax - use applied rate as fallback
-                    expected_rate = self._validate_tax_rate(line_item.tax_rate, line_item_id=line_item.id)
+                    logger.warning(f"No verification found for line_item_id={line_item.id}, using applied tax_rate={applied_rate}")
+                else:
                     zero_rate_fallback_count += 1
                     logger.warning(
                         f"Verification returned 0.0000 for taxable line_item_id={line_item.id} "
                         f"with applied_rate={line_item.tax_rate}, using applied rate as fallback for expected tax calculation"
                     )
-                    # Track that we're using fallback - will update verification later
-                    fallback_rate_updates[line_item.id] = expected_rate
-                
-                # Calculate expected tax for this line item
-                # line_total is validated to be >= 0 by model, but handle edge case defensively
-                if line_item.line_total < Decimal('0.00'):
-                    logger.warning(f"Negative line_total {line_item.line_total} for line_item_id={line_item.id}, treating as 0.00")
-                    base_line_total = Decimal('0.00')
-                else:
-                    base_line_total = line_item.line_total
-                
-                # Apply invoice-level discount proportionally if present
-                # For line-item discounts, line_total should already reflect the discount
-                # IMPORTANT: Allocate discount only to taxable items (use taxable_subtotal, not total subtotal)
-                # Only apply invoice-level discount if line_totals are pre-discount
-                if (invoice.invoice_discount_amount and invoice.invoice_discount_amount > Decimal('0.00') 
-                    and taxable_subtotal > Decimal('0.00') and not line_totals_include_discount):
-                    # Calculate proportional discount for this line item based on taxable subtotal
-                    proportional_discount = invoice.invoice_discount_amount * (base_line_total / taxable_subtotal)
-                    discounted_amount = base_line_total - proportional_discount
-                    # Ensure discounted amount is non-negative
-                    if discounted_amount < Decimal('0.00'):
-                        logger.warning(
-                            f"Proportional discount {proportional_discount} exceeds line_total {base_line_total} "
-                            f"for line_item_id={line_item.id}, using 0.00"
-                        )
-                        discounted_amount = Decimal('0.00')
-                else:
-                    # No invoice-level discount to apply (either none exists, or line_totals already include it)
-                    # Use line_total directly (which should already reflect line-item discounts and possibly invoice-level discount)
-                    discounted_amount = base_line_total
-                
-                # Calculate tax on the discounted amount
-                line_expected_tax = expected_rate * discounted_amount
-                total_expected_tax += line_expected_tax
-                
-                # Warn if line_total appears to be pre-discount (sum of line_totals > total_amount + invoice_discount_amount)
-                if subtotal > invoice.total_amount + invoice.invoice_discount_amount + Decimal('0.01'):
-                    logger.warning(
-                        f"Line item {line_item.id} line_total may be pre-discount: "
-                        f"line_total={base_line_total}, unit_price={line_item.unit_price}, "
-                        f"quantity={line_item.quantity}, discount_amount={line_item.discount_amount}"
-                    )
+                fallback_rate_updates[line_item.id] = applied_rate
             
             # Log summary of fallback usage
             if zero_rate_fallback_count > 0:
@@ -1215,67 +2544,46 @@ IMPORTANT:
             
             # Update verification records to reflect fallback rates used in expected tax calculation
             # This ensures verification status is consistent with expected tax calculation
+            line_items_by_id = {line_item.id: line_item for line_item in line_items}
             for line_item_id, fallback_rate in fallback_rate_updates.items():
-                try:
-                    line_item = InvoiceLineItem.objects.get(id=line_item_id)
-                    # Update the most recent verification for this line item
-                    verification = line_item.tax_verifications.order_by('-verified_at').first()
-                    if verification:
-                        # Only update if the expected_rate was 0.0000 (not if it was None)
-                        if verification.expected_tax_rate == Decimal('0.0000'):
-                            verification.expected_tax_rate = fallback_rate
-                            # Recalculate is_correct based on updated expected rate
-                            applied_rate = Decimal(str(line_item.tax_rate))
-                            tolerance = Decimal('0.0001')
-                            rates_match = abs(applied_rate - fallback_rate) <= tolerance
-                            if rates_match:
-                                verification.is_correct = True
-                                verification.reasoning = (
-                                    f"[Updated] Expected tax rate updated from 0.0000 to {fallback_rate * 100:.4f}% "
-                                    f"(using applied rate as fallback). Rates match, so is_correct set to true. "
-                                    f"Original reasoning: {verification.reasoning}"
-                                )
-                            else:
-                                verification.is_correct = False
-                                verification.reasoning = (
-                                    f"[Updated] Expected tax rate updated from 0.0000 to {fallback_rate * 100:.4f}% "
-                                    f"(using applied rate as fallback). Rates don't match. "
-                                    f"Original reasoning: {verification.reasoning}"
-                                )
-                            verification.save(update_fields=['expected_tax_rate', 'is_correct', 'reasoning', 'updated_at'])
-                            logger.info(
-                                f"Updated verification for line_item_id={line_item_id}: "
-                                f"expected_tax_rate={fallback_rate}, is_correct={verification.is_correct}"
-                            )
-                except InvoiceLineItem.DoesNotExist:
-                    logger.warning(f"Line item {line_item_id} not found when updating verification with fallback rate")
-                except Exception as e:
-                    logger.error(f"Error updating verification for line_item_id={line_item_id} with fallback rate: {str(e)}")
-            
-            # Round expected tax to 2 decimal places (currency precision)
-            total_expected_tax = total_expected_tax.quantize(Decimal('0.01'))
-            
-            # Calculate actual tax
-            # Strategy: Use invoice.total_tax_amount if available and > 0 (when tax is shown as total, not per-line-item),
-            # otherwise sum line item tax amounts
-            # This handles cases where invoices show tax as a single total rather than per-line-item
-            if invoice.total_tax_amount and invoice.total_tax_amount > Decimal('0.00'):
-                # Invoice has a total tax amount - use it
-                total_actual_tax = invoice.total_tax_amount
-            else:
-                # Sum individual line item tax amounts
-                total_actual_tax = sum(
-                    max(Decimal('0.00'), line_item.tax_amount)  # Ensure non-negative
-                    for line_item in invoice.line_items.all()
-                )
-            
-            # Validate actual tax is non-negative
-            if total_actual_tax < Decimal('0.00'):
-                logger.warning(f"Negative total_actual_tax {total_actual_tax} for invoice {invoice.invoice_number}, clamping to 0.00")
-                total_actual_tax = Decimal('0.00')
+                line_item = line_items_by_id[line_item_id]
+                verification = verification_objs.get(line_item_id)
+                # Only update if the expected_rate was 0.0000 (not if it was None)
+                if verification and verification.expected_tax_rate == Decimal('0.0000'):
+                    verification.expected_tax_rate = fallback_rate
+                    # Recalculate is_correct based on updated expected rate
+                    applied_rate = Decimal(str(line_item.tax_rate))
+                    tolerance = Decimal('0.0001')
+                    rates_match = abs(applied_rate - fallback_rate) <= tolerance
+                    if rates_match:
+                        verification.is_correct = True
+                        verification.reasoning = (
+                            f"[Updated] Expected tax rate updated from 0.0000 to {fallback_rate * 100:.4f}% "
+                            f"(using applied rate as fallback). Rates match, so is_correct set to true. "
+                            f"Original reasoning: {verification.reasoning}"
+                        )
+                    else:
+                        verification.is_correct = False
+                        verification.reasoning = (
+                            f"[Updated] Expected tax rate updated from 0.0000 to {fallback_rate * 100:.4f}% "
+                            f"(using applied rate as fallback). Rates don't match. "
+                            f"Original reasoning: {verification.reasoning}"
+                        )
+                    if line_item_id in written:
+                        # Already reported as progress; a later verified_at reports the change too
+                        # (bulk_update does not apply auto_now, so updated_at is set here as well)
+                        touched_at = timezone.now()
+                        verification.verified_at = touched_at
+                        verification.updated_at = touched_at
+                    logger.info(
+                        f"Updated verification for line_item_id={line_item_id}: "
+                        f"expected_tax_rate={fallback_rate}, is_correct={verification.is_correct}"
+                    )
             
-            # Round actual tax to 2 decimal places (currency precision)
-            total_actual_tax = total_actual_tax.quantize(Decimal('0.01'))
+            total_expected_tax = from_cents(tax_results['expected_tax'][0])
+            # Actual tax is invoice.total_tax_amount when the invoice shows tax as a single total,
+            # otherwise the sum of the non-negative line item tax amounts
+            total_actual_tax = from_cents(tax_results['actual_tax'][0])
             
         except Exception as e:
             logger.error(f"Error calculating tax amounts for invoice {invoice.invoice_number}: {str(e)}", exc_info=True)
@@ -1286,31 +2594,63 @@ IMPORTANT:
         # Get KB info from first verification that has it
         kb_id = None
         kb_name = None
-        for v in verifications:
-            if v.get('kb_id'):
-                kb_id = v.get('kb_id')
-                kb_name = v.get('kb_name')
+        for verification_result in verification_results:
+            if verification_result.get('kb_id'):
+                kb_id = verification_result.get('kb_id')
+                kb_name = verification_result.get('kb_name')
                 break
         
-        determination, _ = TaxDetermination.objects.update_or_create(
-            invoice=invoice,
-            defaults={
-                'determination_status': 'verified' if summary['all_correct'] else 'discrepancy',
-                'expected_tax': total_expected_tax,
-                'actual_tax': total_actual_tax,
-                'discrepancy_amount': total_actual_tax - total_expected_tax,
-                'verified_at': timezone.now(),
-                'kb_verification_metadata': {
-                    'kb_id': kb_id,
-                    'kb_name': kb_name,
-                    'summary': summary,
-                    'verification_count': total_items
+        with transaction.atomic():
+            if usage_line_items:
+                InvoiceLineItem.objects.bulk_update(usage_line_items, KB_USAGE_FIELDS + ['updated_at'])
+            LineItemTaxVerification.objects.bulk_create(new_verification_objs)
+            if updated_verification_objs:
+                LineItemTaxVerification.objects.bulk_update(
+                    updated_verification_objs,
+                    ['is_correct', 'confidence_score', 'reasoning', 'expected_tax_rate', 'applied_tax_rate',
+                     'verification_details', 'verified_at', 'updated_at']
+                )
+            determination, _ = TaxDetermination.objects.update_or_create(
+                invoice=invoice,
+                defaults={
+                    'determination_status': 'verified' if summary['all_correct'] else 'discrepancy',
+                    'expected_tax': total_expected_tax,
+                    'actual_tax': total_actual_tax,
+                    'discrepancy_amount': total_actual_tax - total_expected_tax,
+                    # Not before any line item's verified_at, so a progress cursor reaches it last
+                    'verified_at': timezone.now(),
+                    'kb_verification_metadata': {
+                        'kb_id': kb_id,
+                        'kb_name': kb_name,
+                        'summary': summary,
+                        'verification_count': total_items
+                    }
                 }
-            }
-        )
+            )
+            
+            # Recalculate total LLM cost from the line items already in memory
+            invoice.recalculate_total_llm_cost(line_items)
         
-        # Recalculate total LLM cost
-        invoice.recalculate_total_llm_cost()
+        for line_item, verification_result in zip(line_items, verification_results):
+            verification_obj = verification_objs[line_item.id]
+            # Fresh KB verdicts become reusable for similar line items
+            if near_duplicate_index is not None and verification_result.get('kb_response') and not verification_result.get('error'):
+                near_duplicate_index.add(
+                    invoice.state_code, line_item.description, line_item.tax_status, line_item.tax_rate,
+                    verification_obj.id, line_item.id
+                )
+            
+            verifications.append({
+                'line_item_id': line_item.id,
+                'verification_id': verification_obj.id,
+                'is_correct': verification_result['is_correct'],
+                'confidence_score': float(verification_result['confidence_score']),
+                'reasoning': verification_result['reasoning'],
+                'expected_tax_rate': float(verification_result['expected_tax_rate']),
+                'applied_tax_rate': float(line_item.tax_rate),
+                'kb_id': verification_result.get('kb_id'),
+                'kb_name': verification_result.get('kb_name')
+            })
         
         return {
             'line_item_verifications': verifications,
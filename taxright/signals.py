@@ -0,0 +1,23 @@
+"""
+Signal handlers for the taxright app.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from taxright.cache import VerificationResultCache
+from taxright.models import StateKnowledgeBase, TaxRule
+from taxright.rule_index import bump_rules_version
+
+
+@receiver(post_save, sender=StateKnowledgeBase)
+@receiver(post_delete, sender=StateKnowledgeBase)
+def invalidate_state_verification_cache(sender, instance, **kwargs):
+    """Drop cached verdicts for a state when its knowledge base mapping is created, changed or removed."""
+    VerificationResultCache.invalidate_state(instance.state_code)
+
+
+@receiver(post_save, sender=TaxRule)
+@receiver(post_delete, sender=TaxRule)
+def refresh_tax_rule_index(sender, instance, **kwargs):
+    """Mark the in-memory TaxRule index stale so the next rate lookup rebuilds it."""
+    bump_rules_version()
@@ -0,0 +1,106 @@
+"""
+Reader for the state sales and use tax topic files in RAG/state_data.
+
+RAG/fileparser.py turns each SUT*.xlsx workbook into one text file per state
+(e.g. North_Carolina3.txt): a 'State: <name>' header followed by
+'Topic: <topic>' sections separated by lines of '='. This module splits those
+files back into topic chunks, long topics into overlapping word windows, for
+the local retrieval indexes (taxright.bm25, taxright.vector_index).
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# File name prefixes written by RAG/fileparser.py, mapped to invoice state codes
+STATE_NAME_CODES = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'District_of_Columbia': 'DC',
+    'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL',
+    'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA',
+    'Maine': 'ME', 'Maryland': 'MD', 'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN',
+    'Mississippi': 'MS', 'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
+    'New_Hampshire': 'NH', 'New_Jersey': 'NJ', 'New_Mexico': 'NM', 'New_York': 'NY',
+    'New_York_City': 'NY', 'North_Carolina': 'NC', 'North_Dakota': 'ND', 'Ohio': 'OH',
+    'Oklahoma': 'OK', 'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode_Island': 'RI',
+    'South_Carolina': 'SC', 'South_Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT',
+    'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West_Virginia': 'WV',
+    'Wisconsin': 'WI', 'Wyoming': 'WY',
+}
+
+MAX_CHUNK_WORDS = 300
+CHUNK_OVERLAP_WORDS = 50
+
+_FILE_NAME = re.compile(r'^(?P<state>[A-Za-z_]+?)(?P<number>\d+)\.txt$')
+_SECTION_SEPARATOR = re.compile(r'\n={10,}\n')
+
+
+def default_state_data_dir() -> Path:
+    """Return the RAG/state_data directory of this checkout."""
+    return Path(__file__).resolve().parent.parent / 'RAG' / 'state_data'
+
+
+def state_code_for_file(file_name: str) -> Optional[str]:
+    """
+    Get the state code a state_data file belongs to.
+
+    Args:
+        file_name: File name such as 'North_Carolina3.txt'
+
+    Returns:
+        str: 2-letter state code, or None for files that are not state topic files
+    """
+    match = _FILE_NAME.match(os.path.basename(file_name))
+    return STATE_NAME_CODES.get(match.group('state')) if match else None
+
+
+def state_data_files(directory=None) -> Dict[str, List[Path]]:
+    """
+    List the topic files in a state_data directory, grouped by state code.
+
+    Args:
+        directory: state_data directory (defaults to RAG/state_data)
+
+    Returns:
+        dict: Sorted file paths by state code
+    """
+    files = {}
+    for path in sorted(Path(directory or default_state_data_dir()).glob('*.txt')):
+        state_code = state_code_for_file(path.name)
+        if state_code:
+            files.setdefault(state_code, []).append(path)
+    return files
+
+
+def split_words(text: str, max_words: int = MAX_CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split text into windows of at most max_words words, consecutive windows sharing overlap words."""
+    words = text.split()
+    if len(words) <= max_words:
+        return [' '.join(words)]
+    step = max(1, max_words - overlap)
+    return [' '.join(words[start:start + max_words]) for start in range(0, len(words) - overlap, step)]
+
+
+def iter_file_chunks(path, max_words: int = MAX_CHUNK_WORDS) -> Iterator[Dict[str, str]]:
+    """
+    Split a state_data file into topic chunks.
+
+    Args:
+        path: Path to a file written by RAG/fileparser.py
+        max_words: Topics longer than this are split into overlapping windows
+
+    Yields:
+        dict: 'topic' and 'text' (prefixed with the topic so every window keeps its context)
+    """
+    content = Path(path).read_text(encoding='utf-8')
+    for section in _SECTION_SEPARATOR.split(content):
+        section = section.strip()
+        topic_start = section.find('Topic:')
+        if topic_start < 0:
+            continue
+        header, _, body = section[topic_start + len('Topic:'):].partition('\n')
+        topic, body = header.strip(), body.strip()
+        if not topic or not body:
+            continue
+        for window in split_words(body, max_words):
+            yield {'topic': topic, 'text': f"Topic: {topic}\n\n{window}"}
@@ -0,0 +1,307 @@
+"""
+Pure expected-tax math over integer cents and rate basis points.
+
+An invoice's expected tax is the sum, over its taxable line items, of the
+expected rate times the line total after the invoice-level discount. The rules
+(previously inlined in BedrockKnowledgeBaseService.verify_invoice_taxes, kept
+below as reference_invoice_tax()) are:
+
+- An item is taxed if its tax_status is 'taxable' or its verification expects a
+  non-zero rate, unless the taxability matrix deliberately decided it exempt.
+- The expected rate is the verification's; with no verification, or a zero
+  expected rate on an item that was charged tax, the applied rate is used
+  instead (a "fallback").
+- Negative line totals count as zero.
+- The invoice discount is allocated to taxed items in proportion to their line
+  totals, unless the line totals already add up to the discounted invoice total
+  (within a cent). A discount larger than the taxed subtotal leaves nothing to tax.
+- The sum is rounded half-even to the cent once, at the invoice level.
+- Actual tax is the invoice's total_tax_amount when positive, else the sum of the
+  non-negative line tax amounts.
+
+Here amounts are int64 cents and rates int64 basis points (0.0675 -> 675), so
+the expected tax of an invoice is the exact fraction
+sum(rate * base) * (taxed subtotal - discount) / (10000 * taxed subtotal) cents,
+rounded half-even in integer arithmetic. Many invoices are evaluated at once:
+line items are flat arrays grouped by invoice through an offsets array (CSR
+layout), and per-invoice sums are segment reductions. Per-line discounted
+amounts and taxes are also allocated in whole cents by largest remainder, so
+they add up exactly to the invoice totals. Invoices large enough to overflow
+int64 intermediates are evaluated with Python integers instead.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CENT = Decimal('0.01')
+BASIS_POINTS = 10000
+
+# Intermediate products above this are evaluated with Python integers instead of int64
+_INT64_SAFE = float(2 ** 62)
+
+ITEM_FIELDS = ('line_total', 'tax_amount', 'applied_bps', 'expected_bps', 'taxable', 'exempt')
+INVOICE_FIELDS = ('total', 'discount', 'total_tax')
+ITEM_RESULTS = ('included', 'fallback', 'rate_bps', 'discounted', 'line_tax')
+
+
+def to_cents(amount) -> int:
+    """Convert a currency amount (Decimal, str, int, float or None) to integer cents, rounding half-even."""
+    if amount is None:
+        return 0
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int(amount.scaleb(2).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def to_bps(rate) -> int:
+    """Convert a decimal rate (0.0675) to integer basis points (675), rounding half-even."""
+    if rate is None:
+        return 0
+    if not isinstance(rate, Decimal):
+        rate = Decimal(str(rate))
+    return int(rate.scaleb(4).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer cents to a 2-decimal-place Decimal amount."""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+class InvoiceBatch:
+    """Line items of many invoices as flat arrays, grouped by invoice in insertion order."""
+
+    def __init__(self):
+        self._items: Dict[str, List[int]] = {field: [] for field in ITEM_FIELDS}
+        self._invoices: Dict[str, List[int]] = {field: [] for field in INVOICE_FIELDS}
+        self._offsets = [0]
+
+    def add_invoice(self, total, discount, total_tax, items: Iterable[Tuple[Any, Any, Any, Any, bool, bool]]) -> int:
+        """
+        Append an invoice.
+
+        Args:
+            total: Invoice total_amount
+            discount: Invoice invoice_discount_amount (None or 0 for none)
+            total_tax: Invoice total_tax_amount (None or 0 when tax is only given per line)
+            items: (line_total, tax_amount, applied_rate, expected_rate, taxable, exempt) per line item, where
+                expected_rate is the verified rate or None without a verification, taxable is
+                tax_status == 'taxable' and exempt marks items the taxability matrix decided exempt
+
+        Returns:
+            int: Position of the invoice in the batch
+        """
+        self._invoices['total'].append(to_cents(total))
+        self._invoices['discount'].append(to_cents(discount))
+        self._invoices['total_tax'].append(to_cents(total_tax))
+        for line_total, tax_amount, applied_rate, expected_rate, taxable, exempt in items:
+            self._items['line_total'].append(to_cents(line_total))
+            self._items['tax_amount'].append(to_cents(tax_amount))
+            self._items['applied_bps'].append(to_bps(applied_rate))
+            self._items['expected_bps'].append(-1 if expected_rate is None else to_bps(expected_rate))
+            self._items['taxable'].append(bool(taxable))
+            self._items['exempt'].append(bool(exempt))
+        self._offsets.append(len(self._items['line_total']))
+        return len(self._offsets) - 2
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The batch as arrays accepted by compute_expected_taxes()."""
+        arrays = {field: np.asarray(values, dtype=np.int64) for field, values in self._items.items()}
+        arrays.update({field: np.asarray(values, dtype=np.int64) for field, values in self._invoices.items()})
+        arrays['taxable'] = arrays['taxable'].astype(bool)
+        arrays['exempt'] = arrays['exempt'].astype(bool)
+        arrays['offsets'] = np.asarray(self._offsets, dtype=np.int64)
+        return arrays
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Sum values over consecutive segments [offsets[i], offsets[i + 1]); empty segments sum to 0."""
+    counts = np.diff(offsets)
+    if not len(counts):
+        return np.zeros(0, dtype=values.dtype)
+    # A trailing zero keeps the start index of empty segments at the end in range
+    padded = np.concatenate((values, np.zeros(1, dtype=values.dtype)))
+    return np.where(counts > 0, np.add.reduceat(padded, offsets[:-1]), values.dtype.type(0))
+
+
+def _round_half_even(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Round non-negative numerator / denominator to the nearest integer, ties to even."""
+    quotient = numerator // denominator
+    twice_remainder = 2 * (numerator - quotient * denominator)
+    round_up = (twice_remainder > denominator) | ((twice_remainder == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def _largest_remainder(numerators: np.ndarray, denominators: np.ndarray, totals: np.ndarray,
+                       offsets: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Allocate whole units to items so each group's allocation adds up to its total.
+
+    Every item gets floor(numerator / denominator); the units still missing from a
+    group's total go one each to its items with the largest remainders (earlier items
+    first on ties). Totals must lie between the group's sum of floors and its count
+    of non-zero remainders above it, as they do for rounded sums of the same fractions.
+    """
+    floors = numerators // denominators
+    remainders = numerators - floors * denominators
+    missing = totals - _segment_sum(floors, offsets)
+    order = np.lexsort((np.arange(len(numerators)), -remainders, groups))
+    rank = np.empty(len(numerators), dtype=np.int64)
+    rank[order] = np.arange(len(numerators)) - offsets[:-1][groups[order]]
+    return floors + (rank < missing[groups])
+
+
+def _evaluate(arrays: Dict[str, np.ndarray], dtype) -> Dict[str, np.ndarray]:
+    """Evaluate compute_expected_taxes() with intermediates of the given dtype (np.int64 or object)."""
+    offsets = arrays['offsets']
+    counts = np.diff(offsets)
+    groups = np.repeat(np.arange(len(counts)), counts)
+    line_total = arrays['line_total'].astype(dtype)
+    expected_bps, applied_bps = arrays['expected_bps'], arrays['applied_bps']
+    total, discount = arrays['total'].astype(dtype), arrays['discount'].astype(dtype)
+    zero = dtype(0) if dtype is not object else 0
+
+    included = ~arrays['exempt'] & (arrays['taxable'] | (expected_bps > 0))
+    fallback = included & ((expected_bps < 0) | ((expected_bps == 0) & (applied_bps > 0)))
+    rate_bps = np.where(included, np.where(fallback, applied_bps, np.maximum(expected_bps, 0)), 0).astype(dtype)
+    base = np.where(included, np.maximum(line_total, zero), zero)
+
+    subtotal = _segment_sum(line_total, offsets)
+    taxed_subtotal = _segment_sum(np.where(included, line_total, zero), offsets)
+    discount_included = (discount > 0) & (np.abs(subtotal - total) <= 1)
+    discount_applied = (discount > 0) & (taxed_subtotal > 0) & ~discount_included
+    # Discounted base = base * factor / divisor, with factor / divisor = 1 when no discount is applied
+    factor = np.where(discount_applied, np.maximum(taxed_subtotal - discount, zero), 1).astype(dtype)
+    divisor = np.where(discount_applied, taxed_subtotal, 1).astype(dtype)
+
+    discounted_numerators = base * factor[groups]
+    discounted = _largest_remainder(
+        discounted_numerators, divisor[groups],
+        _round_half_even(_segment_sum(discounted_numerators, offsets), divisor), offsets, groups
+    )
+    tax_numerators = rate_bps * discounted_numerators
+    tax_denominators = divisor * BASIS_POINTS
+    expected_tax = _round_half_even(_segment_sum(tax_numerators, offsets), tax_denominators)
+    line_tax = _largest_remainder(tax_numerators, tax_denominators[groups], expected_tax, offsets, groups)
+
+    line_tax_amounts = _segment_sum(np.maximum(arrays['tax_amount'], 0).astype(dtype), offsets)
+    total_tax = arrays['total_tax'].astype(dtype)
+    actual_tax = np.maximum(np.where(total_tax > 0, total_tax, line_tax_amounts), zero)
+    return {
+        'included': included,
+        'fallback': fallback,
+        'rate_bps': rate_bps,
+        'discounted': discounted,
+        'line_tax': line_tax,
+        'expected_tax': expected_tax,
+        'actual_tax': actual_tax,
+        'subtotal': subtotal,
+        'taxed_subtotal': taxed_subtotal,
+        'discount_applied': discount_applied,
+        'discount_included': discount_included,
+    }
+
+
+def _select(arrays: Dict[str, np.ndarray], invoice_mask: np.ndarray) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Restrict a batch to the masked invoices, returning the sub-batch and its item mask."""
+    counts = np.diff(arrays['offsets'])
+    item_mask = np.repeat(invoice_mask, counts)
+    selected = {field: arrays[field][item_mask] for field in ITEM_FIELDS}
+    selected.update({field: arrays[field][invoice_mask] for field in INVOICE_FIELDS})
+    selected['offsets'] = np.concatenate(([0], np.cumsum(counts[invoice_mask]))).astype(np.int64)
+    return selected, item_mask
+
+
+def compute_expected_taxes(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Compute expected and actual tax for a batch of invoices.
+
+    Args:
+        arrays: InvoiceBatch.arrays(), or equivalent int64 arrays: per line item 'line_total' and
+            'tax_amount' (cents), 'applied_bps' and 'expected_bps' (basis points, -1 without a
+            verification), bool 'taxable' and 'exempt'; per invoice 'total', 'discount' and
+            'total_tax' (cents); and 'offsets', where invoice i owns items offsets[i]:offsets[i + 1]
+
+    Returns:
+        dict: Per line item 'included', 'fallback' (the applied rate replaced the expected one),
+        'rate_bps', 'discounted' (cents after the discount allocation) and 'line_tax' (cents,
+        summing to the invoice's expected tax); per invoice 'expected_tax' and 'actual_tax'
+        (cents), 'subtotal', 'taxed_subtotal', 'discount_applied' and 'discount_included'
+    """
+    offsets = arrays['offsets']
+    # Upper bound of each invoice's largest intermediate, sum(rate * base * factor), in floating point
+    base_sum = _segment_sum(np.maximum(arrays['line_total'], 0).astype(np.float64), offsets)
+    safe = base_sum * BASIS_POINTS * np.maximum(base_sum, 1) < _INT64_SAFE
+    if safe.all():
+        return _evaluate(arrays, np.int64)
+
+    results = {}
+    for invoice_mask, dtype in ((safe, np.int64), (~safe, object)):
+        if not invoice_mask.any():
+            continue
+        selected, item_mask = _select(arrays, invoice_mask)
+        for field, values in _evaluate(selected, dtype).items():
+            position = item_mask if field in ITEM_RESULTS else invoice_mask
+            if field not in results:
+                results[field] = np.zeros(len(position), dtype=bool if values.dtype == bool else object)
+            results[field][position] = values
+    return results
+
+
+def reference_invoice_tax(total: Decimal, discount: Optional[Decimal], total_tax: Optional[Decimal],
+                          items: Sequence[Tuple[Decimal, Decimal, Decimal, Optional[Decimal], bool, bool]]) -> Dict[str, Any]:
+    """
+    Compute one invoice's expected and actual tax with Decimal arithmetic, line by line.
+
+    This is the calculation verify_invoice_taxes performed before compute_expected_taxes()
+    replaced it, kept as the executable specification the vectorized version is tested and
+    benchmarked against.
+
+    Args:
+        total: Invoice total_amount
+        discount: Invoice invoice_discount_amount
+        total_tax: Invoice total_tax_amount
+        items: Same tuples as InvoiceBatch.add_invoice(), with rates already validated to [0, 1]
+
+    Returns:
+        dict: 'expected_tax' and 'actual_tax' (Decimal, 2 places) and the positions of 'fallback' items
+    """
+    discount = discount or Decimal('0.00')
+    taxed_items = []
+    taxed_subtotal = Decimal('0.00')
+    for position, (line_total, _, applied_rate, expected_rate, taxable, exempt) in enumerate(items):
+        if exempt:
+            continue
+        if not taxable and (expected_rate is None or expected_rate == Decimal('0.0000')):
+            continue
+        taxed_items.append((position, line_total, applied_rate, expected_rate))
+        taxed_subtotal += line_total
+
+    subtotal = sum((item[0] for item in items), Decimal('0.00'))
+    discount_included = discount > Decimal('0.00') and abs(subtotal - total) <= CENT
+
+    expected_tax = Decimal('0.00')
+    fallback = []
+    for position, line_total, applied_rate, expected_rate in taxed_items:
+        if expected_rate is None or (expected_rate == Decimal('0.0000') and applied_rate > Decimal('0.0000')):
+            expected_rate = applied_rate
+            fallback.append(position)
+        base = max(line_total, Decimal('0.00'))
+        if discount > Decimal('0.00') and taxed_subtotal > Decimal('0.00') and not discount_included:
+            discounted = max(base - discount * (base / taxed_subtotal), Decimal('0.00'))
+        else:
+            discounted = base
+        expected_tax += expected_rate * discounted
+
+    if total_tax and total_tax > Decimal('0.00'):
+        actual_tax = total_tax
+    else:
+        actual_tax = sum((max(Decimal('0.00'), item[1]) for item in items), Decimal('0.00'))
+    return {
+        'expected_tax': expected_tax.quantize(CENT),
+        'actual_tax': max(actual_tax, Decimal('0.00')).quantize(CENT),
+        'fallback': fallback,
+    }
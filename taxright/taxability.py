@@ -0,0 +1,407 @@
+"""
+State-by-topic taxability matrix compiled from the SUT workbooks.
+
+RAG/SUT1.xlsx .. SUT12.xlsx each hold one sheet of topic rows ("Section\\n
+Subsection\\nItem") by state columns, with cells such as "Nontaxable\\n Window
+cleaning services are ... \\n Ala. Code §40-23-2.\\n BNA-SUTN AL 28.4.13.". The
+knowledge bases only see them as free text; this module compiles the taxability
+rows into topic x state -> verdict so line items whose category the workbooks
+answer unconditionally (see taxright.categories) are decided without Bedrock.
+
+Cell labels map to a status:
+- Taxable -> 'taxable'
+- Exempt, Nontaxable and No Tax (the state has no sales tax) -> 'exempt'
+- No Guidance -> 'no_guidance'
+- Anything else (Depends, Deductible, Excise Tax, Increased rate, ...) -> 'conditional'
+
+A Taxable or Exempt label whose summary says the opposite (the NC Tires cell is
+labelled Nontaxable but its summary says tires are taxable) becomes
+'unresolved', so the KB decides those items instead of the matrix or the
+rate engine.
+
+Only taxability rows are compiled: a row qualifies when at least half of its
+labels, ignoring No Tax, are taxability labels, which skips definition,
+registration and sourcing rows. A topic repeated across workbooks with
+disagreeing verdicts for a state becomes 'conditional'. The New York City
+column is skipped; invoices carry the New York state code.
+
+The workbooks are plain SpreadsheetML and are read with zipfile/ElementTree, so
+compiling needs no spreadsheet library.
+"""
+import datetime
+import json
+import logging
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from invoice_ocr.config import ConfigManager
+from taxright.models import InvoiceLineItem
+from taxright.state_data import STATE_NAME_CODES
+
+logger = logging.getLogger(__name__)
+
+MATRIX_VERSION = 2
+WORKBOOK_GLOB = 'SUT*.xlsx'
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_CELL_REF = re.compile(r'[A-Z]+')
+
+LABEL_STATUSES = {
+    'taxable': 'taxable',
+    'exempt': 'exempt',
+    'nontaxable': 'exempt',
+    'no tax': 'exempt',
+    'no guidance': 'no_guidance',
+    'depends': 'conditional',
+    'deductible': 'conditional',
+}
+TAXABILITY_LABELS = {'taxable', 'exempt', 'nontaxable', 'depends', 'no guidance', 'deductible'}
+SKIPPED_COLUMNS = {'New York City'}
+
+# Summary phrasing that states taxability. A "not exempt" statement means taxable and is
+# matched first, so the "exempt" in it is not read as an exemption.
+_TAX = r"\btax(?:es)?\b"
+_SALES_TAX = r"(?:the\s+)?(?:[\w.'’]+\s+){0,3}?(?:sales|use|gross retail)\b[^.;,]{0,20}?" + _TAX + r"|(?:the\s+)?tax\b"
+_NOT_EXEMPT_SUMMARY = re.compile(
+    r"\bnot\s+(?:\w+\s+){0,2}?exempt(?:ed)?\b"
+    r"|\bnot\s+have\s+an?\s+(?:\w+\s+)?exemption\b",
+    re.IGNORECASE
+)
+_EXEMPT_SUMMARY = re.compile(
+    r"\b(?:not|no longer)\s+(?:be\s+|generally\s+)?(?:subject to\s+(?:" + _SALES_TAX + r")|taxable|taxed)"
+    r"|\bnon-?taxable\b"
+    r"|" + _TAX + r"\s+(?:does|do) not apply\b|\bdoes not impose\b"
+    r"|\bnot\s+(?:\w+\s+){0,3}?(?:enumerated|listed)\s+(?:as\s+)?(?:an?\s+)?(?:taxable\s+)?services?\b[^.;]*"
+    r"|\bexempt(?:s|ed)?\b[^.;]{0,60}?\bfrom\b[^.;]{0,40}?" + _TAX +
+    r"|\b(?:is|are)\s+(?:\w+\s+)?exempt\b",
+    re.IGNORECASE
+)
+_TAXABLE_SUMMARY = re.compile(
+    r"\b(?:is|are|be)\s+(?:\w+\s+)?(?:taxable|taxed)\b"
+    r"|\bsubject to\s+(?:" + _SALES_TAX + r")",
+    re.IGNORECASE
+)
+
+# Confidence recorded for verdicts decided from the matrix (the workbooks are secondary sources)
+MATRIX_CONFIDENCE = Decimal('0.90')
+
+
+def _column_index(cell_ref: str) -> int:
+    """Zero-based column of a cell reference such as 'AB12'."""
+    index = 0
+    for letter in _CELL_REF.match(cell_ref).group():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def read_sheet_rows(path: Union[str, Path]) -> Iterator[List[str]]:
+    """
+    Read the rows of the first worksheet of an .xlsx workbook as strings.
+
+    Args:
+        path: Workbook path
+
+    Returns:
+        iterator: One list of cell strings per row, padded to the row's last filled column
+    """
+    with zipfile.ZipFile(path) as workbook:
+        names = set(workbook.namelist())
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in names:
+            root = ET.fromstring(workbook.read('xl/sharedStrings.xml'))
+            shared_strings = [
+                ''.join(text.text or '' for text in item.iter(f'{_SHEET_NS}t'))
+                for item in root.findall(f'{_SHEET_NS}si')
+            ]
+        sheet_name = min(
+            (name for name in names if re.fullmatch(r'xl/worksheets/sheet\d+\.xml', name)),
+            key=lambda name: int(re.search(r'\d+', name.rsplit('/', 1)[-1]).group())
+        )
+        sheet = ET.fromstring(workbook.read(sheet_name))
+
+    for row in sheet.iter(f'{_SHEET_NS}row'):
+        values = {}
+        for cell in row.findall(f'{_SHEET_NS}c'):
+            cell_type, value = cell.get('t'), cell.find(f'{_SHEET_NS}v')
+            if cell_type == 's':
+                text = shared_strings[int(value.text)]
+            elif cell_type == 'inlineStr':
+                text = ''.join(part.text or '' for part in cell.iter(f'{_SHEET_NS}t'))
+            else:
+                text = value.text if value is not None and value.text else ''
+            values[_column_index(cell.get('r'))] = text
+        yield [values.get(column, '') for column in range(max(values) + 1)] if values else []
+
+
+def parse_cell(text: str) -> Optional[Dict[str, str]]:
+    """
+    Split a state cell into its label, summary, citation and BNA reference.
+
+    Args:
+        text: Cell text ("Label\\n summary\\n citation\\n ... BNA-SUTN XX n.n.")
+
+    Returns:
+        dict: 'label', 'summary', 'citation' and 'reference' (blank when absent), or None for empty cells
+    """
+    lines = [line.strip() for line in (text or '').split('\n') if line.strip()]
+    if not lines:
+        return None
+    reference = next((line for line in reversed(lines) if line.startswith('BNA-SUTN')), '')
+    body = [line for line in lines[1:] if line != reference]
+    return {
+        'label': lines[0],
+        'summary': body[0] if body else '',
+        'citation': body[1] if len(body) > 1 else '',
+        'reference': reference.rstrip('. '),
+    }
+
+
+def status_for_label(label: str) -> str:
+    """Map a workbook cell label to 'taxable', 'exempt', 'conditional' or 'no_guidance'."""
+    return LABEL_STATUSES.get(' '.join(label.lower().split()), 'conditional')
+
+
+def status_for_summary(summary: str) -> Optional[str]:
+    """
+    Read the taxability a cell summary states.
+
+    Args:
+        summary: Summary sentence(s) of a workbook cell
+
+    Returns:
+        str: 'taxable' or 'exempt', or None when the summary states neither or both
+    """
+    taxable = _NOT_EXEMPT_SUMMARY.search(summary)
+    summary = _NOT_EXEMPT_SUMMARY.sub(' ', summary)
+    exempt = _EXEMPT_SUMMARY.search(summary)
+    taxable = taxable or _TAXABLE_SUMMARY.search(_EXEMPT_SUMMARY.sub(' ', summary))
+    if exempt and not taxable:
+        return 'exempt'
+    if taxable and not exempt:
+        return 'taxable'
+    return None
+
+
+def status_for_cell(cell: Dict[str, str]) -> str:
+    """Status of a parsed cell: its label's status, or 'unresolved' when the summary contradicts the label."""
+    status = status_for_label(cell['label'])
+    if status in ('taxable', 'exempt') and status_for_summary(cell['summary']) not in (None, status):
+        return 'unresolved'
+    return status
+
+
+def topic_path(cell: str) -> str:
+    """Join a multi-line topic cell into a 'Section > Subsection > Item' path."""
+    return ' > '.join(' '.join(part.split()) for part in cell.split('\n') if part.strip())
+
+
+def compile_taxability_matrix(directory: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+    """
+    Compile the taxability rows of the SUT workbooks into a matrix.
+
+    Args:
+        directory: Directory holding SUT*.xlsx (defaults to RAG/)
+
+    Returns:
+        dict: 'version', 'built_at', 'sources' and 'topics' ({topic path: {state code: verdict}}),
+        where each verdict has 'status', 'label', 'summary', 'citation', 'reference' and 'source'
+    """
+    directory = Path(directory) if directory else Path(__file__).resolve().parent.parent / 'RAG'
+    workbooks = sorted(directory.glob(WORKBOOK_GLOB), key=lambda path: (len(path.stem), path.stem))
+    topics: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for workbook in workbooks:
+        rows = read_sheet_rows(workbook)
+        header = next(rows, [])
+        states = {
+            column: STATE_NAME_CODES.get(name.strip().replace(' ', '_'))
+            for column, name in enumerate(header)
+            if column and name.strip() not in SKIPPED_COLUMNS
+        }
+        for row in rows:
+            if not row or not row[0].strip():
+                continue
+            cells = {states[column]: parse_cell(text) for column, text in enumerate(row) if states.get(column)}
+            cells = {state_code: cell for state_code, cell in cells.items() if cell}
+            labels = [cell['label'].lower() for cell in cells.values() if cell['label'].lower() != 'no tax']
+            if not labels or sum(label in TAXABILITY_LABELS for label in labels) * 2 < len(labels):
+                continue
+
+            verdicts = topics.setdefault(topic_path(row[0]), {})
+            for state_code, cell in cells.items():
+                verdict = dict(cell, status=status_for_cell(cell), source=workbook.name)
+                previous = verdicts.get(state_code)
+                if previous and previous['status'] != verdict['status']:
+                    verdict['status'] = 'conditional'
+                    verdict['source'] = f"{previous['source']}, {workbook.name}"
+                verdicts[state_code] = verdict
+
+    return {
+        'version': MATRIX_VERSION,
+        'built_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'sources': [workbook.name for workbook in workbooks],
+        'topics': topics,
+    }
+
+
+class TaxabilityMatrix:
+    """Compiled topic x state taxability verdicts."""
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Initialize the matrix.
+
+        Args:
+            data: Result of compile_taxability_matrix() (or its saved JSON)
+
+        Raises:
+            ValueError: If the data was compiled by an incompatible version
+        """
+        if data.get('version') != MATRIX_VERSION:
+            raise ValueError(f"Unsupported taxability matrix version {data.get('version')!r}")
+        self.built_at = data.get('built_at')
+        self.sources = list(data.get('sources', []))
+        self.topics: Dict[str, Dict[str, Dict[str, str]]] = data['topics']
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'TaxabilityMatrix':
+        """Read a matrix saved with save()."""
+        with open(path, encoding='utf-8') as matrix_file:
+            return cls(json.load(matrix_file))
+
+    def save(self, path: Union[str, Path]):
+        """Write the matrix as JSON."""
+        data = {'version': MATRIX_VERSION, 'built_at': self.built_at, 'sources': self.sources, 'topics': self.topics}
+        with open(path, 'w', encoding='utf-8') as matrix_file:
+            json.dump(data, matrix_file, ensure_ascii=False, sort_keys=True)
+
+    def lookup(self, state_code: str, topic: str) -> Optional[Dict[str, str]]:
+        """
+        Get a state's verdict for a topic.
+
+        Args:
+            state_code: 2-letter state code
+            topic: Topic path as compiled ('Section > Subsection > Item')
+
+        Returns:
+            dict: Verdict, or None if the workbooks do not cover the topic for the state
+        """
+        return self.topics.get(topic, {}).get((state_code or '').upper())
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+
+def taxability_matrix_path() -> Path:
+    """Resolve the configured matrix path (relative paths are relative to the project root)."""
+    path = Path(ConfigManager.get_taxability_matrix_path())
+    return path if path.is_absolute() else Path(__file__).resolve().parent.parent / path
+
+
+_matrix: Optional[TaxabilityMatrix] = None
+_matrix_lock = threading.Lock()
+
+
+def get_taxability_matrix() -> TaxabilityMatrix:
+    """
+    Return the process-wide taxability matrix, loading it on first use.
+
+    The compiled JSON (manage.py build_taxability_matrix) is read when present;
+    otherwise, or when it was compiled by an older version, the matrix is compiled
+    from the workbooks in RAG/.
+    """
+    global _matrix
+    with _matrix_lock:
+        if _matrix is None:
+            path = taxability_matrix_path()
+            if path.exists():
+                try:
+                    _matrix = TaxabilityMatrix.load(path)
+                except ValueError as e:
+                    logger.warning(f"Compiled taxability matrix at {path} is stale ({str(e)}), compiling it from the SUT workbooks")
+            else:
+                logger.info(f"No compiled taxability matrix at {path}, compiling it from the SUT workbooks")
+            if _matrix is None:
+                _matrix = TaxabilityMatrix(compile_taxability_matrix())
+            logger.info(f"Loaded taxability matrix ({len(_matrix)} topics from {len(_matrix.sources)} workbooks)")
+        return _matrix
+
+
+def reset_taxability_matrix():
+    """Drop the process-wide taxability matrix so the next use loads it again (e.g. after a rebuild)."""
+    global _matrix
+    with _matrix_lock:
+        _matrix = None
+
+
+def verify_with_matrix(line_item: InvoiceLineItem, state_code: str, category: Dict[str, str],
+                       verdict: Optional[Dict[str, str]], resolution: Optional[Dict[str, Any]],
+                       tolerance: Decimal) -> Optional[Dict[str, Any]]:
+    """
+    Decide a line item from its category's taxability verdict.
+
+    Exempt verdicts are decided outright: the item is correct when no tax was
+    charged. Taxable verdicts are decided when the item was charged no tax and the
+    rate engine resolved the combined rate it should have carried; a taxable item
+    charged at the resolved rate is already accepted by the rate engine, and any
+    other rate is a rate question for the KB. Conditional, no-guidance and
+    unresolved verdicts always go to the KB.
+
+    Args:
+        line_item: InvoiceLineItem instance
+        state_code: 2-letter state code
+        category: Category from taxright.categories.classify_line_item()
+        verdict: The state's verdict for the category's topic, or None
+        resolution: Result of taxright.rate_engine.resolve_rate(), or None
+        tolerance: Largest applied rate still treated as "no tax charged"
+
+    Returns:
+        dict: Verification result with source 'taxability_matrix', or None if the KB must decide
+    """
+    if not verdict or verdict['status'] not in ('taxable', 'exempt'):
+        return None
+    applied_rate = Decimal(str(line_item.tax_rate or 0))
+    untaxed = applied_rate <= tolerance and Decimal(str(line_item.tax_amount or 0)) == 0
+    if verdict['status'] == 'exempt':
+        expected_rate = Decimal('0.0000')
+        is_correct = untaxed
+    elif untaxed and resolution and resolution['complete'] and resolution['combined_rate'] > 0:
+        expected_rate = resolution['combined_rate']
+        is_correct = False
+    else:
+        return None
+
+    grounds = f"{verdict['summary']} {verdict['citation']}".strip()
+    charged = 'no tax was charged' if untaxed else f"tax was charged at {applied_rate * 100:.2f}%"
+    return {
+        'is_correct': is_correct,
+        'expected_tax_rate': expected_rate,
+        'confidence_score': MATRIX_CONFIDENCE,
+        'reasoning': (
+            f"{category['name']} is {verdict['label'].lower()} in {state_code.upper()} and {charged}"
+            + (f"; the combined rate is {expected_rate * 100:.2f}%" if verdict['status'] == 'taxable' else '')
+            + f". {grounds}"
+        ).strip(),
+        'kb_response': None,
+        'kb_id': None,
+        'kb_name': None,
+        'source': 'taxability_matrix',
+        'taxability': taxability_details(category, verdict),
+    }
+
+
+def taxability_details(category: Dict[str, str], verdict: Dict[str, str]) -> Dict[str, str]:
+    """JSON-safe record of the category and verdict behind a decision, for verification_details."""
+    return {
+        'category': category['slug'],
+        'topic': category['topic'],
+        'status': verdict['status'],
+        'label': verdict['label'],
+        'citation': verdict['citation'],
+        'reference': verdict['reference'],
+        'source': verdict['source'],
+    }
@@ -1,7 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from decimal import Decimal
-from .models import Invoice, InvoiceLineItem, TaxDetermination, TaxRule
+from unittest import mock
+import json
+import re
+from .models import (
+    Invoice, InvoiceLineItem, TaxDetermination, TaxRule, StateKnowledgeBase, LineItemTaxVerification,
+    VerificationCacheEntry,
+)
+from .services import create_invoice_from_ocr_stream, InvoiceDataParser, BedrockKnowledgeBaseService
+from invoice_ocr.config import ConfigManager
 
 
 class InvoiceModelTest(TestCase):
@@ -120,3 +129,1438 @@ class TaxRuleModelTest(TestCase):
         self.assertEqual(self.tax_rule.tax_rate, Decimal('0.0825'))
         self.assertEqual(self.tax_rule.rule_type, 'city')
 
+
+
+class CreateInvoiceFromOCRStreamTest(TestCase):
+    """Test cases for create_invoice_from_ocr_stream"""
+    
+    def setUp(self):
+        """Set up streamed OCR events"""
+        self.ocr_data = {
+            'invoice_number': 'INV-100',
+            'date': '2024-02-01',
+            'vendor_name': 'Stream Vendor',
+            'total_amount': '30.00',
+            'state_code': 'XX',
+            'line_items': [
+                {'description': 'Widget', 'quantity': '1', 'unit_price': '10.00', 'line_total': '10.00'},
+                {'description': 'Gadget', 'quantity': '2', 'unit_price': '10.00', 'line_total': '20.00'},
+            ],
+        }
+        self.usage = {'inputTokens': 500, 'outputTokens': 100, 'totalTokens': 600,
+                      'inputCost': 0.001, 'outputCost': 0.002, 'totalCost': 0.003}
+        self.pdf_file = SimpleUploadedFile('invoice.pdf', b'%PDF-1.4', content_type='application/pdf')
+    
+    def events(self, line_items=None, observed=None):
+        """Yield OCR events, recording the line item count seen in the database before each event"""
+        header = {k: v for k, v in self.ocr_data.items() if k != 'line_items'}
+        for key, value in header.items():
+            yield 'header', {key: value}
+        for item in (self.ocr_data['line_items'] if line_items is None else line_items):
+            if observed is not None:
+                observed.append(InvoiceLineItem.objects.count())
+            yield 'line_item', item
+        yield 'complete', {'result': json.dumps(self.ocr_data), 'usage_info': self.usage, 'job_id': None}
+    
+    def test_line_items_persisted_as_they_arrive(self):
+        """Test each line item is written before the next event is consumed"""
+        observed = []
+        with mock.patch('django.core.files.storage.default_storage.save', return_value='invoice.pdf'):
+            invoice = create_invoice_from_ocr_stream(self.events(observed=observed), self.pdf_file)
+        
+        self.assertEqual(observed, [0, 1])
+        self.assertEqual(invoice.invoice_number, 'INV-100')
+        self.assertEqual(invoice.status, 'completed')
+        self.assertEqual(invoice.line_items.count(), 2)
+        self.assertEqual(invoice.ocr_total_tokens, 600)
+        self.assertEqual(invoice.ocr_total_cost, Decimal('0.003'))
+    
+    def test_final_result_is_authoritative(self):
+        """Test line items are rebuilt when the stream disagrees with the final result"""
+        with mock.patch('django.core.files.storage.default_storage.save', return_value='invoice.pdf'):
+            invoice = create_invoice_from_ocr_stream(
+                self.events(line_items=self.ocr_data['line_items'][:1]), self.pdf_file
+            )
+        
+        self.assertEqual(
+            list(invoice.line_items.order_by('id').values_list('description', flat=True)),
+            ['Widget', 'Gadget']
+        )
+
+
+class InvoiceDataParserReconciliationTest(TestCase):
+    """Test cases for InvoiceDataParser.reconciliation_issues"""
+    
+    def setUp(self):
+        """Set up a consistent invoice"""
+        self.data = {
+            'invoice_number': 'INV-1', 'date': '2024-03-01', 'state_code': 'NC',
+            'total_amount': '107.00', 'total_tax_amount': '7.00', 'invoice_discount_amount': '0',
+            'line_items': [{'description': 'Item', 'quantity': '2', 'unit_price': '50.00', 'line_total': '100.00'}],
+        }
+    
+    def test_consistent_invoice_passes(self):
+        """Test an invoice whose totals reconcile (including tax) has no issues"""
+        self.assertEqual(InvoiceDataParser(json.dumps(self.data)).reconciliation_issues(), [])
+    
+    def test_decimal_placement_error_detected(self):
+        """Test a misplaced decimal in unit_price fails the line item check"""
+        self.data['line_items'][0]['unit_price'] = '5000'
+        issues = InvoiceDataParser(json.dumps(self.data)).reconciliation_issues()
+        self.assertTrue(any(issue.startswith('line_item_math') for issue in issues))
+    
+    def test_state_and_date_sanity(self):
+        """Test invalid state codes and missing dates are reported"""
+        self.data['state_code'] = 'ZZ'
+        del self.data['date']
+        issues = InvoiceDataParser(json.dumps(self.data)).reconciliation_issues()
+        self.assertIn('missing_date', issues)
+        self.assertTrue(any(issue.startswith('invalid_state_code') for issue in issues))
+    
+    def test_invalid_json(self):
+        """Test unparseable output is reported rather than raised"""
+        issues = InvoiceDataParser('{"line_items": [').reconciliation_issues()
+        self.assertTrue(issues[0].startswith('invalid_json'))
+
+
+class StructuredVerificationTest(TestCase):
+    """Test cases for tool-use structured KB verification"""
+    
+    def setUp(self):
+        """Set up an invoice line item, a KB mapping and structured output"""
+        from taxright.retrieval import reset_retrieved_context_cache
+        reset_retrieved_context_cache()
+        self.addCleanup(reset_retrieved_context_cache)
+        ConfigManager.set_config('structured_output_enabled', True)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-S1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('107.00'), total_tax_amount=Decimal('7.00'), state_code='NC'
+        )
+        self.line_item = InvoiceLineItem.objects.create(
+            invoice=self.invoice, description='Software license', quantity=Decimal('1'),
+            unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+            tax_amount=Decimal('7.00'), tax_status='taxable'
+        )
+    
+    def test_tool_input_used_without_text_parsing(self):
+        """Test the verification tool input is normalized directly and text parsing is skipped"""
+        agent_client = mock.Mock()
+        agent_client.retrieve.return_value = {'retrievalResults': [
+            {'content': {'text': 'Prewritten software is taxable at 4.75% plus local rates.'}, 'score': 0.8}
+        ]}
+        runtime_client = mock.Mock()
+        runtime_client.converse.return_value = {
+            'output': {'message': {'role': 'assistant', 'content': [{'toolUse': {
+                'toolUseId': 't1', 'name': 'record_tax_verification',
+                'input': {'is_correct': True, 'expected_tax_rate': 0.07, 'confidence_score': 1.4,
+                          'reasoning': 'Software is taxable in NC.'},
+            }}]}},
+            'usage': {'inputTokens': 900, 'outputTokens': 60, 'totalTokens': 960},
+        }
+        with mock.patch('taxright.services.get_client', side_effect=lambda service, region=None: (
+                agent_client if service == 'bedrock-agent-runtime' else runtime_client)):
+            service = BedrockKnowledgeBaseService()
+            with mock.patch.object(service, '_parse_verification_response') as parse_text:
+                result = service.verify_line_item_tax(self.line_item, 'NC', invoice=self.invoice)
+        
+        parse_text.assert_not_called()
+        self.assertTrue(result['is_correct'])
+        self.assertEqual(result['expected_tax_rate'], Decimal('0.07'))
+        self.assertEqual(result['confidence_score'], Decimal('1.00'))
+        self.assertIn('toolConfig', runtime_client.converse.call_args.kwargs)
+        self.line_item.refresh_from_db()
+        self.assertEqual(self.line_item.kb_total_tokens, 960)
+    
+    def test_parser_accepts_dict(self):
+        """Test InvoiceDataParser uses a structured dict without JSON decoding"""
+        data = {'invoice_number': 'INV-D', 'total_amount': '10.00',
+                'line_items': [{'description': 'Item', 'quantity': '1', 'unit_price': '10.00', 'line_total': '10.00'}]}
+        with mock.patch('taxright.services.json.loads') as loads:
+            extracted = InvoiceDataParser(data).validate_and_extract()
+        loads.assert_not_called()
+        self.assertEqual(extracted['invoice_number'], 'INV-D')
+        self.assertEqual(len(extracted['line_items']), 1)
+
+
+class LoadTestPipelineCommandTest(TransactionTestCase):
+    """Test cases for the load_test_pipeline management command"""
+    
+    def test_pipeline_runs_against_fake_backend(self):
+        """Test uploads run through OCR and verification on the fake backend and config is restored"""
+        from io import StringIO
+        from invoice_ocr.models import BedrockModelConfig, ProcessingConfig
+        
+        BedrockModelConfig.objects.create(name='Nova Lite', model_id='amazon.nova-lite-v1:0', is_default=True)
+        ConfigManager.set_config('fake_llm_latency', {key: {'distribution': 'fixed', 'seconds': 0}
+                                                      for key in ('ocr', 'kb', 'retrieve')})
+        ConfigManager.set_config('fake_llm_line_items', [2, 2])
+        # Random fake descriptions can fall in matrix categories (e.g. janitorial is exempt in CA);
+        # every item should reach the fake KB here
+        ConfigManager.set_config('taxability_matrix_enabled', False)
+        out = StringIO()
+        with mock.patch('django.core.files.storage.default_storage.save', side_effect=lambda name, *args, **kwargs: name):
+            call_command('load_test_pipeline', invoices=3, concurrency=1, create_kb_mappings=True,
+                         target_rate=600, stdout=out)
+        
+        self.assertIn('Succeeded: 3, Failed: 0', out.getvalue())
+        self.assertIn('Lambda concurrency needed', out.getvalue())
+        self.assertEqual(Invoice.objects.filter(status='completed').count(), 3)
+        self.assertEqual(LineItemTaxVerification.objects.filter(is_correct=True).count(), 6)
+        self.assertFalse(ProcessingConfig.objects.filter(key='llm_backend').exists())
+
+
+class ParallelVerificationTest(TestCase):
+    """Test cases for concurrent line item verification in verify_invoice_taxes"""
+    
+    def setUp(self):
+        """Set up an invoice with several line items and a KB mapping"""
+        ConfigManager.set_config('kb_verification_max_workers', 4)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-P1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('428.00'), total_tax_amount=Decimal('28.00'), state_code='NC'
+        )
+        self.line_items = [
+            InvoiceLineItem.objects.create(
+                invoice=self.invoice, description=f'Item {idx}', quantity=Decimal('1'),
+                unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+                tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            for idx in range(4)
+        ]
+    
+    def test_concurrent_calls_ordered_results_and_isolated_errors(self):
+        """Test calls overlap, results keep line item order, writes follow all calls and errors stay per item"""
+        import threading
+        import time
+        
+        events = []
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'peak': 0}
+        
+        def query(kb_id, prompt, region_name=None):
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            time.sleep(0.05)
+            with lock:
+                state['in_flight'] -= 1
+                events.append('call')
+            if 'Item 2' in prompt:
+                raise Exception('KB unavailable')
+            return {
+                'answer': json.dumps({'is_correct': True, 'expected_tax_rate': 0.07,
+                                      'confidence_score': 0.9, 'reasoning': 'Taxable in NC.'}),
+                'metadata': {'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0'},
+                'token_usage': {'inputTokens': 100, 'outputTokens': 20, 'totalTokens': 120},
+            }
+        
+        with mock.patch('taxright.services.get_client'):
+            service = BedrockKnowledgeBaseService()
+        apply_kb_usage = service._apply_kb_usage
+        
+        def record_save(line_item, verification, token_costs=None):
+            events.append('save')
+            return apply_kb_usage(line_item, verification, token_costs)
+        
+        with mock.patch.object(service, 'query_knowledge_base', side_effect=query), \
+                mock.patch.object(service, '_apply_kb_usage', side_effect=record_save):
+            result = service.verify_invoice_taxes(self.invoice)
+        
+        self.assertGreater(state['peak'], 1)
+        self.assertEqual(events, ['call'] * 4 + ['save'] * 4)
+        verifications = result['line_item_verifications']
+        self.assertEqual([v['line_item_id'] for v in verifications], [item.id for item in self.line_items])
+        self.assertEqual([v['is_correct'] for v in verifications], [True, True, False, True])
+        self.assertIn('KB unavailable', verifications[2]['reasoning'])
+
+
+class BatchedVerificationTest(TestCase):
+    """Test cases for batched multi-line-item KB verification"""
+    
+    def setUp(self):
+        """Set up an invoice with duplicate line items, batching enabled and a stubbed KB"""
+        ConfigManager.set_config('kb_verification_max_workers', 1)
+        ConfigManager.set_config('kb_verification_batch_size', 2)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-B1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('535.00'), total_tax_amount=Decimal('35.00'), state_code='NC'
+        )
+        descriptions = ['Paint', 'Lumber', 'paint ', 'Nails', 'Labor']
+        self.line_items = [
+            InvoiceLineItem.objects.create(
+                invoice=self.invoice, description=description, quantity=Decimal('1'),
+                unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+                tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            for description in descriptions
+        ]
+        with mock.patch('taxright.services.get_client'):
+            self.service = BedrockKnowledgeBaseService()
+        self.prompts = []
+    
+    def _answer(self, prompt, skip=()):
+        """Build a batch answer confirming every listed line item except those in skip"""
+        ids = [int(value) for value in re.findall(r'Line item ID (\d+):', prompt)]
+        return json.dumps([
+            {'line_item_id': line_item_id, 'is_correct': True, 'expected_tax_rate': 0.07,
+             'confidence_score': 0.9, 'reasoning': 'Taxable in NC.'}
+            for line_item_id in ids if line_item_id not in skip
+        ])
+    
+    def _query(self, skip=()):
+        def query(kb_id, prompt, region_name=None):
+            self.prompts.append(prompt)
+            if 'Line item ID' in prompt:
+                answer = self._answer(prompt, skip)
+            else:
+                answer = json.dumps({'is_correct': True, 'expected_tax_rate': 0.07,
+                                     'confidence_score': 0.8, 'reasoning': 'Single check.'})
+            return {
+                'answer': answer,
+                'metadata': {'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0'},
+                'token_usage': {'inputTokens': 101, 'outputTokens': 21, 'totalTokens': 122},
+            }
+        return query
+    
+    def test_batches_and_deduplicates_line_items(self):
+        """Test duplicates are verified once and K items share a prompt"""
+        with mock.patch.object(self.service, 'query_knowledge_base', side_effect=self._query()):
+            result = self.service.verify_invoice_taxes(self.invoice)
+        
+        # 4 distinct descriptions in batches of 2
+        self.assertEqual(len(self.prompts), 2)
+        self.assertTrue(all(v['is_correct'] for v in result['line_item_verifications']))
+        duplicate = LineItemTaxVerification.objects.get(line_item=self.line_items[2])
+        self.assertEqual(duplicate.verification_details['batch']['deduplicated_from'], self.line_items[0].id)
+        
+        # Token usage of a batch is split across its items and not counted again for duplicates
+        for item in self.line_items:
+            item.refresh_from_db()
+        self.assertEqual(self.line_items[2].kb_total_tokens, 0)
+        self.assertEqual(sum(item.kb_total_tokens for item in self.line_items), 244)
+    
+    def test_missing_items_retried_individually(self):
+        """Test an item left out of the batch answer is verified on its own"""
+        skipped = self.line_items[1].id
+        with mock.patch.object(self.service, 'query_knowledge_base', side_effect=self._query(skip={skipped})):
+            result = self.service.verify_invoice_taxes(self.invoice)
+        
+        self.assertEqual(len(self.prompts), 3)
+        self.assertNotIn('Line item ID', self.prompts[-1])
+        retried = LineItemTaxVerification.objects.get(line_item_id=skipped)
+        self.assertEqual(retried.reasoning, 'Single check.')
+        self.assertTrue(retried.verification_details['batch']['retried_individually'])
+        self.assertEqual(len(result['line_item_verifications']), 5)
+    
+    def test_parse_salvages_truncated_array(self):
+        """Test complete verdicts are recovered from a truncated batch answer"""
+        text = ('```json\n[{"line_item_id": 1, "is_correct": true, "expected_tax_rate": 0.07, '
+                '"confidence_score": 0.9, "reasoning": "ok"}, {"line_item_id": 2, "is_corr')
+        elements = self.service._parse_batch_verification_response(text)
+        verdicts = self.service._collect_batch_verdicts(elements, [1, 2])
+        self.assertEqual(list(verdicts), [1])
+        self.assertEqual(verdicts[1]['expected_tax_rate'], Decimal('0.07'))
+
+
+class VerificationCacheTest(TestCase):
+    """Test cases for the persistent verification result cache"""
+    
+    def setUp(self):
+        """Set up a KB mapping, two invoices for the same item and a stubbed KB"""
+        ConfigManager.set_config('kb_verification_max_workers', 1)
+        self.kb = StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoices = []
+        for number, description in (('INV-C1', 'PVC Pipe, 1/2"'), ('INV-C2', 'pvc pipe 1/2')):
+            invoice = Invoice.objects.create(
+                invoice_number=number, date='2024-01-15', vendor_name='Vendor',
+                total_amount=Decimal('107.00'), total_tax_amount=Decimal('7.00'), state_code='NC'
+            )
+            InvoiceLineItem.objects.create(
+                invoice=invoice, description=description, quantity=Decimal('1'),
+                unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+                tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            self.invoices.append(invoice)
+        with mock.patch('taxright.services.get_client'):
+            self.service = BedrockKnowledgeBaseService()
+        self.query = mock.Mock(return_value={
+            'answer': json.dumps({'is_correct': True, 'expected_tax_rate': 0.07,
+                                  'confidence_score': 0.9, 'reasoning': 'Taxable in NC.'}),
+            'citations': [{'retrievedReferences': [{'content': {'text': 'NC 7%'}}]}],
+            'metadata': {'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0'},
+            'token_usage': {'inputTokens': 100, 'outputTokens': 20, 'totalTokens': 120},
+        })
+    
+    def _verify(self, invoice):
+        with mock.patch.object(self.service, 'query_knowledge_base', self.query):
+            self.service.verify_invoice_taxes(invoice)
+        return LineItemTaxVerification.objects.get(line_item__invoice=invoice)
+    
+    def test_hit_skips_kb_at_zero_cost(self):
+        """Test a repeat item is verified from cache without a KB call or cost"""
+        first = self._verify(self.invoices[0])
+        second = self._verify(self.invoices[1])
+        
+        self.assertEqual(self.query.call_count, 1)
+        self.assertEqual(first.verification_details['source'], 'knowledge_base')
+        self.assertEqual(second.verification_details['source'], 'cache')
+        self.assertEqual(second.verification_details['citations'], first.verification_details['citations'])
+        self.assertTrue(second.is_correct)
+        self.assertEqual(second.line_item.kb_total_tokens, 0)
+        self.assertEqual(VerificationCacheEntry.objects.get().hit_count, 1)
+    
+    def test_expired_entries_are_requeried(self):
+        """Test entries older than the TTL are discarded"""
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        ConfigManager.set_config('verification_cache_ttl_days', 7)
+        self._verify(self.invoices[0])
+        VerificationCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=8))
+        second = self._verify(self.invoices[1])
+        
+        self.assertEqual(self.query.call_count, 2)
+        self.assertEqual(second.verification_details['source'], 'knowledge_base')
+    
+    def test_kb_mapping_change_invalidates_state(self):
+        """Test saving the state's KB mapping drops its cached verdicts"""
+        self._verify(self.invoices[0])
+        self.assertEqual(VerificationCacheEntry.objects.filter(state_code='NC').count(), 1)
+        
+        self.kb.knowledge_base_name = 'NC KB v2'
+        self.kb.save()
+        
+        self.assertFalse(VerificationCacheEntry.objects.exists())
+    
+    def test_lookups_and_stores_are_batched(self):
+        """Test an invoice's cache lookups, hit counts and new entries each take one query"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        for invoice in self.invoices:
+            for idx in range(4):
+                InvoiceLineItem.objects.create(
+                    invoice=invoice, description=f'Fitting {idx}', quantity=Decimal('1'),
+                    unit_price=Decimal('10.00'), line_total=Decimal('10.00'), tax_rate=Decimal('0.0700'),
+                    tax_amount=Decimal('0.70'), tax_status='taxable'
+                )
+        
+        cache_queries = []
+        for invoice in self.invoices:
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch.object(self.service, 'query_knowledge_base', self.query):
+                self.service.verify_invoice_taxes(invoice)
+            cache_queries.append([query['sql'].split()[0] for query in queries.captured_queries
+                                  if 'taxright_verificationcacheentry' in query['sql']])
+        
+        self.assertEqual(self.query.call_count, 5)
+        self.assertEqual(cache_queries[0], ['SELECT', 'INSERT'])
+        self.assertEqual(cache_queries[1], ['SELECT', 'UPDATE'])
+        self.assertEqual(set(VerificationCacheEntry.objects.values_list('hit_count', flat=True)), {1})
+
+
+class NearDuplicateIndexTest(TestCase):
+    """Test cases for the MinHash/LSH near-duplicate index"""
+    
+    def setUp(self):
+        """Set up an index with one verified paint line item"""
+        from taxright.near_duplicates import NearDuplicateIndex
+        self.index = NearDuplicateIndex()
+        self.index.add('NC', 'Dover White Interior Paint 5 gal', 'taxable', Decimal('0.0700'), verification_id=11, line_item_id=1)
+        self.index.add('NC', 'Copy paper case', 'taxable', Decimal('0.0700'), verification_id=12, line_item_id=2)
+    
+    def test_lookup_requires_same_state_status_and_rate(self):
+        """Test variants match only within the state, tax status and applied rate"""
+        match = self.index.lookup('nc', 'DOVER WHITE INTERIOR PAINT 5GAL', 'taxable', '0.07', threshold=0.6)
+        self.assertEqual(match['verification_id'], 11)
+        self.assertGreaterEqual(match['similarity'], 0.6)
+        self.assertIsNone(self.index.lookup('NC', 'Dover White Interior Paint 5 gal', 'exempt', '0.07', threshold=0.6))
+        self.assertIsNone(self.index.lookup('NC', 'Dover White Interior Paint 5 gal', 'taxable', '0.0725', threshold=0.6))
+        self.assertIsNone(self.index.lookup('GA', 'Dover White Interior Paint 5 gal', 'taxable', '0.07', threshold=0.6))
+        self.assertIsNone(self.index.lookup('NC', 'Installation labor', 'taxable', '0.07', threshold=0.6))
+    
+    def test_incremental_update_and_serialization(self):
+        """Test re-adding a line item replaces its verdict and the index survives a write/read round trip"""
+        import io
+        from taxright.near_duplicates import NearDuplicateIndex
+        
+        self.index.add('NC', 'Dover White Interior Paint 5 gal', 'taxable', Decimal('0.0700'), verification_id=21, line_item_id=1)
+        buffer = io.BytesIO()
+        self.index.write(buffer)
+        buffer.seek(0)
+        loaded = NearDuplicateIndex.read(buffer)
+        
+        self.assertEqual(len(loaded), 3)
+        match = loaded.lookup('NC', 'dover white interior paint 5 gal', 'taxable', '0.07', threshold=0.6)
+        self.assertEqual(match['verification_id'], 21)
+        self.assertEqual(loaded.max_verification_id, 21)
+
+
+class NearDuplicateVerificationTest(TestCase):
+    """Test cases for reusing near-duplicate verdicts in verify_invoice_taxes"""
+    
+    def setUp(self):
+        """Set up two invoices with variant descriptions of the same item"""
+        from taxright.near_duplicates import reset_near_duplicate_index
+        reset_near_duplicate_index()
+        self.addCleanup(reset_near_duplicate_index)
+        ConfigManager.set_config('kb_verification_max_workers', 1)
+        ConfigManager.set_config('near_duplicate_enabled', True)
+        ConfigManager.set_config('near_duplicate_index_storage', 'local')
+        ConfigManager.set_config('near_duplicate_index_path', '/nonexistent/near_duplicate_index.bin')
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoices = []
+        for number, description in (('INV-N1', 'Sherwin Williams Dover White Interior Paint 5 gal'),
+                                     ('INV-N2', 'SHERWIN-WILLIAMS DOVER WHITE INT PAINT 5GAL')):
+            invoice = Invoice.objects.create(
+                invoice_number=number, date='2024-01-15', vendor_name='Vendor',
+                total_amount=Decimal('107.00'), total_tax_amount=Decimal('7.00'), state_code='NC'
+            )
+            InvoiceLineItem.objects.create(
+                invoice=invoice, description=description, quantity=Decimal('1'),
+                unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+                tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            self.invoices.append(invoice)
+        with mock.patch('taxright.services.get_client'):
+            self.service = BedrockKnowledgeBaseService()
+    
+    def test_variant_reuses_verdict_with_source_and_similarity(self):
+        """Test a variant description reuses the prior verdict without a KB call"""
+        query = mock.Mock(return_value={
+            'answer': json.dumps({'is_correct': True, 'expected_tax_rate': 0.07,
+                                  'confidence_score': 0.9, 'reasoning': 'Paint is taxable in NC.'}),
+            'metadata': {'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0'},
+            'token_usage': {'inputTokens': 100, 'outputTokens': 20, 'totalTokens': 120},
+        })
+        with mock.patch.object(self.service, 'query_knowledge_base', query):
+            self.service.verify_invoice_taxes(self.invoices[0])
+            self.service.verify_invoice_taxes(self.invoices[1])
+        
+        self.assertEqual(query.call_count, 1)
+        first = LineItemTaxVerification.objects.get(line_item__invoice=self.invoices[0])
+        second = LineItemTaxVerification.objects.get(line_item__invoice=self.invoices[1])
+        details = second.verification_details
+        self.assertEqual(details['source'], 'near_duplicate')
+        self.assertEqual(details['near_duplicate']['verification_id'], first.id)
+        self.assertGreaterEqual(details['near_duplicate']['similarity'], 0.6)
+        self.assertEqual(second.reasoning, 'Paint is taxable in NC.')
+
+
+class SplitRetrievalTest(TestCase):
+    """Test cases for retrieval split from generation with the retrieved context cache"""
+    
+    def setUp(self):
+        """Set up an invoice with three line items and Converse generation"""
+        from taxright.retrieval import reset_retrieved_context_cache
+        reset_retrieved_context_cache()
+        self.addCleanup(reset_retrieved_context_cache)
+        ConfigManager.set_config('kb_generation_mode', 'converse')
+        ConfigManager.set_config('kb_verification_max_workers', 1)
+        ConfigManager.set_config('verification_cache_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-R1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('321.00'), total_tax_amount=Decimal('21.00'), state_code='NC'
+        )
+        for description in ('PVC pipe, 1/2 in', 'pvc pipe 1/2 in', 'Copy paper case'):
+            InvoiceLineItem.objects.create(
+                invoice=self.invoice, description=description, quantity=Decimal('1'),
+                unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+                tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+        self.agent_client = mock.Mock()
+        self.agent_client.retrieve.return_value = {'retrievalResults': [
+            {'content': {'text': 'NC general rate of sales tax is 4.75%.'}, 'score': 0.82,
+             'location': {'type': 'S3', 's3Location': {'uri': 's3://kb/nc/sut1.txt'}}},
+        ]}
+        self.runtime_client = mock.Mock()
+        self.runtime_client.converse.return_value = {
+            'output': {'message': {'role': 'assistant', 'content': [{'text': json.dumps({
+                'is_correct': True, 'expected_tax_rate': 0.07, 'confidence_score': 0.9,
+                'reasoning': 'Taxable at the combined NC rate.'})}]}},
+            'usage': {'inputTokens': 500, 'outputTokens': 40, 'totalTokens': 540},
+        }
+        patcher = mock.patch('taxright.services.get_client', side_effect=lambda service, region=None: (
+            self.agent_client if service == 'bedrock-agent-runtime' else self.runtime_client))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = BedrockKnowledgeBaseService()
+    
+    def test_invoice_scope_retrieves_once_and_records_chunks(self):
+        """Test one Retrieve call serves every item across runs and chunks are stored in verification_details"""
+        self.service.verify_invoice_taxes(self.invoice)
+        self.service.verify_invoice_taxes(self.invoice)
+        
+        self.assertEqual(self.agent_client.retrieve.call_count, 1)
+        self.agent_client.retrieve_and_generate.assert_not_called()
+        self.assertEqual(self.runtime_client.converse.call_count, 6)
+        self.assertNotIn('toolConfig', self.runtime_client.converse.call_args.kwargs)
+        details = [verification.verification_details for verification in
+                   LineItemTaxVerification.objects.filter(line_item__invoice=self.invoice).order_by('line_item_id')]
+        self.assertTrue(all(detail['retrieval']['cache_hit'] for detail in details))
+        self.assertEqual(details[0]['retrieval']['chunks'], [{
+            'rank': 1, 'score': 0.82, 'location': 's3://kb/nc/sut1.txt',
+            'text': 'NC general rate of sales tax is 4.75%.',
+        }])
+        self.assertIn('PVC pipe, 1/2 in; Copy paper case', details[0]['retrieval']['query'])
+    
+    def test_line_item_scope_shares_equivalent_queries(self):
+        """Test per-item retrieval reuses passages for queries that differ only in formatting"""
+        ConfigManager.set_config('kb_retrieval_scope', 'line_item')
+        self.service.verify_invoice_taxes(self.invoice)
+        
+        self.assertEqual(self.agent_client.retrieve.call_count, 2)
+        cache_hits = [verification.verification_details['retrieval']['cache_hit'] for verification in
+                      LineItemTaxVerification.objects.filter(line_item__invoice=self.invoice).order_by('line_item_id')]
+        self.assertEqual(cache_hits, [False, True, False])
+    
+    def test_cache_expires_and_evicts_least_recently_used(self):
+        """Test cached passages expire after the TTL and the least recently used query is evicted"""
+        from taxright.retrieval import RetrievedContextCache
+        now = [0.0]
+        cache = RetrievedContextCache(max_entries=2, ttl_seconds=60, clock=lambda: now[0])
+        retrieve = mock.Mock(return_value=[{'content': {'text': 'passage'}}])
+        
+        cache.get_or_retrieve('KB1', 'a', retrieve)
+        cache.get_or_retrieve('KB1', 'b', retrieve)
+        self.assertTrue(cache.get_or_retrieve('KB1', 'a', retrieve)[1])
+        cache.get_or_retrieve('KB1', 'c', retrieve)
+        self.assertFalse(cache.get_or_retrieve('KB1', 'b', retrieve)[1])
+        now[0] = 61.0
+        self.assertFalse(cache.get_or_retrieve('KB1', 'b', retrieve)[1])
+        self.assertEqual(retrieve.call_count, 5)
+
+
+class BM25RetrievalTest(TestCase):
+    """Test cases for the offline BM25 index as the KB retrieval source"""
+    
+    STATE_FILES = {
+        'North_Carolina1.txt': (
+            'Topic: Tangible Personal Property Building Materials',
+            'Sales of PVC pipe, lumber and other building materials are taxable at the general rate.',
+            'Topic: Services Janitorial',
+            'Janitorial services are not subject to sales tax.',
+        ),
+        'California1.txt': (
+            'Topic: Tangible Personal Property Building Materials',
+            'Building materials such as PVC pipe sold to contractors are taxable.',
+        ),
+    }
+    
+    def setUp(self):
+        """Write a small state_data directory, build its index and configure BM25 retrieval"""
+        import tempfile
+        from pathlib import Path
+        from taxright.bm25 import reset_bm25_index, write_bm25_index
+        from taxright.retrieval import reset_retrieved_context_cache
+        
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for file_name, sections in self.STATE_FILES.items():
+            body = '\n'.join(f"{sections[i]}\n\n{sections[i + 1]}\n\n{'=' * 50}\n" for i in range(0, len(sections), 2))
+            (Path(directory.name) / 'state_data').mkdir(exist_ok=True)
+            (Path(directory.name) / 'state_data' / file_name).write_text(f"State: X\n\n{body}", encoding='utf-8')
+        self.index_path = str(Path(directory.name) / 'state_data_bm25.idx')
+        write_bm25_index(self.index_path, directory=Path(directory.name) / 'state_data')
+        
+        for reset in (reset_bm25_index, reset_retrieved_context_cache):
+            reset()
+            self.addCleanup(reset)
+        ConfigManager.set_config('kb_retrieval_source', 'bm25')
+        ConfigManager.set_config('kb_bm25_index_path', self.index_path)
+        ConfigManager.set_config('verification_cache_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-B1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('107.00'), total_tax_amount=Decimal('7.00'), state_code='NC'
+        )
+        InvoiceLineItem.objects.create(
+            invoice=self.invoice, description='PVC pipes 1/2 in', quantity=Decimal('1'),
+            unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+            tax_amount=Decimal('7.00'), tax_status='taxable'
+        )
+        self.agent_client = mock.Mock()
+        self.runtime_client = mock.Mock()
+        self.runtime_client.converse.return_value = {
+            'output': {'message': {'role': 'assistant', 'content': [{'text': json.dumps({
+                'is_correct': True, 'expected_tax_rate': 0.07, 'confidence_score': 0.9,
+                'reasoning': 'Building materials are taxable.'})}]}},
+            'usage': {'inputTokens': 500, 'outputTokens': 40, 'totalTokens': 540},
+        }
+        patcher = mock.patch('taxright.services.get_client', side_effect=lambda service, region=None: (
+            self.agent_client if service == 'bedrock-agent-runtime' else self.runtime_client))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_search_is_scoped_to_state(self):
+        """Test BM25 ranks the matching chunk first and only searches the requested state"""
+        from taxright.bm25 import BM25Index
+        index = BM25Index(self.index_path)
+        self.addCleanup(index.close)
+        
+        results = index.retrieve('nc', 'tax on pvc pipe', 5)
+        self.assertEqual(results[0]['metadata']['topic'], 'Tangible Personal Property Building Materials')
+        self.assertIn('PVC pipe, lumber', results[0]['content']['text'])
+        self.assertEqual(results[0]['location']['localLocation']['uri'], 'state_data/North_Carolina1.txt')
+        self.assertTrue(all(result['metadata']['state_code'] == 'NC' for result in results))
+        self.assertEqual(index.retrieve('TX', 'pvc pipe', 5), [])
+    
+    def test_verification_retrieves_locally_and_generates_with_converse(self):
+        """Test verification uses local passages with Converse and makes no KB calls"""
+        BedrockKnowledgeBaseService().verify_invoice_taxes(self.invoice)
+        
+        self.agent_client.retrieve.assert_not_called()
+        self.agent_client.retrieve_and_generate.assert_not_called()
+        prompt = self.runtime_client.converse.call_args.kwargs['messages'][0]['content'][0]['text']
+        self.assertIn('PVC pipe, lumber and other building materials', prompt)
+        details = LineItemTaxVerification.objects.get(line_item__invoice=self.invoice).verification_details
+        self.assertEqual(details['retrieval']['source'], 'bm25')
+        self.assertEqual(details['retrieval']['chunks'][0]['location'], 'state_data/North_Carolina1.txt')
+    
+    def test_missing_index_falls_back_to_knowledge_base(self):
+        """Test a missing index falls back to the KB Retrieve API"""
+        ConfigManager.set_config('kb_bm25_index_path', self.index_path + '.missing')
+        self.agent_client.retrieve.return_value = {'retrievalResults': [
+            {'content': {'text': 'NC taxes building materials.'}, 'score': 0.7},
+        ]}
+        BedrockKnowledgeBaseService().verify_invoice_taxes(self.invoice)
+        
+        self.agent_client.retrieve.assert_called_once()
+        details = LineItemTaxVerification.objects.get(line_item__invoice=self.invoice).verification_details
+        self.assertEqual(details['retrieval']['source'], 'bedrock')
+
+
+class VectorIndexTest(TestCase):
+    """Test cases for the local vector index as the KB retrieval source"""
+    
+    def setUp(self):
+        """Write a small state_data directory, build its vector index and configure vector retrieval"""
+        import tempfile
+        from pathlib import Path
+        from taxright.retrieval import reset_retrieved_context_cache
+        from taxright.vector_index import build_vector_index, reset_vector_index
+        
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_data = Path(directory.name) / 'state_data'
+        self.state_data.mkdir()
+        for file_name, sections in BM25RetrievalTest.STATE_FILES.items():
+            self._write_state_file(file_name, sections)
+        self.index_dir = str(Path(directory.name) / 'state_data_vectors')
+        self.build_stats = build_vector_index(self.index_dir, directory=self.state_data)
+        
+        for reset in (reset_vector_index, reset_retrieved_context_cache):
+            reset()
+            self.addCleanup(reset)
+        ConfigManager.set_config('kb_retrieval_source', 'vector')
+        ConfigManager.set_config('kb_vector_index_dir', self.index_dir)
+        ConfigManager.set_config('verification_cache_enabled', False)
+    
+    def _write_state_file(self, file_name, sections):
+        body = '\n'.join(f"{sections[i]}\n\n{sections[i + 1]}\n\n{'=' * 50}\n" for i in range(0, len(sections), 2))
+        (self.state_data / file_name).write_text(f"State: X\n\n{body}", encoding='utf-8')
+    
+    def test_search_is_scoped_to_state(self):
+        """Test the vector index ranks the matching chunk first and only searches the requested state"""
+        from taxright.vector_index import LocalVectorIndex
+        index = LocalVectorIndex(self.index_dir)
+        self.addCleanup(index.close)
+        
+        results = index.retrieve('nc', 'tax on pvc pipe and lumber', 5)
+        self.assertEqual(len(results), 2)
+        self.assertIn('PVC pipe, lumber', results[0]['content']['text'])
+        self.assertEqual(results[0]['location']['localLocation']['uri'], 'state_data/North_Carolina1.txt')
+        self.assertGreater(results[0]['score'], results[1]['score'])
+        self.assertEqual(index.retrieve('TX', 'pvc pipe', 5), [])
+    
+    def test_rebuild_embeds_only_changed_files(self):
+        """Test an incremental rebuild reuses embeddings of unchanged files"""
+        from taxright.vector_index import LocalVectorIndex, build_vector_index
+        self.assertEqual((self.build_stats['embedded_files'], self.build_stats['reused_files']), (2, 0))
+        self._write_state_file('California1.txt', (
+            'Topic: Services Repair', 'Repair labor is exempt when separately stated.',
+        ))
+        
+        stats = build_vector_index(self.index_dir, directory=self.state_data)
+        
+        self.assertEqual((stats['embedded_files'], stats['reused_files'], stats['embedded_chunks']), (1, 1, 1))
+        index = LocalVectorIndex(self.index_dir)
+        self.addCleanup(index.close)
+        self.assertIn('Repair labor is exempt', index.retrieve('CA', 'repair labor', 1)[0]['content']['text'])
+        self.assertIn('PVC pipe, lumber', index.retrieve('NC', 'pvc pipe lumber', 1)[0]['content']['text'])
+    
+    def test_verification_retrieves_from_vector_index(self):
+        """Test verification uses vector index passages and makes no KB calls"""
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        invoice = Invoice.objects.create(
+            invoice_number='INV-V1', date='2024-01-15', vendor_name='Vendor',
+            total_amount=Decimal('107.00'), total_tax_amount=Decimal('7.00'), state_code='NC'
+        )
+        InvoiceLineItem.objects.create(
+            invoice=invoice, description='PVC pipe and lumber', quantity=Decimal('1'),
+            unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'),
+            tax_amount=Decimal('7.00'), tax_status='taxable'
+        )
+        agent_client, runtime_client = mock.Mock(), mock.Mock()
+        runtime_client.converse.return_value = {
+            'output': {'message': {'role': 'assistant', 'content': [{'text': json.dumps({
+                'is_correct': True, 'expected_tax_rate': 0.07, 'confidence_score': 0.9,
+                'reasoning': 'Building materials are taxable.'})}]}},
+            'usage': {'inputTokens': 500, 'outputTokens': 40, 'totalTokens': 540},
+        }
+        with mock.patch('taxright.services.get_client', side_effect=lambda service, region=None: (
+                agent_client if service == 'bedrock-agent-runtime' else runtime_client)):
+            BedrockKnowledgeBaseService().verify_invoice_taxes(invoice)
+        
+        agent_client.retrieve.assert_not_called()
+        details = LineItemTaxVerification.objects.get(line_item__invoice=invoice).verification_details
+        self.assertEqual(details['retrieval']['source'], 'vector')
+        self.assertIn('PVC pipe, lumber', details['retrieval']['chunks'][0]['text'])
+
+
+class RateEngineTest(TestCase):
+    """Test cases for the TaxRule rate engine fast path"""
+    
+    def setUp(self):
+        """Set up NC rules, an invoice in Wake County and a KB mapping"""
+        from taxright.rule_index import reset_tax_rule_index
+        self.addCleanup(reset_tax_rule_index)
+        for jurisdiction, rate, effective_date, rule_type in (
+            ('', '0.0450', '2020-01-01', 'state'),
+            ('', '0.0475', '2023-07-01', 'state'),
+            ('', '0.0500', '2025-01-01', 'state'),
+            ('Wake County', '0.0200', '2020-01-01', 'county'),
+            ('Durham County', '0.0225', '2020-01-01', 'county'),
+        ):
+            TaxRule.objects.create(
+                state_code='NC', jurisdiction=jurisdiction, tax_rate=Decimal(rate),
+                effective_date=effective_date, rule_type=rule_type
+            )
+        ConfigManager.set_config('verification_cache_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-R1', date='2024-01-15', vendor_name='Vendor', jurisdiction='Wake County, Raleigh',
+            total_amount=Decimal('213.50'), total_tax_amount=Decimal('13.50'), state_code='NC'
+        )
+        self.matching = self._create_line_item('Copy paper', '0.0675')
+        self.mismatched = self._create_line_item('Printer toner', '0.0700')
+    
+    def _create_line_item(self, description, rate):
+        return InvoiceLineItem.objects.create(
+            invoice=self.invoice, description=description, quantity=Decimal('1'),
+            unit_price=Decimal('100.00'), line_total=Decimal('100.00'), tax_rate=Decimal(rate),
+            tax_amount=Decimal(rate) * 100, tax_status='taxable'
+        )
+    
+    def test_resolves_rules_effective_on_date_for_jurisdiction(self):
+        """Test the latest state rule on the date is combined with matching local rules only"""
+        from taxright.rate_engine import resolve_rate
+        
+        resolution = resolve_rate('nc', 'Wake County, Raleigh', '2024-01-15')
+        self.assertEqual(resolution['combined_rate'], Decimal('0.0675'))
+        self.assertTrue(resolution['complete'])
+        self.assertEqual([c['jurisdiction'] for c in resolution['components']], ['', 'Wake County'])
+        self.assertEqual(resolve_rate('NC', 'wake', '2025-02-01')['combined_rate'], Decimal('0.0700'))
+        self.assertFalse(resolve_rate('NC', 'Orange County', '2024-01-15')['complete'])
+        self.assertIsNone(resolve_rate('NC', '', '2019-12-31'))
+        self.assertIsNone(resolve_rate('TX', '', '2024-01-15'))
+    
+    def test_matching_rate_skips_knowledge_base(self):
+        """Test a matching taxable item is verified by the rate engine and only the mismatch reaches the KB"""
+        with mock.patch('taxright.services.get_client'):
+            service = BedrockKnowledgeBaseService()
+        kb_verdict = {
+            'is_correct': False, 'expected_tax_rate': Decimal('0.0675'), 'confidence_score': Decimal('0.90'),
+            'reasoning': 'Wake County combined rate is 6.75%.', 'kb_response': None,
+        }
+        with mock.patch.object(service, '_verify_line_item', return_value=kb_verdict) as verify:
+            service.verify_invoice_taxes(self.invoice)
+        
+        self.assertEqual([call.args[0].id for call in verify.call_args_list], [self.mismatched.id])
+        verification = LineItemTaxVerification.objects.get(line_item=self.matching)
+        self.assertTrue(verification.is_correct)
+        self.assertEqual(verification.expected_tax_rate, Decimal('0.0675'))
+        self.assertEqual(verification.verification_details['source'], 'rule_engine')
+        self.assertEqual(verification.verification_details['rule_engine']['combined_rate'], '0.0675')
+        self.assertEqual(self.matching.kb_total_tokens, 0)
+    
+    def test_disabled_and_non_taxable_items_use_knowledge_base(self):
+        """Test exempt items and a disabled engine leave verification to the KB"""
+        with mock.patch('taxright.services.get_client'):
+            service = BedrockKnowledgeBaseService()
+        self.matching.tax_status = 'exempt'
+        with mock.patch.object(service, '_verify_line_item', return_value={'is_correct': True}) as verify:
+            service.verify_line_item_tax(self.matching, 'NC', self.invoice.jurisdiction, invoice=self.invoice)
+            ConfigManager.set_config('rule_engine_enabled', False)
+            self.matching.tax_status = 'taxable'
+            service.verify_line_item_tax(self.matching, 'NC', self.invoice.jurisdiction, invoice=self.invoice)
+        self.assertEqual(verify.call_count, 2)
+
+
+class TaxRuleIndexTest(TestCase):
+    """Test cases for the in-memory effective-dated TaxRule index"""
+    
+    def setUp(self):
+        """Set up statewide and county rules and a fresh process-wide index"""
+        from taxright.rule_index import reset_tax_rule_index
+        reset_tax_rule_index()
+        self.addCleanup(reset_tax_rule_index)
+        self.state_rule = TaxRule.objects.create(
+            state_code='NC', tax_rate=Decimal('0.0475'), effective_date='2020-01-01', rule_type='state'
+        )
+        TaxRule.objects.create(
+            state_code='NC', jurisdiction='Wake County', tax_rate=Decimal('0.0200'),
+            effective_date='2020-01-01', rule_type='county'
+        )
+    
+    def test_bisect_lookup_and_snapshot_round_trip(self):
+        """Test the rule in effect is found by date and survives a snapshot round trip"""
+        import datetime
+        import io
+        from taxright.rule_index import TaxRuleIndex, jurisdiction_keys
+        rows = [
+            (1, 'nc', '', 'state', Decimal('0.0450'), datetime.date(2019, 1, 1)),
+            (2, 'NC', '', 'state', Decimal('0.0475'), datetime.date(2023, 7, 1)),
+            (3, 'NC', 'City of Raleigh', 'city', Decimal('0.0050'), datetime.date(2021, 1, 1)),
+            (4, 'NC', 'Raleigh', 'city', Decimal('0.0075'), datetime.date(2024, 1, 1)),
+        ]
+        index = TaxRuleIndex.build(reversed(rows))
+        buffer = io.BytesIO()
+        index.write(buffer)
+        buffer.seek(0)
+        
+        for candidate in (index, TaxRuleIndex.read(buffer)):
+            rates = lambda on_date: [
+                (rule['rule_id'], rule['tax_rate'])
+                for rule in candidate.rules_on('NC', jurisdiction_keys('Raleigh'), on_date)
+            ]
+            self.assertEqual(rates(datetime.date(2018, 12, 31)), [])
+            self.assertEqual(rates(datetime.date(2020, 6, 1)), [(1, Decimal('0.0450'))])
+            self.assertEqual(rates(datetime.date(2023, 7, 1)), [(2, Decimal('0.0475')), (3, Decimal('0.0050'))])
+            self.assertEqual(rates(datetime.date(2025, 1, 1)), [(2, Decimal('0.0475')), (4, Decimal('0.0075'))])
+            self.assertEqual(len(candidate), 4)
+    
+    def test_rule_changes_refresh_index(self):
+        """Test saving and deleting a TaxRule is reflected by the next lookup"""
+        from taxright.rate_engine import resolve_rate
+        self.assertEqual(resolve_rate('NC', 'Wake County', '2024-01-15')['combined_rate'], Decimal('0.0675'))
+        
+        self.state_rule.tax_rate = Decimal('0.0500')
+        self.state_rule.save()
+        self.assertEqual(resolve_rate('NC', 'Wake County', '2024-01-15')['combined_rate'], Decimal('0.0700'))
+        self.state_rule.delete()
+        self.assertIsNone(resolve_rate('NC', 'Wake County', '2024-01-15'))
+    
+    def test_cold_start_uses_current_snapshot_only(self):
+        """Test a snapshot matching the database is loaded instead of the rules, and a stale one is ignored"""
+        import tempfile
+        from pathlib import Path
+        from taxright.rule_index import TaxRuleIndex, get_tax_rule_index, reset_tax_rule_index
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = str(Path(directory.name) / 'tax_rules.snapshot')
+        ConfigManager.set_config('tax_rule_snapshot_path', path)
+        call_command('snapshot_tax_rules', stdout=mock.Mock())
+        
+        reset_tax_rule_index()
+        with mock.patch.object(TaxRuleIndex, 'build', wraps=TaxRuleIndex.build) as build:
+            self.assertEqual(len(get_tax_rule_index()), 2)
+            build.assert_not_called()
+            
+            TaxRule.objects.create(state_code='CA', tax_rate=Decimal('0.0725'), effective_date='2020-01-01')
+            reset_tax_rule_index()
+            self.assertTrue(get_tax_rule_index().has_state('CA'))
+            build.assert_called_once()
+
+
+class TaxabilityMatrixTest(TestCase):
+    """Test cases for the SUT taxability matrix and line item categories"""
+    
+    def _write_workbook(self, path, rows):
+        """Write a minimal single-sheet .xlsx with inline string cells"""
+        import zipfile
+        from xml.sax.saxutils import escape
+        sheet_rows = ''.join(
+            f'<row r="{number}">' + ''.join(
+                f'<c r="{chr(65 + column)}{number}" t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+                for column, text in enumerate(row) if text
+            ) + '</row>'
+            for number, row in enumerate(rows, start=1)
+        )
+        with zipfile.ZipFile(path, 'w') as workbook:
+            workbook.writestr(
+                'xl/worksheets/sheet1.xml',
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<sheetData>{sheet_rows}</sheetData></worksheet>'
+            )
+    
+    def test_compiles_taxability_rows_from_workbooks(self):
+        """Test labels map to statuses, non-taxability rows are skipped and disagreeing duplicates become conditional"""
+        import tempfile
+        from pathlib import Path
+        from taxright.taxability import TaxabilityMatrix, compile_taxability_matrix
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        header = ['Topic', 'Alabama\n', 'Alaska\n', 'New York', 'New York City', 'North Carolina\n']
+        window_cleaning = 'Real Property\nServices to Real Property\nWindow Cleaning\n'
+        self._write_workbook(Path(directory.name) / 'SUT1.xlsx', [
+            header,
+            [window_cleaning, ' Nontaxable\n Window cleaning is a nontaxable service.\n Ala. Code §40-23-2.\n BNA-SUTN AL 28.4.13. ',
+             ' No Tax\n Alaska does not impose a sales and use tax.\n BNA-SUTN AK 28.4.13.', ' Taxable\n Taxable.',
+             ' Exempt\n Exempt in NYC.', ' Depends\n Depends on the contract.'],
+            ['Registration\nThreshold', ' Yes\n Register.', ' No Tax', ' Yes', ' Yes', ' No'],
+        ])
+        self._write_workbook(Path(directory.name) / 'SUT2.xlsx', [
+            header,
+            [window_cleaning, ' Taxable\n Taxable per a later ruling.', '', ' Taxable\n Taxable.', '', ' Depends\n Depends.'],
+        ])
+        
+        matrix = TaxabilityMatrix(compile_taxability_matrix(directory.name))
+        self.assertEqual(matrix.sources, ['SUT1.xlsx', 'SUT2.xlsx'])
+        self.assertEqual(list(matrix.topics), ['Real Property > Services to Real Property > Window Cleaning'])
+        topic = 'Real Property > Services to Real Property > Window Cleaning'
+        self.assertEqual(matrix.lookup('ak', topic)['status'], 'exempt')
+        self.assertEqual(matrix.lookup('NY', topic)['status'], 'taxable')
+        self.assertEqual(matrix.lookup('NC', topic)['status'], 'conditional')
+        alabama = matrix.lookup('AL', topic)
+        self.assertEqual((alabama['status'], alabama['source']), ('conditional', 'SUT1.xlsx, SUT2.xlsx'))
+        self.assertEqual(alabama['label'], 'Taxable')
+        self.assertIsNone(matrix.lookup('CA', topic))
+    
+    def test_label_contradicted_by_summary_goes_to_knowledge_base(self):
+        """Test a cell whose summary contradicts its label (NC Tires) is unresolved and left to the KB"""
+        import tempfile
+        from pathlib import Path
+        from taxright.rule_index import reset_tax_rule_index
+        from taxright.taxability import TaxabilityMatrix, compile_taxability_matrix, status_for_summary
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self._write_workbook(Path(directory.name) / 'SUT4.xlsx', [
+            ['Topic', 'North Carolina\n', 'Texas\n'],
+            ['Transportation Property, Fuel, Services\nMotor Vehicles, Intrastate or Non-Commercial Use\nTires\n\n',
+             ' Nontaxable\n Sales of tires are taxable as sales of tangible personal property. \n'
+             ' N.C. Gen. Stat. §105-164.4(a).\n \n BNA-SUTN NC 29.3.9. \n\n',
+             ' Taxable\n Tires are taxable.\n Tex. Tax Code §151.010.\n BNA-SUTN TX 29.3.9.'],
+        ])
+        matrix = TaxabilityMatrix(compile_taxability_matrix(directory.name))
+        topic = 'Transportation Property, Fuel, Services > Motor Vehicles, Intrastate or Non-Commercial Use > Tires'
+        self.assertEqual(matrix.lookup('NC', topic)['status'], 'unresolved')
+        self.assertEqual(matrix.lookup('TX', topic)['status'], 'taxable')
+        self.assertEqual(status_for_summary("Equipment used to store finished products is not exempt from Georgia's sales and use tax."), 'taxable')
+        self.assertEqual(status_for_summary('Gasoline is subject to the petroleum tax and is therefore exempt from sales and use tax.'), 'exempt')
+        self.assertIsNone(status_for_summary('Oil and filters are subject to sales tax. Sales to interstate carriers are exempt from sales tax.'))
+        
+        reset_tax_rule_index()
+        self.addCleanup(reset_tax_rule_index)
+        ConfigManager.set_config('verification_cache_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        invoice = Invoice.objects.create(
+            invoice_number='INV-T2', date='2024-01-15', vendor_name='Tire Shop', total_amount=Decimal('100.00'), state_code='NC'
+        )
+        tires = InvoiceLineItem.objects.create(
+            invoice=invoice, description='Tires (set of 4)', quantity=Decimal('1'), unit_price=Decimal('100.00'),
+            line_total=Decimal('100.00'), tax_rate=Decimal('0'), tax_amount=Decimal('0'), tax_status='exempt'
+        )
+        with mock.patch('taxright.services.get_client'):
+            service = BedrockKnowledgeBaseService()
+        kb_verdict = {
+            'is_correct': False, 'expected_tax_rate': Decimal('0.0475'), 'confidence_score': Decimal('0.80'),
+            'reasoning': 'Tires are taxable in NC.', 'kb_response': None,
+        }
+        with mock.patch('taxright.services.get_taxability_matrix', return_value=matrix), \
+                mock.patch.object(service, '_verify_line_item', return_value=kb_verdict) as verify:
+            service.verify_invoice_taxes(invoice)
+        
+        self.assertEqual([call.args[0].id for call in verify.call_args_list], [tires.id])
+        self.assertFalse(LineItemTaxVerification.objects.get(line_item=tires).is_correct)
+    
+    def test_classifies_descriptions_and_generic_service_vendors(self):
+        """Test descriptions map to workbook categories and vendors only classify generic service lines"""
+        from taxright.categories import classify_line_item
+        slug = lambda description, vendor='': (classify_line_item(description, vendor) or {}).get('slug')
+        self.assertEqual(slug('Janitorial services - March'), 'janitorial')
+        self.assertEqual(slug('Window cleaning, exterior'), 'window_cleaning')
+        self.assertEqual(slug('Diesel fuel 120 gal'), 'undyed_diesel')
+        self.assertEqual(slug('Bottled water 24 pk'), 'bottled_water')
+        self.assertEqual(slug('Service call', 'Ace Plumbing LLC'), 'plumbing')
+        self.assertIsNone(slug('PVC pipe 1/2 in', 'Ace Plumbing LLC'))
+        self.assertIsNone(slug('Coffee maker'))
+        self.assertIsNone(slug('Diesel generator rental'))
+        self.assertIsNone(slug('Equipment rental (weekly)'))
+    
+    def test_unconditional_categories_skip_knowledge_base(self):
+        """Test exempt and untaxed taxable categories are decided locally and only conditional ones reach the KB"""
+        from taxright.categories import classify_line_item
+        from taxright.rule_index import reset_tax_rule_index
+        from taxright.taxability import MATRIX_VERSION, TaxabilityMatrix
+        reset_tax_rule_index()
+        self.addCleanup(reset_tax_rule_index)
+        TaxRule.objects.create(state_code='NC', tax_rate=Decimal('0.0475'), effective_date='2020-01-01', rule_type='state')
+        ConfigManager.set_config('verification_cache_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        invoice = Invoice.objects.create(
+            invoice_number='INV-T1', date='2024-01-15', vendor_name='Facility Services Inc',
+            total_amount=Decimal('300.00'), state_code='NC'
+        )
+        items = {}
+        for description, rate in (('Window cleaning', '0.0475'), ('Tires (set of 4)', '0'), ('Plumbing repair', '0')):
+            items[description] = InvoiceLineItem.objects.create(
+                invoice=invoice, description=description, quantity=Decimal('1'), unit_price=Decimal('100.00'),
+                line_total=Decimal('100.00'), tax_rate=Decimal(rate), tax_amount=Decimal(rate) * 100,
+                tax_status='taxable' if Decimal(rate) else 'exempt'
+            )
+        verdict = lambda status, label: {
+            'status': status, 'label': label, 'summary': f'{label} in North Carolina.',
+            'citation': 'N.C. Gen. Stat. §105-164.4.', 'reference': 'BNA-SUTN NC', 'source': 'SUT.xlsx',
+        }
+        matrix = TaxabilityMatrix({'version': MATRIX_VERSION, 'sources': ['SUT.xlsx'], 'topics': {
+            classify_line_item('Window cleaning')['topic']: {'NC': verdict('exempt', 'Nontaxable')},
+            classify_line_item('Tires')['topic']: {'NC': verdict('taxable', 'Taxable')},
+            classify_line_item('Plumbing repair')['topic']: {'NC': verdict('conditional', 'Depends')},
+        }})
+        
+        with mock.patch('taxright.services.get_client'):
+            service = BedrockKnowledgeBaseService()
+        kb_verdict = {
+            'is_correct': True, 'expected_tax_rate': Decimal('0.0000'), 'confidence_score': Decimal('0.80'),
+            'reasoning': 'Repair to real property is not taxable here.', 'kb_response': None,
+        }
+        with mock.patch('taxright.services.get_taxability_matrix', return_value=matrix), \
+                mock.patch.object(service, '_verify_line_item', return_value=kb_verdict) as verify:
+            service.verify_invoice_taxes(invoice)
+        
+        self.assertEqual([call.args[0].id for call in verify.call_args_list], [items['Plumbing repair'].id])
+        window_cleaning = LineItemTaxVerification.objects.get(line_item=items['Window cleaning'])
+        self.assertFalse(window_cleaning.is_correct)
+        self.assertEqual(window_cleaning.expected_tax_rate, Decimal('0.0000'))
+        self.assertEqual(window_cleaning.verification_details['source'], 'taxability_matrix')
+        self.assertEqual(window_cleaning.verification_details['taxability']['category'], 'window_cleaning')
+        tires = LineItemTaxVerification.objects.get(line_item=items['Tires (set of 4)'])
+        self.assertFalse(tires.is_correct)
+        self.assertEqual(tires.expected_tax_rate, Decimal('0.0475'))
+
+
+class VerificationPersistenceTest(TestCase):
+    """Test cases for the bulk persistence path of verify_invoice_taxes"""
+    
+    def setUp(self):
+        """Set up a KB mapping, model pricing and a loaded TaxRule index"""
+        from invoice_ocr.models import BedrockModelConfig
+        from taxright.rule_index import get_tax_rule_index, reset_tax_rule_index
+        reset_tax_rule_index()
+        get_tax_rule_index()
+        self.addCleanup(reset_tax_rule_index)
+        ConfigManager.set_config('near_duplicate_enabled', False)
+        StateKnowledgeBase.objects.create(state_code='NC', knowledge_base_id='KB123', knowledge_base_name='NC KB')
+        BedrockModelConfig.objects.create(
+            name='Sonnet', model_id='anthropic.claude-3-sonnet-20240229-v1:0',
+            input_token_cost=Decimal('0.003'), output_token_cost=Decimal('0.015')
+        )
+        with mock.patch('taxright.services.get_client'):
+            self.service = BedrockKnowledgeBaseService()
+    
+    def _verify(self, count, **invoice_fields):
+        """Create an invoice with count line items and verify it with canned KB verdicts, capturing the queries
+        
+        Only the KB call is stubbed: local rules, the verification cache and persistence all run.
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        invoice = Invoice.objects.create(
+            invoice_number=f'INV-Q{count}', date='2024-01-15', vendor_name='Vendor', state_code='NC',
+            total_amount=Decimal('107.00') * count, **invoice_fields
+        )
+        line_items = [
+            InvoiceLineItem.objects.create(
+                invoice=invoice, description=f'Item {count}-{idx}', quantity=Decimal('1'), unit_price=Decimal('100.00'),
+                line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'), tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            for idx in range(count)
+        ]
+        results = {
+            line_item.id: {
+                'is_correct': idx % 2 == 0, 'expected_tax_rate': Decimal('0.0700') if idx % 2 == 0 else Decimal('0.0000'),
+                'confidence_score': Decimal('0.90'), 'reasoning': 'Taxable in NC.', 'kb_id': 'KB123', 'kb_name': 'NC KB',
+                'kb_response': {
+                    'citations': [], 'metadata': {'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0'},
+                    'token_usage': {'inputTokens': 1000, 'outputTokens': 100, 'totalTokens': 1100},
+                },
+            }
+            for idx, line_item in enumerate(line_items)
+        }
+        with mock.patch.object(self.service, '_verify_line_item_safely',
+                               side_effect=lambda line_item, *args, **kwargs: results[line_item.id]), \
+                CaptureQueriesContext(connection) as queries:
+            result = self.service.verify_invoice_taxes(invoice)
+        return invoice, line_items, result, len(queries)
+    
+    def test_query_count_does_not_grow_with_line_items(self):
+        """Test verifying and re-verifying an invoice uses a fixed number of queries regardless of its size"""
+        _, _, _, small = self._verify(3)
+        invoice, line_items, result, large = self._verify(60)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 20)
+        
+        # Re-verification is served from the verification cache and updates the existing records in bulk,
+        # again at a fixed cost
+        with mock.patch.object(self.service, '_verify_line_item_safely') as verify_line_item:
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+            with CaptureQueriesContext(connection) as queries:
+                self.service.verify_invoice_taxes(invoice)
+        verify_line_item.assert_not_called()
+        self.assertLessEqual(len(queries), large)
+        self.assertEqual(LineItemTaxVerification.objects.filter(line_item__invoice=invoice).count(), 60)
+        self.assertEqual(
+            LineItemTaxVerification.objects.filter(line_item__invoice=invoice, verification_details__source='cache').count(), 60
+        )
+    
+    def test_bulk_writes_match_per_item_results(self):
+        """Test KB costs, fallback-updated verifications and the determination are all persisted"""
+        invoice, line_items, result, _ = self._verify(4)
+        invoice.refresh_from_db()
+        
+        self.assertEqual(invoice.total_llm_cost, Decimal('0.0180'))
+        line_items[0].refresh_from_db()
+        self.assertEqual(line_items[0].kb_total_tokens, 1100)
+        self.assertEqual(line_items[0].kb_total_cost, Decimal('0.0045'))
+        
+        # Zero expected rates on taxed items fall back to the applied rate, which then matches
+        fallback = LineItemTaxVerification.objects.get(line_item=line_items[1])
+        self.assertEqual(fallback.expected_tax_rate, Decimal('0.0700'))
+        self.assertTrue(fallback.is_correct)
+        self.assertTrue(fallback.reasoning.startswith('[Updated]'))
+        self.assertEqual(
+            [v['verification_id'] for v in result['line_item_verifications']],
+            [LineItemTaxVerification.objects.get(line_item=line_item).id for line_item in line_items]
+        )
+        determination = TaxDetermination.objects.get(invoice=invoice)
+        self.assertEqual(determination.expected_tax, Decimal('28.00'))
+        self.assertEqual(determination.actual_tax, Decimal('28.00'))
+
+
+class TaxMathTest(TestCase):
+    """Test cases for the vectorized expected-tax math in taxright.tax_math"""
+    
+    def _random_invoice(self, rng):
+        """Generate a random invoice, biased towards discount, fallback and rounding edge cases"""
+        items = []
+        for _ in range(rng.randint(0, 8)):
+            applied_rate = Decimal(rng.choice([0, 0, 400, 675, 725, 1025, 10000])) / 10000
+            expected_rate = rng.choice([None, Decimal('0.0000'), applied_rate, Decimal(rng.randint(0, 1500)) / 10000])
+            line_total = Decimal(rng.choice([0, 1, 5, rng.randint(0, 10 ** 6), rng.randint(0, 10 ** 11)])) / 100
+            items.append((line_total, Decimal(rng.randint(0, 10 ** 5)) / 100, applied_rate, expected_rate,
+                          rng.random() < 0.7, rng.random() < 0.1))
+        subtotal = sum((item[0] for item in items), Decimal('0.00'))
+        discount = rng.choice([None, Decimal('0.00'), Decimal(rng.randint(1, 10 ** 5)) / 100, subtotal * 2])
+        total = rng.choice([subtotal, subtotal - (discount or 0), subtotal + Decimal('0.01'), Decimal(rng.randint(0, 10 ** 7)) / 100])
+        total_tax = rng.choice([None, Decimal('0.00'), Decimal(rng.randint(0, 10 ** 5)) / 100])
+        return total, discount, total_tax, items
+    
+    def test_matches_decimal_reference(self):
+        """Test vectorized results equal the line-by-line Decimal calculation on seeded random invoices"""
+        import random
+        from taxright.tax_math import InvoiceBatch, compute_expected_taxes, from_cents, reference_invoice_tax
+        rng = random.Random(2024)
+        invoices = [self._random_invoice(rng) for _ in range(500)]
+        batch = InvoiceBatch()
+        for invoice in invoices:
+            batch.add_invoice(*invoice)
+        arrays = batch.arrays()
+        results = compute_expected_taxes(arrays)
+        
+        for position, invoice in enumerate(invoices):
+            reference = reference_invoice_tax(*invoice)
+            start, end = arrays['offsets'][position], arrays['offsets'][position + 1]
+            self.assertEqual(from_cents(results['expected_tax'][position]), reference['expected_tax'], invoice)
+            self.assertEqual(from_cents(results['actual_tax'][position]), reference['actual_tax'], invoice)
+            self.assertEqual([i for i in range(end - start) if results['fallback'][start + i]], reference['fallback'])
+    
+    def test_largest_remainder_allocation_is_exact(self):
+        """Test per-line taxes and discounted amounts add up exactly to the invoice totals, including past int64"""
+        from taxright.tax_math import InvoiceBatch, compute_expected_taxes
+        batch = InvoiceBatch()
+        thirds = [(Decimal('33.33'), 0, Decimal('0.0725'), Decimal('0.0725'), True, False)] * 3
+        batch.add_invoice(Decimal('89.99'), Decimal('10.00'), None, thirds)
+        batch.add_invoice(Decimal('0.00'), None, None, [])
+        huge = [(Decimal('9999999999.99'), 0, Decimal('0.0700'), Decimal('0.0700'), True, False)] * 2
+        batch.add_invoice(Decimal('19999999999.98'), Decimal('0.01'), None, huge + thirds)
+        results = compute_expected_taxes(batch.arrays())
+        
+        # 3 x 33.33 less 10.00 discount = 89.99 taxed at 7.25% = 6.524275 -> 6.52
+        self.assertEqual(list(results['expected_tax']), [652, 0, 140000000725])
+        self.assertEqual(sum(results['line_tax'][:3]), 652)
+        self.assertEqual(sorted(results['discounted'][:3]), [2999, 3000, 3000])
+        self.assertEqual(sum(results['line_tax'][3:]), results['expected_tax'][2])
+        self.assertEqual(sum(results['discounted'][3:]), 2 * 999999999999 + 3 * 3333 - 1)
+    
+    def test_recompute_command_updates_stale_determinations(self):
+        """Test recompute_tax_determinations rewrites only amounts that no longer match the line items"""
+        from io import StringIO
+        invoice = Invoice.objects.create(
+            invoice_number='INV-RC', date='2024-01-15', vendor_name='Vendor', state_code='NC',
+            total_amount=Decimal('190.00'), invoice_discount_amount=Decimal('10.00')
+        )
+        for description, rate in (('Widget', Decimal('0.0700')), ('Gadget', Decimal('0.0000'))):
+            line_item = InvoiceLineItem.objects.create(
+                invoice=invoice, description=description, quantity=Decimal('1'), unit_price=Decimal('100.00'),
+                line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'), tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            LineItemTaxVerification.objects.create(
+                line_item=line_item, is_correct=bool(rate), confidence_score=Decimal('0.90'), reasoning='Checked.',
+                expected_tax_rate=rate, applied_tax_rate=Decimal('0.0700'), verification_details={'source': 'taxability_matrix'}
+            )
+        TaxDetermination.objects.create(
+            invoice=invoice, expected_tax=Decimal('14.00'), actual_tax=Decimal('14.00'), discrepancy_amount=Decimal('0.00')
+        )
+        
+        call_command('recompute_tax_determinations', '--dry-run', stdout=StringIO())
+        self.assertEqual(TaxDetermination.objects.get(invoice=invoice).expected_tax, Decimal('14.00'))
+        out = StringIO()
+        call_command('recompute_tax_determinations', stdout=out)
+        # The matrix-exempt Gadget is excluded and the whole discount falls on the Widget: 90.00 x 7%
+        determination = TaxDetermination.objects.get(invoice=invoice)
+        self.assertEqual(determination.expected_tax, Decimal('6.30'))
+        self.assertEqual(determination.discrepancy_amount, Decimal('7.70'))
+        self.assertIn('Updated 1 of 1', out.getvalue())
+
+
+class VerificationProgressTest(TransactionTestCase):
+    """Test cases for following tax verification progress over SSE and long-polling"""
+    
+    def setUp(self):
+        """Set up a user and an invoice whose KB verdicts are canned"""
+        from django.contrib.auth.models import User
+        ConfigManager.set_config('near_duplicate_enabled', False)
+        self.user = User.objects.create_user(username='reviewer', password='secret')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-SSE', date='2024-01-15', vendor_name='Vendor', state_code='NC', total_amount=Decimal('214.00')
+        )
+        self.line_items = [
+            InvoiceLineItem.objects.create(
+                invoice=self.invoice, description=f'Item {idx}', quantity=Decimal('1'), unit_price=Decimal('100.00'),
+                line_total=Decimal('100.00'), tax_rate=Decimal('0.0700'), tax_amount=Decimal('7.00'), tax_status='taxable'
+            )
+            for idx in range(2)
+        ]
+        
+        def verify_line_items(invoice, line_items, on_result=None):
+            results = []
+            for line_item in line_items:
+                result = {'is_correct': True, 'expected_tax_rate': Decimal('0.0700'), 'confidence_score': Decimal('0.90'),
+                          'reasoning': 'Taxable in NC.', 'kb_response': None}
+                if on_result is not None:
+                    on_result(line_item, result)
+                results.append(result)
+            return results
+        
+        self.patches = [
+            mock.patch('taxright.services.get_client'),
+            mock.patch.object(BedrockKnowledgeBaseService, '_verify_line_items', side_effect=verify_line_items),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_progress_writes_verifications_before_the_determination(self):
+        """Test progress mode saves each verification as it completes and moves verified_at on re-verification"""
+        from django.utils import timezone
+        from taxright.progress import parse_cursor, progress_since
+        service = BedrockKnowledgeBaseService()
+        start = timezone.now()
+        saved_before_callback = []
+        
+        def on_progress(verification, result):
+            saved_before_callback.append(LineItemTaxVerification.objects.filter(id=verification.id).exists())
+        
+        service.verify_invoice_taxes(self.invoice, on_progress=on_progress)
+        self.assertEqual(saved_before_callback, [True, True])
+        progress = progress_since(self.invoice, start)
+        self.assertEqual([event['line_item_id'] for event in progress['verifications']], [item.id for item in self.line_items])
+        self.assertEqual(progress['determination']['expected_tax'], '14.00')
+        self.assertEqual(progress_since(self.invoice, parse_cursor(progress['cursor']))['verifications'], [])
+        
+        # A re-verification reuses the records but reports them again after the previous cursor
+        service.verify_invoice_taxes(self.invoice, progress=True)
+        again = progress_since(self.invoice, parse_cursor(progress['cursor']))
+        self.assertEqual(len(again['verifications']), 2)
+        self.assertIsNotNone(again['determination'])
+        self.assertEqual(LineItemTaxVerification.objects.filter(line_item__invoice=self.invoice).count(), 2)
+    
+    def test_fallback_touches_written_verifications(self):
+        """Test the expected-rate fallback moves updated_at with verified_at on verifications written as progress"""
+        service = BedrockKnowledgeBaseService()
+        written = {}
+        
+        def zero_rate(invoice, line_items, on_result=None):
+            results = []
+            for line_item in line_items:
+                result = {'is_correct': False, 'expected_tax_rate': Decimal('0.0000'), 'confidence_score': Decimal('0.50'),
+                          'reasoning': 'No rate found.', 'kb_response': None}
+                on_result(line_item, result)
+                written[line_item.id] = LineItemTaxVerification.objects.get(line_item=line_item).updated_at
+                results.append(result)
+            return results
+        
+        BedrockKnowledgeBaseService._verify_line_items.side_effect = zero_rate
+        service.verify_invoice_taxes(self.invoice, progress=True)
+        
+        for verification in LineItemTaxVerification.objects.filter(line_item__invoice=self.invoice):
+            self.assertTrue(verification.is_correct)
+            self.assertEqual(verification.updated_at, verification.verified_at)
+            self.assertGreater(verification.updated_at, written[verification.line_item_id])
+    
+    def test_stream_follows_a_verification_started_by_post(self):
+        """Test the SSE endpoint only follows from a cursor, sending one event per line item then the determination"""
+        from django.urls import reverse
+        self.client.force_login(self.user)
+        url = reverse('taxright:invoice-verify-taxes-stream', args=[self.invoice.id])
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='text/event-stream').status_code, 400)
+        BedrockKnowledgeBaseService._verify_line_items.assert_not_called()
+        
+        cursor = self.client.get(reverse('taxright:invoice-verification-progress', args=[self.invoice.id])).json()['cursor']
+        self.client.post(reverse('taxright:invoice-verify-taxes', args=[self.invoice.id]) + '?progress=1')
+        response = self.client.get(url, {'cursor': cursor}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        events = re.findall(r'^event: (\w+)$', body, re.MULTILINE)
+        self.assertEqual(events, ['verification', 'verification', 'determination'])
+        
+        determination_id = re.findall(r'^id: (.+)$', body, re.MULTILINE)[-1]
+        ConfigManager.set_config('verification_poll_timeout_seconds', 0)
+        resumed = self.client.get(url, HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=determination_id)
+        resumed_events = re.findall(r'^event: (\w+)$', b''.join(resumed.streaming_content).decode(), re.MULTILINE)
+        self.assertEqual(resumed_events, ['determination'])
+        self.assertEqual(BedrockKnowledgeBaseService._verify_line_items.call_count, 1)
+    
+    def test_in_flight_verification_not_started_twice(self):
+        """Test a POST while a progress verification looks in flight is refused with a cursor to follow"""
+        from django.urls import reverse
+        self.client.force_login(self.user)
+        url = reverse('taxright:invoice-verify-taxes', args=[self.invoice.id])
+        self.assertEqual(self.client.post(url + '?progress=1').status_code, 200)
+        
+        # Results saved moments ago without a determination after them: still running
+        TaxDetermination.objects.filter(invoice=self.invoice).delete()
+        response = self.client.post(url + '?progress=1')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('cursor', response.json())
+        self.assertEqual(BedrockKnowledgeBaseService._verify_line_items.call_count, 1)
+    
+    def test_long_poll_follows_a_cursor(self):
+        """Test verification-progress hands out a cursor and returns only results saved after it"""
+        from django.urls import reverse
+        self.client.force_login(self.user)
+        url = reverse('taxright:invoice-verification-progress', args=[self.invoice.id])
+        cursor = self.client.get(url).json()['cursor']
+        self.assertEqual(self.client.get(url, {'cursor': cursor}).json()['verifications'], [])
+        
+        self.client.post(reverse('taxright:invoice-verify-taxes', args=[self.invoice.id]) + '?progress=1')
+        data = self.client.get(url, {'cursor': cursor, 'wait': 1}).json()
+        self.assertEqual(len(data['verifications']), 2)
+        self.assertEqual(data['determination']['determination_status'], 'verified')
+        self.assertEqual(self.client.get(url, {'cursor': 'yesterday'}).status_code, 400)
@@ -0,0 +1,418 @@
+"""
+Local vector index over the state tax topic files in RAG/state_data.
+
+A companion to the BM25 index (taxright.bm25) and an A/B counterpart to the
+Bedrock S3-vector knowledge bases. Every chunk produced by taxright.state_data
+is embedded ahead of time (manage.py build_vector_index) into a directory of:
+
+    embeddings.npy  float32 [chunks, dimension], L2-normalized, memory-mapped at runtime
+    texts.bin       utf-8 chunk texts
+    metadata.json   embedder, per-state row ranges, per-file hashes and row ranges,
+                    topics and per-row (file, topic, text offsets)
+
+Rows are sorted by state, so a query scores only its state's slice of the
+matrix with one matrix-vector product. Rebuilds are incremental: chunks of
+files whose content hash is unchanged keep their embeddings and only changed
+or new files are embedded again.
+
+The embedding function is pluggable through the kb_vector_embedder config:
+'hashing' (deterministic, local, no network; the default and the one tests
+use), 'titan' (Amazon Titan Text Embeddings V2 through Bedrock, the model the
+knowledge bases use) or a dotted path to an Embedder subclass.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from invoice_ocr.backends import get_client
+from invoice_ocr.config import ConfigManager
+from invoice_ocr.exceptions import ConfigurationError
+from invoice_ocr.resilience import call_with_resilience
+from taxright.bm25 import tokenize
+from taxright.state_data import MAX_CHUNK_WORDS, default_state_data_dir, iter_file_chunks, state_data_files
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+EMBEDDINGS_FILE = 'embeddings.npy'
+TEXTS_FILE = 'texts.bin'
+METADATA_FILE = 'metadata.json'
+
+EMBEDDERS = {
+    'hashing': 'taxright.vector_index.HashingEmbedder',
+    'titan': 'taxright.vector_index.BedrockTitanEmbedder',
+}
+
+
+class Embedder:
+    """Interface for text embedding functions used by the vector index."""
+
+    name = None
+
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the embedding space; embeddings are only reused across builds with the same fingerprint."""
+        return f"{self.name}:{self.dimension}"
+
+    def embed(self, texts: List[str]):
+        """
+        Embed texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            numpy.ndarray: float32 [len(texts), dimension], each row L2-normalized
+        """
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic feature-hashing embedder (words and word bigrams, log-scaled counts).
+
+    Needs no model or network, so it is stable across processes and machines and
+    suitable for tests and offline use. It captures lexical overlap only.
+    """
+
+    name = 'hashing'
+
+    def _features(self, text: str) -> Counter:
+        tokens = tokenize(text)
+        return Counter(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+    def embed(self, texts: List[str]):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class BedrockTitanEmbedder(Embedder):
+    """Amazon Titan Text Embeddings V2 through bedrock-runtime invoke_model (one call per text)."""
+
+    name = 'titan'
+    model_id = 'amazon.titan-embed-text-v2:0'
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.name}:{self.model_id}:{self.dimension}"
+
+    def embed(self, texts: List[str]):
+        client = get_client('bedrock-runtime')
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            body = json.dumps({'inputText': text, 'dimensions': self.dimension, 'normalize': True})
+            response = call_with_resilience(
+                lambda: client.invoke_model(modelId=self.model_id, body=body),
+                breaker_key=f"bedrock-runtime:{self.model_id}"
+            )
+            vectors[row] = json.loads(response['body'].read())['embedding']
+        return vectors
+
+
+def get_embedder(name: Optional[str] = None, dimension: Optional[int] = None) -> Embedder:
+    """
+    Create the configured embedder.
+
+    Args:
+        name: Embedder alias or dotted class path (defaults to kb_vector_embedder config)
+        dimension: Embedding dimension (defaults to kb_vector_dimension config)
+
+    Returns:
+        Embedder instance
+
+    Raises:
+        ConfigurationError: If the embedder cannot be loaded
+    """
+    name = name or ConfigManager.get_kb_vector_embedder()
+    try:
+        embedder_class = import_string(EMBEDDERS.get(name, name))
+    except ImportError as e:
+        raise ConfigurationError(f"Unknown vector embedder '{name}': {str(e)}")
+    return embedder_class(dimension=dimension or ConfigManager.get_kb_vector_dimension())
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_vector_index(output_dir, directory=None, embedder: Optional[Embedder] = None,
+                       max_chunk_words: int = MAX_CHUNK_WORDS, full: bool = False) -> Dict[str, Any]:
+    """
+    Build or incrementally update the vector index for a state_data directory.
+
+    Files whose content hash matches the existing index (built with the same embedder)
+    keep their chunks and embeddings; other files are chunked and embedded again, and
+    files no longer present are dropped. The new files are written next to the old ones
+    and moved into place, metadata last.
+
+    Args:
+        output_dir: Index directory
+        directory: state_data directory (defaults to RAG/state_data)
+        embedder: Embedder to use (defaults to the configured one)
+        max_chunk_words: Topics longer than this are split into overlapping windows
+        full: Re-embed every file even if unchanged
+
+    Returns:
+        dict: Build statistics (states, files, reused_files, embedded_files, chunks, embedded_chunks, bytes)
+    """
+    output_dir = Path(output_dir)
+    directory = Path(directory or default_state_data_dir())
+    embedder = embedder or get_embedder()
+
+    previous = None
+    if not full:
+        try:
+            previous = LocalVectorIndex(output_dir)
+        except (OSError, ValueError):
+            previous = None
+        if previous is not None and (previous.embedder_fingerprint != embedder.fingerprint
+                                     or previous.max_chunk_words != max_chunk_words):
+            logger.info("Vector index embedder or chunking changed; re-embedding every file")
+            previous = None
+
+    blocks, texts, topics = [], bytearray(), {}
+    files, states, rows = {}, {}, []
+    stats = {'reused_files': 0, 'embedded_files': 0, 'embedded_chunks': 0}
+    for state_code, paths in sorted(state_data_files(directory).items()):
+        state_start = len(rows)
+        for path in paths:
+            sha256 = _file_sha256(path)
+            old = previous.files.get(path.name) if previous else None
+            if old and old['sha256'] == sha256 and old['state_code'] == state_code:
+                chunks = [previous.chunk(row) for row in range(*old['rows'])]
+                block = np.array(previous.embeddings[old['rows'][0]:old['rows'][1]], dtype=np.float32)
+                stats['reused_files'] += 1
+            else:
+                chunks = list(iter_file_chunks(path, max_chunk_words))
+                block = embedder.embed([chunk['text'] for chunk in chunks]) if chunks \
+                    else np.zeros((0, embedder.dimension), dtype=np.float32)
+                stats['embedded_files'] += 1
+                stats['embedded_chunks'] += len(chunks)
+
+            file_index = len(files)
+            files[path.name] = {'state_code': state_code, 'sha256': sha256, 'rows': [len(rows), len(rows) + len(chunks)]}
+            for chunk in chunks:
+                encoded = chunk['text'].encode('utf-8')
+                rows.append([file_index, topics.setdefault(chunk['topic'], len(topics)), len(texts), len(texts) + len(encoded)])
+                texts.extend(encoded)
+            blocks.append(block)
+        states[state_code] = [state_start, len(rows)]
+    if previous is not None:
+        previous.close()
+
+    embeddings = np.concatenate(blocks) if blocks else np.zeros((0, embedder.dimension), dtype=np.float32)
+    metadata = {
+        'version': FORMAT_VERSION,
+        'embedder': embedder.fingerprint,
+        'dimension': embedder.dimension,
+        'max_chunk_words': max_chunk_words,
+        'built_at': timezone.now().isoformat(),
+        'source': str(directory),
+        'states': states,
+        'files': files,
+        'topics': sorted(topics, key=topics.get),
+        'rows': rows,
+    }
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / f"{EMBEDDINGS_FILE}.tmp", 'wb') as handle:
+        np.save(handle, embeddings.astype(np.float32, copy=False))
+    (output_dir / f"{TEXTS_FILE}.tmp").write_bytes(bytes(texts))
+    (output_dir / f"{METADATA_FILE}.tmp").write_text(json.dumps(metadata, separators=(',', ':')), encoding='utf-8')
+    for name in (EMBEDDINGS_FILE, TEXTS_FILE, METADATA_FILE):
+        os.replace(output_dir / f"{name}.tmp", output_dir / name)
+
+    stats.update({
+        'states': len(states),
+        'files': len(files),
+        'chunks': len(rows),
+        'bytes': sum((output_dir / name).stat().st_size for name in (EMBEDDINGS_FILE, TEXTS_FILE, METADATA_FILE)),
+    })
+    return stats
+
+
+class LocalVectorIndex:
+    """Read-only vector index with memory-mapped embeddings and per-state row ranges."""
+
+    def __init__(self, index_dir, embedder: Optional[Embedder] = None):
+        """
+        Open an index directory written by build_vector_index().
+
+        Args:
+            index_dir: Index directory
+            embedder: Embedder for queries (defaults to the one the index was built with,
+                resolved from its fingerprint on first search)
+
+        Raises:
+            FileNotFoundError: If the index has not been built
+            ValueError: If the files are incompatible or inconsistent
+        """
+        self.index_dir = Path(index_dir)
+        metadata = json.loads((self.index_dir / METADATA_FILE).read_text(encoding='utf-8'))
+        if metadata['version'] != FORMAT_VERSION:
+            raise ValueError(f"Incompatible vector index version {metadata['version']}")
+        self.embeddings = np.load(self.index_dir / EMBEDDINGS_FILE, mmap_mode='r')
+        if self.embeddings.shape != (len(metadata['rows']), metadata['dimension']):
+            raise ValueError(
+                f"Vector index embeddings {self.embeddings.shape} do not match metadata "
+                f"({len(metadata['rows'])} rows x {metadata['dimension']}); rebuild it"
+            )
+        self._texts = np.memmap(self.index_dir / TEXTS_FILE, dtype=np.uint8, mode='r') \
+            if (self.index_dir / TEXTS_FILE).stat().st_size else np.zeros(0, dtype=np.uint8)
+
+        self.embedder_fingerprint = metadata['embedder']
+        self.dimension = metadata['dimension']
+        self.max_chunk_words = metadata['max_chunk_words']
+        self.built_at = metadata['built_at']
+        self.states = metadata['states']
+        self.files = metadata['files']
+        self.topics = metadata['topics']
+        self.rows = metadata['rows']
+        self._file_names = list(self.files)
+        self._embedder = embedder
+
+    def close(self):
+        """Drop the memory maps (they are unmapped once no slices of them remain)."""
+        self.embeddings = None
+        self._texts = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def embedder(self) -> Embedder:
+        """Query embedder, matching the embedding space the index was built in."""
+        if self._embedder is None:
+            name = self.embedder_fingerprint.split(':', 1)[0]
+            self._embedder = get_embedder(name, self.dimension)
+            if self._embedder.fingerprint != self.embedder_fingerprint:
+                raise ConfigurationError(
+                    f"Vector index was built with {self.embedder_fingerprint}, "
+                    f"but the configured embedder is {self._embedder.fingerprint}"
+                )
+        return self._embedder
+
+    def has_state(self, state_code: str) -> bool:
+        """Return True if the index has chunks for a state."""
+        row_range = self.states.get((state_code or '').upper())
+        return bool(row_range) and row_range[1] > row_range[0]
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        """
+        Get a chunk's text and provenance.
+
+        Args:
+            row: Row returned by search()
+
+        Returns:
+            dict: 'row', 'text', 'topic' and 'file'
+        """
+        file_index, topic_index, text_start, text_end = self.rows[row]
+        return {
+            'row': row,
+            'text': bytes(self._texts[text_start:text_end]).decode('utf-8'),
+            'topic': self.topics[topic_index],
+            'file': self._file_names[file_index],
+        }
+
+    def search(self, state_code: str, query: str, top_k: int = 5) -> List[tuple]:
+        """
+        Rank a state's chunks by cosine similarity to a query.
+
+        Args:
+            state_code: 2-letter state code
+            query: Query text
+            top_k: Number of results
+
+        Returns:
+            list: (row, similarity) pairs, best first; empty if the state is not indexed
+        """
+        if not self.has_state(state_code):
+            return []
+        start, end = self.states[state_code.upper()]
+        query_vector = self.embedder.embed([query])[0]
+        # Rows and the query are L2-normalized, so the dot product is the cosine similarity
+        scores = self.embeddings[start:end] @ query_vector
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(start + int(offset), float(scores[offset])) for offset in best]
+
+    def retrieve(self, state_code: str, query: str, number_of_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search a state and format the hits like Bedrock Retrieve 'retrievalResults'.
+
+        Args:
+            state_code: 2-letter state code
+            query: Query text
+            number_of_results: Number of results
+
+        Returns:
+            list: Retrieval results with content, location, score and metadata
+        """
+        results = []
+        for row, score in self.search(state_code, query, number_of_results):
+            chunk = self.chunk(row)
+            results.append({
+                'content': {'text': chunk['text']},
+                'location': {'type': 'LOCAL', 'localLocation': {'uri': f"state_data/{chunk['file']}"}},
+                'score': round(score, 4),
+                'metadata': {'state_code': state_code.upper(), 'topic': chunk['topic'], 'chunk_id': row},
+            })
+        return results
+
+
+def vector_index_dir() -> Path:
+    """Resolve the configured index directory (relative paths are relative to the project root)."""
+    path = Path(ConfigManager.get_kb_vector_index_dir())
+    return path if path.is_absolute() else Path(__file__).resolve().parent.parent / path
+
+
+_index: Optional[LocalVectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> LocalVectorIndex:
+    """
+    Return the process-wide vector index, mapping it on first use.
+
+    Raises:
+        FileNotFoundError: If the index has not been built (manage.py build_vector_index)
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LocalVectorIndex(vector_index_dir())
+            logger.info(
+                f"Mapped vector index {_index.index_dir} ({len(_index)} chunks, "
+                f"{_index.embedder_fingerprint}, built {_index.built_at})"
+            )
+        return _index
+
+
+def reset_vector_index():
+    """Drop the process-wide vector index so the next use maps the files again (e.g. after a rebuild)."""
+    global _index
+    with _index_lock:
+        _index = None
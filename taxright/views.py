@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum
 from django.contrib import messages
@@ -7,6 +8,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from decimal import Decimal
 import tempfile
 import os
@@ -21,9 +23,23 @@ from .serializers import (
     LineItemTaxVerificationSerializer,
     StateKnowledgeBaseSerializer
 )
-from .services import create_invoice_from_ocr, BedrockKnowledgeBaseService
+from .services import create_invoice_from_ocr, create_invoice_from_ocr_stream, BedrockKnowledgeBaseService
+from .progress import (
+    format_cursor, parse_cursor, sse_event, verification_in_progress, verification_stream, wait_for_progress
+)
 from invoice_ocr.services import InvoiceProcessor
 from invoice_ocr.exceptions import InvoiceProcessingError
+from invoice_ocr.config import ConfigManager
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renderer that lets text/event-stream requests through content negotiation; errors become an SSE event."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('verification_error', data).encode(self.charset)
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -151,26 +167,41 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         
         return Response(data)
     
+    def _verification_error(self, invoice):
+        """Get the reason an invoice cannot be verified, or None"""
+        if not invoice.state_code or invoice.state_code == 'XX':
+            return 'Invoice does not have a valid state code'
+        if not invoice.line_items.exists():
+            return 'Invoice has no line items to verify'
+        return None
+    
     @action(detail=True, methods=['post'], url_path='verify-taxes')
     def verify_taxes(self, request, pk=None):
-        """Manually trigger tax verification for an invoice"""
-        invoice = self.get_object()
+        """
+        Manually trigger tax verification for an invoice.
         
-        if not invoice.state_code or invoice.state_code == 'XX':
-            return Response(
-                {'error': 'Invoice does not have a valid state code'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        With ?progress=1 each line item's verification is saved as soon as it is ready,
+        so the verification-progress and verify-taxes/stream endpoints can report it before
+        this request returns. A verification that looks in flight is not started twice:
+        the response is 409 with the cursor to follow it from.
+        """
+        invoice = self.get_object()
         
-        if not invoice.line_items.exists():
+        error = self._verification_error(invoice)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        in_flight_cursor = verification_in_progress(invoice, ConfigManager.get_verification_in_flight_seconds())
+        if in_flight_cursor is not None:
             return Response(
-                {'error': 'Invoice has no line items to verify'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Tax verification is already running for this invoice', 'cursor': format_cursor(in_flight_cursor)},
+                status=status.HTTP_409_CONFLICT
             )
         
         try:
             kb_service = BedrockKnowledgeBaseService()
-            result = kb_service.verify_invoice_taxes(invoice)
+            result = kb_service.verify_invoice_taxes(
+                invoice, progress=request.query_params.get('progress') in ('1', 'true')
+            )
             
             return Response({
                 'message': 'Tax verification completed',
@@ -188,6 +219,54 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=True, methods=['get'], url_path='verify-taxes/stream',
+            renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def verify_taxes_stream(self, request, pk=None):
+        """
+        Follow an invoice's tax verification as server-sent events.
+        
+        Sends a 'verification' event per line item verification saved after the cursor
+        (Last-Event-ID, or ?cursor= from verification-progress taken before POSTing
+        verify-taxes) and a final 'determination' event. It never starts a verification.
+        """
+        invoice = self.get_object()
+        resume = request.headers.get('Last-Event-ID') or request.query_params.get('cursor')
+        if not resume:
+            return Response(
+                {'error': 'A cursor is required; start the verification with a POST to verify-taxes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            cursor = parse_cursor(resume)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(verification_stream(invoice, cursor), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @action(detail=True, methods=['get'], url_path='verification-progress')
+    def verification_progress(self, request, pk=None):
+        """
+        Long-poll the verifications and determination saved after a cursor.
+        
+        Without a cursor, returns the current cursor to follow a verification about to be
+        started. With ?wait=<seconds> (capped by verification_poll_timeout_seconds), waits
+        until there is something new.
+        """
+        invoice = self.get_object()
+        if not request.query_params.get('cursor'):
+            return Response({'cursor': format_cursor(timezone.now()), 'verifications': [], 'determination': None})
+        try:
+            cursor = parse_cursor(request.query_params['cursor'])
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        wait = min(max(wait, 0.0), ConfigManager.get_verification_poll_timeout())
+        return Response(wait_for_progress(invoice, cursor, wait))
+    
     @action(detail=True, methods=['get'], url_path='pipeline/tax-determination')
     def get_tax_determination_data(self, request, pk=None):
         """Get tax determination data for pipeline"""
@@ -330,6 +409,7 @@ def invoice_detail(request, invoice_id):
         'invoice': invoice,
         'line_items_kb_cost': line_items_kb_cost,
         'line_items_kb_tokens': line_items_kb_tokens,
+        'verification_streaming': ConfigManager.get_verification_streaming_enabled(),
     }
     
     return render(request, 'taxright/invoice_detail.html', context)
@@ -374,6 +454,20 @@ def upload_invoice(request):
             
             # Process via OCR
             processor = InvoiceProcessor()
+            if ConfigManager.get_ocr_streaming_enabled():
+                # Line items are written as the model generates them
+                invoice = create_invoice_from_ocr_stream(
+                    processor.process_pdf_stream(
+                        file_path=temp_file_path,
+                        method='bedrock',
+                        create_job=True
+                    ),
+                    pdf_file=pdf_file,
+                    invoice=invoice
+                )
+                messages.success(request, f'Invoice {invoice.invoice_number} processed successfully!')
+                return redirect('taxright:invoice_detail', invoice_id=invoice.id)
+            
             ocr_result, ocr_usage_info = processor.process_pdf(
                 file_path=temp_file_path,
                 method='bedrock',